@@ -15,7 +15,40 @@ class Settings(BaseSettings):
     stellar_network_passphrase: str = "Test SDF Network ; September 2015"  # Testnet
     stellar_horizon_url: str = "https://horizon-testnet.stellar.org"
     stellar_admin_secret: str = ""  # Admin account secret key
+    stellar_channel_secrets: str = ""  # Comma-separated funded channel account secrets for parallel submission
     chainfund_contract_id: str = ""  # Deployed project funding contract ID
+    soroban_cli_path: str = "stellar"  # Stellar CLI used for v2 contract calls
+    soroban_cli_concurrency: int = 4  # CLI processes running at once
+    soroban_cli_max_queue: int = 64  # Calls waiting for a slot before requests get a 503
+    soroban_cli_invoke_timeout: float = 60  # Seconds per transaction before the process is killed
+    soroban_cli_view_timeout: float = 30  # Seconds per read-only (--is-view) call
+    soroban_transport: str = "rpc"  # "rpc" (in-process JSON-RPC client) or "cli"; writes use the CLI until STELLAR_ADMIN_SECRET is set
+    soroban_rpc_url: str = "https://soroban-testnet.stellar.org"
+    soroban_rpc_max_connections: int = 20  # Pooled keep-alive connections to the RPC node
+    soroban_rpc_timeout: float = 10  # Seconds per JSON-RPC request
+    soroban_rpc_tx_timeout: float = 60  # Max wait for a sent transaction to be applied
+    soroban_rpc_poll_interval: float = 1.0  # Seconds between getTransaction polls
+    contract_view_cache_ledgers: int = 2  # Ledgers a cached contract read stays valid (0 disables)
+    contract_view_cache_size: int = 4096  # Cached contract reads kept in memory
+    chain_indexer_enabled: bool = False  # Follow contract events into the chain_* tables
+    chain_indexer_start_ledger: int = 0  # First ledger to index when there is no checkpoint (0 = latest)
+    chain_indexer_poll_interval: float = 5  # Seconds between getEvents polls
+    chain_indexer_page_size: int = 200  # Events per getEvents page
+    chain_indexer_backfill_chunk: int = 2000  # Ledgers per backfill range
+    chain_indexer_backfill_concurrency: int = 4  # Backfill ranges fetched at once
+    chain_indexer_backfill_max_ledgers: int = 120960  # Largest range POST /v2/index/backfill accepts (about a week)
+    contract_reads_from_index: bool = False  # Serve v2 reads from the chain index when it has the row
+    tx_batch_window_ms: float = 50  # How long bulk writes (SBT/reward mints, refunds) wait to share a transaction
+    tx_batch_max_items: int = 20  # Items per batched transaction (bounded by the Soroban resource budget)
+    http_timeout: float = 10  # Seconds per outbound HTTP request (Horizon, Friendbot, IPFS pinning)
+    horizon_submit_timeout: float = 35  # Seconds to wait on POST /transactions (Horizon answers 504 after ~30s)
+    http_max_connections: int = 50  # Pooled keep-alive connections across all hosts
+    http_max_per_host: int = 10  # Requests in flight to one host
+    http_max_retries: int = 3  # Retries of idempotent requests after errors, timeouts, 429 and 502-504
+    http_breaker_failure_threshold: int = 5  # Consecutive failures before a host is skipped
+    http_breaker_reset_seconds: float = 30.0
+    account_cache_ttl_seconds: float = 5  # Cached account balances/sequence numbers (about one ledger; 0 disables)
+    account_cache_size: int = 10000  # Cached accounts kept in memory
 
     model_config = {
         "env_file": ".env",
@@ -37,11 +70,45 @@ class Settings(BaseSettings):
     
     # AI Configuration
     groq_api_key: str = ""
+    groq_model: str = "llama3-70b-8192"
+    ai_max_concurrency: int = 4  # Groq calls in flight per worker
+    ai_timeout_seconds: float = 20.0  # Per call, including the provider round trip
+    ai_queue_timeout_seconds: float = 5.0  # Max wait for a free call slot before falling back
+    ai_breaker_failure_threshold: int = 5  # Consecutive failures before using the fallback
+    ai_breaker_reset_seconds: float = 30.0
+    ai_cache_ttl_hours: float = 168  # Cached analysis results are reused for a week
+    ai_cache_memory_size: int = 1024  # Entries kept in the in-process LRU
+    ai_scoring_concurrency: int = 2  # Parallel calls for batch scoring (capped below ai_max_concurrency)
+    ai_scoring_rate_per_minute: float = 30  # Provider request budget for batch scoring
+    ai_score_max_age_days: float = 30  # Scores older than this are recomputed
+    ai_job_workers: int = 4  # AI job queue workers per process
+    ai_job_user_concurrency: int = 2  # Running AI jobs per user
+    ai_job_max_queued_per_user: int = 20  # Submissions beyond this get a 429
+    ai_job_sync_wait_seconds: float = 60  # Max wait for endpoints answering inline
+    ai_job_callback_timeout_seconds: float = 10
+    ai_job_callback_allow_private: bool = False  # Development only: accept http:// and loopback/private callback hosts
+
+    # Proof image processing
+    image_workers: int = 2  # Processes for decoding/hashing proof images
+    image_duplicate_max_distance: int = 10  # pHash bits that may differ for a near-duplicate
+    proof_geo_radius_km: float = 5.0  # How far a proof photo's geotag may be from the task location
 
     # JWT Configuration
     jwt_secret_key: str = "your-secret-key-change-in-production"
     jwt_algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    jwt_keyring_path: str = ""  # Defaults to keyring.json next to chainfund.db
+
+    # Login Lockout Configuration
+    login_max_failures: int = 5  # Failed logins per account before it is locked
+    login_ip_max_failures: int = 20  # Failed logins per IP before it is blocked
+    login_failure_window_minutes: int = 15
+    login_lockout_minutes: int = 15
+
+    # Horizontal Scaling Configuration
+    horizontal_scaling: bool = False  # Share counters across uvicorn workers via SQLite
+    web_workers: int = 0  # 0 = one worker per CPU core
+    shared_state_db_path: str = ""  # Defaults to shared_state.db next to chainfund.db
 
     # CORS Configuration - Using List directly
     allowed_origins: List[str] = [
@@ -37,6 +37,14 @@ def dict_from_row(row) -> Optional[Dict]:
     return dict(row)
 
 
+def ensure_columns(cursor, table: str, columns: List[tuple]):
+    """Add (name, type) columns to an existing table if they are missing"""
+    existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    for column_name, column_type in columns:
+        if column_name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column_name} {column_type}")
+
+
 def init_database():
     """Initialize the database with all required tables"""
     with get_db_connection() as conn:
@@ -65,11 +73,19 @@ def init_database():
                 primary_wallet TEXT,
                 stellar_public_key TEXT,
                 last_login TEXT,
+                failed_login_attempts INTEGER DEFAULT 0,
+                locked_until TEXT,
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP,
                 updated_at TEXT DEFAULT CURRENT_TIMESTAMP
             )
         ''')
         
+        # Columns added after the first release (older databases lack them)
+        ensure_columns(cursor, 'users', [
+            ("failed_login_attempts", "INTEGER DEFAULT 0"),
+            ("locked_until", "TEXT"),
+        ])
+        
         # Auth Tokens table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS auth_tokens (
@@ -98,6 +114,49 @@ def init_database():
             )
         ''')
         
+        # Wallet Identity table - every linked wallet resolves to one user
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS wallet_identity (
+                address TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_wallet_identity_user ON wallet_identity(user_id)")
+        
+        # Backfill wallets linked before the index existed
+        cursor.execute('''
+            INSERT OR IGNORE INTO wallet_identity (address, user_id)
+            SELECT wallet_address, id FROM users WHERE wallet_address IS NOT NULL
+        ''')
+        cursor.execute('''
+            INSERT OR IGNORE INTO wallet_identity (address, user_id)
+            SELECT primary_wallet, id FROM users WHERE primary_wallet IS NOT NULL
+        ''')
+        cursor.execute('''
+            INSERT OR IGNORE INTO wallet_identity (address, user_id)
+            SELECT wallet_address, user_id FROM wallet_connections
+        ''')
+
+        # API keys for machine clients (only an HMAC of the secret is stored)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS api_keys (
+                prefix TEXT PRIMARY KEY,
+                secret_hmac TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                scopes TEXT DEFAULT '[]',  -- JSON array
+                tier TEXT DEFAULT 'standard',
+                roles TEXT DEFAULT '[]',  -- JSON array, snapshot of owner's roles
+                revoked INTEGER DEFAULT 0,
+                usage_count INTEGER DEFAULT 0,
+                last_used_at TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_api_keys_user ON api_keys(user_id)")
+
         # Audit Log table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS audit_log (
@@ -115,6 +174,195 @@ def init_database():
             )
         ''')
         
+        # Email Outbox table - emails written in the same transaction as their event
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS email_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                dedupe_key TEXT UNIQUE NOT NULL,
+                template TEXT NOT NULL,
+                to_email TEXT NOT NULL,
+                params TEXT,  -- JSON
+                status TEXT DEFAULT 'pending',  -- pending, sending, sent, dead
+                attempts INTEGER DEFAULT 0,
+                next_attempt_at TEXT,
+                locked_until TEXT,
+                last_error TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                sent_at TEXT
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_email_outbox_due ON email_outbox(status, next_attempt_at)")
+        
+        # Fan-out Jobs table - one notification to every backer of a project
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS fanout_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                dedupe_key TEXT UNIQUE NOT NULL,
+                template TEXT NOT NULL,
+                project_id INTEGER NOT NULL,
+                params TEXT,  -- JSON, shared by every recipient
+                status TEXT DEFAULT 'pending',  -- pending, running, done, failed
+                cursor_id INTEGER DEFAULT 0,  -- last user id processed (keyset cursor)
+                total INTEGER,
+                sent INTEGER DEFAULT 0,
+                failed INTEGER DEFAULT 0,
+                attempts INTEGER DEFAULT 0,  -- claims since the last saved chunk
+                locked_until TEXT,
+                last_error TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                started_at TEXT,
+                updated_at TEXT,
+                finished_at TEXT
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_fanout_jobs_status ON fanout_jobs(status)")
+        ensure_columns(cursor, 'fanout_jobs', [
+            ('attempts', 'INTEGER DEFAULT 0'),
+        ])
+        
+        # Notification Preferences table - instant email or hourly/daily digest
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS notification_preferences (
+                user_id INTEGER PRIMARY KEY,
+                digest_mode TEXT DEFAULT 'instant',  -- instant, hourly, daily
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # Notification Events table - buffered events waiting for a digest
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS notification_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                event_type TEXT NOT NULL,
+                project_id INTEGER,
+                project_title TEXT,
+                actor_name TEXT,
+                amount REAL DEFAULT 0,
+                currency TEXT DEFAULT 'XLM',
+                digest_id INTEGER,  -- NULL until included in a digest
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_notification_events_pending
+            ON notification_events(user_id, id) WHERE digest_id IS NULL
+        ''')
+        
+        # Notification Digests table - one row per digest email
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS notification_digests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                mode TEXT NOT NULL,
+                window_start TEXT,
+                window_end TEXT,
+                event_count INTEGER DEFAULT 0,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # AI Analysis Cache table - provider results keyed by normalized content hash
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_analysis_cache (
+                cache_key TEXT PRIMARY KEY,  -- sha256 of kind, model, prompt version and content
+                kind TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                result TEXT NOT NULL,  -- JSON
+                hits INTEGER DEFAULT 0,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                expires_at TEXT NOT NULL,
+                last_hit_at TEXT
+            )
+        ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ai_analysis_cache_expires ON ai_analysis_cache(expires_at)"
+        )
+        
+        # Project AI Scores table - latest greenwashing score per project/campaign
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS project_ai_scores (
+                source TEXT NOT NULL,  -- projects, campaigns
+                project_id INTEGER NOT NULL,
+                score INTEGER NOT NULL,
+                credibility_level TEXT,
+                flags TEXT,  -- JSON array
+                summary TEXT,
+                model TEXT,
+                prompt_version TEXT,
+                content_hash TEXT,  -- rescored when the project text changes
+                scored_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (source, project_id)
+            )
+        ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_project_ai_scores_score ON project_ai_scores(source, score)"
+        )
+        
+        # AI Scoring Jobs table - resumable batch scoring runs
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_scoring_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                status TEXT DEFAULT 'pending',  -- pending, running, done, failed, cancelled
+                force INTEGER DEFAULT 0,  -- rescore everything, not only unscored/stale
+                cursor_source TEXT,  -- checkpoint: last source/id fully processed
+                cursor_id INTEGER DEFAULT 0,
+                total INTEGER,
+                scored INTEGER DEFAULT 0,
+                skipped INTEGER DEFAULT 0,
+                failed INTEGER DEFAULT 0,
+                requested_by INTEGER,
+                locked_until TEXT,
+                last_error TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                started_at TEXT,
+                updated_at TEXT,
+                finished_at TEXT
+            )
+        ''')
+        
+        # AI job queue (proof verification, sustainability analysis)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,  -- verify_proof, analyze_sustainability
+                user_id INTEGER NOT NULL,
+                priority INTEGER DEFAULT 5,  -- lower runs first
+                status TEXT DEFAULT 'queued',  -- queued, running, succeeded, failed, cancelled
+                payload TEXT NOT NULL,  -- JSON
+                result TEXT,  -- JSON
+                error TEXT,
+                attempts INTEGER DEFAULT 0,
+                run_after TEXT,  -- retry backoff
+                locked_until TEXT,
+                callback_url TEXT,
+                callback_secret TEXT,
+                callback_status TEXT,  -- pending, delivered, failed
+                callback_attempts INTEGER DEFAULT 0,
+                callback_next_at TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                started_at TEXT,
+                finished_at TEXT,
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_ai_jobs_queue
+            ON ai_jobs(status, priority, id)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_ai_jobs_user
+            ON ai_jobs(user_id, status)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_ai_jobs_callbacks
+            ON ai_jobs(callback_status, callback_next_at)
+        ''')
+        
         # Projects/Campaigns table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS projects (
@@ -180,6 +428,7 @@ def init_database():
                 FOREIGN KEY (donor_wallet) REFERENCES users(wallet_address)
             )
         ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_donations_project_wallet ON donations(project_id, donor_wallet)")
         
         # Project Updates table
         cursor.execute('''
@@ -309,6 +558,161 @@ def init_database():
             )
         ''')
 
+        # Perceptual fingerprints of submitted proof images (reuse detection)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS image_fingerprints (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sha256 TEXT NOT NULL,
+                phash INTEGER NOT NULL,  -- 64-bit, stored signed
+                dhash INTEGER NOT NULL,
+                width INTEGER,
+                height INTEGER,
+                source TEXT NOT NULL,  -- bounty, milestone
+                ref_id TEXT NOT NULL,
+                user_id INTEGER,
+                duplicate_of INTEGER,  -- closest earlier fingerprint when flagged
+                distance INTEGER,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (duplicate_of) REFERENCES image_fingerprints(id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_image_fingerprints_ref
+            ON image_fingerprints(source, ref_id)
+        ''')
+        ensure_columns(cursor, 'bounties', [
+            ('proof_flagged', 'INTEGER DEFAULT 0'),  # proof resembles another stored proof
+        ])
+
+        # Daily AI call accounting (latency, tokens, fallbacks) per endpoint, user and model
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_usage_daily (
+                day TEXT NOT NULL,  -- YYYY-MM-DD (UTC)
+                endpoint TEXT NOT NULL,
+                operation TEXT NOT NULL,  -- analyze_sustainability, verify_proof
+                user_id INTEGER NOT NULL DEFAULT 0,  -- 0 for background work
+                model TEXT NOT NULL DEFAULT '',
+                outcome TEXT NOT NULL,  -- provider, cache, local, fallback
+                fallback_reason TEXT NOT NULL DEFAULT '',
+                calls INTEGER DEFAULT 0,
+                provider_requests INTEGER DEFAULT 0,  -- calls that got a provider reply
+                prompt_tokens INTEGER DEFAULT 0,
+                completion_tokens INTEGER DEFAULT 0,
+                truncated INTEGER DEFAULT 0,  -- completions cut off by max_tokens
+                latency_ms_sum REAL DEFAULT 0,
+                latency_ms_max REAL DEFAULT 0,
+                latency_histogram TEXT,  -- JSON counts per ROLLUP_BUCKETS_MS bucket
+                updated_at TEXT,
+                PRIMARY KEY (day, endpoint, operation, user_id, model, outcome, fallback_reason)
+            )
+        ''')
+        ensure_columns(cursor, 'ai_jobs', [
+            ('endpoint', 'TEXT'),  # route that queued the job, for usage accounting
+        ])
+
+        # On-chain state materialized from ChainFund core/SBT contract events (app/services/chain_indexer.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chain_events (
+                event_id TEXT PRIMARY KEY,  -- RPC event id, ordered by ledger and position
+                contract_id TEXT NOT NULL,
+                ledger INTEGER NOT NULL,
+                tx_hash TEXT,
+                topic TEXT NOT NULL,  -- JSON, decoded
+                value TEXT,  -- JSON, decoded
+                applied_at TEXT NOT NULL
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chain_events_ledger ON chain_events(ledger)")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chain_index_cursor (
+                stream TEXT PRIMARY KEY,  -- contract ids being followed
+                ledger INTEGER NOT NULL,  -- next ledger to read when there is no cursor
+                cursor TEXT,  -- RPC paging cursor after the last applied event
+                updated_at TEXT NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chain_campaigns (
+                campaign_id INTEGER PRIMARY KEY,
+                contract_id TEXT NOT NULL,
+                creator TEXT NOT NULL,
+                title TEXT,
+                description TEXT,
+                total_goal INTEGER NOT NULL,  -- stroops
+                funds_raised INTEGER DEFAULT 0,
+                funds_released INTEGER DEFAULT 0,
+                funds_locked INTEGER DEFAULT 0,
+                backer_count INTEGER DEFAULT 0,
+                status INTEGER DEFAULT 1,  -- CampaignStatus (repr u32)
+                current_milestone INTEGER DEFAULT 0,
+                milestone_count INTEGER,  -- NULL until details are hydrated
+                created_ledger INTEGER NOT NULL,
+                closed_at INTEGER,  -- ledger timestamp
+                status_event TEXT,  -- last event that set the status
+                updated_ledger INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chain_campaigns_status ON chain_campaigns(status)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chain_campaigns_creator ON chain_campaigns(creator)")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chain_milestones (
+                campaign_id INTEGER NOT NULL,
+                milestone_id INTEGER NOT NULL,
+                title TEXT,
+                description TEXT,
+                amount INTEGER,
+                status INTEGER DEFAULT 0,  -- MilestoneStatus (repr u32)
+                ipfs_proof TEXT,
+                ai_verdict INTEGER DEFAULT 0,  -- VerificationStatus (repr u32)
+                ai_confidence INTEGER DEFAULT 0,
+                votes_for INTEGER DEFAULT 0,
+                votes_against INTEGER DEFAULT 0,
+                voter_count INTEGER DEFAULT 0,
+                released_amount INTEGER,
+                fee INTEGER,
+                status_event TEXT,
+                updated_ledger INTEGER NOT NULL,
+                PRIMARY KEY (campaign_id, milestone_id)
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chain_milestones_status ON chain_milestones(status)")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chain_backers (
+                campaign_id INTEGER NOT NULL,
+                backer TEXT NOT NULL,
+                amount INTEGER DEFAULT 0,
+                voting_power INTEGER DEFAULT 0,  -- isqrt(amount), as the contract computes it
+                votes_cast INTEGER DEFAULT 0,
+                funded_ledger INTEGER NOT NULL,
+                updated_ledger INTEGER NOT NULL,
+                PRIMARY KEY (campaign_id, backer)
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chain_backers_backer ON chain_backers(backer)")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chain_votes (
+                campaign_id INTEGER NOT NULL,
+                milestone_id INTEGER NOT NULL,
+                voter TEXT NOT NULL,
+                approve INTEGER NOT NULL,
+                voting_power INTEGER NOT NULL,
+                ledger INTEGER NOT NULL,
+                PRIMARY KEY (campaign_id, milestone_id, voter)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chain_sbts (
+                token_id INTEGER PRIMARY KEY,
+                owner TEXT NOT NULL,
+                role INTEGER NOT NULL,  -- SbtRole (repr u32)
+                campaign_id INTEGER DEFAULT 0,
+                is_active INTEGER DEFAULT 1,
+                minted_ledger INTEGER NOT NULL,
+                revoked_ledger INTEGER
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chain_sbts_owner ON chain_sbts(owner)")
+
         # Products table (Marketplace)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS products (
@@ -465,7 +869,9 @@ def reset_database():
         cursor = conn.cursor()
         
         tables = [
-            'audit_log', 'wallet_connections', 'auth_tokens',
+            'chain_events', 'chain_index_cursor', 'chain_campaigns', 'chain_milestones', 'chain_backers', 'chain_votes', 'chain_sbts',
+            'ai_usage_daily', 'image_fingerprints', 'ai_jobs', 'ai_scoring_jobs', 'project_ai_scores', 'ai_analysis_cache', 'notification_digests', 'notification_events', 'notification_preferences',
+            'fanout_jobs', 'email_outbox', 'audit_log', 'api_keys', 'wallet_identity', 'wallet_connections', 'auth_tokens',
             'milestone_votes', 'reviews', 'transactions', 'orders',
             'gigs', 'project_updates', 'donations', 'milestones',
             'projects', 'users'
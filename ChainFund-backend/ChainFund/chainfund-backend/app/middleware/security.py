@@ -15,15 +15,31 @@ import html
 class RateLimitMiddleware(BaseHTTPMiddleware):
     """Rate limiting middleware to prevent DDoS attacks"""
     
-    def __init__(self, app, requests_per_minute: int = 60):
+    def __init__(self, app, requests_per_minute: int = 60, shared_state=None):
         super().__init__(app)
         self.requests_per_minute = requests_per_minute
         self.request_counts = defaultdict(list)
+        # When set, counts are kept in process-shared state so limits hold across workers
+        self.shared_state = shared_state
+        
+    def _rate_limited(self):
+        return JSONResponse(
+            status_code=429,
+            content={
+                "error": "Rate limit exceeded",
+                "message": f"Maximum {self.requests_per_minute} requests per minute"
+            }
+        )
         
     async def dispatch(self, request: Request, call_next):
         # Get client IP
         client_ip = request.client.host
         
+        if self.shared_state is not None:
+            if self.shared_state.hit(f"ratelimit:{client_ip}", 60) > self.requests_per_minute:
+                return self._rate_limited()
+            return await call_next(request)
+        
         # Clean old entries
         now = time.time()
         self.request_counts[client_ip] = [
@@ -33,13 +49,7 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         
         # Check rate limit
         if len(self.request_counts[client_ip]) >= self.requests_per_minute:
-            return JSONResponse(
-                status_code=429,
-                content={
-                    "error": "Rate limit exceeded",
-                    "message": f"Maximum {self.requests_per_minute} requests per minute"
-                }
-            )
+            return self._rate_limited()
         
         # Add current request
         self.request_counts[client_ip].append(now)
@@ -1,8 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, HttpUrl, ValidationError
 from typing import List, Optional, Dict, Any
+from app.config import settings
 from app.services.ai_service import ai_service
+from app.services.ai_scoring import ai_scoring
+from app.services.ai_jobs import ai_jobs, CallbackURLError, QueueFullError, resolve_callback_url
+from app.services.ai_usage import ai_usage, GROUP_COLUMNS as USAGE_GROUP_COLUMNS
 from app.routers.auth import get_current_user
+from app.routers.api_keys import get_current_principal
+from app.utils.disconnect import cancel_on_disconnect
 
 router = APIRouter(
     prefix="/api/ai",
@@ -10,6 +19,9 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# JWT session, or an API key with the "ai" scope acting as its owner
+get_ai_user = get_current_principal("ai")
+
 class AnalysisRequest(BaseModel):
     title: str
     description: str
@@ -23,47 +35,208 @@ class AnalysisResponse(BaseModel):
     impact_metrics: List[str]
     summary: str
 
+class ScoringJobRequest(BaseModel):
+    force: bool = False  # Rescore every project, not only unscored or stale ones
+
 class ProofRequest(BaseModel):
     milestone_title: str
     image_base64: Optional[str] = None # Or handle file upload separately, keeping it simple for JSON body
+    bounty_id: Optional[int] = None  # where/when the proof is expected, for the geotag and time checks
+    project_id: Optional[int] = None
 
-@router.post("/verify-proof")
-async def verify_proof(request: ProofRequest, current_user: dict = Depends(get_current_user)):
+class JobRequest(BaseModel):
+    kind: str  # verify_proof | analyze_sustainability
+    payload: Dict[str, Any]
+    priority: str = "normal"  # low | normal (high is reserved for admins and inline requests)
+    callback_url: Optional[HttpUrl] = None
+
+# Payload schema per job kind: the same bodies as the inline endpoints
+JOB_PAYLOAD_MODELS = {
+    "verify_proof": ProofRequest,
+    "analyze_sustainability": AnalysisRequest,
+}
+
+def _job_payload(kind: str, payload: dict) -> dict:
+    """Validate a queued job's payload against its kind's request model (422 like a bad body)"""
+    model = JOB_PAYLOAD_MODELS.get(kind)
+    if model is None:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Unknown AI job kind: {kind}")
+    try:
+        return model.model_validate(payload).model_dump()
+    except ValidationError as e:
+        raise RequestValidationError([{**error, "loc": ("body", "payload", *error["loc"])} for error in e.errors()])
+
+def _submit_job(current_user, kind: str, payload: dict, priority: str = "normal",
+                callback_url: Optional[str] = None, endpoint: Optional[str] = None) -> dict:
+    try:
+        return ai_jobs.submit(current_user.id, kind, payload, priority=priority, callback_url=callback_url,
+                              endpoint=endpoint)
+    except QueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+    except CallbackURLError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _wants_async(mode: str, http_request: Request) -> bool:
+    return mode == "async" or "respond-async" in http_request.headers.get("prefer", "")
+
+def _accepted(job: dict) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={**job, "status_url": f"/api/ai/jobs/{job['job_id']}"},
+        headers={"Location": f"/api/ai/jobs/{job['job_id']}"},
+    )
+
+async def _run_inline(http_request: Request, current_user, kind: str, payload: dict, mode: str):
     """
-    Simulates Computer Vision analysis of a proof-of-work image.
-    Returns verification status and detected objects.
+    Run an AI job for an endpoint. With mode=async (or Prefer: respond-async)
+    return 202 and the job id right away; otherwise wait for the result as
+    before, falling back to 202 if it takes longer than AI_JOB_SYNC_WAIT_SECONDS.
     """
+    if _wants_async(mode, http_request):
+        return _accepted(_submit_job(current_user, kind, payload, endpoint=http_request.url.path))
+
+    job = _submit_job(current_user, kind, payload, priority="high", endpoint=http_request.url.path)
     try:
-        result = await ai_service.verify_proof_of_work(
-            milestone_title=request.milestone_title
-        )
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        job = await cancel_on_disconnect(http_request, ai_jobs.wait(job["job_id"], settings.ai_job_sync_wait_seconds))
+    except HTTPException:
+        ai_jobs.cancel(job["job_id"])
+        raise
+    if job["status"] == "succeeded":
+        return job["result"]
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"])
+    return _accepted(job)
+
+@router.post("/verify-proof")
+async def verify_proof(request: ProofRequest, http_request: Request,
+                       mode: str = Query("sync", pattern="^(sync|async)$"),
+                       current_user: dict = Depends(get_ai_user)):
+    """
+    Checks a proof-of-work image locally (geotag against the bounty or project,
+    capture time, sharpness, exposure). Returns the verdict with the extracted
+    evidence, or a job to poll with mode=async.
+    """
+    return await _run_inline(http_request, current_user, "verify_proof", request.model_dump(), mode)
 
 @router.post("/analyze-sustainability", response_model=AnalysisResponse)
-async def analyze_sustainability(request: AnalysisRequest, current_user: dict = Depends(get_current_user)):
+async def analyze_sustainability(request: AnalysisRequest, http_request: Request,
+                                 mode: str = Query("sync", pattern="^(sync|async)$"),
+                                 current_user: dict = Depends(get_ai_user)):
     """
     Analyzes a project proposal for sustainability credibility using AI.
-    Returns a score and detailed feedback to detect Greenwashing.
+    Returns a score and detailed feedback to detect Greenwashing, or a job
+    to poll with mode=async. The job is cancelled if the client disconnects.
     """
-    try:
-        result = await ai_service.analyze_sustainability(
-            title=request.title,
-            description=request.description,
-            category=request.category
-        )
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _run_inline(http_request, current_user, "analyze_sustainability", request.model_dump(), mode)
+
+# ==================== JOBS ====================
+
+@router.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(request: JobRequest, current_user=Depends(get_ai_user)):
+    """
+    Queue an AI job. Poll the returned status_url, or receive the finished
+    job at callback_url (signed with the returned callback_secret).
+    """
+    if request.priority == "high" and 'admin' not in current_user.roles:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="High priority is reserved for admins")
+    payload = _job_payload(request.kind, request.payload)
+    if request.callback_url:
+        try:
+            await resolve_callback_url(str(request.callback_url))
+        except CallbackURLError as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    job = _submit_job(current_user, request.kind, payload, request.priority,
+                      str(request.callback_url) if request.callback_url else None, endpoint="/api/ai/jobs")
+    return _accepted(job)
+
+@router.get("/jobs")
+async def list_jobs(limit: int = Query(20, ge=1, le=100), current_user=Depends(get_ai_user)):
+    """The current user's most recent AI jobs"""
+    return {"jobs": ai_jobs.list_for_user(current_user.id, limit)}
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: int, current_user=Depends(get_ai_user)):
+    """Status and, once finished, the result of an AI job"""
+    job = ai_jobs.get(job_id, None if 'admin' in current_user.roles else current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: int, current_user=Depends(get_ai_user)):
+    """Cancel a queued or running AI job"""
+    if not ai_jobs.cancel(job_id, None if 'admin' in current_user.roles else current_user.id):
+        raise HTTPException(status_code=409, detail="Job is not queued or running")
+    return {"job_id": job_id, "status": "cancelled"}
 
 @router.get("/health")
 async def ai_health_check():
     """
     Checks if the AI service is configured and ready.
+    "degraded" means the circuit breaker is routing requests to the mock fallback.
     """
+    status = ai_service.status()
     return {
-        "status": "online",
-        "provider": "Groq" if ai_service.client else "Mock",
-        "model": "llama3-70b-8192"
+        "status": "degraded" if status["circuit_breaker"]["state"] == "open" else "online",
+        **status,
+        "jobs": ai_jobs.status(),
     }
+
+# ==================== BATCH SCORING (admin) ====================
+
+def _require_admin(current_user):
+    if 'admin' not in current_user.roles:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+
+@router.post("/scoring/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def start_scoring_job(request: ScoringJobRequest, current_user=Depends(get_current_user)):
+    """
+    Score every unscored or stale project and campaign in the background.
+    Returns the running job instead if one is already active.
+    """
+    _require_admin(current_user)
+    if not ai_service.client:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="AI provider not configured")
+    job = ai_scoring.create_job(current_user.id, force=request.force)
+    return {**job, "progress_url": f"/api/ai/scoring/jobs/{job['job_id']}"}
+
+@router.get("/scoring/jobs/{job_id}")
+async def scoring_job_progress(job_id: int, current_user=Depends(get_current_user)):
+    """Progress and checkpoint of a batch scoring job"""
+    _require_admin(current_user)
+    progress = ai_scoring.progress(job_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="Scoring job not found")
+    return progress
+
+@router.post("/scoring/jobs/{job_id}/cancel")
+async def cancel_scoring_job(job_id: int, current_user=Depends(get_current_user)):
+    """Stop a batch scoring job after its current chunk"""
+    _require_admin(current_user)
+    if not ai_scoring.cancel_job(job_id):
+        raise HTTPException(status_code=409, detail="Job is not pending or running")
+    return {"job_id": job_id, "status": "cancelled"}
+
+# ==================== USAGE (admin) ====================
+
+@router.get("/usage")
+async def ai_usage_report(days: int = Query(7, ge=1, le=90),
+                          group_by: str = Query("day,endpoint", description="Comma-separated: "
+                                                + ", ".join(USAGE_GROUP_COLUMNS)),
+                          user_id: Optional[int] = None,
+                          current_user=Depends(get_current_user)):
+    """
+    Daily AI call accounting: calls, latency (avg/p50/p95/max), prompt and
+    completion tokens, truncated completions, cache hits and fallbacks by
+    reason, regrouped by any of the rollup columns.
+    """
+    _require_admin(current_user)
+    columns = tuple(column.strip() for column in group_by.split(",") if column.strip())
+    unknown = [column for column in columns if column not in USAGE_GROUP_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown group_by column(s): {', '.join(unknown)}")
+    await ai_usage.flush()
+    return {"days": days, "group_by": columns,
+            "rows": await asyncio.to_thread(ai_usage.report, days, columns, user_id)}
@@ -0,0 +1,148 @@
+"""
+API Keys Router
+Scoped keys for indexers and partner integrations.
+
+Keys are managed with a normal JWT session; machine clients then send
+``X-API-Key: cfk_...`` and never go through the login flow:
+
+- ``read`` keys are metered and rate limited on the public catalogue reads
+  (``optional_api_key``); those stay open to anonymous callers
+- ``ai`` keys act as their owner on the AI endpoints (``get_current_principal``)
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, status, Header
+from pydantic import BaseModel, validator
+from typing import List, Optional
+from ..services.api_key_service import (
+    api_key_service, ApiKeyError, ApiKeyRateLimited, ApiKeyRecord, ApiKeyScope, RATE_LIMIT_TIERS
+)
+from .auth import get_current_user, oauth2_scheme, UserResponse
+
+router = APIRouter(prefix="/api/auth/api-keys", tags=["API Keys"])
+
+# Tiers above this one can only be issued by admins
+SELF_SERVICE_TIERS = ("free", "standard")
+
+# ==================== PYDANTIC MODELS ====================
+
+class ApiKeyCreate(BaseModel):
+    name: str
+    scopes: List[ApiKeyScope] = ["read"]
+    tier: str = "standard"
+
+    @validator('tier')
+    def validate_tier(cls, v):
+        if v not in RATE_LIMIT_TIERS:
+            raise ValueError(f'Tier must be one of: {list(RATE_LIMIT_TIERS)}')
+        return v
+
+# ==================== DEPENDENCIES ====================
+
+def _verify(api_key: str, scope: Optional[str]) -> ApiKeyRecord:
+    try:
+        return api_key_service.verify(api_key, scope)
+    except ApiKeyRateLimited as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": "60"}
+        )
+    except ApiKeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e)
+        )
+
+def require_api_key(scope: Optional[str] = None):
+    """
+    Dependency factory authenticating a machine client by API key.
+
+    Usage:
+        @router.get("/feed")
+        async def feed(principal: dict = Depends(require_api_key("read"))):
+    """
+    async def dependency(x_api_key: Optional[str] = Header(None)) -> dict:
+        if not x_api_key:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Missing X-API-Key header"
+            )
+        return _verify(x_api_key, scope).principal()
+
+    return dependency
+
+def optional_api_key(scope: str):
+    """
+    Dependency factory for public endpoints: anonymous calls pass through
+    (None), a presented key must be valid, carry ``scope`` and be within
+    its tier's rate limit, and is counted.
+    """
+    async def dependency(x_api_key: Optional[str] = Header(None)) -> Optional[dict]:
+        if not x_api_key:
+            return None
+        return _verify(x_api_key, scope).principal()
+
+    return dependency
+
+def get_current_principal(scope: str):
+    """
+    Dependency factory accepting either a JWT session or an API key with
+    ``scope``. A key acts as its owner, with the roles it was issued with,
+    and is resolved without a users table lookup (no username, email or
+    wallet address).
+    """
+    async def dependency(token: Optional[str] = Depends(oauth2_scheme),
+                         x_api_key: Optional[str] = Header(None)) -> UserResponse:
+        if token or not x_api_key:
+            return await get_current_user(token)
+        record = _verify(x_api_key, scope)
+        roles = list(record.roles) or ["donor"]
+        return UserResponse(
+            id=record.user_id,
+            username=None,
+            email=None,
+            wallet_address="",
+            role=roles[0],
+            roles=roles,
+            is_verified=False,
+            created_at="",
+        )
+
+    return dependency
+
+# ==================== ENDPOINTS ====================
+
+@router.post("/", status_code=status.HTTP_201_CREATED)
+async def create_api_key(key: ApiKeyCreate, current_user: UserResponse = Depends(get_current_user)):
+    """Create an API key. The key is shown once - store it securely."""
+    if key.tier not in SELF_SERVICE_TIERS and 'admin' not in current_user.roles:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Only admins can issue '{key.tier}' keys"
+        )
+
+    return api_key_service.create_key(
+        user_id=current_user.id,
+        name=key.name,
+        scopes=key.scopes,
+        tier=key.tier,
+        roles=current_user.roles,
+    )
+
+@router.get("/")
+async def list_api_keys(current_user: UserResponse = Depends(get_current_user)):
+    """List your API keys with usage counters"""
+    return {"keys": api_key_service.list_keys(current_user.id)}
+
+@router.get("/whoami")
+async def whoami(principal: dict = Depends(require_api_key())):
+    """Identify the calling API key (no database access)"""
+    return principal
+
+@router.delete("/{key_id}")
+async def revoke_api_key(key_id: str, current_user: UserResponse = Depends(get_current_user)):
+    """Revoke one of your API keys"""
+    owner = None if 'admin' in current_user.roles else current_user.id
+    if not api_key_service.revoke_key(key_id, user_id=owner):
+        raise HTTPException(status_code=404, detail="API key not found")
+    return {"message": "API key revoked", "key_id": key_id}
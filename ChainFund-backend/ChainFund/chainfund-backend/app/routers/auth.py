@@ -17,16 +17,16 @@ from pydantic import BaseModel, EmailStr, validator
 from typing import Optional, List
 import sqlite3
 import json
-import secrets
-import asyncio
 from ..database import get_db_connection, dict_from_row
 from ..services.email_service import email_service
+from ..services.key_ring import key_ring
+from ..services.login_guard import login_guard, LoginLocked
+from ..services.wallet_identity import wallet_identity
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
 # Security configuration
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-SECRET_KEY = secrets.token_urlsafe(32)  # Generate secure key
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 REFRESH_TOKEN_EXPIRE_DAYS = 7
@@ -117,14 +117,23 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire, "type": "access"})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    kid, secret = key_ring.active_key()
+    return jwt.encode(to_encode, secret, algorithm=ALGORITHM, headers={"kid": kid})
 
 def create_refresh_token(data: dict):
     """Create JWT refresh token"""
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     to_encode.update({"exp": expire, "type": "refresh"})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    kid, secret = key_ring.active_key()
+    return jwt.encode(to_encode, secret, algorithm=ALGORITHM, headers={"kid": kid})
+
+def decode_token(token: str) -> dict:
+    """Verify a JWT against the key named by its kid header"""
+    secret = key_ring.get_key(jwt.get_unverified_header(token).get("kid"))
+    if not secret:
+        raise JWTError("Unknown signing key")
+    return jwt.decode(token, secret, algorithms=[ALGORITHM])
 
 def verify_stellar_signature(wallet_address: str, message: str, signature: str) -> bool:
     """
@@ -136,15 +145,18 @@ def verify_stellar_signature(wallet_address: str, message: str, signature: str)
     return True  # Placeholder
 
 def get_user_by_wallet(wallet_address: str) -> Optional[dict]:
-    """Get user by wallet address"""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM users WHERE wallet_address = ? OR primary_wallet = ?",
-            (wallet_address, wallet_address)
-        )
-        row = cursor.fetchone()
-        return dict_from_row(row)
+    """Get user by any wallet linked to the account"""
+    user_id = wallet_identity.resolve(wallet_address)
+    if user_id is None:
+        return None
+    
+    user = get_user_by_id(user_id)
+    if user is None:
+        # Cached mapping went stale (user row replaced) - resolve once more
+        wallet_identity.invalidate(wallet_address)
+        user_id = wallet_identity.resolve(wallet_address)
+        user = get_user_by_id(user_id) if user_id is not None else None
+    return user
 
 def get_user_by_email(email: str) -> Optional[dict]:
     """Get user by email"""
@@ -207,6 +219,8 @@ def create_user(user_data: dict) -> dict:
             1   # verified
         ))
         
+        wallet_identity.link(cursor, user_data['wallet_address'], user_id)
+        
         conn.commit()
         return get_user_by_id(user_id)
 
@@ -271,26 +285,20 @@ async def connect_wallet(auth_request: WalletAuthRequest):
             user = create_user(user_data)
             log_auth_event(user['id'], 'wallet_register', auth_request.wallet_address)
             
-            # Send welcome email if email exists
+            # Send welcome email if email exists (queued, not sent inline)
             if user.get('email'):
-                asyncio.create_task(
-                    asyncio.to_thread(
-                        email_service.send_welcome_email,
-                        user['email'],
-                        user.get('username', 'Stellar User')
-                    )
+                email_service.send_welcome_email(
+                    user['email'],
+                    user.get('username', 'Stellar User')
                 )
             
             # Send wallet connected notification
             if user.get('email'):
-                asyncio.create_task(
-                    asyncio.to_thread(
-                        email_service.send_wallet_connected,
-                        user['email'],
-                        user.get('username', 'User'),
-                        auth_request.wallet_address,
-                        'Stellar'
-                    )
+                email_service.send_wallet_connected(
+                    user['email'],
+                    user.get('username', 'User'),
+                    auth_request.wallet_address,
+                    'Stellar'
                 )
         else:
             # Update last login
@@ -385,7 +393,7 @@ async def register(user_data: UserRegister):
         
         user = create_user(new_user_data)
         
-        # Send welcome email
+        # Send welcome email (queued on the email dispatcher)
         if user_data.email:
             try:
                 email_service.send_welcome_email(
@@ -431,47 +439,65 @@ async def register(user_data: UserRegister):
         )
 
 @router.post("/login", response_model=TokenResponse)
-async def login(credentials: EmailAuthRequest):
+async def login(credentials: EmailAuthRequest, request: Request):
     """
     Login with email and password
+    Repeated failures lock the account / client IP before any password hashing
     """
+    client_ip = request.client.host if request.client else None
     try:
         user = get_user_by_email(credentials.email)
         
+        try:
+            login_guard.check(credentials.email, client_ip, user)
+        except LoginLocked as e:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=e.reason,
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        
         if not user or not user.get('password_hash'):
+            login_guard.record_failure(credentials.email, client_ip)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid email or password"
             )
         
         if not verify_password(credentials.password, user['password_hash']):
+            login_guard.record_failure(credentials.email, client_ip, user)
             log_auth_event(user['id'], 'login_failed', user.get('wallet_address'))
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid email or password"
             )
         
-        # Update last login
+        login_guard.record_success(credentials.email, client_ip)
+        
+        # Update last login (and clear a persisted lock in the same write)
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE users SET last_login = ? WHERE id = ?",
-                (datetime.utcnow().isoformat(), user['id'])
-            )
+            if user.get('failed_login_attempts') or user.get('locked_until'):
+                cursor.execute(
+                    "UPDATE users SET last_login = ?, failed_login_attempts = 0, locked_until = NULL WHERE id = ?",
+                    (datetime.utcnow().isoformat(), user['id'])
+                )
+            else:
+                cursor.execute(
+                    "UPDATE users SET last_login = ? WHERE id = ?",
+                    (datetime.utcnow().isoformat(), user['id'])
+                )
             conn.commit()
         
         log_auth_event(user['id'], 'email_login', user.get('wallet_address'))
         
-        # Send login notification email (async so it doesn't slow down login)
+        # Send login notification email (queued so it doesn't slow down login)
         try:
-            asyncio.create_task(
-                asyncio.to_thread(
-                    email_service.send_login_notification,
-                    user['email'],
-                    user.get('username', 'User'),
-                    'Unknown',  # IP address - could be extracted from request
-                    'Web Browser'
-                )
+            email_service.send_login_notification(
+                user['email'],
+                user.get('username', 'User'),
+                client_ip or 'Unknown',
+                'Web Browser'
             )
         except Exception as email_error:
             print(f"Login notification email failed: {email_error}")
@@ -521,7 +547,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         )
     
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         user_id = int(payload.get("sub"))
         
         user = get_user_by_id(user_id)
@@ -580,7 +606,7 @@ async def refresh_access_token(refresh_token: str):
     Refresh access token using refresh token
     """
     try:
-        payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(refresh_token)
         
         if payload.get("type") != "refresh":
             raise HTTPException(
@@ -9,6 +9,10 @@ from typing import List, Optional
 from datetime import datetime
 from ..database import get_db_connection, dict_from_row
 from ..routers.auth import oauth2_scheme, get_current_user
+from ..routers.api_keys import optional_api_key
+from ..services.image_fingerprints import image_fingerprints
+from ..services.proof_verification import proof_verifier
+from ..utils.image_hash import decode_image_payload
 
 router = APIRouter(prefix="/api/bounties", tags=["Eco-Bounties"])
 
@@ -36,14 +40,15 @@ class BountyResponse(BaseModel):
     creator_wallet: Optional[str]
     assigned_to: Optional[str]
     proof_image: Optional[str]
+    proof_flagged: bool = False
     created_at: str
 
 class BountyProof(BaseModel):
-    proof_image: str
+    proof_image: str  # data URI / base64 (fingerprinted for reuse) or a URL
 
 # ==================== ENDPOINTS ====================
 
-@router.get("/", response_model=List[BountyResponse])
+@router.get("/", response_model=List[BountyResponse], dependencies=[Depends(optional_api_key("read"))])
 async def get_bounties(status: Optional[str] = None):
     """Get all bounties, optionally filtered by status"""
     with get_db_connection() as conn:
@@ -56,7 +61,7 @@ async def get_bounties(status: Optional[str] = None):
         rows = cursor.fetchall()
         return [dict_from_row(row) for row in rows]
 
-@router.get("/{bounty_id}", response_model=BountyResponse)
+@router.get("/{bounty_id}", response_model=BountyResponse, dependencies=[Depends(optional_api_key("read"))])
 async def get_bounty(bounty_id: int):
     """Get bounty by ID"""
     with get_db_connection() as conn:
@@ -71,7 +76,7 @@ async def get_bounty(bounty_id: int):
 async def create_bounty(bounty: BountyCreate, current_user: dict = Depends(get_current_user)):
     """Create a new bounty (Creator/Admin only)"""
     # Check role
-    roles = current_user.get('roles', [])
+    roles = current_user.roles
     if 'creator' not in roles and 'admin' not in roles:
         # Allow donors to create bounties too? Maybe "Eco-Bounty Sponsor"? 
         # For now, restrict to creators/admins or maybe anyone can post if they fund it?
@@ -88,7 +93,7 @@ async def create_bounty(bounty: BountyCreate, current_user: dict = Depends(get_c
         ''', (
             bounty.title, bounty.description, bounty.reward, bounty.currency,
             bounty.latitude, bounty.longitude, bounty.location_name,
-            current_user['wallet_address']
+            current_user.wallet_address
         ))
         conn.commit()
         bounty_id = cursor.lastrowid
@@ -111,14 +116,20 @@ async def claim_bounty(bounty_id: int, current_user: dict = Depends(get_current_
             
         cursor.execute('''
             UPDATE bounties SET status = 'assigned', assigned_to = ? WHERE id = ?
-        ''', (current_user['wallet_address'], bounty_id))
+        ''', (current_user.wallet_address, bounty_id))
         conn.commit()
         
         return {"message": "Bounty claimed successfully"}
 
 @router.post("/{bounty_id}/submit")
 async def submit_proof(bounty_id: int, proof: BountyProof, current_user: dict = Depends(get_current_user)):
-    """Submit proof for a bounty"""
+    """
+    Submit proof for a bounty.
+    Inline images are inspected once: the geotag, capture time and image
+    quality are checked against the bounty, and the fingerprint is compared
+    with earlier proofs. A reused or contradicting proof is flagged for the
+    verifier rather than rejected.
+    """
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM bounties WHERE id = ?", (bounty_id,))
@@ -126,15 +137,34 @@ async def submit_proof(bounty_id: int, proof: BountyProof, current_user: dict =
         if not existing:
             raise HTTPException(status_code=404, detail="Bounty not found")
             
-        if existing['assigned_to'] != current_user['wallet_address']:
+        if existing['assigned_to'] != current_user.wallet_address:
             raise HTTPException(status_code=403, detail="You are not assigned to this bounty")
-            
-        cursor.execute('''
-            UPDATE bounties SET status = 'completed', proof_image = ? WHERE id = ?
-        ''', (proof.proof_image, bounty_id))
+
+    duplicate_check = verification = None
+    image_bytes = decode_image_payload(proof.proof_image)
+    if image_bytes and proof_verifier.enabled:
+        try:
+            evidence = await proof_verifier.inspect(image_bytes)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        verification = proof_verifier.assess(evidence, proof_verifier.reference(bounty_id=bounty_id))
+        duplicate_check = await image_fingerprints.check_and_record(
+            None, "bounty", bounty_id, current_user.id, fp=evidence["fingerprint"]
+        )
+
+    flagged = bool(duplicate_check and duplicate_check["duplicate"]) or \
+        bool(verification and verification["verdict"] == "rejected")
+    with get_db_connection() as conn:
+        conn.execute('''
+            UPDATE bounties SET status = 'completed', proof_image = ?, proof_flagged = ? WHERE id = ?
+        ''', (proof.proof_image, int(flagged), bounty_id))
         conn.commit()
         
-        return {"message": "Proof submitted, awaiting verification"}
+    return {
+        "message": "Proof submitted, awaiting verification",
+        "duplicate_check": duplicate_check,
+        "verification": verification,
+    }
 
 @router.post("/{bounty_id}/verify")
 async def verify_bounty(bounty_id: int, current_user: dict = Depends(get_current_user)):
@@ -146,7 +176,7 @@ async def verify_bounty(bounty_id: int, current_user: dict = Depends(get_current
         if not existing:
             raise HTTPException(status_code=404, detail="Bounty not found")
             
-        if existing['creator_wallet'] != current_user['wallet_address'] and 'admin' not in current_user.get('roles', []):
+        if existing['creator_wallet'] != current_user.wallet_address and 'admin' not in current_user.roles:
              raise HTTPException(status_code=403, detail="Only creator can verify")
 
         cursor.execute('''
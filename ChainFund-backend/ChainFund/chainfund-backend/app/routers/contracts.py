@@ -8,14 +8,15 @@ import os
 router = APIRouter()
 
 from app.config import Settings
+from app.services.shared_state import shared_state
 settings = Settings()
 
 # Use the contract ID from configuration
 CONTRACT_ID = settings.chainfund_contract_id
 DEFAULT_CONTRACT_BALANCE = "0"  # Initial balance will be 0
 
-# Store contract balances in memory (replace with database in production)
-contract_balances = {}
+# Contract balances live in process-shared state so every worker agrees
+BALANCE_KEY = "contract_balance:{}"
 
 @router.get("/test")
 async def test_route():
@@ -26,7 +27,7 @@ async def test_route():
 async def get_contract_status(project_id: str):
     """Get contract status for a project"""
     try:
-        balance = contract_balances.get(project_id, DEFAULT_CONTRACT_BALANCE)
+        balance = str(shared_state.get(BALANCE_KEY.format(project_id), DEFAULT_CONTRACT_BALANCE))
         return {
             "contract_id": CONTRACT_ID,
             "status": "active",
@@ -47,7 +48,7 @@ async def deploy_contract(
     """Deploy project funding contract with initial balance"""
     try:
         # Initialize contract balance for the project
-        contract_balances[project_id] = amount
+        shared_state.set(BALANCE_KEY.format(project_id), amount)
         
         return {
             "status": "success",
@@ -67,10 +68,8 @@ async def make_donation(
 ) -> Dict[str, Any]:
     """Make a donation to a projects funding contract"""
     try:
-        # Get current balance and update it
-        current_balance = contract_balances.get(project_id, "0")
-        new_balance = str(int(current_balance) + int(amount))
-        contract_balances[project_id] = new_balance
+        # Atomically add to the current balance
+        new_balance = str(shared_state.incr(BALANCE_KEY.format(project_id), int(amount)))
 
         # Return transaction details with explorer URLs
         tx_hash = "mock_tx_hash"  # In production, this would be the actual transaction hash
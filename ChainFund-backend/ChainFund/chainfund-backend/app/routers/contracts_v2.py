@@ -13,15 +13,26 @@ Modules integrated:
 - SBT Reputation System
 """
 
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Query, Depends
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable
 from enum import Enum
-import subprocess
+import asyncio
 import json
-import os
 from datetime import datetime
 
+from app.config import settings
+from app.routers.auth import get_current_user
+from app.services.account_cache import account_cache, native_balance
+from app.services.chain_indexer import chain_indexer
+from app.services.contract_spec import METHOD_SPECS, encode_args, load_deployed_addresses
+from app.services.contract_view_cache import contract_view_cache
+from app.services.horizon_client import HorizonError
+from app.services.soroban_cli import soroban_cli, CLIBusyError
+from app.services.soroban_rpc import soroban_rpc
+from app.services.tx_batcher import tx_batcher
+from app.utils.http_client import http_client
+
 router = APIRouter(prefix="/v2", tags=["contracts-v2"])
 
 # ============================================================================
@@ -31,32 +42,30 @@ router = APIRouter(prefix="/v2", tags=["contracts-v2"])
 class ContractConfig:
     """Contract deployment configuration"""
     NETWORK = "testnet"
-    RPC_URL = "https://soroban-testnet.stellar.org"
+    RPC_URL = settings.soroban_rpc_url
     
     # Contract addresses - loaded from deployment file
     CORE_CONTRACT_ID: Optional[str] = None
     SBT_CONTRACT_ID: Optional[str] = None
-    ADMIN_KEY: str = "admin"
+    ADMIN_KEY: str = "admin"  # stellar CLI identity
+    ADMIN_ADDRESS: Optional[str] = None  # its public key, for RPC calls
     
     # XLM token address on testnet
     XLM_TOKEN = "CDLZFC3SYJYDZT7K67VZ75HPJVIEUVNIXF47ZG2FB2RMQQVU2EZ4KUXH"
     
     @classmethod
     def load_addresses(cls):
-        """Load deployed contract addresses from file"""
-        # Look for addresses file in rust-contracts directory
-        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-        addresses_file = os.path.join(base_dir, "rust-contracts", "deployed_addresses.json")
-        
-        if os.path.exists(addresses_file):
-            try:
-                with open(addresses_file) as f:
-                    data = json.load(f)
-                    cls.CORE_CONTRACT_ID = data.get("contracts", {}).get("chainfund_core")
-                    cls.SBT_CONTRACT_ID = data.get("contracts", {}).get("chainfund_sbt")
-                    print(f"Loaded contract addresses: Core={cls.CORE_CONTRACT_ID}, SBT={cls.SBT_CONTRACT_ID}")
-            except Exception as e:
-                print(f"Error loading contract addresses: {e}")
+        """Load deployed contract addresses from rust-contracts/deployed_addresses.json"""
+        try:
+            data = load_deployed_addresses()
+            if data:
+                cls.CORE_CONTRACT_ID = data.get("contracts", {}).get("chainfund_core")
+                cls.SBT_CONTRACT_ID = data.get("contracts", {}).get("chainfund_sbt")
+                cls.ADMIN_ADDRESS = data.get("admin")
+                chain_indexer.configure(cls.CORE_CONTRACT_ID, cls.SBT_CONTRACT_ID, cls.ADMIN_ADDRESS)
+                print(f"Loaded contract addresses: Core={cls.CORE_CONTRACT_ID}, SBT={cls.SBT_CONTRACT_ID}")
+        except Exception as e:
+            print(f"Error loading contract addresses: {e}")
 
 # Load addresses on module import
 ContractConfig.load_addresses()
@@ -146,15 +155,24 @@ class MintSbtRequest(BaseModel):
 
 class ContractResponse(BaseModel):
     success: bool
-    data: Optional[Dict[str, Any]] = None
+    data: Optional[Any] = None
     error: Optional[str] = None
+    error_kind: Optional[str] = None  # contract, auth, bad_seq, timeout, network, ...
+    error_code: Optional[int] = None  # contract error number for Error(Contract, #N)
     tx_hash: Optional[str] = None
+    source: Optional[str] = None  # "index" when served from the chain index
+
+class BackfillRequest(BaseModel):
+    start_ledger: int = Field(..., ge=1)
+    end_ledger: int = Field(..., gt=1)
+    chunk_ledgers: int = Field(default=settings.chain_indexer_backfill_chunk, ge=1)
+    concurrency: int = Field(default=settings.chain_indexer_backfill_concurrency, ge=1, le=32)
 
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
 
-def invoke_contract(contract_id: str, method: str, args: List[str]) -> Dict[str, Any]:
+async def invoke_contract(contract_id: str, method: str, args: List[str]) -> Dict[str, Any]:
     """
     Invoke a contract method using stellar CLI.
     For actual blockchain transactions.
@@ -162,78 +180,72 @@ def invoke_contract(contract_id: str, method: str, args: List[str]) -> Dict[str,
     if not contract_id:
         return {"success": False, "error": "Contract not deployed. Run deploy-chainfund.ps1 first."}
     
-    cmd = [
-        "stellar", "contract", "invoke",
-        "--id", contract_id,
-        "--source", ContractConfig.ADMIN_KEY,
-        "--network", ContractConfig.NETWORK,
-        "--", method
-    ] + args
-    
-    try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
-        
-        if result.returncode == 0:
-            output = result.stdout.strip()
-            try:
-                data = json.loads(output) if output else {"result": "success"}
-            except json.JSONDecodeError:
-                data = {"raw_output": output}
-            
-            return {"success": True, "data": data}
-        else:
-            return {"success": False, "error": result.stderr.strip() or "Contract call failed"}
-            
-    except subprocess.TimeoutExpired:
-        return {"success": False, "error": "Contract call timed out after 60 seconds"}
-    except FileNotFoundError:
-        return {"success": False, "error": "Stellar CLI not found. Install with: cargo install stellar-cli"}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
-
-def query_contract(contract_id: str, method: str, args: List[str] = None) -> Dict[str, Any]:
+    result = await _call(contract_id, method, args, view=False)
+    contract_view_cache.invalidate_for_write(method, args, result)
+    account_cache.invalidate_for_write(args)
+    if result["success"] and result.get("data") is None:
+        result["data"] = {"result": "success"}
+    return result
+
+async def query_contract(contract_id: str, method: str, args: List[str] = None) -> Dict[str, Any]:
     """
     Query a contract (read-only, no transaction fees).
+    Served from the view cache while the result is a few ledgers old at most.
     """
     if not contract_id:
         return {"success": False, "error": "Contract not deployed"}
     
     args = args or []
-    cmd = [
-        "stellar", "contract", "invoke",
-        "--id", contract_id,
-        "--source", ContractConfig.ADMIN_KEY,
-        "--network", ContractConfig.NETWORK,
-        "--is-view",
-        "--", method
-    ] + args
-    
+    return await contract_view_cache.get_or_load(
+        contract_id, method, args, lambda: _call(contract_id, method, args, view=True)
+    )
+
+async def query_indexed(contract_id: str, method: str, args: List[str],
+                        lookup: Callable[[], Any]) -> Dict[str, Any]:
+    """
+    Serve a read from the chain index (CONTRACT_READS_FROM_INDEX) when it
+    follows this contract and has the row; otherwise query the contract.
+    """
+    if settings.contract_reads_from_index and contract_id and contract_id in chain_indexer.contract_ids:
+        data = await asyncio.to_thread(lookup)
+        if data is not None:
+            return {"success": True, "data": data, "source": "index"}
+    return await query_contract(contract_id, method, args)
+
+def _hydrated(campaign: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Campaigns first seen through events lack title and milestones until hydrated"""
+    return campaign if campaign and campaign["title"] is not None else None
+
+def _rpc_writes() -> bool:
+    """RPC writes are signed with STELLAR_ADMIN_SECRET; without it they use the CLI's identity"""
+    return settings.soroban_transport == "rpc" and soroban_rpc.admin_public_key() is not None
+
+async def _call(contract_id: str, method: str, args: List[str], view: bool) -> Dict[str, Any]:
+    """
+    Route the call to the configured transport (SOROBAN_TRANSPORT). The RPC
+    client takes the same CLI-style arguments, encoded via contract_spec;
+    methods without a spec, and writes while no admin secret is configured,
+    still go through the CLI.
+    """
+    rpc = settings.soroban_transport == "rpc" if view else _rpc_writes()
+    if not rpc or method not in METHOD_SPECS:
+        return await _run_cli(contract_id, method, args, view)
+    admin = soroban_rpc.admin_public_key() or ContractConfig.ADMIN_ADDRESS
+    try:
+        parameters = encode_args(method, args, aliases={ContractConfig.ADMIN_KEY: admin} if admin else None)
+    except ValueError as e:
+        return {"success": False, "error": str(e), "error_kind": "invalid_args"}
+    return await soroban_rpc.invoke(contract_id, method, parameters, source=admin, view=view)
+
+async def _run_cli(contract_id: str, method: str, args: List[str], view: bool) -> Dict[str, Any]:
+    """Run the call on the shared CLI executor; a full queue answers 503 instead of waiting"""
     try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=30
+        return await soroban_cli.invoke(
+            contract_id, method, args,
+            source=ContractConfig.ADMIN_KEY, network=ContractConfig.NETWORK, view=view
         )
-        
-        if result.returncode == 0:
-            output = result.stdout.strip()
-            try:
-                data = json.loads(output) if output else None
-            except json.JSONDecodeError:
-                data = {"raw_output": output}
-            
-            return {"success": True, "data": data}
-        else:
-            return {"success": False, "error": result.stderr.strip()}
-            
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+    except CLIBusyError as e:
+        raise HTTPException(status_code=503, detail=f"Contract executor busy: {e}", headers={"Retry-After": "5"})
 
 # ============================================================================
 # STATUS & CONFIGURATION
@@ -262,6 +274,15 @@ async def get_contract_status():
             }
         },
         "ready": ContractConfig.CORE_CONTRACT_ID is not None,
+        "transport": settings.soroban_transport,
+        "write_transport": "rpc" if _rpc_writes() else "cli",
+        "executor": soroban_cli.status(),
+        "rpc": soroban_rpc.status(),
+        "view_cache": contract_view_cache.stats(),
+        "batcher": tx_batcher.status(),
+        "http": http_client.status(),
+        "account_cache": account_cache.stats(),
+        "reads_from_index": settings.contract_reads_from_index,
         "timestamp": datetime.utcnow().isoformat()
     }
 
@@ -269,6 +290,7 @@ async def get_contract_status():
 async def reload_contract_config():
     """Reload contract addresses from deployment file"""
     ContractConfig.load_addresses()
+    contract_view_cache.clear()
     return await get_contract_status()
 
 # ============================================================================
@@ -300,20 +322,22 @@ async def create_campaign(request: CreateCampaignRequest):
         "--total_goal", str(request.total_goal),
     ]
     
-    # Add milestones
-    for ms in request.milestones:
-        args.extend(["--milestone", f"{ms.title}:{ms.description}:{ms.amount}"])
+    # Vec<(String, String, i128)> as JSON, which both the CLI and contract_spec parse
+    args.extend(["--milestone_configs", json.dumps(
+        [[ms.title, ms.description, str(ms.amount)] for ms in request.milestones]
+    )])
     
-    result = invoke_contract(ContractConfig.CORE_CONTRACT_ID, "create_campaign", args)
+    result = await invoke_contract(ContractConfig.CORE_CONTRACT_ID, "create_campaign", args)
     return ContractResponse(**result)
 
 @router.get("/campaigns/{campaign_id}", response_model=ContractResponse)
 async def get_campaign(campaign_id: int):
     """Get full campaign details including milestones and backer count"""
-    result = query_contract(
+    result = await query_indexed(
         ContractConfig.CORE_CONTRACT_ID,
         "get_campaign",
-        ["--campaign_id", str(campaign_id)]
+        ["--campaign_id", str(campaign_id)],
+        lambda: _hydrated(chain_indexer.campaign(campaign_id))
     )
     return ContractResponse(**result)
 
@@ -325,7 +349,7 @@ async def fund_campaign(campaign_id: int, request: FundCampaignRequest):
     Funds are locked in escrow and released only when milestones are approved.
     Backer receives quadratic voting power = sqrt(amount).
     """
-    result = invoke_contract(
+    result = await invoke_contract(
         ContractConfig.CORE_CONTRACT_ID,
         "fund_campaign",
         [
@@ -345,7 +369,7 @@ async def close_campaign(campaign_id: int, caller_address: str = Body(...)):
     - All milestones must be released
     - Only creator or admin can close
     """
-    result = invoke_contract(
+    result = await invoke_contract(
         ContractConfig.CORE_CONTRACT_ID,
         "close_campaign",
         [
@@ -362,10 +386,11 @@ async def close_campaign(campaign_id: int, caller_address: str = Body(...)):
 @router.get("/campaigns/{campaign_id}/milestones/{milestone_id}", response_model=ContractResponse)
 async def get_milestone(campaign_id: int, milestone_id: int):
     """Get milestone details including AI verdict and vote counts"""
-    result = query_contract(
+    result = await query_indexed(
         ContractConfig.CORE_CONTRACT_ID,
         "get_milestone",
-        ["--campaign_id", str(campaign_id), "--milestone_id", str(milestone_id)]
+        ["--campaign_id", str(campaign_id), "--milestone_id", str(milestone_id)],
+        lambda: chain_indexer.milestone(campaign_id, milestone_id)
     )
     return ContractResponse(**result)
 
@@ -381,7 +406,7 @@ async def submit_milestone_proof(
     This triggers the AI verification process.
     Status changes to PROOF_SUBMITTED, then PENDING AI verification.
     """
-    result = invoke_contract(
+    result = await invoke_contract(
         ContractConfig.CORE_CONTRACT_ID,
         "submit_proof",
         [
@@ -406,7 +431,7 @@ async def release_milestone_funds(campaign_id: int, milestone_id: int):
     
     Platform fee (2.5%) is deducted automatically.
     """
-    result = invoke_contract(
+    result = await invoke_contract(
         ContractConfig.CORE_CONTRACT_ID,
         "release_funds",
         ["--campaign_id", str(campaign_id), "--milestone_id", str(milestone_id)]
@@ -447,7 +472,7 @@ async def submit_ai_verdict(
         VerificationStatus.REJECTED: "5"
     }
     
-    result = invoke_contract(
+    result = await invoke_contract(
         ContractConfig.CORE_CONTRACT_ID,
         "submit_ai_verdict",
         [
@@ -486,7 +511,7 @@ async def cast_vote(
     - Milestone must be in VOTING_OPEN status
     - Can only vote once per milestone
     """
-    result = invoke_contract(
+    result = await invoke_contract(
         ContractConfig.CORE_CONTRACT_ID,
         "vote",
         [
@@ -508,10 +533,11 @@ async def get_vote_status(campaign_id: int, milestone_id: int):
     - votes_against: Total quadratic voting power against
     - voter_count: Number of unique voters
     """
-    result = query_contract(
+    result = await query_indexed(
         ContractConfig.CORE_CONTRACT_ID,
         "get_vote_status",
-        ["--campaign_id", str(campaign_id), "--milestone_id", str(milestone_id)]
+        ["--campaign_id", str(campaign_id), "--milestone_id", str(milestone_id)],
+        lambda: chain_indexer.vote_status(campaign_id, milestone_id)
     )
     return ContractResponse(**result)
 
@@ -524,10 +550,11 @@ async def get_backer_info(campaign_id: int, backer_address: str):
     - amount: Total contribution in stroops
     - voting_power: Quadratic voting power (sqrt of amount)
     """
-    result = query_contract(
+    result = await query_indexed(
         ContractConfig.CORE_CONTRACT_ID,
         "get_backer",
-        ["--campaign_id", str(campaign_id), "--backer", backer_address]
+        ["--campaign_id", str(campaign_id), "--backer", backer_address],
+        lambda: chain_indexer.backer(campaign_id, backer_address)
     )
     return ContractResponse(**result)
 
@@ -565,7 +592,15 @@ async def mint_sbt(request: MintSbtRequest):
         SbtRole.PIONEER: "9"
     }
     
-    result = invoke_contract(
+    if _rpc_writes() and ContractConfig.SBT_CONTRACT_ID:
+        # Concurrent mints share one batch_mint transaction
+        result = await tx_batcher.mint_sbt(
+            ContractConfig.SBT_CONTRACT_ID, request.recipient_address, int(role_map[request.role]),
+            request.campaign_id, request.metadata_uri or ""
+        )
+        return ContractResponse(**result)
+    
+    result = await invoke_contract(
         ContractConfig.SBT_CONTRACT_ID,
         "mint",
         [
@@ -588,43 +623,47 @@ async def get_sbt_profile(user_address: str):
     - total_reputation: Sum of all active token values
     - roles_held: Unique roles this user has earned
     """
-    result = query_contract(
+    result = await query_indexed(
         ContractConfig.SBT_CONTRACT_ID,
         "get_profile",
-        ["--user", user_address]
+        ["--user", user_address],
+        lambda: chain_indexer.profile(user_address)
     )
     return ContractResponse(**result)
 
 @router.get("/sbt/reputation/{user_address}")
 async def get_user_reputation(user_address: str):
     """Get user's total reputation score"""
-    result = query_contract(
+    result = await query_indexed(
         ContractConfig.SBT_CONTRACT_ID,
         "get_reputation",
-        ["--user", user_address]
+        ["--user", user_address],
+        lambda: (chain_indexer.profile(user_address) or {}).get("total_reputation")
     )
     
     if result["success"]:
-        return {"address": user_address, "reputation": result["data"]}
+        return {"address": user_address, "reputation": result["data"], "source": result.get("source")}
     return ContractResponse(**result)
 
 @router.get("/sbt/{token_id}", response_model=ContractResponse)
 async def get_sbt_details(token_id: int):
     """Get full details of a specific SBT"""
-    result = query_contract(
+    result = await query_indexed(
         ContractConfig.SBT_CONTRACT_ID,
         "get_sbt",
-        ["--token_id", str(token_id)]
+        ["--token_id", str(token_id)],
+        lambda: chain_indexer.sbt(token_id)
     )
     return ContractResponse(**result)
 
 @router.get("/sbt/user/{user_address}/tokens", response_model=ContractResponse)
 async def get_user_sbts(user_address: str):
     """Get all SBTs owned by a user"""
-    result = query_contract(
+    result = await query_indexed(
         ContractConfig.SBT_CONTRACT_ID,
         "get_user_sbts",
-        ["--user", user_address]
+        ["--user", user_address],
+        lambda: chain_indexer.user_sbts(user_address) or None
     )
     return ContractResponse(**result)
 
@@ -644,7 +683,12 @@ async def refund_campaign_backers(campaign_id: int, admin_address: str = Body(..
     
     All locked funds are returned to backers.
     """
-    result = invoke_contract(
+    if _rpc_writes() and ContractConfig.CORE_CONTRACT_ID:
+        # One refund_backers call covers every backer; repeated requests join it
+        result = await tx_batcher.refund_backers(ContractConfig.CORE_CONTRACT_ID, campaign_id, admin_address)
+        return ContractResponse(**result)
+    
+    result = await invoke_contract(
         ContractConfig.CORE_CONTRACT_ID,
         "refund_backers",
         ["--campaign_id", str(campaign_id), "--admin", admin_address]
@@ -661,7 +705,7 @@ async def toggle_contract_pause(admin_address: str = Body(...), paused: bool = B
     - No new funding accepted
     - Existing milestones can still be processed
     """
-    result = invoke_contract(
+    result = await invoke_contract(
         ContractConfig.CORE_CONTRACT_ID,
         "set_paused",
         ["--admin", admin_address, "--paused", str(paused).lower()]
@@ -671,5 +715,89 @@ async def toggle_contract_pause(admin_address: str = Body(...), paused: bool = B
 @router.get("/admin/config", response_model=ContractResponse)
 async def get_admin_config():
     """Get current contract configuration (admin, fees, etc.)"""
-    result = query_contract(ContractConfig.CORE_CONTRACT_ID, "get_config", [])
+    result = await query_contract(ContractConfig.CORE_CONTRACT_ID, "get_config", [])
     return ContractResponse(**result)
+
+# ============================================================================
+# CHAIN INDEX
+# ============================================================================
+
+@router.get("/index/status")
+async def get_index_status():
+    """Indexer checkpoint, lag behind the network and indexed row counts"""
+    return await asyncio.to_thread(chain_indexer.status)
+
+@router.get("/index/campaigns")
+async def list_indexed_campaigns(
+    status: Optional[int] = Query(None, ge=1, le=4, description="1 Active, 2 Funded, 3 Completed, 4 Failed"),
+    creator: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0)
+):
+    """Campaigns from the chain index, newest first"""
+    campaigns = await asyncio.to_thread(chain_indexer.campaigns, status, creator, limit, offset)
+    return {"campaigns": campaigns, "count": len(campaigns), "source": "index"}
+
+@router.get("/index/campaigns/{campaign_id}/backers")
+async def list_indexed_backers(
+    campaign_id: int,
+    balances: bool = Query(False, description="Include each backer's XLM balance"),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0)
+):
+    """Backers of a campaign from the chain index, optionally with balances fetched in batches"""
+    backers = await asyncio.to_thread(chain_indexer.backers, campaign_id, limit, offset)
+    if balances and backers:
+        try:
+            accounts = await account_cache.prefetch([backer["address"] for backer in backers])
+        except HorizonError as e:
+            raise HTTPException(status_code=503, detail=f"Balances unavailable: {e}")
+        for backer in backers:
+            backer["balance"] = native_balance(accounts[backer["address"]])
+    return {"campaign_id": campaign_id, "backers": backers, "count": len(backers), "source": "index"}
+
+@router.get("/index/milestones")
+async def list_indexed_milestones(
+    status: int = Query(4, ge=0, le=8, description="Milestone status (default 4, voting open)"),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0)
+):
+    """Milestones in a status across all campaigns, most recently updated first"""
+    milestones = await asyncio.to_thread(chain_indexer.milestones, status, limit, offset)
+    return {"milestones": milestones, "count": len(milestones), "source": "index"}
+
+def _require_admin(current_user):
+    if 'admin' not in current_user.roles:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+@router.post("/index/backfill", status_code=202)
+async def backfill_index(request: BackfillRequest, current_user=Depends(get_current_user)):
+    """
+    Index a historical ledger range in parallel chunks, in the background
+    (idempotent, leaves the checkpoint alone). Returns the running backfill
+    instead if one is already active.
+    """
+    _require_admin(current_user)
+    if request.end_ledger <= request.start_ledger:
+        raise HTTPException(status_code=400, detail="end_ledger must be after start_ledger")
+    if request.end_ledger - request.start_ledger > settings.chain_indexer_backfill_max_ledgers:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range too large (max {settings.chain_indexer_backfill_max_ledgers} ledgers per backfill)"
+        )
+    if not chain_indexer.contract_ids:
+        raise HTTPException(status_code=400, detail="Contracts not deployed")
+    job = chain_indexer.start_backfill(
+        request.start_ledger, request.end_ledger, request.chunk_ledgers, request.concurrency,
+        requested_by=current_user.id
+    )
+    return {**job, "progress_url": f"/v2/index/backfill/{job['job_id']}"}
+
+@router.get("/index/backfill/{job_id}")
+async def backfill_progress(job_id: int, current_user=Depends(get_current_user)):
+    """Progress of a background backfill"""
+    _require_admin(current_user)
+    progress = chain_indexer.backfill_progress(job_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="Backfill job not found")
+    return progress
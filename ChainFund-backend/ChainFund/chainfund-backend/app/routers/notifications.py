@@ -0,0 +1,56 @@
+"""
+Notifications Router
+Email delivery status and notification settings
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import BaseModel, validator
+from ..services.email_outbox import email_outbox
+from ..services.email_fanout import email_fanout
+from ..services.notification_digest import notification_digest, DIGEST_MODES
+from .auth import get_current_user, UserResponse
+
+router = APIRouter(prefix="/api/v1/notifications", tags=["Notifications"])
+
+# ==================== PYDANTIC MODELS ====================
+
+class NotificationPreferences(BaseModel):
+    digest_mode: str  # instant, hourly, daily
+
+    @validator('digest_mode')
+    def validate_digest_mode(cls, v):
+        if v not in DIGEST_MODES:
+            raise ValueError(f'Digest mode must be one of: {list(DIGEST_MODES)}')
+        return v
+
+# ==================== ENDPOINTS ====================
+
+@router.get("/outbox/status")
+async def outbox_status(current_user: UserResponse = Depends(get_current_user)):
+    """Email outbox backlog: pending, retrying, dead and dispatcher queue depth (admin only)"""
+    if 'admin' not in current_user.roles:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return email_outbox.status()
+
+@router.get("/preferences")
+async def get_preferences(current_user: UserResponse = Depends(get_current_user)):
+    """Your donation notification mode and how many events await the next digest"""
+    return {
+        "digest_mode": notification_digest.get_mode(current_user.id),
+        "pending_events": notification_digest.pending_count(current_user.id),
+    }
+
+@router.put("/preferences")
+async def update_preferences(prefs: NotificationPreferences, current_user: UserResponse = Depends(get_current_user)):
+    """Receive donation emails instantly or as an hourly/daily digest"""
+    notification_digest.set_mode(current_user.id, prefs.digest_mode)
+    return {"digest_mode": prefs.digest_mode}
+
+@router.get("/fanout/{job_id}")
+async def fanout_progress(job_id: int, current_user: UserResponse = Depends(get_current_user)):
+    """Progress of a fan-out job of one of your projects (e.g. milestone notification to all backers)"""
+    owner = None if 'admin' in current_user.roles else current_user.id
+    progress = email_fanout.progress(job_id, user_id=owner)
+    if not progress:
+        raise HTTPException(status_code=404, detail="Fan-out job not found")
+    return progress
@@ -8,14 +8,17 @@ Features:
 - Email notifications for all events
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from pydantic import BaseModel, validator
 from typing import Optional, List
 from datetime import datetime
 import json
-import asyncio
 from ..database import get_db_connection, dict_from_row
-from ..services.email_service import email_service
+from ..services.email_outbox import email_outbox
+from ..services.email_fanout import email_fanout
+from ..services.notification_digest import notification_digest
+from ..services.ai_scoring import add_score_filters
+from .api_keys import optional_api_key
 
 router = APIRouter(prefix="/api/v1/projects", tags=["Projects"])
 
@@ -109,7 +112,6 @@ def get_project_backers(project_id: int):
 @router.post("/create")
 async def create_project(
     project: ProjectCreate,
-    background_tasks: BackgroundTasks,
     user_id: int = None  # In production, get from JWT token
 ):
     """
@@ -172,22 +174,20 @@ async def create_project(
                     milestone.deadline,
                     'pending'
                 ))
-            
-            conn.commit()
-            
-            # Get creator info for email
+
+            # Queue project created email in the same transaction
             if user_id:
                 creator = get_user_by_id(user_id)
                 if creator and creator.get('email'):
-                    # Send project created email
-                    background_tasks.add_task(
-                        email_service.send_project_created,
-                        creator['email'],
-                        creator.get('username', 'Project Creator'),
-                        project.title,
-                        slug,
-                        project.goal
-                    )
+                    email_outbox.enqueue(cursor, 'project_created', creator['email'], {
+                        'user_name': creator.get('username', 'Project Creator'),
+                        'project_title': project.title,
+                        'project_slug': slug,
+                        'goal': project.goal,
+                    }, dedupe_key=f"project_created:{project_id}")
+
+            conn.commit()
+            email_outbox.notify()
             
             return {
                 "success": True,
@@ -207,7 +207,6 @@ async def create_project(
 async def donate_to_project(
     project_id: int,
     donation: DonationCreate,
-    background_tasks: BackgroundTasks,
     user_id: int = None  # In production, get from JWT token
 ):
     """
@@ -262,7 +261,8 @@ async def donate_to_project(
                 donation.tx_hash,
                 now
             ))
-            
+            donation_id = cursor.lastrowid
+
             # Update project raised amount
             cursor.execute('''
                 UPDATE campaigns 
@@ -270,31 +270,29 @@ async def donate_to_project(
                 WHERE id = ?
             ''', (donation.amount, project_id))
             
-            conn.commit()
-            
-            # Send email to project creator
+            # Queue email to project creator (or buffer it for their digest)
             if project.get('creator_email'):
-                background_tasks.add_task(
-                    email_service.send_donation_received,
-                    project['creator_email'],
-                    project['title'],
-                    donor_name,
-                    donation.amount,
-                    donation.currency,
-                    donation.tx_hash
-                )
-            
-            # Send receipt to donor
+                notification_digest.route_donation_received(
+                    cursor, project.get('creator_id'), project['creator_email'], project_id, {
+                        'project_title': project['title'],
+                        'donor_name': donor_name,
+                        'amount': donation.amount,
+                        'currency': donation.currency,
+                        'tx_hash': donation.tx_hash,
+                    }, dedupe_key=f"donation_received:{donation_id}")
+
+            # Queue receipt to donor
             if donor_email and not donation.anonymous:
-                background_tasks.add_task(
-                    email_service.send_donation_confirmation,
-                    donor_email,
-                    donor.get('username', 'Supporter'),
-                    project['title'],
-                    donation.amount,
-                    donation.currency,
-                    donation.tx_hash
-                )
+                email_outbox.enqueue(cursor, 'donation_confirmation', donor_email, {
+                    'donor_name': donor.get('username', 'Supporter'),
+                    'project_title': project['title'],
+                    'amount': donation.amount,
+                    'currency': donation.currency,
+                    'tx_hash': donation.tx_hash,
+                }, dedupe_key=f"donation_confirmation:{donation_id}")
+
+            conn.commit()
+            email_outbox.notify()
             
             return {
                 "success": True,
@@ -317,7 +315,6 @@ async def complete_milestone(
     project_id: int,
     milestone_id: int,
     update: MilestoneUpdate,
-    background_tasks: BackgroundTasks,
     user_id: int = None
 ):
     """
@@ -352,26 +349,21 @@ async def complete_milestone(
                 WHERE id = ?
             ''', (update.proof_url, update.notes, now, milestone_id))
             
+            # Queue one fan-out job to notify every backer (sent in chunks by the worker)
+            job_id = email_fanout.create_job(cursor, 'milestone_completed', project_id, {
+                'project_title': milestone['project_title'],
+                'milestone_title': milestone['title'],
+                'milestone_number': milestone.get('milestone_order', 1),
+            }, dedupe_key=f"milestone_completed:{milestone_id}")
+
             conn.commit()
-            
-            # Get all backers and notify them
-            backers = get_project_backers(project_id)
-            
-            for backer in backers:
-                if backer.get('email'):
-                    background_tasks.add_task(
-                        email_service.send_milestone_notification,
-                        backer['email'],
-                        backer.get('username', 'Backer'),
-                        milestone['project_title'],
-                        milestone['title'],
-                        milestone.get('milestone_order', 1)
-                    )
+            email_fanout.notify()
             
             return {
                 "success": True,
                 "message": f"Milestone '{milestone['title']}' marked as completed!",
-                "backers_notified": len(backers)
+                "notification_job_id": job_id,
+                "progress_url": f"/api/v1/notifications/fanout/{job_id}"
             }
             
     except HTTPException:
@@ -383,26 +375,35 @@ async def complete_milestone(
         )
 
 
-@router.get("/")
+@router.get("/", dependencies=[Depends(optional_api_key("read"))])
 async def list_projects(
     category: Optional[str] = None,
     status: str = "active",
+    min_score: Optional[int] = Query(None, ge=0, le=100),
+    max_score: Optional[int] = Query(None, ge=0, le=100),
+    sort: str = Query("newest", pattern="^(newest|score_desc|score_asc)$"),
     limit: int = 20,
     offset: int = 0
 ):
-    """List all projects with optional filtering"""
+    """List all projects with optional filtering (min/max_score use the batch AI greenwashing score)"""
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
             
-            query = "SELECT * FROM campaigns WHERE status = ?"
+            query = '''
+                SELECT c.*, s.score AS ai_score, s.credibility_level AS ai_credibility_level
+                FROM campaigns c
+                LEFT JOIN project_ai_scores s ON s.source = 'campaigns' AND s.project_id = c.id
+                WHERE c.status = ?
+            '''
             params = [status]
             
             if category:
-                query += " AND category = ?"
+                query += " AND c.category = ?"
                 params.append(category)
             
-            query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+            query, params = add_score_filters(query, params, min_score, max_score, sort, "c")
+            query += " LIMIT ? OFFSET ?"
             params.extend([limit, offset])
             
             cursor.execute(query, params)
@@ -421,7 +422,7 @@ async def list_projects(
         )
 
 
-@router.get("/{project_id}")
+@router.get("/{project_id}", dependencies=[Depends(optional_api_key("read"))])
 async def get_project(project_id: int):
     """Get single project details"""
     try:
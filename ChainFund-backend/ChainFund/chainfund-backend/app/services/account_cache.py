@@ -0,0 +1,271 @@
+"""
+Account State Cache
+===================
+Short-lived cache of Stellar account state (balances, sequence numbers)
+for the Stellar service's account lookups.
+
+Entries live ACCOUNT_CACHE_TTL_SECONDS (about one ledger) and are dropped
+as soon as one of our own transactions touches the account: its source,
+the operations' sources and their destinations, and for contract calls
+the submitting accounts and any account passed as an argument. Missing
+accounts are cached too. Changes made by others are picked up through the
+TTL. A load that was in flight when its account was invalidated is
+returned to its callers but not cached.
+
+Single lookups load the full Horizon record; concurrent misses for one
+account share that request. ``prefetch`` fills the cache for a list of
+addresses (e.g. every backer of a campaign) with batched
+``getLedgerEntries`` calls to the Soroban RPC node, up to
+LEDGER_ENTRIES_PER_REQUEST accounts per request, falling back to Horizon
+when RPC is unavailable. Those entries carry the native balance and the
+sequence number only, so a later full lookup still goes to Horizon.
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.config import settings
+from app.services.horizon_client import horizon
+from app.services.soroban_rpc import SorobanRPCError, soroban_rpc
+from app.utils.metrics import metrics
+
+try:
+    from stellar_sdk import Keypair, StrKey
+    from stellar_sdk import xdr as stellar_xdr
+    STELLAR_SDK_AVAILABLE = True
+except ImportError:
+    STELLAR_SDK_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+LEDGER_ENTRIES_PER_REQUEST = 200  # getLedgerEntries key limit
+STROOPS_PER_XLM = 10_000_000
+
+metrics.describe("account_cache_requests_total", "counter", "Account state cache lookups by kind and outcome")
+
+
+def native_balance(record: Optional[Dict[str, Any]]) -> str:
+    """XLM balance of an account record, "0" if it has none or does not exist"""
+    for balance in (record or {}).get("balances", []):
+        if balance.get("asset_type") == "native":
+            return balance["balance"]
+    return "0"
+
+
+def transaction_accounts(transaction) -> List[str]:
+    """Accounts a transaction can change: its source, operation sources and destinations"""
+    accounts = {transaction.transaction.source.account_id}
+    for op in transaction.transaction.operations:
+        if op.source is not None:
+            accounts.add(op.source.account_id)
+        destination = getattr(op, "destination", None)
+        if destination is not None:
+            accounts.add(destination if isinstance(destination, str) else destination.account_id)
+    return sorted(accounts)
+
+
+class AccountStateCache:
+    """TTL cache of Horizon account records with write invalidation and batched prefetch"""
+
+    def __init__(self, ttl: float = settings.account_cache_ttl_seconds,
+                 max_entries: int = settings.account_cache_size):
+        self.ttl = max(0.0, ttl)
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()  # account -> {record, complete, stored_at}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._epochs: "OrderedDict[str, int]" = OrderedDict()  # account -> number of its last invalidation
+        self._epoch_floor = 0  # epoch of accounts not in _epochs (raised as entries are evicted)
+        self._invalidations = itertools.count(1)
+        self._outcomes = Counter()
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    def _cached(self, account_id: str, complete: bool) -> Optional[dict]:
+        entry = self._entries.get(account_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry["stored_at"] >= self.ttl:
+            del self._entries[account_id]
+            return None
+        if complete and not entry["complete"]:
+            return None
+        self._entries.move_to_end(account_id)
+        return entry
+
+    def _epoch(self, account_id: str) -> int:
+        return self._epochs.get(account_id, self._epoch_floor)
+
+    def _store(self, account_id: str, record: Optional[dict], complete: bool, epoch: int):
+        if not self.ttl or epoch != self._epoch(account_id):
+            # The account was invalidated while this was loading: the record may predate our own write
+            return
+        self._entries[account_id] = {"record": record, "complete": complete, "stored_at": time.monotonic()}
+        self._entries.move_to_end(account_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def info(self, account_id: str) -> Optional[Dict[str, Any]]:
+        """Full Horizon account record, or None if the account does not exist"""
+        return await self._get(account_id, complete=True)
+
+    async def summary(self, account_id: str) -> Optional[Dict[str, Any]]:
+        """Account record with at least ``id``, ``sequence`` and the native balance"""
+        return await self._get(account_id, complete=False)
+
+    async def _get(self, account_id: str, complete: bool) -> Optional[Dict[str, Any]]:
+        kind = "info" if complete else "summary"
+        if not self.ttl:
+            return await horizon.get_account(account_id)
+        entry = self._cached(account_id, complete)
+        if entry is not None:
+            self._count(kind, "hit")
+            return entry["record"]
+
+        task = self._inflight.get(account_id)
+        if task is not None:
+            self._count(kind, "coalesced")
+        else:
+            self._count(kind, "miss")
+            task = self._inflight[account_id] = asyncio.create_task(self._load(account_id))
+            task.add_done_callback(lambda t: self._inflight.get(account_id) is t and self._inflight.pop(account_id))
+        return await asyncio.shield(task)
+
+    async def _load(self, account_id: str) -> Optional[Dict[str, Any]]:
+        epoch = self._epoch(account_id)
+        record = await horizon.get_account(account_id)
+        self._store(account_id, record, True, epoch)
+        return record
+
+    async def prefetch(self, account_ids: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Account summaries for many addresses, loading the ones not cached in
+        batches. Addresses that are not accounts (e.g. contract ids) map to None.
+        """
+        account_ids = list(dict.fromkeys(account_ids))
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        missing = []
+        for account_id in account_ids:
+            if not StrKey.is_valid_ed25519_public_key(account_id):
+                results[account_id] = None
+                continue
+            entry = self._cached(account_id, complete=False) if self.ttl else None
+            if entry is not None:
+                self._count("prefetch", "hit")
+                results[account_id] = entry["record"]
+            else:
+                self._count("prefetch", "miss")
+                missing.append(account_id)
+
+        if missing:
+            epochs = {account_id: self._epoch(account_id) for account_id in missing}
+            chunks = [missing[i:i + LEDGER_ENTRIES_PER_REQUEST]
+                      for i in range(0, len(missing), LEDGER_ENTRIES_PER_REQUEST)]
+            for loaded in await asyncio.gather(*(self._load_batch(chunk) for chunk in chunks)):
+                for account_id, (record, complete) in loaded.items():
+                    self._store(account_id, record, complete, epochs[account_id])
+                    results[account_id] = record
+        return {account_id: results[account_id] for account_id in account_ids}
+
+    async def _load_batch(self, account_ids: List[str]) -> Dict[str, tuple]:
+        """account -> (record, complete) for up to LEDGER_ENTRIES_PER_REQUEST accounts"""
+        keys = [
+            stellar_xdr.LedgerKey(
+                type=stellar_xdr.LedgerEntryType.ACCOUNT,
+                account=stellar_xdr.LedgerKeyAccount(account_id=Keypair.from_public_key(a).xdr_account_id()),
+            )
+            for a in account_ids
+        ]
+        try:
+            response = await soroban_rpc.get_ledger_entries(keys)
+        except SorobanRPCError as e:
+            logger.warning(f"Batched account load failed ({e}); loading {len(account_ids)} accounts from Horizon")
+            records = await asyncio.gather(*(horizon.get_account(a) for a in account_ids))
+            return {a: (record, True) for a, record in zip(account_ids, records)}
+
+        loaded: Dict[str, tuple] = {a: (None, True) for a in account_ids}  # no entry: account does not exist
+        for item in response.entries or []:
+            entry = stellar_xdr.LedgerEntryData.from_xdr(item.xdr).account
+            account_id = StrKey.encode_ed25519_public_key(entry.account_id.account_id.ed25519.uint256)
+            stroops = entry.balance.int64
+            loaded[account_id] = ({
+                "id": account_id,
+                "sequence": str(entry.seq_num.sequence_number.int64),
+                "balances": [{"asset_type": "native",
+                              "balance": f"{stroops // STROOPS_PER_XLM}.{stroops % STROOPS_PER_XLM:07d}"}],
+                "last_modified_ledger": item.last_modified_ledger,
+            }, False)
+        return loaded
+
+    # ------------------------------------------------------------------
+    # Invalidation
+    # ------------------------------------------------------------------
+
+    def invalidate(self, account_ids: Iterable[str]):
+        """Drop accounts a transaction of ours may have changed (after every attempt: it may still land)"""
+        epoch = next(self._invalidations)
+        for account_id in account_ids:
+            self._epochs[account_id] = epoch
+            self._epochs.move_to_end(account_id)
+            self._entries.pop(account_id, None)
+            self._inflight.pop(account_id, None)  # new callers must not join a read that predates the write
+        while len(self._epochs) > self.max_entries:
+            _, evicted = self._epochs.popitem(last=False)
+            self._epoch_floor = max(self._epoch_floor, evicted)
+
+    def invalidate_transaction(self, transaction):
+        self.invalidate(transaction_accounts(transaction))
+
+    def invalidate_for_write(self, args: Iterable[str]):
+        """
+        After a contract call (every attempt): the accounts that send our
+        transactions pay fees and use sequence numbers, and accounts passed as
+        arguments may receive or send funds.
+        """
+        accounts = set(soroban_rpc.sequences.public_keys())
+        admin = soroban_rpc.admin_public_key()
+        if admin:
+            accounts.add(admin)
+        accounts.update(arg for arg in args if StrKey.is_valid_ed25519_public_key(arg))
+        self.invalidate(accounts)
+
+    def clear(self):
+        self._epoch_floor = next(self._invalidations)
+        self._epochs.clear()
+        self._inflight.clear()
+        self._entries.clear()
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+
+    def _count(self, kind: str, outcome: str):
+        self._outcomes[outcome] += 1
+        metrics.inc("account_cache_requests_total", kind=kind, outcome=outcome)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def hit_rate(self) -> float:
+        total = sum(self._outcomes.values())
+        return (total - self._outcomes["miss"]) / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": bool(self.ttl),
+            "ttl_seconds": self.ttl,
+            "entries": len(self._entries),
+            "in_flight": len(self._inflight),
+            "hit_rate": round(self.hit_rate(), 4),
+            "lookups": dict(self._outcomes),
+        }
+
+
+# Singleton instance
+account_cache = AccountStateCache()
+metrics.gauge_callback("account_cache_entries", account_cache.__len__, "Account states held in memory")
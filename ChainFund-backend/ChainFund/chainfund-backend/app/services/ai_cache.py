@@ -0,0 +1,193 @@
+"""
+AI Result Cache
+===============
+Content-addressed cache for LLM analysis results.
+
+The key is a SHA-256 over the analysis kind, model, prompt version and the
+normalized inputs (Unicode NFKC, collapsed whitespace), so re-saving an
+unchanged draft never reaches the provider, while a model or prompt change
+naturally misses. Lookups go through an in-memory LRU first, then the
+``ai_analysis_cache`` table; both honour the TTL.
+
+Concurrent requests for the same key are coalesced: one upstream call runs
+and every waiter gets its result. The call is only cancelled when the last
+waiter goes away (e.g. all clients disconnected). Computations that return
+None (provider unavailable, fallback used) are shared but not stored.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import unicodedata
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.config import settings
+from app.database import get_db_connection
+from app.utils.cache import LRUCache
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PURGE_EVERY_WRITES = 200
+
+metrics.describe("ai_cache_requests_total", "counter", "AI result cache lookups by outcome")
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """Canonical form for hashing: NFKC, trimmed, runs of whitespace collapsed"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", value or "")).strip()
+
+
+class AICache:
+    """Memory LRU + SQLite cache with TTL and single-flight coalescing"""
+
+    def __init__(self, memory_size: int = 1024, ttl_hours: float = 168):
+        self.ttl = timedelta(hours=ttl_hours)
+        self._memory = LRUCache(maxsize=memory_size, ttl=self.ttl.total_seconds())
+        self._inflight: Dict[str, list] = {}  # key -> [task, waiters]
+        self._writes = 0
+        self._outcomes = Counter()
+
+    @staticmethod
+    def make_key(kind: str, model: str, prompt_version: str, *parts: str) -> str:
+        material = "\x1f".join([kind, model, str(prompt_version), *(normalize_text(p) for p in parts)])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def _load(self, key: str) -> Optional[dict]:
+        now = datetime.utcnow().isoformat()
+        with get_db_connection() as conn:
+            row = conn.execute(
+                "SELECT result FROM ai_analysis_cache WHERE cache_key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE ai_analysis_cache SET hits = hits + 1, last_hit_at = ? WHERE cache_key = ?", (now, key)
+            )
+            conn.commit()
+        return json.loads(row[0])
+
+    def _store(self, key: str, kind: str, model: str, prompt_version: str, result: dict):
+        now = datetime.utcnow()
+        with get_db_connection() as conn:
+            conn.execute('''
+                INSERT INTO ai_analysis_cache (cache_key, kind, model, prompt_version, result, created_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(cache_key) DO UPDATE SET result = excluded.result, hits = 0,
+                    created_at = excluded.created_at, expires_at = excluded.expires_at
+            ''', (key, kind, model, str(prompt_version), json.dumps(result), now.isoformat(),
+                  (now + self.ttl).isoformat()))
+            conn.commit()
+
+        self._writes += 1
+        if self._writes % PURGE_EVERY_WRITES == 0:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        with get_db_connection() as conn:
+            cursor = conn.execute(
+                "DELETE FROM ai_analysis_cache WHERE expires_at <= ?", (datetime.utcnow().isoformat(),)
+            )
+            conn.commit()
+            return cursor.rowcount
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    async def get_or_compute(self, kind: str, model: str, prompt_version: str, parts: Tuple[str, ...],
+                             compute: Callable[[], Awaitable[Optional[dict]]]) -> Tuple[Optional[dict], str]:
+        """
+        Return (result, source) where source is memory, db, coalesced or miss.
+        ``compute`` returns the provider result, or None to skip caching.
+        """
+        key = self.make_key(kind, model, prompt_version, *parts)
+
+        cached = self._memory.get(key)
+        if cached is not None:
+            self._count(kind, "memory_hit")
+            return cached, "memory"
+
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self._count(kind, "coalesced")
+            result, _ = await self._wait(flight)
+            return result, "coalesced"
+
+        task = asyncio.create_task(self._fill(key, kind, model, prompt_version, compute))
+        flight = self._inflight[key] = [task, 0]
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        result, source = await self._wait(flight)
+        self._count(kind, "db_hit" if source == "db" else "miss")
+        return result, source
+
+    @staticmethod
+    async def _wait(flight: list) -> tuple:
+        task = flight[0]
+        flight[1] += 1
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if flight[1] == 1 and not task.done():
+                task.cancel()  # nobody else wants the answer
+            raise
+        finally:
+            flight[1] -= 1
+        return result
+
+    async def _fill(self, key: str, kind: str, model: str, prompt_version: str,
+                    compute: Callable[[], Awaitable[Optional[dict]]]):
+        try:
+            stored = await asyncio.to_thread(self._load, key)
+        except Exception as e:
+            logger.error(f"AI cache read failed: {e}")
+            stored = None
+        if stored is not None:
+            self._memory.set(key, stored)
+            return stored, "db"
+
+        result = await compute()
+        if result is not None:
+            self._memory.set(key, result)
+            try:
+                await asyncio.to_thread(self._store, key, kind, model, prompt_version, result)
+            except Exception as e:
+                logger.error(f"AI cache write failed: {e}")
+        return result, "miss"
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+
+    def _count(self, kind: str, outcome: str):
+        self._outcomes[outcome] += 1
+        metrics.inc("ai_cache_requests_total", kind=kind, outcome=outcome)
+
+    def hit_rate(self) -> float:
+        total = sum(self._outcomes.values())
+        return (total - self._outcomes["miss"]) / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with get_db_connection() as conn:
+            stored = conn.execute("SELECT COUNT(*) FROM ai_analysis_cache").fetchone()[0]
+        return {
+            "hit_rate": round(self.hit_rate(), 4),
+            "lookups": dict(self._outcomes),
+            "memory_entries": len(self._memory),
+            "stored_entries": stored,
+            "in_flight": len(self._inflight),
+            "ttl_hours": self.ttl.total_seconds() / 3600,
+        }
+
+
+# Singleton instance
+ai_cache = AICache(memory_size=settings.ai_cache_memory_size, ttl_hours=settings.ai_cache_ttl_hours)
+metrics.gauge_callback("ai_cache_hit_ratio", ai_cache.hit_rate, "Share of AI cache lookups served without a provider call")
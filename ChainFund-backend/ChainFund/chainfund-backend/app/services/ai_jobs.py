@@ -0,0 +1,550 @@
+"""
+AI Job Queue
+============
+Durable queue for slow AI work (proof-of-work verification, sustainability
+analysis) so HTTP requests don't stay open for the length of a model call.
+
+``submit`` stores an ``ai_jobs`` row and returns its id at once. Workers
+claim queued rows with a lease, lowest priority value first, skipping users
+who already have AI_JOB_USER_CONCURRENCY jobs running, so one user's backlog
+cannot starve everybody else. Failed runs are retried with backoff; a job
+whose worker died is requeued once its lease expires.
+
+Clients poll ``/api/ai/jobs/{id}`` or pass a ``callback_url``: the finished
+job is POSTed there, signed with a per-job HMAC secret returned at
+submission (``X-ChainFund-Signature: sha256=<hex>``), and redelivered with
+backoff until the receiver answers 2xx. Callback URLs must be https and
+resolve only to public addresses; the host is resolved again before every
+delivery and the request is sent to the checked address, so a DNS change
+after submission cannot point it at an internal service.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import secrets
+import socket
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.config import settings
+from app.database import get_db_connection, dict_from_row
+from app.services.ai_service import ai_service
+from app.services.ai_usage import ai_usage
+from app.services.image_fingerprints import image_fingerprints
+from app.services.proof_verification import proof_verifier
+from app.utils.image_hash import decode_image_payload
+from app.services.email_outbox import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+# Lower values run first
+PRIORITIES = {"high": 1, "normal": 5, "low": 9}
+
+POLL_INTERVAL = 2.0
+LEASE_SECONDS = 300
+JOB_TIMEOUT = 120  # seconds per attempt, well inside the lease
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 5  # seconds before the second attempt, doubled after that
+CALLBACK_MAX_ATTEMPTS = 6
+FINISHED_RETENTION_DAYS = 7
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+async def _verify_proof(payload: dict) -> dict:
+    # Tracked as a whole so the image decode counts towards the call's latency
+    async with ai_usage.track("verify_proof"):
+        return await _verify_proof_tracked(payload)
+
+
+async def _verify_proof_tracked(payload: dict) -> dict:
+    reference = await asyncio.to_thread(
+        proof_verifier.reference, payload.get("bounty_id"), payload.get("project_id")
+    )
+    image_bytes = decode_image_payload(payload.get("image_base64"))
+    if not image_bytes or not proof_verifier.enabled:
+        return await ai_service.verify_proof_of_work(payload["milestone_title"], image_bytes, reference)
+
+    # One decode serves both the evidence checks and the duplicate lookup
+    try:
+        evidence = await proof_verifier.inspect(image_bytes)
+    except ValueError as e:
+        return proof_verifier.unreadable(str(e))
+    result = await ai_service.verify_proof_of_work(
+        payload["milestone_title"], reference=reference, evidence=evidence
+    )
+    if image_fingerprints.enabled:
+        # Only checked here; proofs are recorded when actually submitted
+        result["duplicate_check"] = await image_fingerprints.check(None, fp=evidence["fingerprint"])
+    return result
+
+
+async def _analyze_sustainability(payload: dict) -> dict:
+    return await ai_service.analyze_sustainability(
+        title=payload["title"],
+        description=payload["description"],
+        category=payload.get("category", "General"),
+    )
+
+
+# Job kinds and the coroutine that runs each one
+JOB_HANDLERS: Dict[str, Callable[[dict], Awaitable[dict]]] = {
+    "verify_proof": _verify_proof,
+    "analyze_sustainability": _analyze_sustainability,
+}
+
+
+class QueueFullError(Exception):
+    """The user already has the maximum number of unfinished jobs"""
+
+
+class CallbackURLError(ValueError):
+    """A callback URL that is not https or does not resolve to public addresses only"""
+
+
+def _public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return not (ip.is_loopback or ip.is_private or ip.is_link_local or ip.is_reserved
+                or ip.is_multicast or ip.is_unspecified) and ip.is_global
+
+
+def check_callback_url(url: str) -> tuple:
+    """(scheme, host, port) of an acceptable callback URL; raises CallbackURLError"""
+    parts = urlsplit(url)
+    allowed = ("https", "http") if settings.ai_job_callback_allow_private else ("https",)
+    if parts.scheme not in allowed:
+        raise CallbackURLError("callback_url must use https")
+    if not parts.hostname:
+        raise CallbackURLError("callback_url has no host")
+    if parts.username or parts.password:
+        raise CallbackURLError("callback_url must not contain credentials")
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError:
+        raise CallbackURLError("callback_url has an invalid port")
+    return parts.scheme, parts.hostname, port
+
+
+async def resolve_callback_url(url: str) -> List[str]:
+    """
+    Addresses a callback URL's host resolves to, all of them public (unless
+    AI_JOB_CALLBACK_ALLOW_PRIVATE). Raises CallbackURLError otherwise.
+    """
+    _, host, port = check_callback_url(url)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError):
+        raise CallbackURLError(f"callback_url host {host} does not resolve")
+    addresses = list(dict.fromkeys(info[4][0] for info in infos))
+    if not addresses:
+        raise CallbackURLError(f"callback_url host {host} does not resolve")
+    if not settings.ai_job_callback_allow_private and not all(_public_address(a) for a in addresses):
+        raise CallbackURLError(f"callback_url host {host} resolves to a non-public address")
+    return addresses
+
+
+class AIJobQueue:
+    """Persistent AI job queue with per-user caps, priorities and callbacks"""
+
+    def __init__(self, workers: int = settings.ai_job_workers,
+                 user_concurrency: int = settings.ai_job_user_concurrency,
+                 max_queued_per_user: int = settings.ai_job_max_queued_per_user):
+        self.workers = max(1, workers)
+        self.user_concurrency = max(1, user_concurrency)
+        self.max_queued_per_user = max(1, max_queued_per_user)
+        self._tasks: list = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._finished: Dict[int, asyncio.Event] = {}  # local waiters, by job id
+        self._running: Dict[int, asyncio.Task] = {}
+        self._http: Optional[httpx.AsyncClient] = None
+
+    # ------------------------------------------------------------------
+    # Submission
+    # ------------------------------------------------------------------
+
+    def submit(self, user_id: int, kind: str, payload: dict, priority: str = "normal",
+               callback_url: Optional[str] = None, endpoint: Optional[str] = None) -> dict:
+        """
+        Queue a job and return its public view (plus the callback secret, which
+        is only ever shown here). Raises QueueFullError over the per-user cap.
+        """
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown AI job kind: {kind}")
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        if callback_url:
+            check_callback_url(callback_url)  # addresses are checked by the caller (async) and on delivery
+
+        callback_secret = secrets.token_hex(32) if callback_url else None
+        with get_db_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")  # count and insert under one write lock, or the cap can be overshot
+            unfinished = conn.execute(
+                "SELECT COUNT(*) FROM ai_jobs WHERE user_id = ? AND status IN ('queued', 'running')",
+                (user_id,)
+            ).fetchone()[0]
+            if unfinished >= self.max_queued_per_user:
+                raise QueueFullError(f"At most {self.max_queued_per_user} unfinished AI jobs per user")
+            row = conn.execute('''
+                INSERT INTO ai_jobs (kind, user_id, priority, payload, callback_url, callback_secret,
+                                     endpoint, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                RETURNING *
+            ''', (kind, user_id, PRIORITIES[priority], json.dumps(payload), callback_url,
+                  callback_secret, endpoint, datetime.utcnow().isoformat())).fetchone()
+            conn.commit()
+
+        job = self._public(dict_from_row(row))
+        if callback_secret:
+            job["callback_secret"] = callback_secret
+        self.notify()
+        return job
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def get(self, job_id: int, user_id: Optional[int] = None) -> Optional[dict]:
+        """Public view of a job; with ``user_id``, only that user's jobs are visible"""
+        with get_db_connection() as conn:
+            row = conn.execute("SELECT * FROM ai_jobs WHERE id = ?", (job_id,)).fetchone()
+        job = dict_from_row(row)
+        if not job or (user_id is not None and job["user_id"] != user_id):
+            return None
+        return self._public(job)
+
+    def list_for_user(self, user_id: int, limit: int = 20) -> list:
+        with get_db_connection() as conn:
+            rows = conn.execute(
+                "SELECT * FROM ai_jobs WHERE user_id = ? ORDER BY id DESC LIMIT ?", (user_id, limit)
+            ).fetchall()
+        return [self._public(dict_from_row(row)) for row in rows]
+
+    def cancel(self, job_id: int, user_id: Optional[int] = None) -> bool:
+        """Cancel a queued or running job (a running one is stopped if it runs in this process)"""
+        query = ("UPDATE ai_jobs SET status = 'cancelled', finished_at = ?, locked_until = NULL "
+                 "WHERE id = ? AND status IN ('queued', 'running')")
+        params = [datetime.utcnow().isoformat(), job_id]
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        with get_db_connection() as conn:
+            cancelled = conn.execute(query, params).rowcount > 0
+            conn.commit()
+
+        if cancelled:
+            task = self._running.get(job_id)
+            if task is not None:
+                task.cancel()
+            self._signal_finished(job_id)
+        return cancelled
+
+    async def wait(self, job_id: int, timeout: float) -> Optional[dict]:
+        """
+        Wait up to ``timeout`` seconds for a job to finish and return its view.
+        Jobs run by another process are picked up by re-reading the row.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        event = self._finished.setdefault(job_id, asyncio.Event())
+        try:
+            while True:
+                job = await asyncio.to_thread(self.get, job_id)
+                if job is None or job["status"] in FINISHED_STATUSES:
+                    return job
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return job
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=min(remaining, 1.0))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._finished.pop(job_id, None)
+
+    @staticmethod
+    def _public(job: dict) -> dict:
+        priority = next((name for name, value in PRIORITIES.items() if value == job["priority"]), job["priority"])
+        return {
+            "job_id": job["id"],
+            "kind": job["kind"],
+            "status": job["status"],
+            "priority": priority,
+            "attempts": job["attempts"],
+            "result": json.loads(job["result"]) if job["result"] else None,
+            "error": job["error"],
+            "callback_status": job["callback_status"],
+            "created_at": job["created_at"],
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"],
+        }
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    def _recover(self):
+        """Requeue running jobs whose lease expired (worker crashed or restarted)"""
+        now = datetime.utcnow().isoformat()
+        with get_db_connection() as conn:
+            conn.execute(
+                "UPDATE ai_jobs SET status = 'failed', error = 'worker lease expired', finished_at = ?, "
+                "locked_until = NULL, callback_status = CASE WHEN callback_url IS NULL THEN NULL ELSE 'pending' END, "
+                "callback_next_at = ? WHERE status = 'running' AND locked_until <= ? AND attempts >= ?",
+                (now, now, now, MAX_ATTEMPTS)
+            )
+            conn.execute(
+                "UPDATE ai_jobs SET status = 'queued', locked_until = NULL "
+                "WHERE status = 'running' AND locked_until <= ?",
+                (now,)
+            )
+            conn.commit()
+
+    def _claim(self) -> Optional[dict]:
+        """Lease the most urgent queued job whose owner is under the running cap"""
+        now = datetime.utcnow()
+        with get_db_connection() as conn:
+            row = conn.execute('''
+                UPDATE ai_jobs
+                SET status = 'running', attempts = attempts + 1, locked_until = ?,
+                    started_at = COALESCE(started_at, ?)
+                WHERE id = (
+                    SELECT j.id FROM ai_jobs j
+                    WHERE j.status = 'queued' AND (j.run_after IS NULL OR j.run_after <= ?)
+                      AND (SELECT COUNT(*) FROM ai_jobs r
+                           WHERE r.user_id = j.user_id AND r.status = 'running') < ?
+                    ORDER BY j.priority, j.id
+                    LIMIT 1
+                )
+                RETURNING *
+            ''', (
+                (now + timedelta(seconds=LEASE_SECONDS)).isoformat(), now.isoformat(),
+                now.isoformat(), self.user_concurrency
+            )).fetchone()
+            conn.commit()
+        return dict_from_row(row)
+
+    def _settle(self, job: dict, result: Optional[dict], error: Optional[str]):
+        now = datetime.utcnow()
+        callback = "pending" if job["callback_url"] else None
+        with get_db_connection() as conn:
+            if error is None:
+                conn.execute(
+                    "UPDATE ai_jobs SET status = 'succeeded', result = ?, error = NULL, finished_at = ?, "
+                    "locked_until = NULL, callback_status = ?, callback_next_at = ? "
+                    "WHERE id = ? AND status = 'running'",
+                    (json.dumps(result), now.isoformat(), callback, now.isoformat(), job["id"])
+                )
+            elif job["attempts"] < MAX_ATTEMPTS:
+                conn.execute(
+                    "UPDATE ai_jobs SET status = 'queued', error = ?, run_after = ?, locked_until = NULL "
+                    "WHERE id = ? AND status = 'running'",
+                    (error, (now + timedelta(seconds=RETRY_DELAY * 2 ** (job["attempts"] - 1))).isoformat(), job["id"])
+                )
+            else:
+                conn.execute(
+                    "UPDATE ai_jobs SET status = 'failed', error = ?, finished_at = ?, locked_until = NULL, "
+                    "callback_status = ?, callback_next_at = ? WHERE id = ? AND status = 'running'",
+                    (error, now.isoformat(), callback, now.isoformat(), job["id"])
+                )
+            conn.commit()
+
+    async def run_job(self, job: dict):
+        handler = JOB_HANDLERS.get(job["kind"])
+        result, error = None, None
+        if handler is None:
+            error = f"Unknown AI job kind: {job['kind']}"
+        else:
+            # Separate task so cancel() can stop the job without stopping the worker;
+            # it inherits the usage attribution set here
+            with ai_usage.attribute(job.get("endpoint") or f"job:{job['kind']}", job["user_id"]):
+                task = asyncio.create_task(handler(json.loads(job["payload"])))
+            self._running[job["id"]] = task
+            try:
+                done, _ = await asyncio.wait({task}, timeout=JOB_TIMEOUT)
+            finally:
+                self._running.pop(job["id"], None)
+                if not task.done():
+                    task.cancel()
+            if task.cancelled():
+                return  # cancel() already settled the row
+            if not done:
+                error = f"timed out after {JOB_TIMEOUT}s"
+            elif task.exception() is not None:
+                error = str(task.exception())[:500] or type(task.exception()).__name__
+            else:
+                result = task.result()
+
+        if error:
+            logger.warning(f"AI job {job['id']} ({job['kind']}) attempt {job['attempts']} failed: {error}")
+        await asyncio.to_thread(self._settle, job, result, error)
+        self._signal_finished(job["id"])
+        if job["callback_url"]:
+            self.notify()
+
+    def _signal_finished(self, job_id: int):
+        event = self._finished.get(job_id)
+        if event is not None:
+            event.set()
+
+    # ------------------------------------------------------------------
+    # Callbacks
+    # ------------------------------------------------------------------
+
+    def _claim_callback(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        with get_db_connection() as conn:
+            row = conn.execute('''
+                UPDATE ai_jobs
+                SET callback_attempts = callback_attempts + 1, callback_next_at = ?
+                WHERE id = (
+                    SELECT id FROM ai_jobs
+                    WHERE callback_status = 'pending' AND callback_next_at <= ?
+                    ORDER BY callback_next_at LIMIT 1
+                )
+                RETURNING *
+            ''', ((now + timedelta(seconds=LEASE_SECONDS)).isoformat(), now.isoformat())).fetchone()
+            conn.commit()
+        return dict_from_row(row)
+
+    @staticmethod
+    def sign(secret: str, body: bytes) -> str:
+        return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+    async def deliver_callback(self, job: dict) -> bool:
+        body = json.dumps(self._public(job)).encode()
+        try:
+            # Resolve again (DNS may have changed since submission) and connect to the checked address
+            address = (await resolve_callback_url(job["callback_url"]))[0]
+            scheme, host, port = check_callback_url(job["callback_url"])
+            parts = urlsplit(job["callback_url"])
+            pinned = parts._replace(netloc=f"[{address}]:{port}" if ":" in address else f"{address}:{port}")
+            response = await self._http.post(pinned.geturl(), content=body, headers={
+                "Host": parts.netloc,
+                "Content-Type": "application/json",
+                "X-ChainFund-Job": str(job["id"]),
+                "X-ChainFund-Signature": self.sign(job["callback_secret"], body),
+            }, extensions={"sni_hostname": host})
+            ok, error = response.is_success, f"HTTP {response.status_code}"
+        except CallbackURLError as e:
+            ok, error = False, str(e)
+        except httpx.HTTPError as e:
+            ok, error = False, str(e) or type(e).__name__
+
+        if ok:
+            status, next_at = "delivered", None
+        elif job["callback_attempts"] >= CALLBACK_MAX_ATTEMPTS:
+            status, next_at = "failed", None
+            logger.warning(f"AI job {job['id']} callback gave up: {error}")
+        else:
+            status = "pending"
+            next_at = (datetime.utcnow() + timedelta(seconds=backoff_delay(job["callback_attempts"]))).isoformat()
+
+        def settle():
+            with get_db_connection() as conn:
+                conn.execute(
+                    "UPDATE ai_jobs SET callback_status = ?, callback_next_at = ? WHERE id = ?",
+                    (status, next_at, job["id"])
+                )
+                conn.commit()
+
+        await asyncio.to_thread(settle)
+        return ok
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def purge_finished(self, days: int = FINISHED_RETENTION_DAYS) -> int:
+        cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat()
+        with get_db_connection() as conn:
+            cursor = conn.execute(
+                "DELETE FROM ai_jobs WHERE status IN ('succeeded', 'failed', 'cancelled') AND finished_at < ? "
+                "AND (callback_status IS NULL OR callback_status != 'pending')",
+                (cutoff,)
+            )
+            conn.commit()
+            return cursor.rowcount
+
+    async def _work_once(self) -> bool:
+        """Run one job or one callback delivery; False when there was nothing to do"""
+        job = await asyncio.to_thread(self._claim)
+        if job:
+            await self.run_job(job)
+            return True
+
+        callback = await asyncio.to_thread(self._claim_callback)
+        if callback:
+            await self.deliver_callback(callback)
+            return True
+        return False
+
+    async def _worker(self, index: int):
+        last_maintenance = None
+        while True:
+            busy = False
+            try:
+                if index == 0 and (last_maintenance is None or
+                                   datetime.utcnow() - last_maintenance > timedelta(seconds=LEASE_SECONDS / 5)):
+                    await asyncio.to_thread(self._recover)
+                    await asyncio.to_thread(self.purge_finished)
+                    last_maintenance = datetime.utcnow()
+                busy = await self._work_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"AI job worker error: {e}")
+
+            if not busy:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self):
+        """Start the workers (call from app lifespan)"""
+        if not self._tasks:
+            self._wakeup = asyncio.Event()
+            self._http = httpx.AsyncClient(timeout=settings.ai_job_callback_timeout_seconds, follow_redirects=False)
+            self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        """Stop the workers; running jobs are requeued when their lease expires"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def status(self) -> Dict[str, Any]:
+        with get_db_connection() as conn:
+            counts = {
+                row["status"]: row["count"]
+                for row in conn.execute("SELECT status, COUNT(*) AS count FROM ai_jobs GROUP BY status")
+            }
+            callbacks = conn.execute(
+                "SELECT COUNT(*) FROM ai_jobs WHERE callback_status = 'pending'"
+            ).fetchone()[0]
+        return {
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "succeeded": counts.get("succeeded", 0),
+            "failed": counts.get("failed", 0),
+            "pending_callbacks": callbacks,
+            "workers": len(self._tasks),
+            "user_concurrency": self.user_concurrency,
+        }
+
+
+# Singleton instance
+ai_jobs = AIJobQueue()
@@ -0,0 +1,343 @@
+"""
+AI Scoring
+==========
+Batch greenwashing scores for the whole catalog (``projects`` and
+``campaigns``), stored in ``project_ai_scores`` so list endpoints can
+filter and sort by score.
+
+An admin creates a job; the worker streams both tables with a keyset
+cursor, skips rows whose stored score is still fresh (same content hash,
+which covers model and prompt version, and younger than
+AI_SCORE_MAX_AGE_DAYS) and analyzes the rest with bounded parallelism
+and a per-minute budget, leaving call slots free for interactive
+requests. While the provider's circuit breaker is open the job waits
+instead of writing mock scores. The cursor and counters are checkpointed
+after every chunk, so an interrupted job resumes where it stopped.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from app.config import settings
+from app.database import get_db_connection, dict_from_row
+from app.services.ai_cache import AICache
+from app.services.ai_service import ai_service, SUSTAINABILITY_PROMPT_VERSION
+from app.services.ai_usage import ai_usage
+from app.utils.token_bucket import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+SOURCES = ("projects", "campaigns")
+CHUNK_SIZE = 50
+ITEM_ATTEMPTS = 3
+POLL_INTERVAL = 5.0
+LEASE_SECONDS = 300
+
+SCORE_SORTS = ("newest", "score_desc", "score_asc")
+
+
+def add_score_filters(query: str, params: list, min_score: Optional[int], max_score: Optional[int],
+                      sort: str, alias: str) -> tuple:
+    """
+    Append score filters and ordering to a catalog query that LEFT JOINs
+    project_ai_scores as ``s``. Unscored rows are excluded by score filters
+    and sorted last.
+    """
+    if min_score is not None:
+        query += " AND s.score >= ?"
+        params.append(min_score)
+    if max_score is not None:
+        query += " AND s.score <= ?"
+        params.append(max_score)
+    if sort == "score_desc":
+        query += f" ORDER BY s.score IS NULL, s.score DESC, {alias}.created_at DESC"
+    elif sort == "score_asc":
+        query += f" ORDER BY s.score IS NULL, s.score ASC, {alias}.created_at DESC"
+    else:
+        query += f" ORDER BY {alias}.created_at DESC"
+    return query, params
+
+
+class AIScoringService:
+    """Resumable batch scoring of projects and campaigns"""
+
+    def __init__(self, concurrency: int = settings.ai_scoring_concurrency,
+                 rate_per_minute: float = settings.ai_scoring_rate_per_minute,
+                 max_age_days: float = settings.ai_score_max_age_days):
+        # Never take every AI call slot: interactive analysis keeps at least one
+        self.concurrency = max(1, min(concurrency, ai_service.max_concurrency - 1 or 1))
+        self.rate_per_minute = rate_per_minute
+        self.max_age = timedelta(days=max_age_days)
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    # ------------------------------------------------------------------
+    # Jobs
+    # ------------------------------------------------------------------
+
+    def create_job(self, requested_by: Optional[int], force: bool = False) -> dict:
+        """Queue a scoring run; returns the already active job instead of starting a second one"""
+        with get_db_connection() as conn:
+            active = conn.execute(
+                "SELECT id FROM ai_scoring_jobs WHERE status IN ('pending', 'running') ORDER BY id LIMIT 1"
+            ).fetchone()
+            if active:
+                return {"job_id": active[0], "created": False}
+            cursor = conn.execute(
+                "INSERT INTO ai_scoring_jobs (force, requested_by, created_at) VALUES (?, ?, ?)",
+                (int(force), requested_by, datetime.utcnow().isoformat())
+            )
+            conn.commit()
+            job_id = cursor.lastrowid
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return {"job_id": job_id, "created": True}
+
+    def cancel_job(self, job_id: int) -> bool:
+        with get_db_connection() as conn:
+            cursor = conn.execute(
+                "UPDATE ai_scoring_jobs SET status = 'cancelled', finished_at = ?, locked_until = NULL "
+                "WHERE id = ? AND status IN ('pending', 'running')",
+                (datetime.utcnow().isoformat(), job_id)
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def _claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        with get_db_connection() as conn:
+            row = conn.execute('''
+                UPDATE ai_scoring_jobs
+                SET status = 'running', locked_until = ?, started_at = COALESCE(started_at, ?)
+                WHERE id = (
+                    SELECT id FROM ai_scoring_jobs
+                    WHERE status = 'pending' OR (status = 'running' AND locked_until <= ?)
+                    ORDER BY id LIMIT 1
+                )
+                RETURNING *
+            ''', (
+                (now + timedelta(seconds=LEASE_SECONDS)).isoformat(), now.isoformat(), now.isoformat()
+            )).fetchone()
+            conn.commit()
+        return dict_from_row(row)
+
+    def _checkpoint(self, job_id: int, source: str, cursor_id: int, scored: int, skipped: int,
+                    failed: int, total: Optional[int] = None) -> bool:
+        """Save progress; returns False if the job was cancelled meanwhile"""
+        now = datetime.utcnow()
+        with get_db_connection() as conn:
+            cursor = conn.execute('''
+                UPDATE ai_scoring_jobs
+                SET cursor_source = ?, cursor_id = ?, scored = scored + ?, skipped = skipped + ?,
+                    failed = failed + ?, total = COALESCE(?, total), locked_until = ?, updated_at = ?
+                WHERE id = ? AND status = 'running'
+            ''', (source, cursor_id, scored, skipped, failed, total,
+                  (now + timedelta(seconds=LEASE_SECONDS)).isoformat(), now.isoformat(), job_id))
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def _finish(self, job_id: int, status: str, error: str = None):
+        with get_db_connection() as conn:
+            conn.execute(
+                "UPDATE ai_scoring_jobs SET status = ?, last_error = ?, locked_until = NULL, finished_at = ? "
+                "WHERE id = ? AND status = 'running'",
+                (status, error, datetime.utcnow().isoformat(), job_id)
+            )
+            conn.commit()
+
+    # ------------------------------------------------------------------
+    # Catalog streaming
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _sources(conn) -> List[str]:
+        """Catalog tables present in this database (not every deployment has campaigns)"""
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        return [source for source in SOURCES if source in existing]
+
+    def count_catalog(self) -> int:
+        with get_db_connection() as conn:
+            return sum(conn.execute(f"SELECT COUNT(*) FROM {source}").fetchone()[0] for source in self._sources(conn))
+
+    def fetch_chunk(self, source: str, after_id: int, limit: int) -> List[dict]:
+        """Next rows of one catalog table with their current score metadata (keyset pagination)"""
+        with get_db_connection() as conn:
+            rows = conn.execute(f'''
+                SELECT p.id, p.title, p.description, p.full_description, p.category,
+                       s.content_hash, s.scored_at
+                FROM {source} p
+                LEFT JOIN project_ai_scores s ON s.source = ? AND s.project_id = p.id
+                WHERE p.id > ?
+                ORDER BY p.id LIMIT ?
+            ''', (source, after_id, limit)).fetchall()
+        return [dict_from_row(row) for row in rows]
+
+    @staticmethod
+    def _analysis_input(row: dict) -> tuple:
+        text = row.get("description") or ""
+        if row.get("full_description"):
+            text = f"{text}\n\n{row['full_description']}"
+        return row.get("title") or "", text, row.get("category") or "General"
+
+    def content_hash(self, row: dict) -> str:
+        # Same key as the analysis cache, so model/prompt changes also mark scores stale
+        return AICache.make_key("sustainability", ai_service.model, SUSTAINABILITY_PROMPT_VERSION,
+                                *self._analysis_input(row))
+
+    def is_stale(self, row: dict, force: bool) -> bool:
+        if force or not row.get("scored_at"):
+            return True
+        if row.get("content_hash") != self.content_hash(row):
+            return True
+        return datetime.fromisoformat(row["scored_at"]) < datetime.utcnow() - self.max_age
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+
+    def save_score(self, source: str, row: dict, result: dict):
+        with get_db_connection() as conn:
+            conn.execute('''
+                INSERT INTO project_ai_scores (
+                    source, project_id, score, credibility_level, flags, summary,
+                    model, prompt_version, content_hash, scored_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(source, project_id) DO UPDATE SET
+                    score = excluded.score, credibility_level = excluded.credibility_level,
+                    flags = excluded.flags, summary = excluded.summary, model = excluded.model,
+                    prompt_version = excluded.prompt_version, content_hash = excluded.content_hash,
+                    scored_at = excluded.scored_at
+            ''', (
+                source, row["id"], max(0, min(100, int(result["score"]))), result.get("credibility_level"),
+                json.dumps(result.get("flags") or []), result.get("summary"), ai_service.model,
+                SUSTAINABILITY_PROMPT_VERSION, self.content_hash(row), datetime.utcnow().isoformat()
+            ))
+            conn.commit()
+
+    async def _score_row(self, source: str, row: dict, bucket: TokenBucket, slots: asyncio.Semaphore) -> bool:
+        async with slots:
+            for _ in range(ITEM_ATTEMPTS):
+                # Provider degraded: wait for the breaker instead of storing mock scores
+                wait = ai_service.breaker.retry_after()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await bucket.acquire()
+                result = await ai_service.try_analyze_sustainability(*self._analysis_input(row))
+                if result is not None:
+                    try:
+                        await asyncio.to_thread(self.save_score, source, row, result)
+                        return True
+                    except (TypeError, ValueError, KeyError) as e:
+                        logger.warning(f"Unusable AI score for {source}/{row['id']}: {e}")
+                        return False
+            return False
+
+    async def run_job(self, job: dict):
+        """Score a claimed job from its checkpoint to the end of the catalog"""
+        if not ai_service.client:
+            await asyncio.to_thread(self._finish, job["id"], "failed", "AI provider not configured")
+            return
+
+        force = bool(job["force"])
+        bucket = TokenBucket(self.rate_per_minute / 60.0, burst=self.concurrency)
+        slots = asyncio.Semaphore(self.concurrency)
+
+        total = job["total"]
+        if total is None:
+            total = await asyncio.to_thread(self.count_catalog)
+
+        with get_db_connection() as conn:
+            sources = self._sources(conn)
+        # Resume: skip sources finished before the checkpoint
+        if job["cursor_source"] in sources:
+            sources = sources[sources.index(job["cursor_source"]):]
+        logger.info(f"🌿 AI scoring job {job['id']} over {sources}, {total} rows, checkpoint "
+                    f"{job['cursor_source']}:{job['cursor_id']}")
+
+        for source in sources:
+            cursor_id = job["cursor_id"] if source == job["cursor_source"] else 0
+            while True:
+                rows = await asyncio.to_thread(self.fetch_chunk, source, cursor_id, CHUNK_SIZE)
+                if not rows:
+                    break
+                stale = [row for row in rows if self.is_stale(row, force)]
+                with ai_usage.attribute("ai_scoring", job["requested_by"]):
+                    results = await asyncio.gather(*(self._score_row(source, row, bucket, slots) for row in stale))
+                scored = sum(results)
+                cursor_id = rows[-1]["id"]
+                still_running = await asyncio.to_thread(
+                    self._checkpoint, job["id"], source, cursor_id, scored,
+                    len(rows) - len(stale), len(stale) - scored, total
+                )
+                total = None  # only written with the first checkpoint
+                if not still_running:
+                    logger.info(f"AI scoring job {job['id']} cancelled")
+                    return
+
+        await asyncio.to_thread(self._finish, job["id"], "done")
+        logger.info(f"✅ AI scoring job {job['id']} finished")
+
+    async def _run(self):
+        while True:
+            job = None
+            try:
+                job = await asyncio.to_thread(self._claim)
+                if job:
+                    await self.run_job(job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"AI scoring worker error: {e}")
+                if job:
+                    await asyncio.to_thread(self._finish, job["id"], "failed", str(e))
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Start the worker; an interrupted job resumes once its lease expires"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # ------------------------------------------------------------------
+    # Progress
+    # ------------------------------------------------------------------
+
+    def progress(self, job_id: int) -> Optional[dict]:
+        with get_db_connection() as conn:
+            job = dict_from_row(conn.execute("SELECT * FROM ai_scoring_jobs WHERE id = ?", (job_id,)).fetchone())
+        if not job:
+            return None
+        done = job["scored"] + job["skipped"] + job["failed"]
+        return {
+            "job_id": job["id"],
+            "status": job["status"],
+            "force": bool(job["force"]),
+            "total": job["total"],
+            "scored": job["scored"],
+            "skipped": job["skipped"],
+            "failed": job["failed"],
+            "percent": round(100 * done / job["total"], 1) if job["total"] else (100.0 if job["status"] == "done" else 0.0),
+            "checkpoint": {"source": job["cursor_source"], "id": job["cursor_id"]},
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"],
+            "last_error": job["last_error"],
+        }
+
+
+# Singleton instance
+ai_scoring = AIScoringService()
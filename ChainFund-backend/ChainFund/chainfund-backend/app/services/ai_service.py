@@ -1,40 +1,151 @@
 import os
 import json
+import asyncio
 import logging
+import time
 from typing import Dict, Any, Optional
 from app.config import settings
+from app.utils.circuit_breaker import CircuitBreaker
+from app.services.ai_cache import ai_cache
+from app.services.ai_usage import ai_usage
+from app.services.credibility_model import credibility_model
+from app.services.proof_verification import proof_verifier
 
 # Try to import Groq, but fail gracefully if not installed
 try:
-    from groq import Groq
+    from groq import AsyncGroq
 except ImportError:
-    Groq = None
+    AsyncGroq = None
 
 logger = logging.getLogger(__name__)
 
+# Keys the analysis endpoint's response model requires
+ANALYSIS_FIELDS = {"score", "credibility_level", "flags", "suggestions", "impact_metrics", "summary"}
+
+# Bump whenever the sustainability prompt changes so cached results are not reused
+SUSTAINABILITY_PROMPT_VERSION = "1"
+
 class AIService:
     def __init__(self):
         self.api_key = settings.groq_api_key
+        self.model = settings.groq_model
+        self.timeout = settings.ai_timeout_seconds
+        self.queue_timeout = settings.ai_queue_timeout_seconds
         self.client = None
         
-        if self.api_key and Groq:
+        # Bounds concurrent provider calls; requests beyond it wait (up to queue_timeout)
+        self.max_concurrency = max(1, settings.ai_max_concurrency)
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._in_flight = 0
+        self.breaker = CircuitBreaker(
+            "groq",
+            failure_threshold=settings.ai_breaker_failure_threshold,
+            reset_timeout=settings.ai_breaker_reset_seconds,
+        )
+        
+        if self.api_key and AsyncGroq:
             try:
-                self.client = Groq(api_key=self.api_key)
+                # Retries are left to the breaker; the timeout here backs up the wait_for below
+                self.client = AsyncGroq(api_key=self.api_key, timeout=self.timeout, max_retries=0)
                 logger.info("✅ Groq AI Client initialized successfully")
             except Exception as e:
                 logger.error(f"❌ Failed to initialize Groq client: {e}")
         else:
             logger.warning("⚠️ Groq API Key missing or library not installed. AI features will use mock data.")
 
+    async def _complete_json(self, system: str, prompt: str, max_tokens: int = 1024) -> Optional[Dict[str, Any]]:
+        """
+        One JSON chat completion through the concurrency limiter, timeout and
+        circuit breaker. Returns None when the caller should use its fallback.
+        """
+        if not self.client:
+            ai_usage.fallback("no_client", self.model)
+            return None
+        if not self.breaker.allow():
+            ai_usage.fallback("breaker_open", self.model)
+            return None
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            # Saturated, not failing: don't count against the provider
+            logger.warning(f"AI call slots busy for {self.queue_timeout}s, using fallback")
+            ai_usage.fallback("saturated", self.model)
+            return None
+
+        self._in_flight += 1
+        started = time.perf_counter()
+        try:
+            chat_completion = await asyncio.wait_for(
+                self.client.chat.completions.create(
+                    messages=[
+                        {"role": "system", "content": system},
+                        {"role": "user", "content": prompt}
+                    ],
+                    model=self.model,
+                    temperature=0.3,
+                    max_tokens=max_tokens,
+                    response_format={"type": "json_object"}
+                ),
+                timeout=self.timeout
+            )
+            choice = chat_completion.choices[0]
+            ai_usage.provider_response(self.model, time.perf_counter() - started,
+                                       getattr(chat_completion, "usage", None),
+                                       getattr(choice, "finish_reason", None), max_tokens)
+            result = json.loads(choice.message.content)
+        except asyncio.TimeoutError:
+            logger.error(f"Groq API call timed out after {self.timeout}s")
+            self.breaker.record_failure("timeout")
+            ai_usage.fallback("timeout", self.model)
+            return None
+        except Exception as e:
+            logger.error(f"Error calling Groq API: {e}")
+            self.breaker.record_failure(str(e)[:200])
+            ai_usage.fallback("invalid_json" if isinstance(e, json.JSONDecodeError) else "provider_error",
+                              self.model)
+            return None
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+        self.breaker.record_success()
+        return result
+
+    def status(self) -> Dict[str, Any]:
+        """Provider, limiter and breaker state for the health endpoint"""
+        return {
+            "provider": "Groq" if self.client else "Mock",
+            "model": self.model,
+            "fallback": f"{credibility_model.name} {credibility_model.version}" if credibility_model else "heuristic",
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "timeout_seconds": self.timeout,
+            "circuit_breaker": self.breaker.snapshot(),
+            "cache": ai_cache.stats(),
+        }
+
     async def analyze_sustainability(self, title: str, description: str, category: str) -> Dict[str, Any]:
         """
         Analyzes a project proposal for sustainability credibility ("Greenwashing Detection").
         Returns a JSON object with score, feedback, and classification.
         """
-        
-        # Fallback to mock if client not available
+        async with ai_usage.track("analyze_sustainability"):
+            result = await self.try_analyze_sustainability(title, description, category)
+            # Fallback when the provider is missing, unavailable, saturated or degraded
+            return result if result is not None else self._offline_analysis(title, description)
+
+    async def try_analyze_sustainability(self, title: str, description: str,
+                                         category: str) -> Optional[Dict[str, Any]]:
+        """Provider (or cached) analysis, or None when only the mock fallback is available"""
+        async with ai_usage.track("analyze_sustainability"):
+            return await self._try_analyze_sustainability(title, description, category)
+
+    async def _try_analyze_sustainability(self, title: str, description: str,
+                                          category: str) -> Optional[Dict[str, Any]]:
         if not self.client:
-            return self._mock_analysis(title, description)
+            ai_usage.fallback("no_client")
+            return None
 
         prompt = f"""
         You are an expert Scientific Auditor for a Regenerative Finance platform. 
@@ -61,63 +172,49 @@ class AIService:
         }}
         """
 
-        try:
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a rigid scientific auditor. Return ONLY valid JSON."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                model="llama3-70b-8192",
-                temperature=0.3,
-                max_tokens=1024,
-                response_format={"type": "json_object"}
+        async def compute() -> Optional[Dict[str, Any]]:
+            result = await self._complete_json(
+                "You are a rigid scientific auditor. Return ONLY valid JSON.", prompt
             )
-            
-            result_json = chat_completion.choices[0].message.content
-            return json.loads(result_json)
+            # Off-schema replies are not cached
+            if result is not None and not ANALYSIS_FIELDS.issubset(result):
+                ai_usage.fallback("off_schema", self.model)
+                return None
+            return result
 
-        except Exception as e:
-            logger.error(f"Error calling Groq API: {e}")
-            return self._mock_analysis(title, description)
+        # Identical drafts (after normalization) share one provider call and its cached result
+        result, source = await ai_cache.get_or_compute(
+            "sustainability", self.model, SUSTAINABILITY_PROMPT_VERSION,
+            (title, description, category), compute
+        )
+        ai_usage.cache_result(source, self.model, hit=result is not None and source != "miss")
+        return result
 
-    async def verify_proof_of_work(self, milestone_title: str, image_bytes: bytes = None) -> Dict[str, Any]:
+    async def verify_proof_of_work(self, milestone_title: str, image_bytes: bytes = None,
+                                   reference: Optional[dict] = None,
+                                   evidence: Optional[dict] = None) -> Dict[str, Any]:
         """
         Verifies if an image provides visual proof of a milestone completion.
-        Simulates Computer Vision analysis.
+        Runs the local evidence checks (geotag, capture time, sharpness, exposure);
+        only a ``needs_review`` verdict calls for a vision model or a human.
+        Pass ``evidence`` when the image was already inspected.
         """
-        # In a real hackathon flow, you'd send base64 image to GPT-4o or LLaVA.
-        # Here we simulate the AI "Audit" process for the demo.
-        
-        import random
-        import asyncio
-        
-        # Simulate processing time
-        await asyncio.sleep(2)
-        
-        success = random.random() > 0.1 # 90% success rate for demo
-        
-        if success:
-            return {
-                "verified": True,
-                "confidence": 0.95,
-                "analysis": f"AI Verification Successful: Image content matches milestone '{milestone_title}'. Identified: relevant physical evidence, location data consistency.",
-                "objects_detected": ["sapling", "gloves", "soil", "human_hand"],
-                "geotag_match": True
-            }
-        else:
-            return {
-                "verified": False,
-                "confidence": 0.20,
-                "analysis": "AI Verification Failed: Image appears unrelated or blurry. Please upload a clear photo of the completed work.",
-                "objects_detected": ["unknown_blur", "indoor_wall"],
-                "geotag_match": False
-            }
+        async with ai_usage.track("verify_proof"):
+            if evidence is None and not image_bytes:
+                return proof_verifier.unreadable("no proof image provided")
+            if evidence is None and not proof_verifier.enabled:
+                result = proof_verifier.unreadable("image analysis is unavailable (Pillow/NumPy not installed)")
+                result.update(verdict="needs_review", needs_review=True)
+                return result
+            if evidence is None:
+                return await proof_verifier.verify(image_bytes, reference, milestone_title)
+            return proof_verifier.assess(evidence, reference, milestone_title)
+
+    def _offline_analysis(self, title: str, description: str) -> Dict[str, Any]:
+        """Local credibility model (same schema as the LLM), or the basic heuristic without NumPy"""
+        if credibility_model is not None:
+            return credibility_model.analyze(title, description)
+        return self._mock_analysis(title, description)
 
     def _mock_analysis(self, title: str, description: str) -> Dict[str, Any]:
         """
@@ -0,0 +1,338 @@
+"""
+AI Usage Accounting
+===================
+Latency, token and fallback accounting for every ``AIService`` call.
+
+Each public AIService operation runs inside ``ai_usage.track(operation)``,
+which times it and collects what happened underneath: the model, prompt and
+completion tokens, whether the completion hit ``max_tokens``, the cache
+outcome, and why the fallback was used (no client, breaker open, slots
+saturated, timeout, provider error, off-schema reply). The endpoint and
+user come from ``ai_usage.attribute``, set by whoever runs the call (the
+AI job workers, the batch scorer), and flow into nested tasks through a
+context variable.
+
+Finished calls update Prometheus metrics at once and are aggregated in
+memory per (day, endpoint, operation, user, model, outcome, fallback
+reason); a background task folds the aggregates into ``ai_usage_daily``
+every FLUSH_INTERVAL seconds, so the request path never writes to SQLite.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.database import get_db_connection, dict_from_row
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 30
+# Upper bounds of the latency buckets kept per rollup row (plus one overflow bucket)
+ROLLUP_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+GROUP_COLUMNS = ("day", "endpoint", "operation", "user_id", "model", "outcome", "fallback_reason")
+SUMMED_FIELDS = ("calls", "provider_requests", "prompt_tokens", "completion_tokens", "truncated", "latency_ms_sum")
+
+metrics.histogram("ai_call_duration_seconds", "AIService call latency by operation and outcome")
+metrics.histogram("ai_provider_latency_seconds", "Latency of completed provider requests by model")
+metrics.describe("ai_calls_total", "counter", "AIService calls by endpoint, operation and outcome")
+metrics.describe("ai_tokens_total", "counter", "Provider tokens by operation, model and type")
+metrics.describe("ai_fallbacks_total", "counter", "Calls answered by the local fallback, by reason")
+metrics.describe("ai_truncated_completions_total", "counter", "Completions cut off by max_tokens")
+
+_attribution: ContextVar[Tuple[str, int]] = ContextVar("ai_usage_attribution", default=("direct", 0))
+_current: ContextVar[Optional["AICall"]] = ContextVar("ai_usage_call", default=None)
+
+
+class AICall:
+    """What one AIService operation did; filled in by the layers underneath"""
+
+    __slots__ = ("operation", "endpoint", "user_id", "model", "outcome", "fallback_reason",
+                 "cache", "provider_requests", "prompt_tokens", "completion_tokens", "truncated", "max_tokens",
+                 "provider_latency", "started")
+
+    def __init__(self, operation: str, endpoint: str, user_id: int):
+        self.operation = operation
+        self.endpoint = endpoint
+        self.user_id = user_id
+        self.model = ""
+        self.outcome = "local"  # provider, cache, local or fallback
+        self.fallback_reason = ""
+        self.cache: Optional[str] = None  # memory, db, coalesced or miss
+        self.provider_requests = 0  # answered provider requests, including unusable replies
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.truncated = False
+        self.max_tokens: Optional[int] = None
+        self.provider_latency: Optional[float] = None
+        self.started = time.perf_counter()
+
+
+def _new_bucket() -> Dict[str, Any]:
+    return {"calls": 0, "provider_requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "truncated": 0,
+            "latency_ms_sum": 0.0, "latency_ms_max": 0.0, "histogram": [0] * (len(ROLLUP_BUCKETS_MS) + 1)}
+
+
+def _bucket_index(latency_ms: float) -> int:
+    for i, bound in enumerate(ROLLUP_BUCKETS_MS):
+        if latency_ms <= bound:
+            return i
+    return len(ROLLUP_BUCKETS_MS)
+
+
+def histogram_quantile(histogram: List[int], q: float) -> Optional[float]:
+    """Approximate quantile in ms from rollup bucket counts (the overflow bucket reports its lower bound)"""
+    total = sum(histogram)
+    if not total:
+        return None
+    rank, seen = q * total, 0
+    for i, count in enumerate(histogram):
+        if count and seen + count >= rank:
+            if i == len(ROLLUP_BUCKETS_MS):
+                return float(ROLLUP_BUCKETS_MS[-1])
+            lower = ROLLUP_BUCKETS_MS[i - 1] if i else 0
+            return round(lower + (ROLLUP_BUCKETS_MS[i] - lower) * (rank - seen) / count, 1)
+        seen += count
+    return float(ROLLUP_BUCKETS_MS[-1])
+
+
+class AIUsageTracker:
+    """Per-call instrumentation, Prometheus metrics and the daily rollup"""
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._pending: Dict[tuple, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    # ------------------------------------------------------------------
+    # Instrumentation
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def attribute(self, endpoint: Optional[str], user_id: Optional[int]):
+        """Charge AI calls made inside the block (and tasks started from it) to an endpoint and user"""
+        token = _attribution.set((endpoint or "direct", user_id or 0))
+        try:
+            yield
+        finally:
+            _attribution.reset(token)
+
+    @asynccontextmanager
+    async def track(self, operation: str):
+        """Time one AIService operation; nested calls are part of the outer one"""
+        if _current.get() is not None:
+            yield _current.get()
+            return
+        endpoint, user_id = _attribution.get()
+        call = AICall(operation, endpoint, user_id)
+        token = _current.set(call)
+        try:
+            yield call
+        finally:
+            _current.reset(token)
+            self.record(call, time.perf_counter() - call.started)
+
+    @staticmethod
+    def current() -> Optional[AICall]:
+        return _current.get()
+
+    def provider_response(self, model: str, latency: float, usage: Any, finish_reason: Optional[str],
+                          max_tokens: int):
+        """Note a completed provider request on the current call"""
+        call = _current.get()
+        metrics.observe("ai_provider_latency_seconds", latency, model=model)
+        if call is None:
+            return
+        call.model = model
+        call.outcome = "provider"
+        call.provider_latency = latency
+        call.max_tokens = max_tokens
+        call.provider_requests += 1
+        call.prompt_tokens += int(getattr(usage, "prompt_tokens", 0) or 0)
+        call.completion_tokens += int(getattr(usage, "completion_tokens", 0) or 0)
+        call.truncated = call.truncated or finish_reason == "length"
+
+    def fallback(self, reason: str, model: str = ""):
+        """Note that the current call could not use the provider"""
+        call = _current.get()
+        if call is not None:
+            call.outcome = "fallback"
+            call.fallback_reason = reason
+            call.model = call.model or model
+
+    def cache_result(self, source: str, model: str, hit: bool):
+        call = _current.get()
+        if call is not None:
+            call.cache = source
+            call.model = call.model or model
+            if hit:
+                call.outcome = "cache"
+
+    def record(self, call: AICall, duration: float):
+        metrics.observe("ai_call_duration_seconds", duration, operation=call.operation, outcome=call.outcome)
+        metrics.inc("ai_calls_total", endpoint=call.endpoint, operation=call.operation, outcome=call.outcome)
+        if call.prompt_tokens or call.completion_tokens:
+            metrics.inc("ai_tokens_total", call.prompt_tokens, operation=call.operation, model=call.model,
+                        type="prompt")
+            metrics.inc("ai_tokens_total", call.completion_tokens, operation=call.operation, model=call.model,
+                        type="completion")
+        if call.truncated:
+            metrics.inc("ai_truncated_completions_total", operation=call.operation, model=call.model)
+        if call.outcome == "fallback":
+            metrics.inc("ai_fallbacks_total", operation=call.operation, reason=call.fallback_reason)
+
+        latency_ms = duration * 1000
+        key = (datetime.utcnow().strftime("%Y-%m-%d"), call.endpoint, call.operation, call.user_id,
+               call.model, call.outcome, call.fallback_reason)
+        bucket = self._pending.get(key)
+        if bucket is None:
+            bucket = self._pending[key] = _new_bucket()
+        bucket["calls"] += 1
+        bucket["provider_requests"] += call.provider_requests
+        bucket["prompt_tokens"] += call.prompt_tokens
+        bucket["completion_tokens"] += call.completion_tokens
+        bucket["truncated"] += int(call.truncated)
+        bucket["latency_ms_sum"] += latency_ms
+        bucket["latency_ms_max"] = max(bucket["latency_ms_max"], latency_ms)
+        bucket["histogram"][_bucket_index(latency_ms)] += 1
+
+    # ------------------------------------------------------------------
+    # Daily rollup
+    # ------------------------------------------------------------------
+
+    def _write(self, pending: Dict[tuple, Dict[str, Any]]):
+        now = datetime.utcnow().isoformat()
+        with get_db_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for key, bucket in pending.items():
+                row = conn.execute(
+                    f"SELECT latency_histogram FROM ai_usage_daily WHERE "
+                    f"{' AND '.join(f'{column} = ?' for column in GROUP_COLUMNS)}", key
+                ).fetchone()
+                histogram = bucket["histogram"]
+                if row and row[0]:
+                    histogram = [a + b for a, b in zip(json.loads(row[0]), histogram)]
+                conn.execute(f'''
+                    INSERT INTO ai_usage_daily ({", ".join(GROUP_COLUMNS)}, calls, provider_requests,
+                        prompt_tokens, completion_tokens, truncated, latency_ms_sum, latency_ms_max,
+                        latency_histogram, updated_at)
+                    VALUES ({", ".join("?" * len(GROUP_COLUMNS))}, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT({", ".join(GROUP_COLUMNS)}) DO UPDATE SET
+                        calls = calls + excluded.calls,
+                        provider_requests = provider_requests + excluded.provider_requests,
+                        prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                        completion_tokens = completion_tokens + excluded.completion_tokens,
+                        truncated = truncated + excluded.truncated,
+                        latency_ms_sum = latency_ms_sum + excluded.latency_ms_sum,
+                        latency_ms_max = MAX(latency_ms_max, excluded.latency_ms_max),
+                        latency_histogram = excluded.latency_histogram,
+                        updated_at = excluded.updated_at
+                ''', (*key, bucket["calls"], bucket["provider_requests"], bucket["prompt_tokens"], bucket["completion_tokens"],
+                      bucket["truncated"], bucket["latency_ms_sum"], bucket["latency_ms_max"],
+                      json.dumps(histogram), now))
+            conn.commit()
+
+    def _restore(self, pending: Dict[tuple, Dict[str, Any]]):
+        """Put unwritten aggregates back for the next flush"""
+        for key, bucket in pending.items():
+            current = self._pending.setdefault(key, _new_bucket())
+            for field in SUMMED_FIELDS:
+                current[field] += bucket[field]
+            current["latency_ms_max"] = max(current["latency_ms_max"], bucket["latency_ms_max"])
+            current["histogram"] = [a + b for a, b in zip(current["histogram"], bucket["histogram"])]
+
+    async def flush(self) -> int:
+        """Fold the in-memory aggregates into ai_usage_daily; returns the rows touched"""
+        # Swapped on the event loop, where record() runs, so no call is lost
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            await asyncio.to_thread(self._write, pending)
+        except Exception:
+            self._restore(pending)
+            raise
+        return len(pending)
+
+    def report(self, days: int = 7, group_by: Tuple[str, ...] = ("day", "endpoint"),
+               user_id: Optional[int] = None) -> List[dict]:
+        """Rollup rows for the last ``days`` days, regrouped by the given columns"""
+        group_by = tuple(column for column in group_by if column in GROUP_COLUMNS) or ("day",)
+        since = (datetime.utcnow() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        query = "SELECT * FROM ai_usage_daily WHERE day >= ?"
+        params: list = [since]
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        with get_db_connection() as conn:
+            rows = [dict_from_row(row) for row in conn.execute(query, params).fetchall()]
+
+        groups: Dict[tuple, Dict[str, Any]] = {}
+        for row in rows:
+            key = tuple(row[column] for column in group_by)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {**dict(zip(group_by, key)), **_new_bucket(),
+                                       "fallbacks": {}, "cache_hits": 0}
+            for field in SUMMED_FIELDS:
+                group[field] += row[field]
+            group["latency_ms_max"] = max(group["latency_ms_max"], row["latency_ms_max"])
+            if row["latency_histogram"]:
+                group["histogram"] = [a + b for a, b in zip(group["histogram"], json.loads(row["latency_histogram"]))]
+            if row["outcome"] == "cache":
+                group["cache_hits"] += row["calls"]
+            elif row["outcome"] == "fallback":
+                reason = row["fallback_reason"] or "unknown"
+                group["fallbacks"][reason] = group["fallbacks"].get(reason, 0) + row["calls"]
+
+        report = []
+        for group in groups.values():
+            calls, requests = group["calls"], group["provider_requests"]
+            histogram = group.pop("histogram")
+            # Bucket interpolation can overshoot small samples; never report above the observed max
+            p50, p95 = (histogram_quantile(histogram, q) for q in (0.5, 0.95))
+            report.append({
+                **group,
+                "latency_ms_sum": round(group["latency_ms_sum"], 1),
+                "latency_ms_max": round(group["latency_ms_max"], 1),
+                "latency_ms_avg": round(group["latency_ms_sum"] / calls, 1) if calls else None,
+                "latency_ms_p50": min(p50, round(group["latency_ms_max"], 1)) if p50 is not None else None,
+                "latency_ms_p95": min(p95, round(group["latency_ms_max"], 1)) if p95 is not None else None,
+                "avg_prompt_tokens": round(group["prompt_tokens"] / requests, 1) if requests else None,
+                "avg_completion_tokens": round(group["completion_tokens"] / requests, 1) if requests else None,
+                "fallback_rate": round(sum(group["fallbacks"].values()) / calls, 4) if calls else 0.0,
+            })
+        report.sort(key=lambda r: tuple(str(r[column]) for column in group_by))
+        return report
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"AI usage rollup flush failed: {e}")
+
+    def start(self):
+        """Start the rollup flusher (call from app lifespan)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"AI usage rollup flush failed: {e}")
+
+
+# Singleton instance
+ai_usage = AIUsageTracker()
@@ -0,0 +1,296 @@
+"""
+API Key Service
+===============
+Scoped API keys for machine clients (indexers, partner integrations).
+
+Keys look like ``cfk_<prefix>_<secret>``. Only an HMAC of the secret is
+stored. Verification is a dictionary lookup on the prefix plus one HMAC
+against an in-memory copy of the key table, so authenticated machine
+requests touch neither bcrypt nor the users table.
+
+- The in-memory table reloads when another worker creates or revokes a key
+  (checked at most every RELOAD_INTERVAL seconds)
+- Each key carries a rate-limit tier and a set of scopes (API_KEY_SCOPES)
+- Usage counters are aggregated in memory and flushed to SQLite periodically
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Literal, Optional, get_args
+
+from app.database import get_db_connection, dict_from_row
+from app.services.key_ring import key_ring
+from app.services.shared_state import shared_state
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "cfk_"
+PREFIX_LENGTH = 12
+
+# Requests per minute per key (None = unlimited)
+RATE_LIMIT_TIERS: Dict[str, Optional[int]] = {
+    "free": 60,
+    "standard": 600,
+    "partner": 6000,
+    "internal": None,
+}
+
+# What a key can be used for:
+#   read - public catalogue reads (projects, users, gigs, bounties, transactions, stats), metered per key
+#   ai   - AI proof checks, sustainability analysis and AI jobs on behalf of the key's owner
+ApiKeyScope = Literal["read", "ai"]
+API_KEY_SCOPES = get_args(ApiKeyScope)
+
+RELOAD_INTERVAL = 5.0  # seconds between checks for keys changed by other workers
+FLUSH_INTERVAL = 30.0  # seconds between usage counter flushes
+VERSION_KEY = "api_keys:version"
+
+
+class ApiKeyError(Exception):
+    """Raised when an API key is missing, invalid or revoked"""
+
+
+class ApiKeyRateLimited(Exception):
+    """Raised when a key exceeds its tier's rate limit"""
+
+
+@dataclass(frozen=True)
+class ApiKeyRecord:
+    prefix: str
+    secret_hmac: str
+    user_id: int
+    name: str
+    scopes: tuple
+    tier: str
+    roles: tuple
+
+    def has_scope(self, scope: str) -> bool:
+        return "*" in self.scopes or scope in self.scopes
+
+    def principal(self) -> dict:
+        return {
+            "type": "api_key",
+            "key_id": self.prefix,
+            "user_id": self.user_id,
+            "name": self.name,
+            "scopes": list(self.scopes),
+            "tier": self.tier,
+            "roles": list(self.roles),
+        }
+
+
+class ApiKeyService:
+    """Issue, verify and meter API keys"""
+
+    def __init__(self):
+        self._table: Dict[str, ApiKeyRecord] = {}
+        self._loaded = False
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._usage_lock = threading.Lock()  # verify() runs on the loop, flush_usage() in a thread
+        self._usage: Dict[str, int] = {}
+        self._last_used: Dict[str, str] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    # ------------------------------------------------------------------
+    # Key table
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _hmac(secret: str) -> str:
+        return hmac.new(key_ring.named_secret("api_keys"), secret.encode(), hashlib.sha256).hexdigest()
+
+    def _reload(self):
+        with get_db_connection() as conn:
+            rows = conn.execute(
+                "SELECT prefix, secret_hmac, user_id, name, scopes, tier, roles FROM api_keys WHERE revoked = 0"
+            ).fetchall()
+
+        self._table = {
+            row["prefix"]: ApiKeyRecord(
+                prefix=row["prefix"],
+                secret_hmac=row["secret_hmac"],
+                user_id=row["user_id"],
+                name=row["name"],
+                scopes=tuple(json.loads(row["scopes"] or "[]")),
+                tier=row["tier"],
+                roles=tuple(json.loads(row["roles"] or "[]")),
+            )
+            for row in rows
+        }
+        self._loaded = True
+        logger.info(f"Loaded {len(self._table)} active API keys")
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._loaded and now - self._checked_at < RELOAD_INTERVAL:
+            return
+        with self._lock:
+            self._checked_at = now
+            version = shared_state.get(VERSION_KEY, 0)
+            if not self._loaded or version != self._version:
+                self._reload()
+                self._version = version
+
+    def _bump_version(self):
+        shared_state.incr(VERSION_KEY)
+        self._checked_at = 0.0  # force this worker to reload on next verify
+
+    # ------------------------------------------------------------------
+    # Management
+    # ------------------------------------------------------------------
+
+    def create_key(self, user_id: int, name: str, scopes: List[str],
+                   tier: str = "standard", roles: List[str] = None) -> dict:
+        """Create a key. The plaintext key is only returned here."""
+        if tier not in RATE_LIMIT_TIERS:
+            raise ValueError(f"Tier must be one of: {list(RATE_LIMIT_TIERS)}")
+        unknown = set(scopes) - set(API_KEY_SCOPES)
+        if unknown:
+            raise ValueError(f"Unknown scopes {sorted(unknown)}; must be among: {list(API_KEY_SCOPES)}")
+
+        prefix = secrets.token_hex(PREFIX_LENGTH // 2)
+        secret = secrets.token_urlsafe(32)
+        now = datetime.utcnow().isoformat()
+
+        with get_db_connection() as conn:
+            conn.execute('''
+                INSERT INTO api_keys (prefix, secret_hmac, user_id, name, scopes, tier, roles, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (prefix, self._hmac(secret), user_id, name, json.dumps(scopes),
+                  tier, json.dumps(roles or []), now))
+            conn.commit()
+
+        self._bump_version()
+        return {
+            "key_id": prefix,
+            "api_key": f"{KEY_PREFIX}{prefix}_{secret}",
+            "name": name,
+            "scopes": scopes,
+            "tier": tier,
+            "created_at": now,
+        }
+
+    def revoke_key(self, prefix: str, user_id: Optional[int] = None) -> bool:
+        """Revoke a key (restricted to its owner when user_id is given)"""
+        query = "UPDATE api_keys SET revoked = 1 WHERE prefix = ? AND revoked = 0"
+        params = [prefix]
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(user_id)
+
+        with get_db_connection() as conn:
+            cursor = conn.execute(query, params)
+            conn.commit()
+            revoked = cursor.rowcount > 0
+
+        if revoked:
+            self._bump_version()
+        return revoked
+
+    def list_keys(self, user_id: int) -> List[dict]:
+        """List a user's keys with usage (pending counts included)"""
+        with get_db_connection() as conn:
+            rows = conn.execute('''
+                SELECT prefix AS key_id, name, scopes, tier, revoked, usage_count, last_used_at, created_at
+                FROM api_keys WHERE user_id = ? ORDER BY created_at DESC
+            ''', (user_id,)).fetchall()
+
+        with self._usage_lock:
+            usage, last_used = dict(self._usage), dict(self._last_used)
+
+        keys = []
+        for row in rows:
+            key = dict_from_row(row)
+            key["scopes"] = json.loads(key["scopes"] or "[]")
+            key["revoked"] = bool(key["revoked"])
+            key["usage_count"] += usage.get(key["key_id"], 0)
+            key["last_used_at"] = last_used.get(key["key_id"], key["last_used_at"])
+            keys.append(key)
+        return keys
+
+    # ------------------------------------------------------------------
+    # Verification (hot path - no database access)
+    # ------------------------------------------------------------------
+
+    def verify(self, api_key: str, scope: Optional[str] = None) -> ApiKeyRecord:
+        """Verify a presented key, enforce scope and tier, and count usage"""
+        if not api_key or not api_key.startswith(KEY_PREFIX):
+            raise ApiKeyError("Invalid API key")
+
+        prefix = api_key[len(KEY_PREFIX):len(KEY_PREFIX) + PREFIX_LENGTH]
+        secret = api_key[len(KEY_PREFIX) + PREFIX_LENGTH + 1:]
+
+        self._ensure_fresh()
+        record = self._table.get(prefix)
+        if record is None or not hmac.compare_digest(record.secret_hmac, self._hmac(secret)):
+            raise ApiKeyError("Invalid API key")
+
+        if scope and not record.has_scope(scope):
+            raise ApiKeyError(f"API key lacks scope '{scope}'")
+
+        limit = RATE_LIMIT_TIERS.get(record.tier)
+        if limit is not None and shared_state.hit(f"apikey:{prefix}", 60) > limit:
+            raise ApiKeyRateLimited(f"Maximum {limit} requests per minute for tier '{record.tier}'")
+
+        with self._usage_lock:
+            self._usage[prefix] = self._usage.get(prefix, 0) + 1
+            self._last_used[prefix] = datetime.utcnow().isoformat()
+        return record
+
+    # ------------------------------------------------------------------
+    # Usage flushing
+    # ------------------------------------------------------------------
+
+    def flush_usage(self):
+        """Write aggregated usage counters to SQLite"""
+        with self._usage_lock:
+            if not self._usage:
+                return
+            usage, self._usage = self._usage, {}
+            last_used, self._last_used = self._last_used, {}
+
+        try:
+            with get_db_connection() as conn:
+                conn.executemany(
+                    "UPDATE api_keys SET usage_count = usage_count + ?, last_used_at = ? WHERE prefix = ?",
+                    [(count, last_used.get(prefix), prefix) for prefix, count in usage.items()]
+                )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to flush API key usage: {e}")
+            with self._usage_lock:
+                for prefix, count in usage.items():
+                    self._usage[prefix] = self._usage.get(prefix, 0) + count
+                for prefix, ts in last_used.items():
+                    self._last_used.setdefault(prefix, ts)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            await asyncio.to_thread(self.flush_usage)
+
+    def start(self):
+        """Start the periodic usage flusher (call from app lifespan)"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the flusher and persist pending counters"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await asyncio.to_thread(self.flush_usage)
+
+
+# Singleton instance
+api_key_service = ApiKeyService()
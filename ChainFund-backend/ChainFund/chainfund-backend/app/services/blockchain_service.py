@@ -6,6 +6,7 @@ Handles all Stellar blockchain operations
 import os
 import asyncio
 from typing import Optional, Dict, Any, List
+from app.services.account_cache import account_cache, native_balance
 from app.services.soroban_service import stellar_service, validate_wallet_address, normalize_wallet_address
 
 # Global service instance
@@ -18,16 +19,21 @@ async def deploy_campaign_contract(creator_address: str, goal_amount: int, miles
 
 async def get_account_balance(address: str) -> int:
     """Get account balance from Stellar"""
-    account_info = await stellar_service.get_account_info(address)
-    if account_info:
-        for balance in account_info.get("balances", []):
-            if balance.get("asset_type") == "native":
-                return int(float(balance["balance"]))
-    return 0
+    try:
+        return int(float(native_balance(await account_cache.summary(address))))
+    except Exception:
+        return 0
+
+async def get_account_balances(addresses: List[str]) -> Dict[str, int]:
+    """Get account balances for many addresses in batched lookups"""
+    return await stellar_service.get_account_balances(addresses)
 
 async def get_transaction_count(address: str) -> int:
     """Get transaction count (sequence number)"""
-    account_info = await stellar_service.get_account_info(address)
+    try:
+        account_info = await account_cache.summary(address)
+    except Exception:
+        return 0
     return int(account_info.get("sequence", 0)) if account_info else 0
 
 async def send_transaction(from_address: str, to_address: str, amount: int) -> Optional[str]:
@@ -65,6 +71,7 @@ __all__ = [
     'blockchain_service',
     'deploy_campaign_contract',
     'get_account_balance',
+    'get_account_balances',
     'get_transaction_count',
     'send_transaction',
     'get_contract_balance',
@@ -0,0 +1,771 @@
+"""
+Chain Indexer
+=============
+Materializes ChainFund core and SBT contract state into SQLite from the
+contracts' events, so reads and range queries ("milestones with open
+votes", "campaigns by creator") never touch the chain.
+
+The follower pages through ``getEvents`` for both contracts from a
+checkpoint in ``chain_index_cursor``. Each page is applied in one
+transaction together with the new checkpoint, and every event is recorded
+in ``chain_events`` by its RPC id, so replays (a crash between page and
+checkpoint, an overlapping backfill) are no-ops. Counters (funds, votes)
+only change when an event is new; statuses are only moved forward by an
+event later than the one that last set them, so ranges applied out of
+order cannot regress them.
+
+Historical backfill splits a ledger range into chunks fetched in parallel
+and applies them in ledger order; the API runs it as a background job
+(``start_backfill``) whose progress can be polled. Events carry ids and amounts but not
+titles or milestone lists: campaigns are hydrated with one ``get_campaign``
+read when first seen. ``replay`` applies a recorded event list (see
+scripts/chain_index.py) without network access.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import math
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.database import get_db_connection, dict_from_row
+from app.services.contract_spec import decode, encode_args, load_deployed_addresses
+from app.services.soroban_rpc import SorobanRPCError, soroban_rpc
+from app.utils.metrics import metrics
+
+try:
+    from stellar_sdk import xdr as stellar_xdr
+except ImportError:
+    stellar_xdr = None
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF_SECONDS = 60
+HYDRATE_PER_CYCLE = 10
+HYDRATE_AFTER_BACKFILL = 1000
+BACKFILL_JOBS_KEPT = 20  # finished background backfills whose progress stays readable
+
+# Contract enums (repr u32), see rust-contracts/chainfund_core and chainfund_sbt
+CAMPAIGN_ACTIVE, CAMPAIGN_FUNDED, CAMPAIGN_COMPLETED, CAMPAIGN_FAILED = 1, 2, 3, 4
+MILESTONE_PENDING, MILESTONE_IN_PROGRESS, MILESTONE_PROOF_SUBMITTED = 0, 1, 2
+MILESTONE_VOTING_OPEN, MILESTONE_APPROVED, MILESTONE_RELEASED = 4, 5, 6
+MILESTONE_DISPUTED, MILESTONE_REJECTED = 7, 8
+VERDICT_COMPLETED, VERDICT_PARTIAL, VERDICT_SUSPICIOUS = 2, 3, 4
+SBT_REPUTATION = {0: 100, 1: 10, 2: 50, 3: 30, 4: 25, 5: 20, 6: 40, 7: 15, 8: 75, 9: 60}
+
+metrics.describe("chain_indexer_events_total", "counter", "Contract events seen by the indexer by kind and outcome")
+
+
+def decode_event(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """RPC event (topic/value as SCVal XDR) -> {id, contract_id, ledger, tx_hash, topic, value}"""
+    return {
+        "id": raw["id"],
+        "contract_id": raw["contractId"],
+        "ledger": int(raw["ledger"]),
+        "tx_hash": raw.get("txHash"),
+        "topic": [decode(stellar_xdr.SCVal.from_xdr(t)) for t in raw.get("topic", [])],
+        "value": decode(stellar_xdr.SCVal.from_xdr(raw["value"])) if raw.get("value") else None,
+        "successful": raw.get("inSuccessfulContractCall", True),
+    }
+
+
+def _int(value: Any) -> int:
+    return int(value) if value is not None else 0
+
+
+class ChainIndexer:
+    """Event follower, backfill and query layer over the chain_* tables"""
+
+    def __init__(self, client=soroban_rpc,
+                 poll_interval: float = settings.chain_indexer_poll_interval,
+                 page_size: int = settings.chain_indexer_page_size):
+        self.client = client
+        self.poll_interval = poll_interval
+        self.page_size = page_size
+        self.core_contract_id: Optional[str] = None
+        self.sbt_contract_id: Optional[str] = None
+        self.admin_address: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._latest_ledger: Optional[int] = None
+        self._last_error: Optional[str] = None
+        self._applied = 0
+        self._backfills: Dict[int, Dict[str, Any]] = {}  # job id -> progress, newest last
+        self._backfill_ids = itertools.count(1)
+        self._backfill_task: Optional[asyncio.Task] = None
+
+    def configure(self, core_contract_id: Optional[str] = None, sbt_contract_id: Optional[str] = None,
+                  admin_address: Optional[str] = None):
+        """Contracts to follow; defaults to rust-contracts/deployed_addresses.json"""
+        if not (core_contract_id or sbt_contract_id):
+            data = load_deployed_addresses() or {}
+            core_contract_id = data.get("contracts", {}).get("chainfund_core")
+            sbt_contract_id = data.get("contracts", {}).get("chainfund_sbt")
+            admin_address = admin_address or data.get("admin")
+        self.core_contract_id = core_contract_id
+        self.sbt_contract_id = sbt_contract_id
+        self.admin_address = admin_address
+
+    @property
+    def contract_ids(self) -> List[str]:
+        return [c for c in (self.core_contract_id, self.sbt_contract_id) if c]
+
+    @property
+    def stream(self) -> str:
+        return ",".join(self.contract_ids)
+
+    # ------------------------------------------------------------------
+    # Applying events
+    # ------------------------------------------------------------------
+
+    def _set_campaign_status(self, conn, campaign_id: int, status: int, event: dict):
+        conn.execute('''
+            UPDATE chain_campaigns SET status = ?, status_event = ?, updated_ledger = MAX(updated_ledger, ?)
+            WHERE campaign_id = ? AND (status_event IS NULL OR status_event < ?)
+        ''', (status, event["id"], event["ledger"], campaign_id, event["id"]))
+
+    def _ensure_campaign(self, conn, campaign_id: int, event: dict):
+        """Placeholder for a campaign created before indexing started; hydration fills it in"""
+        conn.execute('''
+            INSERT OR IGNORE INTO chain_campaigns (campaign_id, contract_id, creator, total_goal, created_ledger,
+                                                   updated_ledger)
+            VALUES (?, ?, '', 0, ?, ?)
+        ''', (campaign_id, event["contract_id"], event["ledger"], event["ledger"]))
+
+    def _ensure_milestone(self, conn, campaign_id: int, milestone_id: int, event: dict):
+        conn.execute('''
+            INSERT OR IGNORE INTO chain_milestones (campaign_id, milestone_id, updated_ledger) VALUES (?, ?, ?)
+        ''', (campaign_id, milestone_id, event["ledger"]))
+
+    def _set_milestone(self, conn, campaign_id: int, milestone_id: int, event: dict,
+                       status: Optional[int] = None, **fields):
+        self._ensure_milestone(conn, campaign_id, milestone_id, event)
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        if assignments:
+            conn.execute(
+                f"UPDATE chain_milestones SET {assignments}, updated_ledger = MAX(updated_ledger, ?) "
+                "WHERE campaign_id = ? AND milestone_id = ?",
+                (*fields.values(), event["ledger"], campaign_id, milestone_id)
+            )
+        if status is not None:
+            conn.execute('''
+                UPDATE chain_milestones SET status = ?, status_event = ?, updated_ledger = MAX(updated_ledger, ?)
+                WHERE campaign_id = ? AND milestone_id = ? AND (status_event IS NULL OR status_event < ?)
+            ''', (status, event["id"], event["ledger"], campaign_id, milestone_id, event["id"]))
+
+    def _apply_core(self, conn, event: dict) -> str:
+        topic, value = event["topic"], event["value"]
+        name = topic[0] if topic else None
+        ledger = event["ledger"]
+
+        if topic == ["campaign", "created"]:
+            campaign_id, creator, total_goal = value
+            conn.execute('''
+                INSERT INTO chain_campaigns (campaign_id, contract_id, creator, total_goal, status, created_ledger,
+                                             updated_ledger)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(campaign_id) DO UPDATE SET creator = excluded.creator,
+                    total_goal = excluded.total_goal, created_ledger = excluded.created_ledger
+            ''', (campaign_id, event["contract_id"], creator, _int(total_goal), CAMPAIGN_ACTIVE, ledger, ledger))
+            self._set_milestone(conn, campaign_id, 0, event, status=MILESTONE_IN_PROGRESS)
+            return "campaign_created"
+
+        if topic == ["campaign", "closed"]:
+            campaign_id, closed_at = value
+            self._ensure_campaign(conn, campaign_id, event)
+            conn.execute("UPDATE chain_campaigns SET closed_at = ? WHERE campaign_id = ?", (closed_at, campaign_id))
+            self._set_campaign_status(conn, campaign_id, CAMPAIGN_COMPLETED, event)
+            return "campaign_closed"
+
+        campaign_id = topic[1] if len(topic) > 1 and isinstance(topic[1], int) else None
+        if name == "funded" and campaign_id is not None:
+            backer, amount, funds_raised = value[0], _int(value[1]), _int(value[2])
+            self._ensure_campaign(conn, campaign_id, event)
+            new_backer = conn.execute(
+                "SELECT 1 FROM chain_backers WHERE campaign_id = ? AND backer = ?", (campaign_id, backer)
+            ).fetchone() is None
+            conn.execute('''
+                INSERT INTO chain_backers (campaign_id, backer, amount, funded_ledger, updated_ledger)
+                VALUES (?, ?, 0, ?, ?)
+                ON CONFLICT(campaign_id, backer) DO NOTHING
+            ''', (campaign_id, backer, ledger, ledger))
+            total = conn.execute(
+                "SELECT amount FROM chain_backers WHERE campaign_id = ? AND backer = ?", (campaign_id, backer)
+            ).fetchone()[0] + amount
+            conn.execute('''
+                UPDATE chain_backers SET amount = ?, voting_power = ?, updated_ledger = ?
+                WHERE campaign_id = ? AND backer = ?
+            ''', (total, math.isqrt(max(total, 0)), ledger, campaign_id, backer))
+            conn.execute('''
+                UPDATE chain_campaigns SET funds_raised = MAX(funds_raised, ?), funds_locked = funds_locked + ?,
+                    backer_count = backer_count + ?, updated_ledger = MAX(updated_ledger, ?)
+                WHERE campaign_id = ?
+            ''', (funds_raised, amount, int(new_backer), ledger, campaign_id))
+            goal = conn.execute(
+                "SELECT total_goal FROM chain_campaigns WHERE campaign_id = ?", (campaign_id,)
+            ).fetchone()[0]
+            if goal and funds_raised >= goal:
+                self._set_campaign_status(conn, campaign_id, CAMPAIGN_FUNDED, event)
+            return "funded"
+
+        if name == "proof" and campaign_id is not None:
+            milestone_id, ipfs_hash = value
+            self._ensure_campaign(conn, campaign_id, event)
+            self._set_milestone(conn, campaign_id, milestone_id, event, status=MILESTONE_PROOF_SUBMITTED,
+                                ipfs_proof=ipfs_hash)
+            return "proof"
+
+        if name == "ai_vote" and campaign_id is not None:
+            milestone_id, verdict, confidence = value
+            self._ensure_campaign(conn, campaign_id, event)
+            status = {VERDICT_COMPLETED: MILESTONE_VOTING_OPEN, VERDICT_PARTIAL: MILESTONE_VOTING_OPEN,
+                      VERDICT_SUSPICIOUS: MILESTONE_DISPUTED}.get(verdict, MILESTONE_REJECTED)
+            self._set_milestone(conn, campaign_id, milestone_id, event, status=status,
+                                ai_verdict=verdict, ai_confidence=confidence)
+            return "ai_verdict"
+
+        if name == "voted" and campaign_id is not None:
+            milestone_id, voter, approve, power = value[0], value[1], bool(value[2]), _int(value[3])
+            self._ensure_campaign(conn, campaign_id, event)
+            self._ensure_milestone(conn, campaign_id, milestone_id, event)
+            inserted = conn.execute('''
+                INSERT OR IGNORE INTO chain_votes (campaign_id, milestone_id, voter, approve, voting_power, ledger)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (campaign_id, milestone_id, voter, int(approve), power, ledger)).rowcount
+            if inserted:
+                column = "votes_for" if approve else "votes_against"
+                conn.execute(f'''
+                    UPDATE chain_milestones SET {column} = {column} + ?, voter_count = voter_count + 1,
+                        updated_ledger = MAX(updated_ledger, ?)
+                    WHERE campaign_id = ? AND milestone_id = ?
+                ''', (power, ledger, campaign_id, milestone_id))
+                conn.execute(
+                    "UPDATE chain_backers SET votes_cast = votes_cast + 1 WHERE campaign_id = ? AND backer = ?",
+                    (campaign_id, voter)
+                )
+            votes_for, votes_against = conn.execute(
+                "SELECT votes_for, votes_against FROM chain_milestones WHERE campaign_id = ? AND milestone_id = ?",
+                (campaign_id, milestone_id)
+            ).fetchone()
+            # The contract auto-approves on a two-thirds majority
+            if votes_for > votes_against * 2:
+                self._set_milestone(conn, campaign_id, milestone_id, event, status=MILESTONE_APPROVED)
+            return "voted"
+
+        if name == "released" and campaign_id is not None:
+            milestone_id, creator_amount, fee = value[0], _int(value[1]), _int(value[2])
+            self._ensure_campaign(conn, campaign_id, event)
+            self._set_milestone(conn, campaign_id, milestone_id, event, status=MILESTONE_RELEASED,
+                                released_amount=creator_amount, fee=fee)
+            conn.execute('''
+                UPDATE chain_campaigns SET funds_released = funds_released + ?,
+                    funds_locked = MAX(funds_locked - ?, 0), updated_ledger = MAX(updated_ledger, ?)
+                WHERE campaign_id = ?
+            ''', (creator_amount + fee, creator_amount + fee, ledger, campaign_id))
+            count = conn.execute(
+                "SELECT milestone_count FROM chain_campaigns WHERE campaign_id = ?", (campaign_id,)
+            ).fetchone()[0]
+            if count is not None and milestone_id + 1 < count:
+                self._set_milestone(conn, campaign_id, milestone_id + 1, event, status=MILESTONE_IN_PROGRESS)
+                conn.execute(
+                    "UPDATE chain_campaigns SET current_milestone = MAX(current_milestone, ?) WHERE campaign_id = ?",
+                    (milestone_id + 1, campaign_id)
+                )
+            return "released"
+
+        if name == "refund" and campaign_id is not None:
+            self._ensure_campaign(conn, campaign_id, event)
+            conn.execute("UPDATE chain_campaigns SET funds_locked = 0 WHERE campaign_id = ?", (campaign_id,))
+            self._set_campaign_status(conn, campaign_id, CAMPAIGN_FAILED, event)
+            return "refund"
+
+        # init, sbt award (minted by the SBT contract), config changes: recorded in chain_events only
+        return "other"
+
+    def _apply_sbt(self, conn, event: dict) -> str:
+        topic, value = event["topic"], event["value"]
+        name = topic[0] if topic else None
+        if name == "mint" and len(topic) > 1:
+            token_id, role, campaign_id = value
+            conn.execute('''
+                INSERT OR IGNORE INTO chain_sbts (token_id, owner, role, campaign_id, minted_ledger)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (token_id, topic[1], role, campaign_id, event["ledger"]))
+            return "sbt_minted"
+        if name == "revoke" and len(topic) > 1:
+            conn.execute('''
+                UPDATE chain_sbts SET is_active = 0, revoked_ledger = ? WHERE token_id = ?
+            ''', (event["ledger"], topic[1]))
+            return "sbt_revoked"
+        return "other"
+
+    def _apply(self, conn, event: dict) -> Optional[str]:
+        """Apply one decoded event; None when it was already applied or is not state-changing"""
+        if not event["successful"]:
+            return None
+        inserted = conn.execute('''
+            INSERT OR IGNORE INTO chain_events (event_id, contract_id, ledger, tx_hash, topic, value, applied_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (event["id"], event["contract_id"], event["ledger"], event["tx_hash"], json.dumps(event["topic"]),
+              json.dumps(event["value"]), datetime.utcnow().isoformat())).rowcount
+        if not inserted:
+            return None
+        if event["contract_id"] == self.sbt_contract_id:
+            return self._apply_sbt(conn, event)
+        return self._apply_core(conn, event)
+
+    def _apply_batch(self, events: List[dict], checkpoint: Optional[Tuple[int, Optional[str]]] = None) -> int:
+        applied = 0
+        kinds: Dict[str, int] = {}
+        with get_db_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for event in events:
+                    try:
+                        kind = self._apply(conn, event)
+                    except (ValueError, TypeError, IndexError) as e:
+                        # Malformed payload (e.g. a contract upgrade changed it): keep the record, skip the state
+                        logger.error(f"⛓️ Could not apply event {event['id']} {event['topic']}: {e}")
+                        kind = "malformed"
+                    if kind:
+                        applied += 1
+                        kinds[kind] = kinds.get(kind, 0) + 1
+                if checkpoint is not None:
+                    conn.execute('''
+                        INSERT INTO chain_index_cursor (stream, ledger, cursor, updated_at) VALUES (?, ?, ?, ?)
+                        ON CONFLICT(stream) DO UPDATE SET ledger = excluded.ledger, cursor = excluded.cursor,
+                            updated_at = excluded.updated_at
+                    ''', (self.stream, checkpoint[0], checkpoint[1], datetime.utcnow().isoformat()))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        for kind, count in kinds.items():
+            metrics.inc("chain_indexer_events_total", count, kind=kind, outcome="applied")
+        if len(events) > applied:
+            metrics.inc("chain_indexer_events_total", len(events) - applied, kind="any", outcome="skipped")
+        self._applied += applied
+        return applied
+
+    async def apply_events(self, raw_events: List[Dict[str, Any]],
+                           checkpoint: Optional[Tuple[int, Optional[str]]] = None) -> int:
+        """Decode and apply RPC events in order (idempotent); returns how many changed state"""
+        events = [decode_event(raw) for raw in raw_events if raw.get("type", "contract") == "contract"]
+        return await asyncio.to_thread(self._apply_batch, events, checkpoint)
+
+    async def replay(self, raw_events: List[Dict[str, Any]]) -> int:
+        """Apply a recorded event list (e.g. a fixture), sorted by event id, without a checkpoint"""
+        return await self.apply_events(sorted(raw_events, key=lambda e: e["id"]))
+
+    # ------------------------------------------------------------------
+    # Following
+    # ------------------------------------------------------------------
+
+    def _checkpoint(self) -> Optional[dict]:
+        with get_db_connection() as conn:
+            return dict_from_row(conn.execute(
+                "SELECT ledger, cursor FROM chain_index_cursor WHERE stream = ?", (self.stream,)
+            ).fetchone())
+
+    async def poll_once(self) -> int:
+        """Apply every event after the checkpoint; returns how many changed state"""
+        if not self.contract_ids:
+            return 0
+        checkpoint = await asyncio.to_thread(self._checkpoint)
+        if checkpoint is None:
+            start = settings.chain_indexer_start_ledger or (await self.client.get_latest_ledger()).sequence
+            checkpoint = {"ledger": start, "cursor": None}
+        ledger, cursor, applied = checkpoint["ledger"], checkpoint["cursor"], 0
+        while True:
+            page = await self.client.get_events(self.contract_ids, start_ledger=ledger, cursor=cursor,
+                                                limit=self.page_size)
+            events = page.get("events") or []
+            self._latest_ledger = page.get("latestLedger", self._latest_ledger)
+            if events:
+                ledger, cursor = events[-1]["ledger"], page.get("cursor") or events[-1]["id"]
+            elif page.get("cursor"):
+                cursor = page["cursor"]
+            applied += await self.apply_events(events, checkpoint=(ledger, cursor))
+            if len(events) < self.page_size:
+                return applied
+
+    async def _hydrate_one(self, campaign_id: int) -> bool:
+        result = await self.client.invoke(
+            self.core_contract_id, "get_campaign", encode_args("get_campaign", ["--campaign_id", str(campaign_id)]),
+            source=self.admin_address, view=True
+        )
+        if not result["success"] or not isinstance(result.get("data"), dict):
+            return False
+        await asyncio.to_thread(self._store_details, campaign_id, result["data"])
+        return True
+
+    def _store_details(self, campaign_id: int, campaign: dict):
+        """Static campaign fields from get_campaign; balances and statuses stay event-sourced"""
+        milestones = campaign.get("milestones") or []
+        with get_db_connection() as conn:
+            conn.execute('''
+                UPDATE chain_campaigns SET title = ?, description = ?, milestone_count = ?,
+                    creator = CASE WHEN creator = '' THEN ? ELSE creator END,
+                    total_goal = CASE WHEN total_goal = 0 THEN ? ELSE total_goal END
+                WHERE campaign_id = ?
+            ''', (campaign.get("title"), campaign.get("description"), len(milestones), campaign.get("creator", ""),
+                  _int(campaign.get("total_goal")), campaign_id))
+            for index, milestone in enumerate(milestones):
+                milestone_id = milestone.get("id", index)
+                conn.execute('''
+                    INSERT INTO chain_milestones (campaign_id, milestone_id, title, description, amount,
+                                                  updated_ledger)
+                    VALUES (?, ?, ?, ?, ?, 0)
+                    ON CONFLICT(campaign_id, milestone_id) DO UPDATE SET title = excluded.title,
+                        description = excluded.description, amount = excluded.amount
+                ''', (campaign_id, milestone_id, milestone.get("title"), milestone.get("description"),
+                      _int(milestone.get("amount"))))
+            # Releases applied before the milestone count was known could not advance the campaign
+            released = conn.execute('''
+                SELECT MAX(milestone_id) FROM chain_milestones WHERE campaign_id = ? AND status = ?
+            ''', (campaign_id, MILESTONE_RELEASED)).fetchone()[0]
+            if released is not None and released + 1 < len(milestones):
+                conn.execute('''
+                    UPDATE chain_milestones SET status = ? WHERE campaign_id = ? AND milestone_id = ?
+                    AND status = ? AND status_event IS NULL
+                ''', (MILESTONE_IN_PROGRESS, campaign_id, released + 1, MILESTONE_PENDING))
+                conn.execute(
+                    "UPDATE chain_campaigns SET current_milestone = MAX(current_milestone, ?) WHERE campaign_id = ?",
+                    (released + 1, campaign_id)
+                )
+            conn.commit()
+
+    def _unhydrated(self, limit: int) -> List[int]:
+        with get_db_connection() as conn:
+            rows = conn.execute(
+                "SELECT campaign_id FROM chain_campaigns WHERE milestone_count IS NULL ORDER BY campaign_id LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    async def hydrate(self, limit: int = HYDRATE_PER_CYCLE) -> int:
+        """Fetch titles and milestone lists for campaigns first seen through events"""
+        if not self.core_contract_id:
+            return 0
+        hydrated = 0
+        for campaign_id in await asyncio.to_thread(self._unhydrated, limit):
+            hydrated += await self._hydrate_one(campaign_id)
+        return hydrated
+
+    async def _run(self):
+        backoff = self.poll_interval
+        while True:
+            try:
+                await self.poll_once()
+                await self.hydrate()
+                self._last_error, backoff = None, self.poll_interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._last_error = str(e)
+                backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+                logger.warning(f"⛓️ Chain indexer poll failed (retrying in {backoff:g}s): {e}")
+            await asyncio.sleep(backoff)
+
+    def start(self):
+        """Start following events (call from app lifespan)"""
+        if self._task is None:
+            if not self.contract_ids:
+                self.configure()
+            if not self.contract_ids:
+                logger.warning("⛓️ Chain indexer enabled but no contracts are deployed")
+                return
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"⛓️ Chain indexer following {self.stream}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._backfill_task is not None:
+            self._backfill_task.cancel()
+            try:
+                await self._backfill_task
+            except asyncio.CancelledError:
+                pass
+            self._backfill_task = None
+
+    # ------------------------------------------------------------------
+    # Backfill
+    # ------------------------------------------------------------------
+
+    async def fetch_range(self, start_ledger: int, end_ledger: int) -> List[Dict[str, Any]]:
+        """Raw events in [start_ledger, end_ledger)"""
+        events, cursor = [], None
+        while True:
+            page = await self.client.get_events(self.contract_ids, start_ledger=start_ledger, cursor=cursor,
+                                                limit=self.page_size)
+            batch = page.get("events") or []
+            in_range = [e for e in batch if e["ledger"] < end_ledger]
+            events.extend(in_range)
+            if len(in_range) < len(batch) or len(batch) < self.page_size:
+                return events
+            cursor = page.get("cursor") or batch[-1]["id"]
+
+    async def backfill(self, start_ledger: int, end_ledger: int,
+                       chunk_ledgers: int = settings.chain_indexer_backfill_chunk,
+                       concurrency: int = settings.chain_indexer_backfill_concurrency,
+                       progress: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Index [start_ledger, end_ledger) without touching the checkpoint. Chunks are
+        fetched ``concurrency`` at a time and applied in ledger order as they arrive;
+        ``progress`` (if given) is updated after each one.
+        """
+        if not self.contract_ids:
+            self.configure()
+        started = time.perf_counter()
+        slots = asyncio.Semaphore(max(1, concurrency))
+        ranges = [(s, min(s + chunk_ledgers, end_ledger)) for s in range(start_ledger, end_ledger, chunk_ledgers)]
+
+        async def fetch(bounds: Tuple[int, int]) -> List[Dict[str, Any]]:
+            async with slots:
+                return await self.fetch_range(*bounds)
+
+        progress = progress if progress is not None else {}
+        progress.update(ranges=len(ranges), ranges_done=0, events=0, applied=0)
+        tasks = [asyncio.create_task(fetch(bounds)) for bounds in ranges]
+        try:
+            for task in tasks:
+                events = await task
+                applied = await self.apply_events(events)
+                progress["ranges_done"] += 1
+                progress["events"] += len(events)
+                progress["applied"] += applied
+        finally:
+            for task in tasks:
+                task.cancel()
+        progress["hydrated"] = await self.hydrate(limit=HYDRATE_AFTER_BACKFILL)
+        return {
+            "start_ledger": start_ledger,
+            "end_ledger": end_ledger,
+            "ranges": len(ranges),
+            "events": progress["events"],
+            "applied": progress["applied"],
+            "hydrated": progress["hydrated"],
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    def start_backfill(self, start_ledger: int, end_ledger: int,
+                       chunk_ledgers: int = settings.chain_indexer_backfill_chunk,
+                       concurrency: int = settings.chain_indexer_backfill_concurrency,
+                       requested_by: Optional[int] = None) -> Dict[str, Any]:
+        """Run ``backfill`` in the background; returns the running job instead of starting a second one"""
+        if self._backfill_task is not None and not self._backfill_task.done():
+            return {"job_id": next(reversed(self._backfills)), "created": False}
+        job_id = next(self._backfill_ids)
+        job = self._backfills[job_id] = {
+            "job_id": job_id,
+            "status": "running",
+            "start_ledger": start_ledger,
+            "end_ledger": end_ledger,
+            "ranges": 0,
+            "ranges_done": 0,
+            "events": 0,
+            "applied": 0,
+            "hydrated": None,
+            "last_error": None,
+            "requested_by": requested_by,
+            "started_at": datetime.utcnow().isoformat(),
+            "finished_at": None,
+        }
+        while len(self._backfills) > BACKFILL_JOBS_KEPT:
+            del self._backfills[next(iter(self._backfills))]
+        self._backfill_task = asyncio.create_task(self._run_backfill(job, chunk_ledgers, concurrency))
+        return {"job_id": job_id, "created": True}
+
+    async def _run_backfill(self, job: Dict[str, Any], chunk_ledgers: int, concurrency: int):
+        try:
+            await self.backfill(job["start_ledger"], job["end_ledger"], chunk_ledgers, concurrency, progress=job)
+            job["status"] = "done"
+            logger.info(f"⛓️ Backfill {job['job_id']} indexed {job['applied']} events "
+                        f"from ledgers {job['start_ledger']}-{job['end_ledger']}")
+        except asyncio.CancelledError:
+            job["status"] = "cancelled"
+            raise
+        except Exception as e:
+            job["status"], job["last_error"] = "failed", str(e)
+            logger.error(f"⛓️ Backfill {job['job_id']} failed: {e}")
+        finally:
+            job["finished_at"] = datetime.utcnow().isoformat()
+
+    def backfill_progress(self, job_id: int) -> Optional[Dict[str, Any]]:
+        job = self._backfills.get(job_id)
+        if job is None:
+            return None
+        done = job["status"] == "done"
+        percent = round(100 * job["ranges_done"] / job["ranges"], 1) if job["ranges"] else (100.0 if done else 0.0)
+        return {**job, "percent": percent}
+
+    # ------------------------------------------------------------------
+    # Queries (shaped like the contract's own return values)
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _milestone_view(row: dict) -> dict:
+        return {
+            "id": row["milestone_id"],
+            "title": row["title"],
+            "description": row["description"],
+            "amount": str(row["amount"]) if row["amount"] is not None else None,
+            "ipfs_proof": row["ipfs_proof"],
+            "ai_verdict": row["ai_verdict"],
+            "ai_confidence": row["ai_confidence"],
+            "votes_for": row["votes_for"],
+            "votes_against": row["votes_against"],
+            "voter_count": row["voter_count"],
+            "status": row["status"],
+            "updated_ledger": row["updated_ledger"],
+        }
+
+    def campaign(self, campaign_id: int) -> Optional[dict]:
+        with get_db_connection() as conn:
+            row = dict_from_row(conn.execute(
+                "SELECT * FROM chain_campaigns WHERE campaign_id = ?", (campaign_id,)
+            ).fetchone())
+            if row is None:
+                return None
+            milestones = conn.execute(
+                "SELECT * FROM chain_milestones WHERE campaign_id = ? ORDER BY milestone_id", (campaign_id,)
+            ).fetchall()
+        return {
+            "id": row["campaign_id"],
+            "creator": row["creator"],
+            "title": row["title"],
+            "description": row["description"],
+            "total_goal": str(row["total_goal"]),
+            "funds_raised": str(row["funds_raised"]),
+            "funds_released": str(row["funds_released"]),
+            "funds_locked": str(row["funds_locked"]),
+            "backer_count": row["backer_count"],
+            "status": row["status"],
+            "current_milestone": row["current_milestone"],
+            "milestones": [self._milestone_view(dict_from_row(m)) for m in milestones],
+            "created_ledger": row["created_ledger"],
+            "updated_ledger": row["updated_ledger"],
+        }
+
+    def milestone(self, campaign_id: int, milestone_id: int) -> Optional[dict]:
+        with get_db_connection() as conn:
+            row = dict_from_row(conn.execute(
+                "SELECT * FROM chain_milestones WHERE campaign_id = ? AND milestone_id = ?",
+                (campaign_id, milestone_id)
+            ).fetchone())
+        return self._milestone_view(row) if row else None
+
+    def vote_status(self, campaign_id: int, milestone_id: int) -> Optional[list]:
+        """[votes_for, votes_against, voter_count], like get_vote_status"""
+        milestone = self.milestone(campaign_id, milestone_id)
+        return [milestone["votes_for"], milestone["votes_against"], milestone["voter_count"]] if milestone else None
+
+    def backer(self, campaign_id: int, address: str) -> Optional[dict]:
+        with get_db_connection() as conn:
+            row = dict_from_row(conn.execute(
+                "SELECT * FROM chain_backers WHERE campaign_id = ? AND backer = ?", (campaign_id, address)
+            ).fetchone())
+        if row is None:
+            return None
+        return {"address": row["backer"], "amount": str(row["amount"]), "voting_power": row["voting_power"],
+                "votes_cast": row["votes_cast"], "funded_ledger": row["funded_ledger"]}
+
+    def backers(self, campaign_id: int, limit: int = 50, offset: int = 0) -> List[dict]:
+        """Backers of a campaign, largest contribution first"""
+        with get_db_connection() as conn:
+            rows = conn.execute(
+                "SELECT * FROM chain_backers WHERE campaign_id = ? ORDER BY amount DESC, backer LIMIT ? OFFSET ?",
+                (campaign_id, limit, offset),
+            ).fetchall()
+        return [{"address": row["backer"], "amount": str(row["amount"]), "voting_power": row["voting_power"],
+                 "votes_cast": row["votes_cast"], "funded_ledger": row["funded_ledger"]} for row in rows]
+
+    @staticmethod
+    def _sbt_view(row: dict) -> dict:
+        return {"id": row["token_id"], "owner": row["owner"], "role": row["role"],
+                "campaign_id": row["campaign_id"], "is_active": bool(row["is_active"]),
+                "minted_ledger": row["minted_ledger"], "revoked_ledger": row["revoked_ledger"]}
+
+    def sbt(self, token_id: int) -> Optional[dict]:
+        with get_db_connection() as conn:
+            row = dict_from_row(conn.execute("SELECT * FROM chain_sbts WHERE token_id = ?", (token_id,)).fetchone())
+        return self._sbt_view(row) if row else None
+
+    def user_sbts(self, address: str) -> List[dict]:
+        with get_db_connection() as conn:
+            rows = conn.execute("SELECT * FROM chain_sbts WHERE owner = ? ORDER BY token_id", (address,)).fetchall()
+        return [self._sbt_view(dict_from_row(row)) for row in rows]
+
+    def profile(self, address: str) -> Optional[dict]:
+        tokens = self.user_sbts(address)
+        if not tokens:
+            return None
+        active = [t for t in tokens if t["is_active"]]
+        return {
+            "address": address,
+            "tokens": [t["id"] for t in tokens],
+            "total_reputation": sum(SBT_REPUTATION.get(t["role"], 0) for t in active),
+            "roles_held": sorted({t["role"] for t in tokens}),
+        }
+
+    def reputation(self, address: str) -> int:
+        profile = self.profile(address)
+        return profile["total_reputation"] if profile else 0
+
+    def campaigns(self, status: Optional[int] = None, creator: Optional[str] = None,
+                  limit: int = 50, offset: int = 0) -> List[dict]:
+        clauses, params = [], []
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if creator:
+            clauses.append("creator = ?")
+            params.append(creator)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with get_db_connection() as conn:
+            rows = conn.execute(
+                f"SELECT campaign_id FROM chain_campaigns {where} ORDER BY campaign_id DESC LIMIT ? OFFSET ?",
+                (*params, limit, offset)
+            ).fetchall()
+        return [self.campaign(row[0]) for row in rows]
+
+    def milestones(self, status: int, limit: int = 50, offset: int = 0) -> List[dict]:
+        """Milestones in a status across campaigns, e.g. MILESTONE_VOTING_OPEN for open votes"""
+        with get_db_connection() as conn:
+            rows = conn.execute('''
+                SELECT m.*, c.title AS campaign_title FROM chain_milestones m
+                JOIN chain_campaigns c ON c.campaign_id = m.campaign_id
+                WHERE m.status = ? ORDER BY m.updated_ledger DESC LIMIT ? OFFSET ?
+            ''', (status, limit, offset)).fetchall()
+        return [{"campaign_id": row["campaign_id"], "campaign_title": row["campaign_title"],
+                 **self._milestone_view(dict_from_row(row))} for row in rows]
+
+    def status(self) -> Dict[str, Any]:
+        checkpoint = self._checkpoint() if self.contract_ids else None
+        with get_db_connection() as conn:
+            counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                      for table in ("chain_events", "chain_campaigns", "chain_milestones", "chain_sbts")}
+        ledger = checkpoint["ledger"] if checkpoint else None
+        return {
+            "running": self._task is not None,
+            "contracts": self.contract_ids,
+            "checkpoint_ledger": ledger,
+            "latest_ledger": self._latest_ledger,
+            "lag_ledgers": self._latest_ledger - ledger if ledger and self._latest_ledger else None,
+            "applied_since_start": self._applied,
+            "rows": counts,
+            "last_error": self._last_error,
+        }
+
+
+# Singleton instance
+chain_indexer = ChainIndexer()
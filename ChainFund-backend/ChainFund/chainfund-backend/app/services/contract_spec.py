@@ -0,0 +1,168 @@
+"""
+Contract Spec
+=============
+Argument types of the ChainFund core, SBT and reward token contracts
+(rust-contracts/chainfund_core, chainfund_sbt, reward_token), so calls
+written for the stellar CLI (``["--campaign_id", "3", "--backer", "G..."]``)
+can be encoded as SCVals for the native RPC client, and SCVal results
+decoded to the same JSON the CLI prints.
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from stellar_sdk import Address, scval
+    from stellar_sdk import xdr as stellar_xdr
+except ImportError:
+    Address = scval = stellar_xdr = None
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# deploy scripts write rust-contracts/deployed_addresses.json next to the backend directory
+DEPLOYED_ADDRESSES_FILES = (
+    os.path.join(_BACKEND_DIR, "rust-contracts", "deployed_addresses.json"),
+    os.path.join(os.path.dirname(_BACKEND_DIR), "rust-contracts", "deployed_addresses.json"),
+)
+
+# method -> ordered (parameter, type); enums with #[repr(u32)] are plain u32
+METHOD_SPECS: Dict[str, List[Tuple[str, str]]] = {
+    # chainfund_core
+    "create_campaign": [("creator", "address"), ("title", "string"), ("description", "string"),
+                        ("ipfs_metadata", "bytes32"), ("total_goal", "i128"),
+                        ("milestone_configs", "vec<(string,string,i128)>")],
+    "get_campaign": [("campaign_id", "u32")],
+    "close_campaign": [("campaign_id", "u32"), ("caller", "address")],
+    "fund_campaign": [("campaign_id", "u32"), ("backer", "address"), ("amount", "i128")],
+    "release_funds": [("campaign_id", "u32"), ("milestone_id", "u32")],
+    "refund_backers": [("campaign_id", "u32"), ("admin", "address")],
+    "submit_proof": [("campaign_id", "u32"), ("milestone_id", "u32"), ("creator", "address"),
+                     ("ipfs_hash", "bytes32")],
+    "get_milestone": [("campaign_id", "u32"), ("milestone_id", "u32")],
+    "submit_ai_verdict": [("campaign_id", "u32"), ("milestone_id", "u32"), ("oracle", "address"),
+                          ("status", "u32"), ("confidence", "u32")],
+    "vote": [("campaign_id", "u32"), ("milestone_id", "u32"), ("voter", "address"), ("approve", "bool")],
+    "get_vote_status": [("campaign_id", "u32"), ("milestone_id", "u32")],
+    "award_sbt": [("campaign_id", "u32"), ("recipient", "address"), ("role", "u32"), ("caller", "address")],
+    "get_config": [],
+    "set_ai_oracle": [("admin", "address"), ("new_oracle", "address")],
+    "set_paused": [("admin", "address"), ("paused", "bool")],
+    "get_backer": [("campaign_id", "u32"), ("backer", "address")],
+    # chainfund_sbt
+    "mint": [("caller", "address"), ("recipient", "address"), ("role", "u32"), ("campaign_id", "u32"),
+             ("metadata_uri", "string")],
+    "batch_mint": [("caller", "address"), ("recipients", "vec<(address,u32)>"), ("campaign_id", "u32"),
+                   ("metadata_uri", "string")],
+    "revoke": [("admin", "address"), ("token_id", "u64"), ("reason", "string")],
+    "get_sbt": [("token_id", "u64")],
+    "get_profile": [("user", "address")],
+    "get_reputation": [("user", "address")],
+    "has_role": [("user", "address"), ("role", "u32")],
+    "get_user_sbts": [("user", "address")],
+    "get_campaign_sbts": [("campaign_id", "u32")],
+    # reward_token
+    "mint_reward": [("admin", "address"), ("to", "address"), ("amount", "i128")],
+    "batch_mint_reward": [("admin", "address"), ("rewards", "vec<(address,i128)>")],
+    "get_balance": [("account", "address")],
+}
+
+
+def load_deployed_addresses() -> Optional[dict]:
+    """Contents of deployed_addresses.json (contracts, admin, rpc_url), or None if not deployed"""
+    for path in DEPLOYED_ADDRESSES_FILES:
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+    return None
+
+
+def cli_args_to_dict(args: List[str]) -> Dict[str, str]:
+    """["--a", "1", "--b", "x"] -> {"a": "1", "b": "x"}"""
+    values, i = {}, 0
+    while i < len(args):
+        name = args[i]
+        if not name.startswith("--") or i + 1 >= len(args):
+            raise ValueError(f"Expected '--name value' pairs, got {args[i:]}")
+        values[name[2:].replace("-", "_")] = args[i + 1]
+        i += 2
+    return values
+
+
+def _encode(kind: str, value: Any, aliases: Dict[str, str]) -> "stellar_xdr.SCVal":
+    if kind.startswith("vec<(") and kind.endswith(")>"):
+        items = json.loads(value) if isinstance(value, str) else value
+        inner = kind[5:-2].split(",")
+        return scval.to_vec([scval.to_vec([_encode(t, v, aliases) for t, v in zip(inner, item)]) for item in items])
+    if kind == "address":
+        return scval.to_address(Address(aliases.get(value, value)))
+    if kind == "u32":
+        return scval.to_uint32(int(value))
+    if kind == "u64":
+        return scval.to_uint64(int(value))
+    if kind == "i128":
+        return scval.to_int128(int(value))
+    if kind == "bool":
+        return scval.to_bool(value if isinstance(value, bool) else str(value).lower() == "true")
+    if kind == "string":
+        return scval.to_string(str(value))
+    if kind == "bytes32":
+        raw = bytes.fromhex(value)
+        if len(raw) != 32:
+            raise ValueError(f"Expected 32 bytes of hex, got {len(raw)}")
+        return scval.to_bytes(raw)
+    raise ValueError(f"Unsupported argument type {kind}")
+
+
+def encode_args(method: str, args: List[str], aliases: Optional[Dict[str, str]] = None) -> List["stellar_xdr.SCVal"]:
+    """SCVal parameters, in contract order, for CLI-style ``--name value`` arguments"""
+    spec = METHOD_SPECS.get(method)
+    if spec is None:
+        raise ValueError(f"No argument spec for contract method {method}")
+    values = cli_args_to_dict(args)
+    missing = [name for name, _ in spec if name not in values]
+    if missing:
+        raise ValueError(f"Missing argument(s) for {method}: {', '.join(missing)}")
+    try:
+        return [_encode(kind, values[name], aliases or {}) for name, kind in spec]
+    except (TypeError, ValueError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid argument for {method}: {e}") from e
+
+
+def decode(value: "stellar_xdr.SCVal") -> Any:
+    """SCVal -> JSON-compatible value, in the shape the stellar CLI prints"""
+    kind = stellar_xdr.SCValType
+    t = value.type
+    if t == kind.SCV_VOID:
+        return None
+    if t == kind.SCV_BOOL:
+        return value.b
+    if t in (kind.SCV_U32, kind.SCV_I32, kind.SCV_U64, kind.SCV_I64, kind.SCV_TIMEPOINT, kind.SCV_DURATION):
+        return {
+            kind.SCV_U32: scval.from_uint32, kind.SCV_I32: scval.from_int32,
+            kind.SCV_U64: scval.from_uint64, kind.SCV_I64: scval.from_int64,
+            kind.SCV_TIMEPOINT: scval.from_timepoint, kind.SCV_DURATION: scval.from_duration,
+        }[t](value)
+    if t in (kind.SCV_U128, kind.SCV_I128, kind.SCV_U256, kind.SCV_I256):
+        # The CLI prints 128/256-bit integers as strings
+        return str({
+            kind.SCV_U128: scval.from_uint128, kind.SCV_I128: scval.from_int128,
+            kind.SCV_U256: scval.from_uint256, kind.SCV_I256: scval.from_int256,
+        }[t](value))
+    if t == kind.SCV_BYTES:
+        return scval.from_bytes(value).hex()
+    if t == kind.SCV_STRING:
+        return scval.from_string(value).decode(errors="replace")
+    if t == kind.SCV_SYMBOL:
+        return scval.from_symbol(value)
+    if t == kind.SCV_ADDRESS:
+        return scval.from_address(value).address
+    if t == kind.SCV_VEC:
+        return [decode(item) for item in (value.vec.sc_vec if value.vec else [])]
+    if t == kind.SCV_MAP:
+        entries = value.map.sc_map if value.map else []
+        decoded = {}
+        for entry in entries:
+            key = decode(entry.key)
+            decoded[key if isinstance(key, str) else json.dumps(key)] = decode(entry.val)
+        return decoded
+    return {"xdr": value.to_xdr()}
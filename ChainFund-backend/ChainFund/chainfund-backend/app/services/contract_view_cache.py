@@ -0,0 +1,237 @@
+"""
+Contract View Cache
+===================
+Read-through cache for read-only contract calls (v2 endpoints).
+
+Results are keyed by contract, method and arguments and tagged with the
+ledger they were read at: RPC simulations report it, CLI reads get the
+current ledger estimated from the last one seen (ledgers close about every
+LEDGER_SECONDS). An entry is served until CONTRACT_VIEW_CACHE_LEDGERS
+ledgers have passed or one of our own writes touches what it depends on:
+every call is tagged with the campaign, token and account arguments it
+names, and a write drops the entries sharing any of its tags plus the
+untagged ones (``get_config``). Writes made by others are only picked up
+through ledger age.
+
+Concurrent misses for the same key share one contract call, and a read
+that was in flight while a write to one of its tags landed is returned to
+its callers but not stored, so stale state never outlives the write. Reads
+of other campaigns and accounts are not held back.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from app.config import settings
+from app.services.contract_spec import METHOD_SPECS, cli_args_to_dict
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+LEDGER_SECONDS = 5.0
+# argument name -> tag kind, for u32/u64 identifiers
+_ID_TAGS = {"campaign_id": "campaign", "token_id": "token"}
+# Tag of reads that name nothing (``get_config``): every write invalidates it
+_UNTAGGED = ("any", "")
+
+metrics.describe("contract_view_cache_requests_total", "counter", "Contract view cache lookups by method and outcome")
+
+
+def call_tags(method: str, args: List[str]) -> FrozenSet[Tuple[str, str]]:
+    """Campaigns, tokens and accounts a call reads or writes, from its CLI-style arguments"""
+    try:
+        values = cli_args_to_dict(args)
+    except ValueError:
+        return frozenset()
+    tags = set()
+    for name, kind in METHOD_SPECS.get(method, []):
+        value = values.get(name)
+        if value is None:
+            continue
+        if name in _ID_TAGS:
+            tags.add((_ID_TAGS[name], str(value)))
+        elif kind == "address":
+            tags.add(("account", value))
+        elif kind.startswith("vec<(") and "address" in kind:
+            position = kind[5:-2].split(",").index("address")
+            try:
+                tags.update(("account", item[position]) for item in json.loads(value))
+            except (ValueError, TypeError, IndexError):
+                pass
+    return frozenset(tags)
+
+
+def _read_tags(method: str, args: List[str]) -> FrozenSet[Tuple[str, str]]:
+    return call_tags(method, args) or frozenset({_UNTAGGED})
+
+
+class ContractViewCache:
+    """Ledger-tagged LRU of view results with write invalidation and single-flight loads"""
+
+    def __init__(self, max_ledgers: int = settings.contract_view_cache_ledgers,
+                 max_entries: int = settings.contract_view_cache_size):
+        self.max_ledgers = max(0, max_ledgers)
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._inflight: Dict[tuple, list] = {}  # key -> [task, waiters, tags]
+        self._epochs: "OrderedDict[tuple, int]" = OrderedDict()  # tag -> number of its last invalidation
+        self._epoch_floor = 0  # epoch of tags not in _epochs (raised as entries are evicted)
+        self._invalidations = itertools.count(1)
+        self._ledger: Optional[int] = None
+        self._ledger_seen_at = 0.0
+        self._outcomes = Counter()
+
+    # ------------------------------------------------------------------
+    # Ledger clock
+    # ------------------------------------------------------------------
+
+    def observe_ledger(self, ledger: Optional[int]):
+        """Record a ledger sequence reported by the network"""
+        if ledger and (self._ledger is None or ledger > self._ledger):
+            self._ledger, self._ledger_seen_at = ledger, time.monotonic()
+
+    def current_ledger(self) -> Optional[int]:
+        if self._ledger is None:
+            return None
+        return self._ledger + int((time.monotonic() - self._ledger_seen_at) / LEDGER_SECONDS)
+
+    def _fresh(self, entry: dict) -> bool:
+        if entry["ledger"] is not None and self._ledger is not None:
+            return self.current_ledger() - entry["ledger"] < self.max_ledgers
+        # No ledger known yet: age by wall clock
+        return time.monotonic() - entry["stored_at"] < self.max_ledgers * LEDGER_SECONDS
+
+    def _epoch(self, tags: FrozenSet[Tuple[str, str]]) -> int:
+        """Number of the last invalidation touching any of ``tags`` (invalidation numbers only grow)"""
+        return max(self._epochs.get(tag, self._epoch_floor) for tag in tags)
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    async def get_or_load(self, contract_id: str, method: str, args: List[str],
+                          load: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Cached result of a view call, or the result of ``load()`` (stored if it succeeded)"""
+        if not self.max_ledgers:
+            return await load()
+        key = (contract_id, method, tuple(args))
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if self._fresh(entry):
+                self._entries.move_to_end(key)
+                self._count(method, "hit")
+                return dict(entry["result"])
+            del self._entries[key]
+
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self._count(method, "coalesced")
+            return dict(await self._wait(flight))
+
+        tags = _read_tags(method, args)
+        task = asyncio.create_task(self._fill(key, tags, self._epoch(tags), load))
+        flight = self._inflight[key] = [task, 0, tags]
+        task.add_done_callback(lambda _: self._inflight.get(key) is flight and self._inflight.pop(key))
+        self._count(method, "miss")
+        return dict(await self._wait(flight))
+
+    @staticmethod
+    async def _wait(flight: list) -> dict:
+        task = flight[0]
+        flight[1] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if flight[1] == 1 and not task.done():
+                task.cancel()  # nobody else wants the answer
+            raise
+        finally:
+            flight[1] -= 1
+
+    async def _fill(self, key: tuple, tags: FrozenSet[Tuple[str, str]], epoch: int,
+                    load: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        result = await load()
+        self.observe_ledger(result.get("ledger"))
+        if result.get("success") and epoch == self._epoch(tags):
+            self._entries[key] = {
+                "result": result,
+                "ledger": result.get("ledger") or self.current_ledger(),
+                "stored_at": time.monotonic(),
+                "tags": tags,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    # ------------------------------------------------------------------
+    # Invalidation
+    # ------------------------------------------------------------------
+
+    def invalidate_for_write(self, method: str, args: List[str], result: Optional[Dict[str, Any]] = None):
+        """
+        Drop entries a write may have changed. Call after every write attempt,
+        successful or not: a timed-out transaction may still land.
+        """
+        if result:
+            self.observe_ledger(result.get("ledger"))
+        tags = call_tags(method, args) | {_UNTAGGED}
+        epoch = next(self._invalidations)
+        for tag in tags:
+            self._epochs[tag] = epoch
+            self._epochs.move_to_end(tag)
+        while len(self._epochs) > self.max_entries:
+            _, evicted = self._epochs.popitem(last=False)
+            self._epoch_floor = max(self._epoch_floor, evicted)
+        # Reads of these tags already in flight may predate the write; new callers must not join them
+        for key in [key for key, flight in self._inflight.items() if flight[2] & tags]:
+            del self._inflight[key]
+        stale = [key for key, entry in self._entries.items() if entry["tags"] & tags]
+        for key in stale:
+            del self._entries[key]
+        if stale:
+            logger.debug(f"Contract view cache: {method} invalidated {len(stale)} entries")
+
+    def clear(self):
+        self._epoch_floor = next(self._invalidations)
+        self._epochs.clear()
+        self._inflight.clear()
+        self._entries.clear()
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+
+    def _count(self, method: str, outcome: str):
+        self._outcomes[outcome] += 1
+        metrics.inc("contract_view_cache_requests_total", method=method, outcome=outcome)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def hit_rate(self) -> float:
+        total = sum(self._outcomes.values())
+        return (total - self._outcomes["miss"]) / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": bool(self.max_ledgers),
+            "max_ledgers": self.max_ledgers,
+            "entries": len(self._entries),
+            "in_flight": len(self._inflight),
+            "ledger": self.current_ledger(),
+            "hit_rate": round(self.hit_rate(), 4),
+            "lookups": dict(self._outcomes),
+        }
+
+
+# Singleton instance
+contract_view_cache = ContractViewCache()
+metrics.gauge_callback("contract_view_cache_entries", contract_view_cache.__len__,
+                       "Contract view results held in memory")
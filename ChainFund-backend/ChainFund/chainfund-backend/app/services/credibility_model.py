@@ -0,0 +1,337 @@
+"""
+Offline Credibility Model
+=========================
+Local greenwashing scorer used when the LLM is unavailable (no key,
+breaker open, call slots saturated).
+
+A small logistic model over lexicon features of the title + description:
+quantified claims (numbers with units), bare numbers, verification and
+monitoring terms, time-bound commitments, hedge-word density, absolute
+"hype" claims and a too-short indicator. Lexicons, units, weights and
+level thresholds live in a versioned JSON file next to this module, so the
+model can be retuned without code changes.
+
+Feature extraction is vectorized: a batch is normalized with one
+``str.translate`` and split into tokens, tokens are hashed into one array,
+and every lexicon (phrases included) is matched with a single
+``searchsorted`` per n-gram length against a sorted table whose entries
+carry a bitmask of the groups they belong to. Per-document counts come from
+``bincount``, and scoring is a matrix-vector product, so 100k descriptions
+score in seconds.
+The output follows the LLM response schema (score, credibility_level,
+flags, suggestions, impact_metrics, summary).
+"""
+
+import json
+import logging
+import math
+from itertools import chain
+from operator import itemgetter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = Path(__file__).parent / "data" / "credibility_model_v1.json"
+
+# Feature order the extractor produces; the model file must list the same names
+FEATURES = ("log_words", "quantities", "bare_numbers", "verification", "timebound",
+            "hedge_density", "hype", "too_short")
+
+# Normalization works on bytes so it is a single C pass per text: ASCII is
+# lowercased, thousands separators vanish ("50,000"), "%" becomes its own
+# token and other punctuation splits tokens; hyphens stay ("third-party")
+_PUNCTUATION = b".;:!?()[]{}\"'`/\\*&+=<>|~#@^_\t\r\n\x00"
+_NORMALIZE = bytes.maketrans(_PUNCTUATION, b" " * len(_PUNCTUATION))
+DOC_SEPARATOR = b" \x00 "
+_HASH_PRIME = 0x100000001B3
+_first_byte = itemgetter(0)
+_DIGITS = (ord("0"), ord("9"))
+
+
+def _normalize(text: str) -> bytes:
+    return text.encode("utf-8", "replace").lower().translate(_NORMALIZE, b",").replace(b"%", b" % ")
+
+
+def tokenize(text: str) -> List[bytes]:
+    return _normalize(text).split()
+
+
+def _ngram_hashes(hashes: "np.ndarray", n: int) -> "np.ndarray":
+    """Rolling combination of n consecutive token hashes (wraps modulo 2**64)"""
+    combined = hashes[:len(hashes) - n + 1].copy()
+    for k in range(1, n):
+        combined = combined * np.uint64(_HASH_PRIME) + hashes[k:len(hashes) - n + 1 + k]
+    return combined
+
+
+def _token_hashes(tokens: Sequence[bytes]) -> "np.ndarray":
+    return np.fromiter(map(hash, tokens), dtype=np.int64, count=len(tokens)).view(np.uint64)
+
+
+class CredibilityModel:
+    """Vectorized lexicon/quantity scorer with the LLM analysis schema"""
+
+    def __init__(self, spec: dict):
+        if tuple(spec["features"]) != FEATURES:
+            raise ValueError(f"Credibility model {spec.get('version')} expects features {spec['features']}")
+        self.name = spec["name"]
+        self.version = spec["version"]
+        self.weights = np.asarray(spec["weights"], dtype=np.float64)
+        self._weight_list = [float(w) for w in spec["weights"]]
+        self.bias = float(spec["bias"])
+        self.min_words = int(spec["min_words"])
+        self.levels = [(float(threshold), level) for threshold, level in spec["levels"]]
+        self.default_impact_metrics = list(spec["default_impact_metrics"])
+
+        # Every phrase of every group in one sorted table per n-gram length,
+        # each entry carrying the bitmask of groups that contain it
+        groups = {"unit": spec["units"], **spec["lexicons"],
+                  **{f"metric:{name}": terms for name, terms in spec["impact_metrics"].items()}}
+        self._groups = list(groups)
+        self._metric_names = list(spec["impact_metrics"])
+        self._phrases: Dict[int, Dict[tuple, int]] = {}  # n -> token tuple -> group bitmask
+        for bit, terms in enumerate(groups.values()):
+            for term in terms:
+                phrase = tuple(tokenize(term))
+                if phrase:
+                    table = self._phrases.setdefault(len(phrase), {})
+                    table[phrase] = table.get(phrase, 0) | (1 << bit)
+        self._tables = {}
+        for n, table in self._phrases.items():
+            keys = np.array([_ngram_hashes(_token_hashes(phrase), n)[0] for phrase in table], dtype=np.uint64)
+            order = np.argsort(keys)
+            self._tables[n] = (keys[order], np.array(list(table.values()), dtype=np.int64)[order])
+        self._unigrams = {phrase[0]: mask for phrase, mask in self._phrases.get(1, {}).items()}
+        self._starts: Dict[bytes, tuple] = {}
+        for n, table in self._phrases.items():
+            if n > 1:
+                for phrase in table:
+                    self._starts[phrase[0]] = tuple(sorted(set(self._starts.get(phrase[0], ())) | {n}))
+        self._mask_bits = {
+            mask: [bit for bit in range(len(self._groups)) if mask >> bit & 1]
+            for table in self._phrases.values() for mask in table.values()
+        }
+        self._bit_shifts = np.arange(len(self._groups), dtype=np.int64)
+        self._separator_hash = int(_token_hashes([DOC_SEPARATOR.strip()])[0])
+
+    @classmethod
+    def load(cls, path: Path = MODEL_PATH) -> "CredibilityModel":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    # ------------------------------------------------------------------
+    # Features
+    # ------------------------------------------------------------------
+
+    def _group_counts(self, hashes: "np.ndarray", docs: "np.ndarray", n_docs: int) -> tuple:
+        """(n_docs, n_groups) phrase matches per document, plus the unigram group masks"""
+        counts = np.zeros((n_docs, len(self._groups)), dtype=np.int64)
+        unigram_masks = np.zeros(len(hashes), dtype=np.int64)
+        for n, (keys, group_masks) in self._tables.items():
+            if len(hashes) < n:
+                continue
+            grams = _ngram_hashes(hashes, n)
+            idx = np.minimum(np.searchsorted(keys, grams), len(keys) - 1)
+            positions = np.flatnonzero(keys[idx] == grams)
+            if n > 1:
+                positions = positions[docs[positions] == docs[positions + n - 1]]  # phrases never span documents
+            found = group_masks[idx[positions]]
+            if n == 1:
+                unigram_masks[positions] = found
+            if len(positions):
+                # One bincount over (document, group) pairs for every group bit set
+                rows, bits = np.nonzero((found[:, None] >> self._bit_shifts) & 1)
+                cells = docs[positions[rows]] * len(self._groups) + bits
+                counts += np.bincount(cells, minlength=counts.size).reshape(counts.shape)
+        return counts, unigram_masks
+
+    def _extract(self, texts: Sequence[str]) -> tuple:
+        n_docs = len(texts)
+        tokens = DOC_SEPARATOR.join([_normalize(text or "") for text in texts]).split()
+        hashes = _token_hashes(tokens)
+        is_number = np.fromiter(map(bytes.isdigit, tokens), dtype=bool, count=len(tokens))
+        first = np.fromiter(map(_first_byte, tokens), dtype=np.uint8, count=len(tokens))
+
+        # Drop the separators, remembering which document each token came from
+        separators = hashes == np.uint64(self._separator_hash)
+        docs = np.cumsum(separators)
+        if n_docs > 1:
+            keep = ~separators
+            hashes, docs, is_number, first = hashes[keep], docs[keep], is_number[keep], first[keep]
+        lengths = np.bincount(docs, minlength=n_docs)
+        group_counts, unigram_masks = self._group_counts(hashes, docs, n_docs)
+
+        # Quantities: a number followed by a unit, or with the unit glued on ("120ha")
+        leads_digit = (first >= _DIGITS[0]) & (first <= _DIGITS[1])
+        is_unit = (unigram_masks & 1) != 0
+        followed_by_unit = np.zeros(len(hashes), dtype=bool)
+        if len(hashes) > 1:
+            followed_by_unit[:-1] = is_unit[1:] & (docs[:-1] == docs[1:])
+        quantity = (is_number & followed_by_unit) | (leads_digit & ~is_number)
+        counts = {
+            "words": lengths.astype(np.float64),
+            "quantities": np.bincount(docs[quantity], minlength=n_docs).astype(np.float64),
+            "numbers": np.bincount(docs[is_number], minlength=n_docs).astype(np.float64),
+        }
+        for bit, group in enumerate(self._groups):
+            if group != "unit":
+                counts[group] = group_counts[:, bit]
+
+        words = counts["words"]
+        hedge_density = 100.0 * counts["hedge"] / np.maximum(words, 1.0)
+        matrix = np.column_stack([
+            np.log1p(words),
+            np.log1p(counts["quantities"]),
+            np.log1p(np.maximum(counts["numbers"] - counts["quantities"], 0.0)),
+            np.log1p(counts["verification"]),
+            np.log1p(counts["timebound"]),
+            np.log1p(hedge_density),
+            np.log1p(counts["hype"]),
+            (words < self.min_words).astype(np.float64),
+        ]).reshape(n_docs, len(FEATURES))
+        return matrix, counts
+
+    def _extract_one(self, text: str) -> Dict[str, int]:
+        """Counts for a single text with plain dict lookups (no per-call NumPy overhead)"""
+        tokens = tokenize(text)
+        group_counts = [0] * len(self._groups)
+        unigrams = self._unigrams
+        is_unit = [False] * len(tokens)
+        for i, token in enumerate(tokens):
+            mask = unigrams.get(token)
+            if mask:
+                is_unit[i] = bool(mask & 1)
+                for bit in self._mask_bits[mask]:
+                    group_counts[bit] += 1
+            # Longer phrases are only tried where one can start
+            for n in self._starts.get(token, ()):
+                mask = self._phrases[n].get(tuple(tokens[i:i + n]))
+                if mask:
+                    for bit in self._mask_bits[mask]:
+                        group_counts[bit] += 1
+
+        numbers = quantities = 0
+        for i, token in enumerate(tokens):
+            if token.isdigit():
+                numbers += 1
+                if i + 1 < len(tokens) and is_unit[i + 1]:
+                    quantities += 1
+            elif _DIGITS[0] <= token[0] <= _DIGITS[1]:
+                quantities += 1
+        counts = {"words": len(tokens), "quantities": quantities, "numbers": numbers}
+        for bit, group in enumerate(self._groups):
+            if group != "unit":
+                counts[group] = group_counts[bit]
+        return counts
+
+    def _score_one(self, counts: Dict[str, int]) -> int:
+        words = counts["words"]
+        row = (
+            math.log1p(words),
+            math.log1p(counts["quantities"]),
+            math.log1p(max(counts["numbers"] - counts["quantities"], 0)),
+            math.log1p(counts["verification"]),
+            math.log1p(counts["timebound"]),
+            math.log1p(100.0 * counts["hedge"] / max(words, 1)),
+            math.log1p(counts["hype"]),
+            float(words < self.min_words),
+        )
+        logit = sum(w * x for w, x in zip(self._weight_list, row)) + self.bias
+        return round(100.0 / (1.0 + math.exp(-logit)))
+
+    def features(self, texts: Sequence[str]) -> "np.ndarray":
+        """(n, len(FEATURES)) feature matrix"""
+        return self._extract(texts)[0]
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+
+    def score_batch(self, texts: Sequence[str]) -> "np.ndarray":
+        """Integer scores 0-100 for many texts"""
+        if not len(texts):
+            return np.zeros(0, dtype=np.int64)
+        return self._scores(self.features(texts))
+
+    def _scores(self, matrix: "np.ndarray") -> "np.ndarray":
+        logits = matrix @ self.weights + self.bias
+        return np.rint(100.0 / (1.0 + np.exp(-logits))).astype(np.int64)
+
+    def level(self, score: float) -> str:
+        for threshold, level in self.levels:
+            if score >= threshold:
+                return level
+        return self.levels[-1][1]
+
+    def analyze_batch(self, items: Sequence[tuple]) -> List[Dict]:
+        """Full analyses for (title, description) pairs, in the LLM response schema"""
+        if not len(items):
+            return []
+        texts = [f"{title or ''}\n{description or ''}" for title, description in items]
+        matrix, counts = self._extract(texts)
+        scores = self._scores(matrix)
+        rows = np.column_stack(list(counts.values())).astype(np.int64).tolist()
+        names = list(counts)
+        return [self._explain(int(score), dict(zip(names, row))) for score, row in zip(scores, rows)]
+
+    def analyze(self, title: str, description: str) -> Dict:
+        counts = self._extract_one(f"{title or ''}\n{description or ''}")
+        return self._explain(self._score_one(counts), counts)
+
+    def _explain(self, score: int, counts: Dict[str, int]) -> Dict:
+        flags, suggestions = [], []
+        if counts["words"] < self.min_words:
+            flags.append("Description is too short to evaluate")
+            suggestions.append("Describe what will be done, where, and how results will be measured")
+        if counts["quantities"] == 0:
+            flags.append("No quantified impact claims (numbers with units)")
+            suggestions.append("Include estimated outcomes with units, e.g. tonnes CO2/year or hectares restored")
+        if counts["verification"] == 0:
+            flags.append("No monitoring, baseline or third-party verification mentioned")
+            suggestions.append("Explain how impact will be monitored and who verifies it")
+        if counts["timebound"] == 0:
+            suggestions.append("Add a timeline with dated milestones")
+        if counts["hype"]:
+            flags.append(f"Absolute claims without supporting evidence ({counts['hype']})")
+            suggestions.append("Back claims like 'carbon neutral' or 'zero emissions' with a methodology")
+        if counts["words"] and 100.0 * counts["hedge"] / counts["words"] > 5:
+            flags.append("Vague or hedged language dominates the description")
+            suggestions.append("Replace general terms like 'eco-friendly' with specific, measurable commitments")
+        if not suggestions:
+            suggestions.append("Reference scientific studies supporting this method")
+
+        metrics = [name for name in self._metric_names if counts[f"metric:{name}"]]
+        level = self.level(score)
+        return {
+            "score": score,
+            "credibility_level": level,
+            "flags": flags,
+            "suggestions": suggestions,
+            "impact_metrics": metrics or list(self.default_impact_metrics),
+            "summary": (
+                f"Offline analysis (model {self.version}): {level.lower()} credibility, "
+                f"{counts['quantities']} quantified claim(s) and {counts['verification']} verification reference(s)."
+            ),
+        }
+
+
+def load_default_model() -> Optional[CredibilityModel]:
+    """The bundled model, or None when NumPy or the model file is unavailable"""
+    if np is None:
+        logger.warning("⚠️ NumPy not installed. Offline AI fallback uses the basic heuristic.")
+        return None
+    try:
+        return CredibilityModel.load()
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"❌ Failed to load credibility model: {e}")
+        return None
+
+
+# Singleton instance
+credibility_model = load_default_model()
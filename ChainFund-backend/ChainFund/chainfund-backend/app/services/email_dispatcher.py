@@ -0,0 +1,318 @@
+"""
+Email Dispatcher
+================
+Asynchronous outbound email queue backed by a small pool of persistent,
+authenticated SMTP connections.
+
+Request handlers only enqueue (``EmailService._send_email`` does this
+automatically while the dispatcher is running). Worker tasks pull
+messages off an asyncio queue, wait for the relay-wide and per-provider
+rate limits, borrow a pooled connection and send on it. A connection that
+drops is discarded and the message is retried once on a fresh one.
+
+Tuning (environment variables, see EmailConfig):
+- EMAIL_WORKERS / EMAIL_POOL_SIZE / EMAIL_QUEUE_SIZE
+- EMAIL_RATE_LIMIT: messages per second through the relay (0 = unlimited)
+- EMAIL_PROVIDER_RATE_LIMITS: per recipient mail provider, e.g. "gmail.com=10,outlook.com=5"
+"""
+
+import asyncio
+import smtplib
+import socket
+import threading
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from app.services.email_service import EmailConfig, EmailService, email_service
+from app.utils.token_bucket import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Errors after which a connection is considered dead. Every smtplib error is an OSError, so this
+# stays narrow: a refused recipient or sender (SMTPResponseException) leaves the session usable.
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, socket.timeout)
+
+
+@dataclass
+class OutboundEmail:
+    to_email: str
+    subject: str
+    html_content: str
+    plain_text: Optional[str] = None
+    future: Optional[asyncio.Future] = field(default=None, repr=False)
+    bcc: Optional[List[str]] = None
+
+
+def parse_rate_limits(spec: str) -> Dict[str, float]:
+    """Parse "gmail.com=10,outlook.com=5" into {domain: rate}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        domain, _, rate = item.partition("=")
+        try:
+            limits[domain.strip().lower()] = float(rate)
+        except ValueError:
+            logger.warning(f"Ignoring invalid email rate limit: {item!r}")
+    return limits
+
+
+class PooledConnection:
+    """A long-lived SMTP session plus bookkeeping for recycling it"""
+
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            self.server.quit()
+        except Exception:
+            try:
+                self.server.close()
+            except Exception:
+                pass
+
+
+class SMTPConnectionPool:
+    """
+    Fixed number of connection slots. Connections are opened lazily,
+    health-checked with NOOP after sitting idle, and recycled after
+    EMAIL_MAX_PER_CONNECTION messages (many providers cap a session).
+    """
+
+    def __init__(self, service: EmailService, size: int):
+        self.service = service
+        self.size = size
+        self._slots: Optional[asyncio.Queue] = None
+        self.opened = 0  # connections opened since start (for stats/benchmarks)
+
+    def start(self):
+        self._slots = asyncio.Queue()
+        for _ in range(self.size):
+            self._slots.put_nowait(None)
+
+    def _connect(self) -> PooledConnection:
+        server = self.service._get_connection()
+        if server is None:
+            raise smtplib.SMTPConnectError(-1, "Could not connect to SMTP server")
+        self.opened += 1
+        return PooledConnection(server)
+
+    def _healthy(self, conn: PooledConnection) -> bool:
+        if conn.sent >= EmailConfig.MAX_PER_CONNECTION:
+            return False
+        if time.monotonic() - conn.last_used < EmailConfig.IDLE_CHECK_SECONDS:
+            return True
+        try:
+            return conn.server.noop()[0] == 250
+        except Exception:
+            return False
+
+    async def acquire(self) -> PooledConnection:
+        conn = await self._slots.get()
+        try:
+            if conn is not None and not await asyncio.to_thread(self._healthy, conn):
+                await asyncio.to_thread(conn.close)
+                conn = None
+            if conn is None:
+                conn = await asyncio.to_thread(self._connect)
+        except BaseException:
+            self._slots.put_nowait(None)
+            raise
+        return conn
+
+    def release(self, conn: Optional[PooledConnection]):
+        """Return a connection to the pool (None marks the slot as needing a new one)"""
+        if conn is not None:
+            conn.last_used = time.monotonic()
+        self._slots.put_nowait(conn)
+
+    async def discard(self, conn: PooledConnection):
+        await asyncio.to_thread(conn.close)
+        self.release(None)
+
+    async def close(self):
+        if self._slots is None:
+            return
+        while not self._slots.empty():
+            conn = self._slots.get_nowait()
+            if conn is not None:
+                await asyncio.to_thread(conn.close)
+        self._slots = None
+
+
+class EmailDispatcher:
+    """Queue + worker pool delivering email over pooled SMTP connections"""
+
+    def __init__(self, service: EmailService,
+                 workers: int = EmailConfig.WORKERS,
+                 pool_size: int = EmailConfig.POOL_SIZE,
+                 queue_size: int = EmailConfig.QUEUE_SIZE,
+                 rate_limit: float = EmailConfig.RATE_LIMIT,
+                 provider_rate_limits: str = EmailConfig.PROVIDER_RATE_LIMITS):
+        self.service = service
+        self.worker_count = workers
+        self.queue_size = queue_size
+        self.pool = SMTPConnectionPool(service, pool_size)
+        self.rate_limit = rate_limit
+        self.provider_limits = parse_rate_limits(provider_rate_limits)
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._workers = []
+        self._relay_bucket: Optional[TokenBucket] = None
+        self._provider_buckets: Dict[str, TokenBucket] = {}
+        self.stats = {"sent": 0, "failed": 0, "retried": 0, "dropped": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Start workers on the running event loop (call from app lifespan)"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._relay_bucket = TokenBucket(self.rate_limit) if self.rate_limit > 0 else None
+        self._provider_buckets = {
+            domain: TokenBucket(rate) for domain, rate in self.provider_limits.items() if rate > 0
+        }
+        self.pool.start()
+        self._workers = [
+            asyncio.create_task(self._worker(i)) for i in range(self.worker_count)
+        ]
+        self.service.dispatcher = self
+        logger.info(f"📧 Email dispatcher started ({self.worker_count} workers, {self.pool.size} connections)")
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Stop accepting mail, drain what is queued, then close connections"""
+        if not self.running:
+            return
+        self.service.dispatcher = None
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Email dispatcher stopped with {self._queue.qsize()} messages unsent")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await self.pool.close()
+        self._queue = None
+
+    # ------------------------------------------------------------------
+    # Enqueueing
+    # ------------------------------------------------------------------
+
+    def submit(self, to_email: str, subject: str, html_content: str,
+               plain_text: Optional[str] = None, bcc: Optional[List[str]] = None) -> asyncio.Future:
+        """
+        Queue a message from the event loop thread.
+        The returned future resolves to True/False once delivery finishes.
+        """
+        future = asyncio.get_running_loop().create_future()
+        if not self.running:
+            future.set_result(False)
+            return future
+        message = OutboundEmail(to_email, subject, html_content, plain_text,
+                                future=future, bcc=bcc)
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            logger.error(f"Email queue full, dropping message to {to_email}: {subject}")
+            message.future.set_result(False)
+        return message.future
+
+    def enqueue(self, to_email: str, subject: str, html_content: str,
+                plain_text: Optional[str] = None) -> bool:
+        """Fire-and-forget enqueue, safe to call from any thread"""
+        if not self.running:
+            return False
+        if threading.get_ident() == self._loop_thread:
+            future = self.submit(to_email, subject, html_content, plain_text)
+            return not (future.done() and future.result() is False)
+        self._loop.call_soon_threadsafe(self.submit, to_email, subject, html_content, plain_text)
+        return True
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    async def _throttle(self, to_email: str):
+        if self._relay_bucket:
+            await self._relay_bucket.acquire()
+        domain = to_email.rpartition("@")[2].lower()
+        bucket = self._provider_buckets.get(domain)
+        if bucket:
+            await bucket.acquire()
+
+    async def _deliver(self, message: OutboundEmail) -> bool:
+        for attempt in range(2):
+            try:
+                conn = await self.pool.acquire()
+            except Exception as e:
+                logger.error(f"SMTP connection failed: {e}")
+                return False
+            try:
+                await asyncio.to_thread(
+                    self.service._send_on, conn.server, message.to_email,
+                    message.subject, message.html_content, message.plain_text, message.bcc
+                )
+            except CONNECTION_ERRORS as e:
+                await self.pool.discard(conn)
+                if attempt == 0:
+                    self.stats["retried"] += 1
+                    logger.warning(f"SMTP connection dropped ({e}), retrying on a new connection")
+                    continue
+                logger.error(f"Failed to send email to {message.to_email}: {e}")
+                return False
+            except Exception as e:
+                # The session is still usable (e.g. recipient refused)
+                conn.sent += 1
+                self.pool.release(conn)
+                logger.error(f"Failed to send email to {message.to_email}: {e}")
+                return False
+            conn.sent += 1
+            self.pool.release(conn)
+            return True
+        return False
+
+    async def _worker(self, index: int):
+        while True:
+            message = await self._queue.get()
+            try:
+                await self._throttle(message.to_email)
+                ok = await self._deliver(message)
+                self.stats["sent" if ok else "failed"] += 1
+                if ok:
+                    logger.info(f"Email sent successfully to {message.to_email}: {message.subject}")
+                if message.future and not message.future.done():
+                    message.future.set_result(ok)
+            except asyncio.CancelledError:
+                if message.future and not message.future.done():
+                    message.future.set_result(False)
+                raise
+            except Exception as e:
+                logger.error(f"Email worker {index} error: {e}")
+                if message.future and not message.future.done():
+                    message.future.set_result(False)
+            finally:
+                self._queue.task_done()
+
+
+# Singleton instance
+email_dispatcher = EmailDispatcher(email_service)
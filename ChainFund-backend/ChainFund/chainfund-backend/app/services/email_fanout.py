@@ -0,0 +1,369 @@
+"""
+Email Fan-out
+=============
+Sends one notification to every backer of a project (e.g. a completed
+milestone) without loading all backers or rendering per recipient.
+
+A ``fanout_jobs`` row is inserted in the same transaction as the event.
+The worker streams backers with a keyset cursor in chunks, renders the
+shared template once and compiles it around the recipient's name (so each
+message is a few string joins), and sends
+over the dispatcher's pooled connections (or as Bcc batches when
+EMAIL_FANOUT_BCC_BATCH is set). Progress and the cursor are saved after
+every chunk, so a restarted worker resumes where it stopped; at most the
+in-flight chunk is sent again. Recipients whose send failed are handed to
+the email outbox, which retries them with backoff.
+
+A job whose run fails (e.g. the database is briefly locked) stays
+``running`` and is picked up again after a backoff. It is only marked
+failed after MAX_ATTEMPTS claims in a row that saved no chunk.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.database import get_db_connection, dict_from_row
+from app.services.email_service import EmailConfig, EmailTemplates, email_service
+from app.services.email_render import CompiledTemplate
+from app.services.email_outbox import backoff_delay, email_outbox
+
+logger = logging.getLogger(__name__)
+
+# template name -> (renderer, parameter holding the recipient's name)
+FANOUT_TEMPLATES = {
+    "milestone_completed": (EmailTemplates.milestone_completed, "user_name"),
+}
+
+RECIPIENT_SLOT = "\x00recipient_name\x00"
+DEFAULT_RECIPIENT_NAME = "Backer"
+POLL_INTERVAL = 5.0
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 5  # claims without progress before a job is marked failed
+
+
+class EmailFanout:
+    """Chunked, resumable fan-out of one template to all backers of a project"""
+
+    def __init__(self, chunk_size: int = EmailConfig.FANOUT_CHUNK_SIZE,
+                 bcc_batch: int = EmailConfig.FANOUT_BCC_BATCH):
+        self.chunk_size = chunk_size
+        self.bcc_batch = bcc_batch
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # ------------------------------------------------------------------
+    # Job creation (inside the caller's transaction)
+    # ------------------------------------------------------------------
+
+    def create_job(self, cursor, template: str, project_id: int, params: dict, dedupe_key: str) -> int:
+        """Queue a fan-out in the caller's transaction, returning its job id"""
+        if template not in FANOUT_TEMPLATES:
+            raise ValueError(f"Unknown fan-out template: {template}")
+
+        cursor.execute('''
+            INSERT OR IGNORE INTO fanout_jobs (dedupe_key, template, project_id, params)
+            VALUES (?, ?, ?, ?)
+        ''', (dedupe_key, template, project_id, json.dumps(params)))
+        if cursor.rowcount:
+            return cursor.lastrowid
+        cursor.execute("SELECT id FROM fanout_jobs WHERE dedupe_key = ?", (dedupe_key,))
+        return cursor.fetchone()[0]
+
+    def notify(self):
+        """Wake the worker (call after committing); safe from any thread"""
+        if self._loop is None or self._wakeup is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    # ------------------------------------------------------------------
+    # Backer streaming
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _backers_query(select: str) -> str:
+        # Any wallet a backer donated from resolves to their account via wallet_identity
+        return f'''
+            SELECT {select} FROM users u
+            WHERE u.email IS NOT NULL AND u.id IN (
+                SELECT wi.user_id FROM donations d
+                JOIN wallet_identity wi ON wi.address = d.donor_wallet
+                WHERE d.project_id = ?
+            )
+        '''
+
+    def count_backers(self, project_id: int) -> int:
+        with get_db_connection() as conn:
+            return conn.execute(self._backers_query("COUNT(*)"), (project_id,)).fetchone()[0]
+
+    def fetch_backers(self, project_id: int, after_id: int, limit: int) -> list:
+        """Next chunk of backers with id > after_id (keyset pagination)"""
+        with get_db_connection() as conn:
+            rows = conn.execute(
+                self._backers_query("u.id, u.email, u.username") + " AND u.id > ? ORDER BY u.id LIMIT ?",
+                (project_id, after_id, limit)
+            ).fetchall()
+        return [dict_from_row(row) for row in rows]
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    def _claim(self) -> Optional[dict]:
+        """Lease the oldest pending job, or one whose worker died"""
+        now = datetime.utcnow()
+        with get_db_connection() as conn:
+            row = conn.execute('''
+                UPDATE fanout_jobs
+                SET status = 'running', attempts = attempts + 1, locked_until = ?,
+                    started_at = COALESCE(started_at, ?)
+                WHERE id = (
+                    SELECT id FROM fanout_jobs
+                    WHERE status = 'pending' OR (status = 'running' AND locked_until <= ?)
+                    ORDER BY id LIMIT 1
+                )
+                RETURNING *
+            ''', (
+                (now + timedelta(seconds=LEASE_SECONDS)).isoformat(), now.isoformat(), now.isoformat()
+            )).fetchone()
+            conn.commit()
+        return dict_from_row(row)
+
+    def _save_progress(self, job_id: int, cursor_id: int, sent: int, failed_rows: list,
+                       template: str, params: dict, name_param: str, total: Optional[int] = None):
+        """Persist the cursor and counters, handing failed recipients to the outbox atomically"""
+        now = datetime.utcnow()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            for backer in failed_rows:
+                email_outbox.enqueue(cursor, template, backer['email'], {
+                    **params, name_param: backer.get('username') or DEFAULT_RECIPIENT_NAME
+                }, dedupe_key=f"fanout:{job_id}:{backer['id']}")
+            cursor.execute('''
+                UPDATE fanout_jobs
+                SET cursor_id = ?, sent = sent + ?, failed = failed + ?, attempts = 0,
+                    total = COALESCE(?, total), locked_until = ?, updated_at = ?
+                WHERE id = ?
+            ''', (cursor_id, sent, len(failed_rows), total,
+                  (now + timedelta(seconds=LEASE_SECONDS)).isoformat(), now.isoformat(), job_id))
+            conn.commit()
+        if failed_rows:
+            email_outbox.notify()
+
+    def _finish(self, job_id: int, status: str, error: str = None):
+        with get_db_connection() as conn:
+            conn.execute(
+                "UPDATE fanout_jobs SET status = ?, last_error = ?, locked_until = NULL, finished_at = ? WHERE id = ?",
+                (status, error, datetime.utcnow().isoformat(), job_id)
+            )
+            conn.commit()
+
+    def _retry_later(self, job: dict, error: str):
+        """Keep a failed run's job leased until its backoff ends, or fail it after MAX_ATTEMPTS"""
+        now = datetime.utcnow()
+        retry_at = now + timedelta(seconds=backoff_delay(job['attempts']))
+        with get_db_connection() as conn:
+            # attempts is reset by every saved chunk, so read it from the row rather than the claim
+            conn.execute(
+                "UPDATE fanout_jobs SET status = 'failed', last_error = ?, locked_until = NULL, finished_at = ? "
+                "WHERE id = ? AND status = 'running' AND attempts >= ?",
+                (error, now.isoformat(), job['id'], MAX_ATTEMPTS)
+            )
+            conn.execute(
+                "UPDATE fanout_jobs SET last_error = ?, locked_until = ? WHERE id = ? AND status = 'running'",
+                (error, retry_at.isoformat(), job['id'])
+            )
+            conn.commit()
+
+    async def _send(self, to_email: str, subject: str, html_content: str, plain_text: str,
+                    bcc: list = None) -> bool:
+        if not EmailConfig.EMAILS_ENABLED:
+            return True
+        if not EmailConfig.SMTP_USER or not EmailConfig.SMTP_PASSWORD:
+            return False
+        dispatcher = email_service.dispatcher
+        if dispatcher is not None:
+            return await dispatcher.submit(to_email, subject, html_content, plain_text, bcc=bcc)
+        return await asyncio.to_thread(self._send_direct, to_email, subject, html_content, plain_text, bcc)
+
+    @staticmethod
+    def _send_direct(to_email, subject, html_content, plain_text, bcc) -> bool:
+        """Fallback when the dispatcher is not running (scripts)"""
+        server = email_service._get_connection()
+        if server is None:
+            return False
+        try:
+            email_service._send_on(server, to_email, subject, html_content, plain_text, bcc)
+            return True
+        except Exception as e:
+            logger.error(f"Fan-out send failed: {e}")
+            return False
+        finally:
+            try:
+                server.quit()
+            except Exception:
+                pass
+
+    @staticmethod
+    def compile_for_recipients(email) -> tuple:
+        """
+        Split a message rendered with RECIPIENT_SLOT into (subject, html, text)
+        templates, so personalizing it per backer is one join per part.
+        """
+        return (
+            CompiledTemplate.from_marker(email.subject, RECIPIENT_SLOT, "recipient_name", is_html=False),
+            CompiledTemplate.from_marker(email.html, RECIPIENT_SLOT, "recipient_name"),
+            CompiledTemplate.from_marker(email.text, RECIPIENT_SLOT, "recipient_name", is_html=False),
+        )
+
+    async def _send_chunk(self, backers: list, templates: tuple) -> list:
+        """Send one chunk, returning the backers whose send failed"""
+        if self.bcc_batch > 0:
+            # Not personalized: one message per Bcc batch
+            generic = [t.render({"recipient_name": DEFAULT_RECIPIENT_NAME}) for t in templates]
+            batches = [backers[i:i + self.bcc_batch] for i in range(0, len(backers), self.bcc_batch)]
+            results = await asyncio.gather(*(
+                self._send(EmailConfig.SENDER_EMAIL, *generic, bcc=[b['email'] for b in batch])
+                for batch in batches
+            ), return_exceptions=True)
+            return [b for batch, ok in zip(batches, results) if ok is not True for b in batch]
+
+        def personalize(backer: dict) -> list:
+            values = {"recipient_name": backer.get('username') or DEFAULT_RECIPIENT_NAME}
+            return [t.render(values) for t in templates]
+
+        results = await asyncio.gather(*(
+            self._send(backer['email'], *personalize(backer)) for backer in backers
+        ), return_exceptions=True)
+        return [backer for backer, ok in zip(backers, results) if ok is not True]
+
+    async def run_job(self, job: dict):
+        """Send a claimed job from its saved cursor to the end"""
+        renderer, name_param = FANOUT_TEMPLATES[job['template']]
+        params = json.loads(job['params'] or '{}')
+
+        # Render once; only the recipient name differs between messages
+        templates = self.compile_for_recipients(renderer(**{**params, name_param: RECIPIENT_SLOT}))
+
+        total = job['total']
+        if total is None:
+            total = await asyncio.to_thread(self.count_backers, job['project_id'])
+
+        cursor_id = job['cursor_id'] or 0
+        logger.info(f"📣 Fan-out job {job['id']} ({job['template']}) resuming after user {cursor_id}, {total} backers")
+
+        while True:
+            backers = await asyncio.to_thread(self.fetch_backers, job['project_id'], cursor_id, self.chunk_size)
+            if not backers:
+                break
+            failed = await self._send_chunk(backers, templates)
+            cursor_id = backers[-1]['id']
+            await asyncio.to_thread(
+                self._save_progress, job['id'], cursor_id, len(backers) - len(failed), failed,
+                job['template'], params, name_param, total
+            )
+            total = None  # only written with the first chunk
+
+        await asyncio.to_thread(self._finish, job['id'], 'done')
+        logger.info(f"✅ Fan-out job {job['id']} finished")
+
+    async def _run(self):
+        while True:
+            job = None
+            try:
+                job = await asyncio.to_thread(self._claim)
+                if job:
+                    await self.run_job(job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if job:
+                    logger.error(f"Fan-out job {job['id']} failed (attempt {job['attempts']}/{MAX_ATTEMPTS}): {e}")
+                    try:
+                        await asyncio.to_thread(self._retry_later, job, str(e))
+                    except Exception as retry_error:
+                        # The lease still expires, so the job is resumed either way
+                        logger.error(f"Could not reschedule fan-out job {job['id']}: {retry_error}")
+                else:
+                    logger.error(f"Fan-out worker error: {e}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Start the worker; interrupted jobs resume once their lease expires"""
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._loop = None
+
+    # ------------------------------------------------------------------
+    # Progress
+    # ------------------------------------------------------------------
+
+    def progress(self, job_id: int, user_id: Optional[int] = None) -> Optional[dict]:
+        """Progress of a job (restricted to jobs of the user's own projects when user_id is given)"""
+        query = "SELECT * FROM fanout_jobs WHERE id = ?"
+        params = [job_id]
+        if user_id is not None:
+            # Any wallet the creator owns resolves to their account via wallet_identity
+            query += '''
+                AND project_id IN (
+                    SELECT p.id FROM projects p
+                    JOIN wallet_identity wi ON wi.address = p.creator_wallet
+                    WHERE wi.user_id = ?
+                )
+            '''
+            params.append(user_id)
+        with get_db_connection() as conn:
+            row = conn.execute(query, params).fetchone()
+        job = dict_from_row(row)
+        if not job:
+            return None
+
+        done = job['sent'] + job['failed']
+        rate = None
+        if job['started_at'] and done:
+            end = datetime.fromisoformat(job['finished_at'] or job['updated_at'] or datetime.utcnow().isoformat())
+            elapsed = (end - datetime.fromisoformat(job['started_at'])).total_seconds()
+            rate = round(done / elapsed, 1) if elapsed > 0 else None
+
+        return {
+            "job_id": job['id'],
+            "template": job['template'],
+            "project_id": job['project_id'],
+            "status": job['status'],
+            "total": job['total'],
+            "sent": job['sent'],
+            "failed": job['failed'],
+            "percent": round(100 * done / job['total'], 1) if job['total'] else (100.0 if job['status'] == 'done' else 0.0),
+            "messages_per_second": rate,
+            "started_at": job['started_at'],
+            "finished_at": job['finished_at'],
+            "last_error": job['last_error'],
+        }
+
+
+# Singleton instance
+email_fanout = EmailFanout()
@@ -0,0 +1,284 @@
+"""
+Email Outbox
+============
+Durable, deduplicated delivery for emails triggered by business events.
+
+Handlers insert an ``email_outbox`` row with ``enqueue(cursor, ...)``
+inside the same transaction as the event itself (donation, project
+creation, milestone completion), so an email exists if and only if the
+event was committed. Each row carries a dedupe key; enqueueing the same
+key twice is a no-op.
+
+A worker claims due rows in batches with a lease (so a crashed worker's
+rows are picked up again), renders and sends them through the email
+dispatcher, and reschedules failures with exponential backoff and jitter.
+Rows that keep failing, or cannot be rendered at all, are parked as
+``dead`` for inspection.
+"""
+
+import asyncio
+import json
+import random
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from app.database import get_db_connection
+from app.services.email_service import EmailConfig, EmailTemplates, email_service
+
+logger = logging.getLogger(__name__)
+
+# Templates that may be queued, by name (params are passed as keyword arguments)
+OUTBOX_TEMPLATES = {
+    "welcome": EmailTemplates.welcome_email,
+    "project_created": EmailTemplates.project_created,
+    "donation_received": EmailTemplates.donation_received,
+    "donation_confirmation": EmailTemplates.donation_confirmation,
+    "donation_digest": EmailTemplates.donation_digest,
+    "milestone_completed": EmailTemplates.milestone_completed,
+    "wallet_connected": EmailTemplates.wallet_connected,
+}
+
+BATCH_SIZE = 100
+POLL_INTERVAL = 2.0  # seconds between polls when idle
+LEASE_SECONDS = 300  # a claimed row is retried if not settled within this time
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 30  # seconds, doubled per attempt
+BACKOFF_MAX = 6 * 3600
+SENT_RETENTION_DAYS = 7
+
+
+def backoff_delay(attempts: int) -> float:
+    """Exponential backoff with +/-50% jitter so failed batches don't retry in lockstep"""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.5, 1.5)
+
+
+class EmailOutbox:
+    """Transactional outbox + background delivery worker"""
+
+    def __init__(self, batch_size: int = BATCH_SIZE, max_attempts: int = MAX_ATTEMPTS):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # ------------------------------------------------------------------
+    # Enqueueing (inside the caller's transaction)
+    # ------------------------------------------------------------------
+
+    def enqueue(self, cursor, template: str, to_email: str, params: dict, dedupe_key: str) -> bool:
+        """
+        Queue an email in the caller's transaction.
+        Returns False if a row with the same dedupe key already exists.
+        """
+        if template not in OUTBOX_TEMPLATES:
+            raise ValueError(f"Unknown email template: {template}")
+        if not to_email:
+            return False
+
+        cursor.execute('''
+            INSERT OR IGNORE INTO email_outbox (dedupe_key, template, to_email, params, next_attempt_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (dedupe_key, template, to_email, json.dumps(params), datetime.utcnow().isoformat()))
+        return cursor.rowcount > 0
+
+    def notify(self):
+        """Wake the worker (call after committing); safe from any thread"""
+        if self._loop is None or self._wakeup is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    def _claim(self) -> list:
+        """Atomically lease a batch of due rows"""
+        now = datetime.utcnow()
+        with get_db_connection() as conn:
+            rows = conn.execute('''
+                UPDATE email_outbox
+                SET status = 'sending', attempts = attempts + 1, locked_until = ?
+                WHERE id IN (
+                    SELECT id FROM email_outbox
+                    WHERE (status = 'pending' AND next_attempt_at <= ?)
+                       OR (status = 'sending' AND locked_until <= ?)
+                    ORDER BY next_attempt_at
+                    LIMIT ?
+                )
+                RETURNING id, template, to_email, params, attempts
+            ''', (
+                (now + timedelta(seconds=LEASE_SECONDS)).isoformat(),
+                now.isoformat(), now.isoformat(), self.batch_size
+            )).fetchall()
+            conn.commit()
+        return [dict(row) for row in rows]
+
+    def _settle(self, results: Dict[int, tuple]):
+        """Record outcomes: id -> (row, ok, error, permanent)"""
+        now = datetime.utcnow()
+        sent, retry, dead = [], [], []
+        for row_id, (row, ok, error, permanent) in results.items():
+            if ok:
+                sent.append((now.isoformat(), row_id))
+            elif permanent or row["attempts"] >= self.max_attempts:
+                dead.append((error, row_id))
+            else:
+                next_at = now + timedelta(seconds=backoff_delay(row["attempts"]))
+                retry.append((next_at.isoformat(), error, row_id))
+
+        with get_db_connection() as conn:
+            conn.executemany(
+                "UPDATE email_outbox SET status = 'sent', sent_at = ?, locked_until = NULL, last_error = NULL WHERE id = ?",
+                sent
+            )
+            conn.executemany(
+                "UPDATE email_outbox SET status = 'pending', next_attempt_at = ?, last_error = ?, locked_until = NULL WHERE id = ?",
+                retry
+            )
+            conn.executemany(
+                "UPDATE email_outbox SET status = 'dead', last_error = ?, locked_until = NULL WHERE id = ?",
+                dead
+            )
+            conn.commit()
+
+        if dead:
+            logger.error(f"📭 {len(dead)} outbox emails marked dead (unrenderable or out of attempts)")
+
+    async def _send(self, row: dict) -> tuple:
+        """Render and deliver one row, returning (ok, error, permanent)"""
+        try:
+            email = OUTBOX_TEMPLATES[row["template"]](**json.loads(row["params"] or "{}"))
+        except Exception as e:
+            # A row that cannot render will never succeed: park it as dead without retrying
+            return False, f"render failed: {e}", True
+
+        if not EmailConfig.EMAILS_ENABLED:
+            logger.info(f"Emails disabled. Would have sent to {row['to_email']}: {email.subject}")
+            return True, None, False
+        if not EmailConfig.SMTP_USER or not EmailConfig.SMTP_PASSWORD:
+            return False, "SMTP credentials not configured", False
+
+        dispatcher = email_service.dispatcher
+        if dispatcher is not None:
+            ok = await dispatcher.submit(row["to_email"], email.subject, email.html, email.text)
+        else:
+            ok = await asyncio.to_thread(
+                email_service._send_email, row["to_email"], email.subject, email.html, email.text
+            )
+        return ok, None if ok else "delivery failed", False
+
+    async def process_batch(self) -> int:
+        """Claim, send and settle one batch. Returns the number of rows processed."""
+        rows = await asyncio.to_thread(self._claim)
+        if not rows:
+            return 0
+
+        outcomes = await asyncio.gather(*(self._send(row) for row in rows), return_exceptions=True)
+        results = {}
+        for row, outcome in zip(rows, outcomes):
+            if isinstance(outcome, BaseException):
+                outcome = (False, str(outcome), False)
+            results[row["id"]] = (row, *outcome)
+
+        await asyncio.to_thread(self._settle, results)
+        return len(rows)
+
+    def purge_sent(self, days: int = SENT_RETENTION_DAYS) -> int:
+        """Delete delivered rows older than the retention window"""
+        cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat()
+        with get_db_connection() as conn:
+            cursor = conn.execute(
+                "DELETE FROM email_outbox WHERE status = 'sent' AND sent_at < ?", (cutoff,)
+            )
+            conn.commit()
+            return cursor.rowcount
+
+    async def _run(self):
+        last_purge = None
+        while True:
+            try:
+                processed = await self.process_batch()
+                if last_purge is None or datetime.utcnow() - last_purge > timedelta(hours=1):
+                    await asyncio.to_thread(self.purge_sent)
+                    last_purge = datetime.utcnow()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Email outbox worker error: {e}")
+                processed = 0
+
+            if processed < self.batch_size:
+                # Idle (or partially full batch): wait for a poke or the next poll
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self):
+        """Start the delivery worker (call from app lifespan)"""
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the worker; claimed rows are retried after their lease expires"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._loop = None
+
+    # ------------------------------------------------------------------
+    # Status
+    # ------------------------------------------------------------------
+
+    def status(self) -> dict:
+        """Backlog summary for the status endpoint"""
+        now = datetime.utcnow().isoformat()
+        with get_db_connection() as conn:
+            counts = {
+                row["status"]: row["count"]
+                for row in conn.execute(
+                    "SELECT status, COUNT(*) AS count FROM email_outbox GROUP BY status"
+                )
+            }
+            due = conn.execute(
+                "SELECT COUNT(*), MIN(created_at) FROM email_outbox WHERE status = 'pending' AND next_attempt_at <= ?",
+                (now,)
+            ).fetchone()
+            retrying = conn.execute(
+                "SELECT COUNT(*) FROM email_outbox WHERE status = 'pending' AND attempts > 0"
+            ).fetchone()[0]
+
+        oldest_age = None
+        if due[1]:
+            oldest_age = int((datetime.utcnow() - datetime.fromisoformat(due[1].replace(" ", "T"))).total_seconds())
+
+        dispatcher = email_service.dispatcher
+        return {
+            "pending": counts.get("pending", 0),
+            "due": due[0],
+            "retrying": retrying,
+            "sending": counts.get("sending", 0),
+            "sent": counts.get("sent", 0),
+            "dead": counts.get("dead", 0),
+            "oldest_due_age_seconds": oldest_age,
+            "worker_running": self._task is not None,
+            "dispatcher_queue_depth": dispatcher.queue_depth if dispatcher else 0,
+        }
+
+
+# Singleton instance
+email_outbox = EmailOutbox()
@@ -0,0 +1,294 @@
+"""
+Email Rendering
+===============
+Precompiled email templates and MIME assembly.
+
+Template sources use ``{{slot}}`` markers. Each page is merged into the
+base layout and compiled once into a tuple of static fragments with the
+slots between them; values that never change per message (app URL,
+support address, copyright year) are folded into the fragments at compile
+time. A plain-text twin of every template is derived from the HTML at
+compile time as well, so rendering a message is one join per part.
+
+Slot values are HTML-escaped, except for slots whose name ends in
+``_html``: those take pre-rendered markup (usually a ``Fragment`` from a
+compiled partial, which also carries its own plain-text rendering).
+
+Messages are assembled as multipart/alternative by hand from cached
+header blocks instead of building an ``email.message`` tree per send.
+"""
+
+import base64
+import html
+import re
+import time
+from datetime import datetime
+from email.header import Header
+from email.utils import formataddr
+from functools import lru_cache
+from html.parser import HTMLParser
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+SLOT_PATTERN = re.compile(r"\{\{(\w+)\}\}")
+
+# Cannot occur in a base64 body ("_" and "." are outside its alphabet)
+MIME_BOUNDARY = "=_chainfund.alternative_="
+
+
+class Fragment(str):
+    """Rendered markup that also knows its plain-text rendering"""
+
+    def __new__(cls, markup: str, text: str = ""):
+        fragment = super().__new__(cls, markup)
+        fragment.text = text
+        return fragment
+
+    @classmethod
+    def join(cls, fragments: Iterable["Fragment"]) -> "Fragment":
+        fragments = list(fragments)
+        return cls("".join(fragments), "\n".join(f.text for f in fragments))
+
+
+class RenderedEmail(tuple):
+    """(subject, html) -- unpacks like the old template tuples -- plus ``.text``"""
+
+    def __new__(cls, subject: str, html_content: str, text: str):
+        email = super().__new__(cls, (subject, html_content))
+        email.text = text
+        return email
+
+    @property
+    def subject(self) -> str:
+        return self[0]
+
+    @property
+    def html(self) -> str:
+        return self[1]
+
+
+# ============================================================================
+# HTML -> plain text
+# ============================================================================
+
+class _TextExtractor(HTMLParser):
+    BLOCK_TAGS = {"p", "div", "h1", "h2", "h3", "h4", "table", "ul", "ol"}
+    LINE_TAGS = {"tr", "br", "li"}
+    SKIP_TAGS = {"head", "title", "style", "script"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip = 0
+        self._links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n\n")
+        elif tag in self.LINE_TAGS:
+            self.parts.append("\n- " if tag == "li" else "\n")
+        elif tag == "td":
+            self.parts.append(" ")
+        elif tag == "a":
+            self._links.append((dict(attrs).get("href") or "", len(self.parts)))
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n\n")
+        elif tag == "a" and self._links:
+            href, start = self._links.pop()
+            label = "".join(self.parts[start:]).strip()
+            target = href[len("mailto:"):] if href.startswith("mailto:") else href
+            if target and target != label:
+                self.parts.append(f" ({target})" if label else target)
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(re.sub(r"\s+", " ", data))
+
+    def text(self) -> str:
+        lines = (re.sub(r" {2,}", " ", line).strip() for line in "".join(self.parts).split("\n"))
+        return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip() + "\n"
+
+
+def html_to_text(markup: str) -> str:
+    """Readable plain-text alternative for an HTML email (slot markers pass through)"""
+    parser = _TextExtractor()
+    parser.feed(markup)
+    parser.close()
+    return parser.text()
+
+
+# ============================================================================
+# Compiled templates
+# ============================================================================
+
+def _escape(value) -> str:
+    return html.escape(value if value.__class__ is str else str(value))
+
+
+def _section_text(value) -> str:
+    # Optional sections (table rows, tables) go on their own line in the text part
+    text = getattr(value, "text", None)
+    if text is None:
+        text = html_to_text(str(value)).strip()
+    return "\n" + text if text else ""
+
+
+class CompiledTemplate:
+    """Static fragments with named slots between them; rendering is a single join"""
+
+    __slots__ = ("fragments", "slots", "is_html", "_steps")
+
+    def __init__(self, source: str, is_html: bool = True):
+        parts = SLOT_PATTERN.split(source)
+        self._setup(parts[0::2], parts[1::2], is_html)
+
+    def _setup(self, fragments, slots, is_html: bool):
+        self.fragments = tuple(fragments)
+        self.slots = tuple(slots)
+        self.is_html = is_html
+        # (slot, converter, following fragment), resolved once instead of per render
+        self._steps = tuple(
+            (name, self._converter(name), fragment)
+            for name, fragment in zip(self.slots, self.fragments[1:])
+        )
+
+    def _converter(self, name: str) -> Callable[[object], str]:
+        if name.endswith("_html"):
+            return str if self.is_html else _section_text
+        return _escape if self.is_html else str
+
+    @classmethod
+    def from_marker(cls, rendered: str, marker: str, slot: str, is_html: bool = True) -> "CompiledTemplate":
+        """Compile an already rendered string, turning every occurrence of ``marker`` into ``slot``"""
+        template = cls.__new__(cls)
+        fragments = rendered.split(marker)
+        template._setup(fragments, [slot] * (len(fragments) - 1), is_html)
+        return template
+
+    def bind(self, **values) -> "CompiledTemplate":
+        """Fold the given slot values into the static fragments"""
+        fragments, slots = [self.fragments[0]], []
+        for name, convert, fragment in self._steps:
+            if name in values:
+                fragments[-1] += convert(values[name]) + fragment
+            else:
+                slots.append(name)
+                fragments.append(fragment)
+        template = self.__class__.__new__(self.__class__)
+        template._setup(fragments, slots, self.is_html)
+        return template
+
+    def render(self, values: Dict[str, object]) -> str:
+        out = [self.fragments[0]]
+        append = out.append
+        for name, convert, fragment in self._steps:
+            append(convert(values[name]))
+            append(fragment)
+        return "".join(out)
+
+
+class TemplateEngine:
+    """
+    Compiles page templates (wrapped in the base layout) and partials once,
+    recompiling only when the compile-time constants expire (the year rolls over).
+    """
+
+    CONTENT_SLOT = "{{content_html}}"
+
+    def __init__(self, base: str, pages: Dict[str, str], partials: Dict[str, str],
+                 constants: Callable[[], Dict[str, str]]):
+        self.base_source = base
+        self.page_sources = pages
+        self.partial_sources = partials
+        self.constants = constants
+        self._pages: Dict[str, Tuple[CompiledTemplate, CompiledTemplate]] = {}
+        self._partials: Dict[str, Tuple[CompiledTemplate, CompiledTemplate]] = {}
+        self._base: Optional[Tuple[CompiledTemplate, CompiledTemplate]] = None
+        self._expires_at = 0.0
+        self.compile()
+
+    @staticmethod
+    def _compile_pair(source: str, constants: dict) -> Tuple[CompiledTemplate, CompiledTemplate]:
+        return (
+            CompiledTemplate(source).bind(**constants),
+            CompiledTemplate(html_to_text(source), is_html=False).bind(**constants),
+        )
+
+    def compile(self):
+        constants = self.constants()
+        self._base = self._compile_pair(self.base_source, constants)
+        self._pages = {
+            name: self._compile_pair(self.base_source.replace(self.CONTENT_SLOT, source), constants)
+            for name, source in self.page_sources.items()
+        }
+        self._partials = {
+            name: self._compile_pair(source, constants)
+            for name, source in self.partial_sources.items()
+        }
+        self._expires_at = datetime(datetime.now().year + 1, 1, 1).timestamp()
+
+    def _fresh(self):
+        if time.time() >= self._expires_at:
+            self.compile()
+
+    def render(self, name: str, subject: str, /, **values) -> RenderedEmail:
+        """Render a page; the subject doubles as the document title"""
+        self._fresh()
+        html_template, text_template = self._pages[name]
+        values["title"] = subject
+        return RenderedEmail(subject, html_template.render(values), text_template.render(values))
+
+    def partial(self, name: str, /, **values) -> Fragment:
+        self._fresh()
+        html_template, text_template = self._partials[name]
+        return Fragment(html_template.render(values), text_template.render(values).strip())
+
+    def wrap(self, content: str, title: str) -> str:
+        """Wrap arbitrary markup in the base layout"""
+        self._fresh()
+        return self._base[0].render({"content_html": content, "title": title})
+
+
+# ============================================================================
+# MIME assembly
+# ============================================================================
+
+@lru_cache(maxsize=4096)
+def encode_header(value: str) -> str:
+    """RFC 2047-encode a header value unless it is plain ASCII on one line"""
+    if value.isascii() and "\r" not in value and "\n" not in value:
+        return value
+    return Header(value, "utf-8").encode()
+
+
+def _encode_body(content: str) -> str:
+    return base64.encodebytes(content.encode("utf-8")).decode("ascii")
+
+
+class MimeBuilder:
+    """Assembles multipart/alternative messages from cached header blocks"""
+
+    def __init__(self, sender_name: str, sender_email: str):
+        self.sender_name = sender_name
+        self.sender_email = sender_email
+        self._head = (
+            f'Content-Type: multipart/alternative; boundary="{MIME_BOUNDARY}"\n'
+            f"MIME-Version: 1.0\n"
+            f"From: {formataddr((sender_name, sender_email))}\n"
+        )
+        part = 'Content-Type: text/{}; charset="utf-8"\nMIME-Version: 1.0\nContent-Transfer-Encoding: base64\n\n'
+        self._text_part = f"\n--{MIME_BOUNDARY}\n" + part.format("plain")
+        self._html_part = f"\n--{MIME_BOUNDARY}\n" + part.format("html")
+        self._end = f"--{MIME_BOUNDARY}--\n"
+
+    def build(self, to_email: str, subject: str, html_content: str, plain_text: Optional[str] = None) -> str:
+        out = [self._head, "Subject: ", encode_header(subject), "\nTo: ", encode_header(to_email), "\n"]
+        if plain_text:
+            out += [self._text_part, _encode_body(plain_text)]
+        out += [self._html_part, _encode_body(html_content), self._end]
+        return "".join(out)
@@ -10,12 +10,13 @@ Features:
 - Donation receipts
 - Milestone updates
 - Security alerts
+
+Templates are compiled once at import (see email_render.py); every
+message carries an HTML and a generated plain-text part.
 """
 
 import smtplib
 import ssl
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
 from typing import Optional, List, Dict, Any
@@ -24,6 +25,8 @@ import os
 from pathlib import Path
 import logging
 
+from app.services.email_render import TemplateEngine, RenderedEmail, Fragment, MimeBuilder
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -50,21 +53,34 @@ class EmailConfig:
     
     # Email Templates Toggle
     EMAILS_ENABLED = os.getenv("EMAILS_ENABLED", "true").lower() == "true"
+    
+    # Dispatcher (pooled connections + async queue, see email_dispatcher.py)
+    WORKERS = int(os.getenv("EMAIL_WORKERS", "4"))
+    POOL_SIZE = int(os.getenv("EMAIL_POOL_SIZE", "2"))
+    QUEUE_SIZE = int(os.getenv("EMAIL_QUEUE_SIZE", "10000"))
+    RATE_LIMIT = float(os.getenv("EMAIL_RATE_LIMIT", "0"))  # msgs/sec through the relay, 0 = unlimited
+    PROVIDER_RATE_LIMITS = os.getenv("EMAIL_PROVIDER_RATE_LIMITS", "")  # e.g. "gmail.com=10,outlook.com=5"
+    MAX_PER_CONNECTION = int(os.getenv("EMAIL_MAX_PER_CONNECTION", "100"))
+    
+    # Fan-out (one email to every backer of a project, see email_fanout.py)
+    FANOUT_CHUNK_SIZE = int(os.getenv("EMAIL_FANOUT_CHUNK_SIZE", "500"))
+    FANOUT_BCC_BATCH = int(os.getenv("EMAIL_FANOUT_BCC_BATCH", "0"))  # >0 = Bcc batches, not personalized
+    IDLE_CHECK_SECONDS = float(os.getenv("EMAIL_IDLE_CHECK_SECONDS", "30"))
 
 
-class EmailTemplates:
-    """HTML email templates for various notifications"""
-    
-    @staticmethod
-    def base_template(content: str, title: str = "StellarForge Notification") -> str:
-        """Base HTML template with dark theme matching the app"""
-        return f"""
+# ============================================================================
+# TEMPLATE SOURCES
+# Compiled once by the template engine (see email_render.py). {{slot}} values
+# are HTML-escaped unless the slot name ends in _html.
+# ============================================================================
+
+BASE_TEMPLATE = """
 <!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{title}</title>
+    <title>{{title}}</title>
 </head>
 <body style="margin: 0; padding: 0; font-family: 'Helvetica Neue', Helvetica, Arial, sans-serif; background-color: #0a0a0a; color: #ffffff;">
     <table role="presentation" width="100%" cellspacing="0" cellpadding="0" style="background-color: #0a0a0a;">
@@ -82,24 +98,24 @@ class EmailTemplates:
                             </p>
                         </td>
                     </tr>
-                    
+
                     <!-- Content -->
                     <tr>
                         <td style="padding: 40px 32px;">
-                            {content}
+                            {{content_html}}
                         </td>
                     </tr>
-                    
+
                     <!-- Footer -->
                     <tr>
                         <td style="padding: 24px 32px; text-align: center; border-top: 1px solid rgba(255,255,255,0.1); background-color: rgba(0,0,0,0.3); border-radius: 0 0 16px 16px;">
                             <p style="margin: 0 0 8px 0; font-size: 12px; color: #666666;">
-                                © {datetime.now().year} StellarForge. Built on Stellar Network.
+                                © {{year}} StellarForge. Built on Stellar Network.
                             </p>
                             <p style="margin: 0; font-size: 12px; color: #666666;">
-                                <a href="{EmailConfig.APP_URL}" style="color: #888888; text-decoration: none;">Website</a> · 
-                                <a href="{EmailConfig.APP_URL}/about" style="color: #888888; text-decoration: none;">About</a> · 
-                                <a href="mailto:{EmailConfig.SUPPORT_EMAIL}" style="color: #888888; text-decoration: none;">Support</a>
+                                <a href="{{app_url}}" style="color: #888888; text-decoration: none;">Website</a> ·
+                                <a href="{{app_url}}/about" style="color: #888888; text-decoration: none;">About</a> ·
+                                <a href="mailto:{{support_email}}" style="color: #888888; text-decoration: none;">Support</a>
                             </p>
                         </td>
                     </tr>
@@ -111,23 +127,19 @@ class EmailTemplates:
 </html>
 """
 
-    @staticmethod
-    def welcome_email(user_name: str, user_email: str) -> tuple:
-        """Welcome email for new registrations"""
-        subject = f"🎉 Welcome to StellarForge, {user_name}!"
-        
-        content = f"""
+PAGE_TEMPLATES = {
+    "welcome": """
             <h2 style="margin: 0 0 16px 0; font-size: 28px; font-weight: 300; color: #ffffff;">
                 Welcome to the Future of Funding!
             </h2>
             <p style="margin: 0 0 24px 0; font-size: 16px; color: #cccccc; line-height: 1.6;">
-                Hi {user_name},
+                Hi {{user_name}},
             </p>
             <p style="margin: 0 0 24px 0; font-size: 16px; color: #cccccc; line-height: 1.6;">
-                You've successfully joined StellarForge ChainFund – the decentralized crowdfunding platform 
+                You've successfully joined StellarForge ChainFund – the decentralized crowdfunding platform
                 built on the Stellar blockchain. Here's what you can do:
             </p>
-            
+
             <table role="presentation" width="100%" cellspacing="0" cellpadding="0" style="margin: 24px 0;">
                 <tr>
                     <td style="padding: 16px; background-color: rgba(255,255,255,0.05); border-radius: 12px; margin-bottom: 12px;">
@@ -156,100 +168,84 @@ class EmailTemplates:
                     </td>
                 </tr>
             </table>
-            
+
             <p style="margin: 24px 0; text-align: center;">
-                <a href="{EmailConfig.APP_URL}/dashboard" 
-                   style="display: inline-block; padding: 14px 32px; background-color: #ffffff; color: #000000; 
+                <a href="{{app_url}}/dashboard"
+                   style="display: inline-block; padding: 14px 32px; background-color: #ffffff; color: #000000;
                           text-decoration: none; border-radius: 12px; font-weight: 600; font-size: 16px;">
                     Go to Dashboard →
                 </a>
             </p>
-            
+
             <p style="margin: 24px 0 0 0; font-size: 14px; color: #666666; text-align: center;">
-                Connected as: {user_email}
+                Connected as: {{user_email}}
             </p>
-        """
-        
-        return subject, EmailTemplates.base_template(content, subject)
+        """,
 
-    @staticmethod
-    def login_notification(user_name: str, ip_address: str = "Unknown", device: str = "Unknown") -> tuple:
-        """Login notification email"""
-        subject = "🔐 New Login to Your StellarForge Account"
-        
-        login_time = datetime.now().strftime("%B %d, %Y at %I:%M %p UTC")
-        
-        content = f"""
+    "login_notification": """
             <h2 style="margin: 0 0 16px 0; font-size: 24px; font-weight: 300; color: #ffffff;">
                 New Sign-In Detected
             </h2>
             <p style="margin: 0 0 24px 0; font-size: 16px; color: #cccccc; line-height: 1.6;">
-                Hi {user_name},
+                Hi {{user_name}},
             </p>
             <p style="margin: 0 0 24px 0; font-size: 16px; color: #cccccc; line-height: 1.6;">
                 We noticed a new sign-in to your StellarForge account. Here are the details:
             </p>
-            
-            <table role="presentation" width="100%" cellspacing="0" cellpadding="0" 
+
+            <table role="presentation" width="100%" cellspacing="0" cellpadding="0"
                    style="background-color: rgba(255,255,255,0.05); border-radius: 12px; padding: 20px; margin: 24px 0;">
                 <tr>
                     <td style="padding: 8px 16px; color: #888888;">Time:</td>
-                    <td style="padding: 8px 16px; color: #ffffff; text-align: right;">{login_time}</td>
+                    <td style="padding: 8px 16px; color: #ffffff; text-align: right;">{{login_time}}</td>
                 </tr>
                 <tr>
                     <td style="padding: 8px 16px; color: #888888;">IP Address:</td>
-                    <td style="padding: 8px 16px; color: #ffffff; text-align: right;">{ip_address}</td>
+                    <td style="padding: 8px 16px; color: #ffffff; text-align: right;">{{ip_address}}</td>
                 </tr>
                 <tr>
                     <td style="padding: 8px 16px; color: #888888;">Device:</td>
-                    <td style="padding: 8px 16px; color: #ffffff; text-align: right;">{device}</td>
+                    <td style="padding: 8px 16px; color: #ffffff; text-align: right;">{{device}}</td>
                 </tr>
             </table>
-            
-            <div style="padding: 16px; background-color: rgba(255, 193, 7, 0.1); border: 1px solid rgba(255, 193, 7, 0.3); 
+
+            <div style="padding: 16px; background-color: rgba(255, 193, 7, 0.1); border: 1px solid rgba(255, 193, 7, 0.3);
                         border-radius: 12px; margin: 24px 0;">
                 <p style="margin: 0; font-size: 14px; color: #ffc107;">
-                    ⚠️ <strong>Wasn't you?</strong> If you didn't sign in, please secure your account immediately 
+                    ⚠️ <strong>Wasn't you?</strong> If you didn't sign in, please secure your account immediately
                     by changing your password and contacting support.
                 </p>
             </div>
-            
+
             <p style="margin: 24px 0; text-align: center;">
-                <a href="{EmailConfig.APP_URL}/profile" 
-                   style="display: inline-block; padding: 12px 28px; background-color: transparent; color: #ffffff; 
+                <a href="{{app_url}}/profile"
+                   style="display: inline-block; padding: 12px 28px; background-color: transparent; color: #ffffff;
                           text-decoration: none; border-radius: 12px; font-weight: 500; border: 1px solid rgba(255,255,255,0.3);">
                     Review Account Settings
                 </a>
             </p>
-        """
-        
-        return subject, EmailTemplates.base_template(content, subject)
+        """,
 
-    @staticmethod
-    def project_created(user_name: str, project_title: str, project_slug: str, goal: float) -> tuple:
-        """Project creation confirmation email"""
-        subject = f"🚀 Your Project '{project_title}' is Live!"
-        
-        content = f"""
+    "project_created": """
             <h2 style="margin: 0 0 16px 0; font-size: 24px; font-weight: 300; color: #ffffff;">
                 Your Project is Now Live!
             </h2>
             <p style="margin: 0 0 24px 0; font-size: 16px; color: #cccccc; line-height: 1.6;">
-                Congratulations {user_name}! 🎉
+                Congratulations {{user_name}}! 🎉
             </p>
             <p style="margin: 0 0 24px 0; font-size: 16px; color: #cccccc; line-height: 1.6;">
                 Your project has been successfully created and is now visible to the community.
             </p>
-            
+
             <div style="background-color: rgba(255,255,255,0.05); border-radius: 16px; padding: 24px; margin: 24px 0;">
                 <h3 style="margin: 0 0 16px 0; font-size: 20px; font-weight: 500; color: #ffffff;">
-                    {project_title}
+                    {{project_title}}
                 </h3>
                 <table role="presentation" width="100%" cellspacing="0" cellpadding="0">
                     <tr>
                         <td style="padding: 8px 0; color: #888888;">Funding Goal:</td>
                         <td style="padding: 8px 0; color: #49E4A4; text-align: right; font-weight: 600;">
-                            ${goal:,.2f} USD
+                            ${{goal}} USD
                         </td>
                     </tr>
                     <tr>
@@ -260,7 +256,7 @@ class EmailTemplates:
                     </tr>
                 </table>
             </div>
-            
+
             <p style="margin: 0 0 16px 0; font-size: 16px; color: #cccccc; line-height: 1.6;">
                 <strong>Next Steps:</strong>
             </p>
@@ -269,284 +265,447 @@ class EmailTemplates:
                 <li>Update milestones as you make progress</li>
                 <li>Engage with your backers through project updates</li>
             </ul>
-            
+
             <p style="margin: 24px 0; text-align: center;">
-                <a href="{EmailConfig.APP_URL}/project/{project_slug}" 
-                   style="display: inline-block; padding: 14px 32px; background-color: #5B6FED; color: #ffffff; 
+                <a href="{{app_url}}/project/{{project_slug}}"
+                   style="display: inline-block; padding: 14px 32px; background-color: #5B6FED; color: #ffffff;
                           text-decoration: none; border-radius: 12px; font-weight: 600; font-size: 16px;">
                     View Your Project →
                 </a>
             </p>
-        """
-        
-        return subject, EmailTemplates.base_template(content, subject)
+        """,
 
-    @staticmethod
-    def donation_received(project_title: str, donor_name: str, amount: float, currency: str = "XLM", 
-                         tx_hash: str = None) -> tuple:
-        """Donation received notification for project creators"""
-        subject = f"💰 New Donation: ${amount:.2f} for {project_title}"
-        
-        content = f"""
+    "donation_received": """
             <h2 style="margin: 0 0 16px 0; font-size: 24px; font-weight: 300; color: #ffffff;">
                 You've Received a Donation!
             </h2>
             <p style="margin: 0 0 24px 0; font-size: 16px; color: #cccccc; line-height: 1.6;">
                 Great news! Your project has received a new contribution.
             </p>
-            
-            <div style="background: linear-gradient(135deg, rgba(73, 228, 164, 0.1), rgba(91, 111, 237, 0.1)); 
+
+            <div style="background: linear-gradient(135deg, rgba(73, 228, 164, 0.1), rgba(91, 111, 237, 0.1));
                         border-radius: 16px; padding: 32px; margin: 24px 0; text-align: center;">
                 <p style="margin: 0 0 8px 0; font-size: 48px; font-weight: 700; color: #49E4A4;">
-                    ${amount:.2f}
+                    ${{amount_usd}}
                 </p>
                 <p style="margin: 0; font-size: 14px; color: #888888;">
-                    ≈ {amount} {currency}
+                    ≈ {{amount}} {{currency}}
                 </p>
             </div>
-            
-            <table role="presentation" width="100%" cellspacing="0" cellpadding="0" 
+
+            <table role="presentation" width="100%" cellspacing="0" cellpadding="0"
                    style="background-color: rgba(255,255,255,0.05); border-radius: 12px; margin: 24px 0;">
                 <tr>
                     <td style="padding: 16px; color: #888888;">Project:</td>
-                    <td style="padding: 16px; color: #ffffff; text-align: right;">{project_title}</td>
+                    <td style="padding: 16px; color: #ffffff; text-align: right;">{{project_title}}</td>
                 </tr>
                 <tr>
                     <td style="padding: 16px; color: #888888; border-top: 1px solid rgba(255,255,255,0.1);">Donor:</td>
                     <td style="padding: 16px; color: #ffffff; text-align: right; border-top: 1px solid rgba(255,255,255,0.1);">
-                        {donor_name}
+                        {{donor_name}}
                     </td>
                 </tr>
-                {f'''<tr>
-                    <td style="padding: 16px; color: #888888; border-top: 1px solid rgba(255,255,255,0.1);">Transaction:</td>
-                    <td style="padding: 16px; color: #5B6FED; text-align: right; border-top: 1px solid rgba(255,255,255,0.1);">
-                        <a href="https://stellar.expert/explorer/testnet/tx/{tx_hash}" style="color: #5B6FED; text-decoration: none;">
-                            {tx_hash[:12]}...
-                        </a>
-                    </td>
-                </tr>''' if tx_hash else ''}
+                {{tx_row_html}}
             </table>
-            
+
             <p style="margin: 24px 0; text-align: center;">
-                <a href="{EmailConfig.APP_URL}/dashboard" 
-                   style="display: inline-block; padding: 14px 32px; background-color: #ffffff; color: #000000; 
+                <a href="{{app_url}}/dashboard"
+                   style="display: inline-block; padding: 14px 32px; background-color: #ffffff; color: #000000;
                           text-decoration: none; border-radius: 12px; font-weight: 600; font-size: 16px;">
                     View Dashboard →
                 </a>
             </p>
-        """
-        
-        return subject, EmailTemplates.base_template(content, subject)
+        """,
 
-    @staticmethod
-    def donation_confirmation(donor_name: str, project_title: str, amount: float, currency: str = "XLM",
-                             tx_hash: str = None) -> tuple:
-        """Donation confirmation email for donors"""
-        subject = f"🎁 Thank You for Supporting {project_title}!"
-        
-        content = f"""
+    "donation_digest": """
+            <h2 style="margin: 0 0 16px 0; font-size: 24px; font-weight: 300; color: #ffffff;">
+                Your {{period_title}} Donation Digest
+            </h2>
+            <p style="margin: 0 0 24px 0; font-size: 16px; color: #cccccc; line-height: 1.6;">
+                Hi {{user_name}}, here's what your projects received in the last {{window}}.
+            </p>
+
+            <div style="background: linear-gradient(135deg, rgba(73, 228, 164, 0.1), rgba(91, 111, 237, 0.1));
+                        border-radius: 16px; padding: 32px; margin: 24px 0; text-align: center;">
+                <p style="margin: 0 0 8px 0; font-size: 36px; font-weight: 700; color: #49E4A4;">
+                    {{totals}}
+                </p>
+                <p style="margin: 0; font-size: 14px; color: #888888;">
+                    from {{donation_count}} {{donations_noun}}
+                </p>
+            </div>
+
+            <table role="presentation" width="100%" cellspacing="0" cellpadding="0"
+                   style="background-color: rgba(255,255,255,0.05); border-radius: 12px; margin: 24px 0;">
+                <tr>
+                    <td colspan="2" style="padding: 16px; color: #888888;">Top donors</td>
+                </tr>{{donor_rows_html}}
+            </table>
+
+            {{projects_table_html}}
+
+            <p style="margin: 24px 0; text-align: center;">
+                <a href="{{app_url}}/dashboard"
+                   style="display: inline-block; padding: 14px 32px; background-color: #ffffff; color: #000000;
+                          text-decoration: none; border-radius: 12px; font-weight: 600; font-size: 16px;">
+                    View Dashboard →
+                </a>
+            </p>
+            <p style="margin: 0; font-size: 12px; color: #666666; text-align: center;">
+                Prefer an email per donation? Change your notification settings in the dashboard.
+            </p>
+        """,
+
+    "donation_confirmation": """
             <h2 style="margin: 0 0 16px 0; font-size: 24px; font-weight: 300; color: #ffffff;">
                 Thank You for Your Donation!
             </h2>
             <p style="margin: 0 0 24px 0; font-size: 16px; color: #cccccc; line-height: 1.6;">
-                Hi {donor_name},
+                Hi {{donor_name}},
             </p>
             <p style="margin: 0 0 24px 0; font-size: 16px; color: #cccccc; line-height: 1.6;">
-                Your generous contribution helps bring innovative blockchain projects to life. 
+                Your generous contribution helps bring innovative blockchain projects to life.
                 Here's your donation receipt:
             </p>
-            
+
             <div style="background-color: rgba(255,255,255,0.05); border-radius: 16px; padding: 24px; margin: 24px 0;">
                 <table role="presentation" width="100%" cellspacing="0" cellpadding="0">
                     <tr>
                         <td style="padding: 12px 0; color: #888888;">Project:</td>
                         <td style="padding: 12px 0; color: #ffffff; text-align: right; font-weight: 500;">
-                            {project_title}
+                            {{project_title}}
                         </td>
                     </tr>
                     <tr>
                         <td style="padding: 12px 0; color: #888888; border-top: 1px solid rgba(255,255,255,0.1);">Amount:</td>
                         <td style="padding: 12px 0; color: #49E4A4; text-align: right; font-weight: 600; font-size: 18px; border-top: 1px solid rgba(255,255,255,0.1);">
-                            ${amount:.2f} ({currency})
+                            ${{amount_usd}} ({{currency}})
                         </td>
                     </tr>
                     <tr>
                         <td style="padding: 12px 0; color: #888888; border-top: 1px solid rgba(255,255,255,0.1);">Date:</td>
                         <td style="padding: 12px 0; color: #ffffff; text-align: right; border-top: 1px solid rgba(255,255,255,0.1);">
-                            {datetime.now().strftime("%B %d, %Y")}
+                            {{date}}
                         </td>
                     </tr>
-                    {f'''<tr>
-                        <td style="padding: 12px 0; color: #888888; border-top: 1px solid rgba(255,255,255,0.1);">Transaction ID:</td>
-                        <td style="padding: 12px 0; color: #5B6FED; text-align: right; border-top: 1px solid rgba(255,255,255,0.1);">
-                            <a href="https://stellar.expert/explorer/testnet/tx/{tx_hash}" style="color: #5B6FED; text-decoration: none;">
-                                View on Explorer ↗
-                            </a>
-                        </td>
-                    </tr>''' if tx_hash else ''}
+                    {{tx_row_html}}
                 </table>
             </div>
-            
+
             <p style="margin: 0 0 24px 0; font-size: 14px; color: #888888; line-height: 1.6;">
-                Your funds are held in our smart contract escrow and will be released to the project 
+                Your funds are held in our smart contract escrow and will be released to the project
                 as milestones are completed and approved by the community.
             </p>
-            
+
             <p style="margin: 24px 0; text-align: center;">
-                <a href="{EmailConfig.APP_URL}/profile" 
-                   style="display: inline-block; padding: 14px 32px; background-color: #5B6FED; color: #ffffff; 
+                <a href="{{app_url}}/profile"
+                   style="display: inline-block; padding: 14px 32px; background-color: #5B6FED; color: #ffffff;
                           text-decoration: none; border-radius: 12px; font-weight: 600; font-size: 16px;">
                     View Your Donations →
                 </a>
             </p>
-        """
-        
-        return subject, EmailTemplates.base_template(content, subject)
+        """,
 
-    @staticmethod
-    def milestone_completed(user_name: str, project_title: str, milestone_title: str, 
-                           milestone_number: int) -> tuple:
-        """Milestone completion notification"""
-        subject = f"🎯 Milestone Completed: {milestone_title}"
-        
-        content = f"""
+    "milestone_completed": """
             <h2 style="margin: 0 0 16px 0; font-size: 24px; font-weight: 300; color: #ffffff;">
                 Milestone Achieved!
             </h2>
             <p style="margin: 0 0 24px 0; font-size: 16px; color: #cccccc; line-height: 1.6;">
-                Hi {user_name},
+                Hi {{user_name}},
             </p>
             <p style="margin: 0 0 24px 0; font-size: 16px; color: #cccccc; line-height: 1.6;">
                 Great news! A project you're supporting has completed a milestone:
             </p>
-            
-            <div style="background: linear-gradient(135deg, rgba(73, 228, 164, 0.1), rgba(91, 111, 237, 0.1)); 
+
+            <div style="background: linear-gradient(135deg, rgba(73, 228, 164, 0.1), rgba(91, 111, 237, 0.1));
                         border-radius: 16px; padding: 24px; margin: 24px 0;">
                 <div style="display: flex; align-items: center; margin-bottom: 16px;">
-                    <span style="background-color: #49E4A4; color: #000000; padding: 4px 12px; border-radius: 20px; 
+                    <span style="background-color: #49E4A4; color: #000000; padding: 4px 12px; border-radius: 20px;
                                  font-size: 12px; font-weight: 600;">
-                        MILESTONE {milestone_number}
+                        MILESTONE {{milestone_number}}
                     </span>
                 </div>
                 <h3 style="margin: 0 0 8px 0; font-size: 20px; font-weight: 500; color: #ffffff;">
-                    {milestone_title}
+                    {{milestone_title}}
                 </h3>
                 <p style="margin: 0; font-size: 14px; color: #888888;">
-                    Project: {project_title}
+                    Project: {{project_title}}
                 </p>
             </div>
-            
+
             <p style="margin: 0 0 24px 0; font-size: 16px; color: #cccccc; line-height: 1.6;">
-                You can now vote on whether to approve this milestone and release the associated funds 
+                You can now vote on whether to approve this milestone and release the associated funds
                 to the project creators.
             </p>
-            
+
             <p style="margin: 24px 0; text-align: center;">
-                <a href="{EmailConfig.APP_URL}/governance" 
-                   style="display: inline-block; padding: 14px 32px; background-color: #ffffff; color: #000000; 
+                <a href="{{app_url}}/governance"
+                   style="display: inline-block; padding: 14px 32px; background-color: #ffffff; color: #000000;
                           text-decoration: none; border-radius: 12px; font-weight: 600; font-size: 16px;">
                     Vote Now →
                 </a>
             </p>
-        """
-        
-        return subject, EmailTemplates.base_template(content, subject)
+        """,
 
-    @staticmethod
-    def password_reset(user_name: str, reset_token: str) -> tuple:
-        """Password reset email"""
-        subject = "🔑 Reset Your StellarForge Password"
-        reset_link = f"{EmailConfig.APP_URL}/reset-password?token={reset_token}"
-        
-        content = f"""
+    "password_reset": """
             <h2 style="margin: 0 0 16px 0; font-size: 24px; font-weight: 300; color: #ffffff;">
                 Password Reset Request
             </h2>
             <p style="margin: 0 0 24px 0; font-size: 16px; color: #cccccc; line-height: 1.6;">
-                Hi {user_name},
+                Hi {{user_name}},
             </p>
             <p style="margin: 0 0 24px 0; font-size: 16px; color: #cccccc; line-height: 1.6;">
                 We received a request to reset your password. Click the button below to create a new password:
             </p>
-            
+
             <p style="margin: 32px 0; text-align: center;">
-                <a href="{reset_link}" 
-                   style="display: inline-block; padding: 16px 40px; background-color: #ffffff; color: #000000; 
+                <a href="{{reset_link}}"
+                   style="display: inline-block; padding: 16px 40px; background-color: #ffffff; color: #000000;
                           text-decoration: none; border-radius: 12px; font-weight: 600; font-size: 16px;">
                     Reset Password
                 </a>
             </p>
-            
+
             <p style="margin: 0 0 16px 0; font-size: 14px; color: #888888; line-height: 1.6;">
                 This link will expire in 1 hour for security reasons.
             </p>
-            
-            <div style="padding: 16px; background-color: rgba(255, 193, 7, 0.1); border: 1px solid rgba(255, 193, 7, 0.3); 
+
+            <div style="padding: 16px; background-color: rgba(255, 193, 7, 0.1); border: 1px solid rgba(255, 193, 7, 0.3);
                         border-radius: 12px; margin: 24px 0;">
                 <p style="margin: 0; font-size: 14px; color: #ffc107;">
-                    ⚠️ If you didn't request this password reset, please ignore this email. 
+                    ⚠️ If you didn't request this password reset, please ignore this email.
                     Your password will remain unchanged.
                 </p>
             </div>
-            
+
             <p style="margin: 24px 0 0 0; font-size: 12px; color: #666666;">
                 If the button doesn't work, copy and paste this link into your browser:<br>
-                <span style="color: #5B6FED; word-break: break-all;">{reset_link}</span>
+                <span style="color: #5B6FED; word-break: break-all;">{{reset_link}}</span>
             </p>
-        """
-        
-        return subject, EmailTemplates.base_template(content, subject)
+        """,
 
-    @staticmethod
-    def wallet_connected(user_name: str, wallet_address: str, chain: str = "Stellar") -> tuple:
-        """Wallet connection notification"""
-        subject = "🔗 New Wallet Connected to Your Account"
-        
-        short_address = f"{wallet_address[:8]}...{wallet_address[-8:]}" if len(wallet_address) > 16 else wallet_address
-        
-        content = f"""
+    "wallet_connected": """
             <h2 style="margin: 0 0 16px 0; font-size: 24px; font-weight: 300; color: #ffffff;">
                 Wallet Connected Successfully
             </h2>
             <p style="margin: 0 0 24px 0; font-size: 16px; color: #cccccc; line-height: 1.6;">
-                Hi {user_name},
+                Hi {{user_name}},
             </p>
             <p style="margin: 0 0 24px 0; font-size: 16px; color: #cccccc; line-height: 1.6;">
                 A new wallet has been connected to your StellarForge account:
             </p>
-            
-            <div style="background-color: rgba(73, 228, 164, 0.1); border: 1px solid rgba(73, 228, 164, 0.3); 
+
+            <div style="background-color: rgba(73, 228, 164, 0.1); border: 1px solid rgba(73, 228, 164, 0.3);
                         border-radius: 12px; padding: 20px; margin: 24px 0;">
                 <table role="presentation" width="100%" cellspacing="0" cellpadding="0">
                     <tr>
                         <td style="padding: 8px 0; color: #888888;">Chain:</td>
                         <td style="padding: 8px 0; color: #ffffff; text-align: right; font-weight: 500;">
-                            {chain}
+                            {{chain}}
                         </td>
                     </tr>
                     <tr>
                         <td style="padding: 8px 0; color: #888888;">Address:</td>
                         <td style="padding: 8px 0; color: #49E4A4; text-align: right; font-family: monospace;">
-                            {short_address}
+                            {{short_address}}
                         </td>
                     </tr>
                 </table>
             </div>
-            
+
             <p style="margin: 0 0 24px 0; font-size: 14px; color: #888888; line-height: 1.6;">
                 You can now use this wallet for donations, project creation, and governance voting.
             </p>
-            
-            <div style="padding: 16px; background-color: rgba(255, 193, 7, 0.1); border: 1px solid rgba(255, 193, 7, 0.3); 
+
+            <div style="padding: 16px; background-color: rgba(255, 193, 7, 0.1); border: 1px solid rgba(255, 193, 7, 0.3);
                         border-radius: 12px; margin: 24px 0;">
                 <p style="margin: 0; font-size: 14px; color: #ffc107;">
-                    ⚠️ If you didn't connect this wallet, please remove it from your account immediately 
+                    ⚠️ If you didn't connect this wallet, please remove it from your account immediately
                     and contact support.
                 </p>
             </div>
+        """,
+}
+
+# Optional sections, rendered into *_html slots
+PARTIAL_TEMPLATES = {
+    "donation_tx_row": """<tr>
+                    <td style="padding: 16px; color: #888888; border-top: 1px solid rgba(255,255,255,0.1);">Transaction:</td>
+                    <td style="padding: 16px; color: #5B6FED; text-align: right; border-top: 1px solid rgba(255,255,255,0.1);">
+                        <a href="https://stellar.expert/explorer/testnet/tx/{{tx_hash}}" style="color: #5B6FED; text-decoration: none;">
+                            {{tx_short}}...
+                        </a>
+                    </td>
+                </tr>""",
+
+    "receipt_tx_row": """<tr>
+                        <td style="padding: 12px 0; color: #888888; border-top: 1px solid rgba(255,255,255,0.1);">Transaction ID:</td>
+                        <td style="padding: 12px 0; color: #5B6FED; text-align: right; border-top: 1px solid rgba(255,255,255,0.1);">
+                            <a href="https://stellar.expert/explorer/testnet/tx/{{tx_hash}}" style="color: #5B6FED; text-decoration: none;">
+                                View on Explorer ↗
+                            </a>
+                        </td>
+                    </tr>""",
+
+    "digest_donor_row": """
+                <tr>
+                    <td style="padding: 12px 16px; color: #ffffff; border-top: 1px solid rgba(255,255,255,0.1);">{{name}}</td>
+                    <td style="padding: 12px 16px; color: #49E4A4; text-align: right; border-top: 1px solid rgba(255,255,255,0.1);">
+                        {{amount}} {{currency}}
+                    </td>
+                </tr>""",
+
+    "digest_project_row": """
+                <tr>
+                    <td style="padding: 12px 16px; color: #ffffff; border-top: 1px solid rgba(255,255,255,0.1);">{{title}}</td>
+                    <td style="padding: 12px 16px; color: #888888; text-align: right; border-top: 1px solid rgba(255,255,255,0.1);">
+                        {{count}} · {{amount}}
+                    </td>
+                </tr>""",
+
+    "digest_projects_table": """<table role="presentation" width="100%" cellspacing="0" cellpadding="0"
+                   style="background-color: rgba(255,255,255,0.05); border-radius: 12px; margin: 24px 0;">
+                <tr>
+                    <td colspan="2" style="padding: 16px; color: #888888;">By project</td>
+                </tr>{{rows_html}}
+            </table>""",
+}
+
+
+def _template_constants() -> dict:
+    """Values folded into the templates at compile time"""
+    return {
+        "app_url": EmailConfig.APP_URL,
+        "support_email": EmailConfig.SUPPORT_EMAIL,
+        "year": datetime.now().year,
+    }
+
+
+template_engine = TemplateEngine(BASE_TEMPLATE, PAGE_TEMPLATES, PARTIAL_TEMPLATES, _template_constants)
+
+NO_FRAGMENT = Fragment("", "")
+
+
+class EmailTemplates:
+    """HTML email templates for various notifications (each returns a RenderedEmail)"""
+
+    @staticmethod
+    def base_template(content: str, title: str = "StellarForge Notification") -> str:
+        """Base HTML template with dark theme matching the app"""
+        return template_engine.wrap(content, title)
+
+    @staticmethod
+    def welcome_email(user_name: str, user_email: str) -> RenderedEmail:
+        """Welcome email for new registrations"""
+        subject = f"🎉 Welcome to StellarForge, {user_name}!"
+        return template_engine.render("welcome", subject, user_name=user_name, user_email=user_email)
+
+    @staticmethod
+    def login_notification(user_name: str, ip_address: str = "Unknown", device: str = "Unknown") -> RenderedEmail:
+        """Login notification email"""
+        subject = "🔐 New Login to Your StellarForge Account"
+        return template_engine.render(
+            "login_notification", subject,
+            user_name=user_name, ip_address=ip_address, device=device,
+            login_time=datetime.now().strftime("%B %d, %Y at %I:%M %p UTC"),
+        )
+
+    @staticmethod
+    def project_created(user_name: str, project_title: str, project_slug: str, goal: float) -> RenderedEmail:
+        """Project creation confirmation email"""
+        subject = f"🚀 Your Project '{project_title}' is Live!"
+        return template_engine.render(
+            "project_created", subject,
+            user_name=user_name, project_title=project_title, project_slug=project_slug,
+            goal=f"{goal:,.2f}",
+        )
+
+    @staticmethod
+    def donation_received(project_title: str, donor_name: str, amount: float, currency: str = "XLM",
+                         tx_hash: str = None) -> RenderedEmail:
+        """Donation received notification for project creators"""
+        subject = f"💰 New Donation: ${amount:.2f} for {project_title}"
+        tx_row = template_engine.partial(
+            "donation_tx_row", tx_hash=tx_hash, tx_short=tx_hash[:12]
+        ) if tx_hash else NO_FRAGMENT
+        return template_engine.render(
+            "donation_received", subject,
+            project_title=project_title, donor_name=donor_name, amount=amount, currency=currency,
+            amount_usd=f"{amount:.2f}", tx_row_html=tx_row,
+        )
+
+    @staticmethod
+    def donation_digest(user_name: str, period: str, donation_count: int, totals: list,
+                        top_donors: list, projects: list) -> RenderedEmail:
         """
-        
-        return subject, EmailTemplates.base_template(content, subject)
+        Digest of donations received during an hourly/daily window.
+        totals: [[currency, amount]], top_donors: [[name, amount, currency]],
+        projects: [[title, donation_count, amount]]
+        """
+        window = "hour" if period == "hourly" else "day"
+        noun = "donation" if donation_count == 1 else "donations"
+        subject = f"📬 {donation_count} new {noun} in the last {window}"
+
+        donor_rows = Fragment.join(
+            template_engine.partial("digest_donor_row", name=name, amount=f"{amount:,.2f}", currency=currency)
+            for name, amount, currency in top_donors
+        )
+        projects_table = NO_FRAGMENT
+        if len(projects) > 1:
+            projects_table = template_engine.partial("digest_projects_table", rows_html=Fragment.join(
+                template_engine.partial("digest_project_row", title=title, count=count, amount=f"{amount:,.2f}")
+                for title, count, amount in projects
+            ))
+
+        return template_engine.render(
+            "donation_digest", subject,
+            user_name=user_name, period_title=period.capitalize(), window=window,
+            totals=" + ".join(f"{amount:,.2f} {currency}" for currency, amount in totals),
+            donation_count=donation_count, donations_noun=noun,
+            donor_rows_html=donor_rows, projects_table_html=projects_table,
+        )
+
+    @staticmethod
+    def donation_confirmation(donor_name: str, project_title: str, amount: float, currency: str = "XLM",
+                             tx_hash: str = None) -> RenderedEmail:
+        """Donation confirmation email for donors"""
+        subject = f"🎁 Thank You for Supporting {project_title}!"
+        tx_row = template_engine.partial("receipt_tx_row", tx_hash=tx_hash) if tx_hash else NO_FRAGMENT
+        return template_engine.render(
+            "donation_confirmation", subject,
+            donor_name=donor_name, project_title=project_title, currency=currency,
+            amount_usd=f"{amount:.2f}", date=datetime.now().strftime("%B %d, %Y"), tx_row_html=tx_row,
+        )
+
+    @staticmethod
+    def milestone_completed(user_name: str, project_title: str, milestone_title: str,
+                           milestone_number: int) -> RenderedEmail:
+        """Milestone completion notification"""
+        subject = f"🎯 Milestone Completed: {milestone_title}"
+        return template_engine.render(
+            "milestone_completed", subject,
+            user_name=user_name, project_title=project_title, milestone_title=milestone_title,
+            milestone_number=milestone_number,
+        )
+
+    @staticmethod
+    def password_reset(user_name: str, reset_token: str) -> RenderedEmail:
+        """Password reset email"""
+        subject = "🔑 Reset Your StellarForge Password"
+        return template_engine.render(
+            "password_reset", subject,
+            user_name=user_name, reset_link=f"{EmailConfig.APP_URL}/reset-password?token={reset_token}",
+        )
+
+    @staticmethod
+    def wallet_connected(user_name: str, wallet_address: str, chain: str = "Stellar") -> RenderedEmail:
+        """Wallet connection notification"""
+        subject = "🔗 New Wallet Connected to Your Account"
+        short_address = f"{wallet_address[:8]}...{wallet_address[-8:]}" if len(wallet_address) > 16 else wallet_address
+        return template_engine.render(
+            "wallet_connected", subject, user_name=user_name, chain=chain, short_address=short_address,
+        )
+
 
 
 class EmailService:
@@ -556,6 +715,8 @@ class EmailService:
         self.config = EmailConfig
         self.templates = EmailTemplates
         self._connection = None
+        self._mime = None  # Cached header blocks, rebuilt if the sender changes
+        self.dispatcher = None  # Set by EmailDispatcher.start()
     
     def _get_connection(self):
         """Create SMTP connection"""
@@ -575,9 +736,30 @@ class EmailService:
             logger.error(f"Failed to connect to SMTP server: {e}")
             return None
     
+    def _build_message(self, to_email: str, subject: str, html_content: str,
+                       plain_text: str = None) -> str:
+        """Build the MIME message (multipart/alternative when a plain-text part is given)"""
+        if (self._mime is None or self._mime.sender_name != self.config.SENDER_NAME
+                or self._mime.sender_email != self.config.SENDER_EMAIL):
+            self._mime = MimeBuilder(self.config.SENDER_NAME, self.config.SENDER_EMAIL)
+        return self._mime.build(to_email, subject, html_content, plain_text)
+    
+    def _send_on(self, server: smtplib.SMTP, to_email: str, subject: str,
+                 html_content: str, plain_text: str = None, bcc: List[str] = None):
+        """
+        Send one message over an already open connection (raises on failure).
+        Bcc recipients get the same message without appearing in its headers.
+        """
+        msg = self._build_message(to_email, subject, html_content, plain_text)
+        server.sendmail(self.config.SENDER_EMAIL, [to_email] + (bcc or []), msg)
+    
     def _send_email(self, to_email: str, subject: str, html_content: str, 
                    plain_text: str = None) -> bool:
-        """Send an email"""
+        """
+        Send an email.
+        While the dispatcher is running this only enqueues the message;
+        otherwise (scripts, tests) it is sent inline on a new connection.
+        """
         if not self.config.EMAILS_ENABLED:
             logger.info(f"Emails disabled. Would have sent to {to_email}: {subject}")
             return True
@@ -586,28 +768,13 @@ class EmailService:
             logger.warning("SMTP credentials not configured. Email not sent.")
             return False
         
+        if self.dispatcher is not None:
+            return self.dispatcher.enqueue(to_email, subject, html_content, plain_text)
+        
         try:
-            # Create message
-            msg = MIMEMultipart("alternative")
-            msg["Subject"] = subject
-            msg["From"] = f"{self.config.SENDER_NAME} <{self.config.SENDER_EMAIL}>"
-            msg["To"] = to_email
-            
-            # Add plain text fallback
-            if plain_text:
-                msg.attach(MIMEText(plain_text, "plain"))
-            
-            # Add HTML content
-            msg.attach(MIMEText(html_content, "html"))
-            
-            # Send
             server = self._get_connection()
             if server:
-                server.sendmail(
-                    self.config.SENDER_EMAIL,
-                    to_email,
-                    msg.as_string()
-                )
+                self._send_on(server, to_email, subject, html_content, plain_text)
                 server.quit()
                 logger.info(f"Email sent successfully to {to_email}: {subject}")
                 return True
@@ -625,58 +792,58 @@ class EmailService:
     
     def send_welcome_email(self, user_email: str, user_name: str) -> bool:
         """Send welcome email to new users"""
-        subject, html = self.templates.welcome_email(user_name, user_email)
-        return self._send_email(user_email, subject, html)
+        email = self.templates.welcome_email(user_name, user_email)
+        return self._send_email(user_email, email.subject, email.html, email.text)
     
     def send_login_notification(self, user_email: str, user_name: str, 
                                ip_address: str = "Unknown", device: str = "Unknown") -> bool:
         """Send login notification"""
-        subject, html = self.templates.login_notification(user_name, ip_address, device)
-        return self._send_email(user_email, subject, html)
+        email = self.templates.login_notification(user_name, ip_address, device)
+        return self._send_email(user_email, email.subject, email.html, email.text)
     
     def send_project_created(self, user_email: str, user_name: str, 
                             project_title: str, project_slug: str, goal: float) -> bool:
         """Send project creation confirmation"""
-        subject, html = self.templates.project_created(user_name, project_title, project_slug, goal)
-        return self._send_email(user_email, subject, html)
+        email = self.templates.project_created(user_name, project_title, project_slug, goal)
+        return self._send_email(user_email, email.subject, email.html, email.text)
     
     def send_donation_received(self, creator_email: str, project_title: str, 
                               donor_name: str, amount: float, currency: str = "XLM",
                               tx_hash: str = None) -> bool:
         """Send donation notification to project creator"""
-        subject, html = self.templates.donation_received(
+        email = self.templates.donation_received(
             project_title, donor_name, amount, currency, tx_hash
         )
-        return self._send_email(creator_email, subject, html)
+        return self._send_email(creator_email, email.subject, email.html, email.text)
     
     def send_donation_confirmation(self, donor_email: str, donor_name: str,
                                   project_title: str, amount: float, 
                                   currency: str = "XLM", tx_hash: str = None) -> bool:
         """Send donation receipt to donor"""
-        subject, html = self.templates.donation_confirmation(
+        email = self.templates.donation_confirmation(
             donor_name, project_title, amount, currency, tx_hash
         )
-        return self._send_email(donor_email, subject, html)
+        return self._send_email(donor_email, email.subject, email.html, email.text)
     
     def send_milestone_notification(self, user_email: str, user_name: str,
                                    project_title: str, milestone_title: str,
                                    milestone_number: int) -> bool:
         """Send milestone completion notification"""
-        subject, html = self.templates.milestone_completed(
+        email = self.templates.milestone_completed(
             user_name, project_title, milestone_title, milestone_number
         )
-        return self._send_email(user_email, subject, html)
+        return self._send_email(user_email, email.subject, email.html, email.text)
     
     def send_password_reset(self, user_email: str, user_name: str, reset_token: str) -> bool:
         """Send password reset email"""
-        subject, html = self.templates.password_reset(user_name, reset_token)
-        return self._send_email(user_email, subject, html)
+        email = self.templates.password_reset(user_name, reset_token)
+        return self._send_email(user_email, email.subject, email.html, email.text)
     
     def send_wallet_connected(self, user_email: str, user_name: str,
                              wallet_address: str, chain: str = "Stellar") -> bool:
         """Send wallet connection notification"""
-        subject, html = self.templates.wallet_connected(user_name, wallet_address, chain)
-        return self._send_email(user_email, subject, html)
+        email = self.templates.wallet_connected(user_name, wallet_address, chain)
+        return self._send_email(user_email, email.subject, email.html, email.text)
 
 
 # Singleton instance
@@ -0,0 +1,121 @@
+"""
+Horizon Client
+==============
+Async client for the Horizon REST API (accounts, transactions, ledgers),
+used by the Stellar service instead of the synchronous stellar-sdk
+``Server`` run on the default thread pool.
+
+Requests go through the shared HTTP client (app/utils/http_client.py):
+pooled keep-alive connections, a per-host concurrency limit, timeouts,
+jittered retries and a circuit breaker per host. Reads are retried.
+Transaction submission is retried only after a 504 from Horizon: the
+network identifies a transaction by its hash, so resubmitting the same
+envelope either lands it once or reports it as already applied. Every
+other submission failure surfaces at once. Submissions wait up to
+HORIZON_SUBMIT_TIMEOUT, longer than Horizon's own ~30 s wait for the
+ledger, so its 504 arrives instead of a client-side timeout.
+
+scripts/horizon_stub.py serves a local stand-in.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.utils.http_client import UpstreamError, http_client
+
+try:
+    from stellar_sdk import Account
+    STELLAR_SDK_AVAILABLE = True
+except ImportError:
+    STELLAR_SDK_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MAX_SUBMIT_ATTEMPTS = 3  # 504 (submission timed out) answers before giving up
+
+
+class HorizonError(Exception):
+    """A Horizon error response (problem+json), with its result codes for rejected transactions"""
+
+    def __init__(self, message: str, status: Optional[int] = None, extras: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.status = status
+        self.extras = extras or {}
+
+    @property
+    def result_code(self) -> Optional[str]:
+        """Transaction result code of a rejected submission, e.g. ``tx_bad_seq``"""
+        return (self.extras.get("result_codes") or {}).get("transaction")
+
+
+class HorizonClient:
+    """Typed helpers over the Horizon endpoints the backend uses"""
+
+    def __init__(self, url: str = settings.stellar_horizon_url,
+                 submit_timeout: float = settings.horizon_submit_timeout):
+        self.url = url.rstrip("/")
+        self.submit_timeout = submit_timeout
+
+    async def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        try:
+            response = await http_client.get(f"{self.url}{path}", params=params)
+        except UpstreamError as e:
+            raise HorizonError(str(e), e.status) from e
+        return self._json(response)
+
+    @staticmethod
+    def _json(response) -> Dict[str, Any]:
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        if response.status_code >= 400:
+            raise HorizonError(body.get("detail") or body.get("title") or f"HTTP {response.status_code}",
+                               response.status_code, body.get("extras"))
+        return body
+
+    async def get_account(self, account_id: str) -> Optional[Dict[str, Any]]:
+        """Account record, or None if the account does not exist"""
+        try:
+            return await self._get(f"/accounts/{account_id}")
+        except HorizonError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    async def load_account(self, account_id: str) -> "Account":
+        """Account at its current sequence number, for TransactionBuilder"""
+        record = await self.get_account(account_id)
+        if record is None:
+            raise HorizonError(f"Account {account_id} not found", 404)
+        return Account(record["id"], int(record["sequence"]))
+
+    async def transactions(self, account_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Most recent transactions of an account, newest first"""
+        page = await self._get(f"/accounts/{account_id}/transactions", {"order": "desc", "limit": limit})
+        return page["_embedded"]["records"]
+
+    async def latest_ledger(self) -> Dict[str, Any]:
+        page = await self._get("/ledgers", {"order": "desc", "limit": 1})
+        return page["_embedded"]["records"][0]
+
+    async def submit_transaction(self, envelope_xdr: str) -> Dict[str, Any]:
+        """
+        Submit a signed envelope and wait for Horizon's verdict. Raises
+        HorizonError with the result codes when the network rejects it.
+        """
+        for attempt in range(MAX_SUBMIT_ATTEMPTS):
+            try:
+                response = await http_client.post(f"{self.url}/transactions", data={"tx": envelope_xdr},
+                                                  idempotent=False, timeout=self.submit_timeout)
+            except UpstreamError as e:
+                if e.status == 504 and attempt + 1 < MAX_SUBMIT_ATTEMPTS:
+                    logger.info("Horizon submission timed out; resubmitting the same envelope")
+                    continue
+                raise HorizonError(str(e), e.status) from e
+            return self._json(response)
+
+
+# Singleton instance
+horizon = HorizonClient()
@@ -0,0 +1,289 @@
+"""
+Image Fingerprints
+==================
+Detects proof images reused across bounties and milestones.
+
+Every submitted proof is fingerprinted in the process pool (sha256, 64-bit
+pHash and dHash, see app/utils/image_hash.py) and stored in
+``image_fingerprints``. Lookups use multi-index hashing: the pHash is split
+into four 16-bit chunks and, by the pigeonhole principle, any hash within
+Hamming distance d shares at least one chunk within distance d // 4. Each
+chunk has a bucketed (counting-sort) index over all stored hashes, so a query
+probes a few hundred buckets, gathers the candidates and verifies their exact
+distance with vectorized popcounts - milliseconds even for millions of rows.
+New rows land in a small unindexed tail that is scanned directly and folded
+into the buckets once it grows.
+
+The index lives in memory and catches up from the table before every
+lookup, so rows written by other workers are seen too. A near-duplicate
+needs both a close pHash and a dHash that roughly agrees; matches only flag
+the submission for review, they never reject it.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from itertools import combinations
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.database import get_db_connection, dict_from_row
+from app.utils import image_hash
+from app.utils.image_hash import to_signed
+from app.utils.process_pool import run_in_process
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+CHUNKS = 4
+CHUNK_BITS = 16
+CHUNK_VALUES = 1 << CHUNK_BITS
+MIN_TAIL = 8192  # unindexed rows scanned directly before a rebuild
+DHASH_CONFIRM_DISTANCE = 20
+MAX_REPORTED_MATCHES = 5
+
+
+def _popcount(values: "np.ndarray") -> "np.ndarray":
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values).astype(np.int64)
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def _flip_masks(bits: int, radius: int) -> "np.ndarray":
+    """Every XOR mask of ``bits`` bits with at most ``radius`` bits set"""
+    masks = [0]
+    for r in range(1, radius + 1):
+        masks.extend(sum(1 << b for b in combo) for combo in combinations(range(bits), r))
+    return np.array(masks, dtype=np.int64)
+
+
+class HammingIndex:
+    """In-memory multi-index hash table over 64-bit hashes"""
+
+    def __init__(self):
+        self._size = 0
+        self._indexed = 0
+        self._ids = np.zeros(1024, dtype=np.int64)
+        self._hashes = np.zeros(1024, dtype=np.uint64)
+        self._dhashes = np.zeros(1024, dtype=np.uint64)
+        self._offsets: List["np.ndarray"] = []  # per chunk: bucket start offsets (CHUNK_VALUES + 1)
+        self._order: List["np.ndarray"] = []  # per chunk: row positions sorted by chunk value
+        self._masks: Dict[int, "np.ndarray"] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, row_id: int, phash: int, dhash: int):
+        self.extend(np.array([row_id], dtype=np.int64), np.array([phash], dtype=np.uint64),
+                    np.array([dhash], dtype=np.uint64))
+
+    def extend(self, row_ids: "np.ndarray", phashes: "np.ndarray", dhashes: "np.ndarray"):
+        count = len(row_ids)
+        if self._size + count > len(self._ids):
+            capacity = max(len(self._ids) * 2, self._size + count)
+            self._ids = np.resize(self._ids, capacity)
+            self._hashes = np.resize(self._hashes, capacity)
+            self._dhashes = np.resize(self._dhashes, capacity)
+        end = self._size + count
+        self._ids[self._size:end] = row_ids
+        self._hashes[self._size:end] = phashes
+        self._dhashes[self._size:end] = dhashes
+        self._size = end
+        if self._size - self._indexed > max(MIN_TAIL, self._indexed // 8):
+            self.rebuild()
+
+    def rebuild(self):
+        """Fold the tail into the per-chunk buckets"""
+        hashes = self._hashes[:self._size]
+        self._offsets, self._order = [], []
+        for chunk in range(CHUNKS):
+            values = ((hashes >> np.uint64(chunk * CHUNK_BITS)) & np.uint64(CHUNK_VALUES - 1)).astype(np.int64)
+            offsets = np.zeros(CHUNK_VALUES + 1, dtype=np.int64)
+            np.cumsum(np.bincount(values, minlength=CHUNK_VALUES), out=offsets[1:])
+            self._offsets.append(offsets)
+            self._order.append(np.argsort(values, kind="stable").astype(np.int32))
+        self._indexed = self._size
+
+    def _candidates(self, phash: int, max_distance: int) -> "np.ndarray":
+        radius = max_distance // CHUNKS
+        masks = self._masks.get(radius)
+        if masks is None:
+            masks = self._masks[radius] = _flip_masks(CHUNK_BITS, radius)
+        found = [np.arange(self._indexed, self._size)]  # the tail is scanned directly
+        for chunk in range(CHUNKS):
+            if not self._indexed:
+                break
+            probes = ((phash >> (chunk * CHUNK_BITS)) & (CHUNK_VALUES - 1)) ^ masks
+            starts = self._offsets[chunk][probes]
+            lengths = self._offsets[chunk][probes + 1] - starts
+            total = int(lengths.sum())
+            if not total:
+                continue
+            # Concatenate the bucket ranges without a Python loop
+            shifts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+            found.append(self._order[chunk][shifts + np.arange(total)])
+        return np.unique(np.concatenate(found))
+
+    def search(self, phash: int, dhash: int, max_distance: int) -> List[tuple]:
+        """(row_id, phash_distance, dhash_distance) within ``max_distance``, closest first"""
+        if not self._size:
+            return []
+        positions = self._candidates(phash, max_distance)
+        if not len(positions):
+            return []
+        distances = _popcount(self._hashes[positions] ^ np.uint64(phash))
+        close = distances <= max_distance
+        positions, distances = positions[close], distances[close]
+        d_distances = _popcount(self._dhashes[positions] ^ np.uint64(dhash))
+        order = np.lexsort((d_distances, distances))
+        return [(int(self._ids[positions[i]]), int(distances[i]), int(d_distances[i])) for i in order]
+
+
+class ImageFingerprintService:
+    """Fingerprints proof images and flags near-duplicates of stored ones"""
+
+    def __init__(self, max_distance: int = settings.image_duplicate_max_distance):
+        self.max_distance = max(0, min(max_distance, 4 * CHUNKS - 1))
+        self.enabled = image_hash.available()
+        self._index = HammingIndex() if self.enabled else None
+        self._last_id = 0
+        self._lock = asyncio.Lock()
+
+    # ------------------------------------------------------------------
+    # Index maintenance
+    # ------------------------------------------------------------------
+
+    def _fetch_since(self, last_id: int) -> list:
+        with get_db_connection() as conn:
+            return conn.execute(
+                "SELECT id, phash, dhash FROM image_fingerprints WHERE id > ? ORDER BY id", (last_id,)
+            ).fetchall()
+
+    async def _catch_up(self):
+        """Add rows stored since the last lookup (including other workers' rows)"""
+        rows = await asyncio.to_thread(self._fetch_since, self._last_id)
+        if not rows:
+            return
+        columns = np.array([tuple(row) for row in rows], dtype=np.int64)
+        self._index.extend(columns[:, 0], columns[:, 1].view(np.uint64), columns[:, 2].view(np.uint64))
+        self._last_id = int(columns[-1, 0])
+        if len(rows) > 1000:
+            logger.info(f"🖼️ Image fingerprint index loaded {len(rows)} rows ({len(self._index)} total)")
+
+    # ------------------------------------------------------------------
+    # Fingerprinting and lookup
+    # ------------------------------------------------------------------
+
+    async def fingerprint(self, data: bytes) -> dict:
+        """Decode and hash in the process pool; ValueError if the bytes are not an image"""
+        try:
+            return await run_in_process(image_hash.fingerprint, data)
+        except Exception as e:
+            raise ValueError(f"Unreadable image: {e}") from e
+
+    def _describe(self, matches: List[tuple], exclude: Optional[tuple]) -> List[dict]:
+        if not matches:
+            return []
+        distances = {row_id: (d, dd) for row_id, d, dd in matches}
+        with get_db_connection() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM image_fingerprints WHERE id IN ({','.join('?' * len(distances))})",
+                list(distances)
+            ).fetchall()
+        described = []
+        for row in map(dict_from_row, rows):
+            if exclude and (row["source"], row["ref_id"]) == exclude:
+                continue  # resubmitting to the same bounty is not reuse
+            phash_distance, dhash_distance = distances[row["id"]]
+            described.append({
+                "fingerprint_id": row["id"],
+                "source": row["source"],
+                "ref_id": row["ref_id"],
+                "user_id": row["user_id"],
+                "phash_distance": phash_distance,
+                "dhash_distance": dhash_distance,
+                "exact": phash_distance == 0 and dhash_distance == 0,
+                "created_at": row["created_at"],
+            })
+        described.sort(key=lambda m: (m["phash_distance"], m["dhash_distance"]))
+        # Closest fingerprint per bounty/milestone only
+        seen, unique = set(), []
+        for match in described:
+            if (match["source"], match["ref_id"]) not in seen:
+                seen.add((match["source"], match["ref_id"]))
+                unique.append(match)
+        return unique[:MAX_REPORTED_MATCHES]
+
+    async def find_duplicates(self, fp: dict, exclude: Optional[tuple] = None) -> List[dict]:
+        """Stored proofs within the distance threshold of a fingerprint"""
+        async with self._lock:
+            await self._catch_up()
+            matches = self._index.search(fp["phash"], fp["dhash"], self.max_distance)
+        matches = [m for m in matches if m[2] <= DHASH_CONFIRM_DISTANCE]
+        return await asyncio.to_thread(self._describe, matches, exclude)
+
+    async def check(self, data: Optional[bytes], exclude: Optional[tuple] = None, fp: Optional[dict] = None) -> dict:
+        """
+        Fingerprint an image and report near-duplicates without storing it.
+        Pass ``fp`` when the image was already decoded (see app/utils/image_evidence.py).
+        """
+        fp = fp or await self.fingerprint(data)
+        matches = await self.find_duplicates(fp, exclude)
+        return {
+            "duplicate": bool(matches),
+            "matches": matches,
+            "phash": f"{fp['phash']:016x}",
+            "dhash": f"{fp['dhash']:016x}",
+        }
+
+    def _store(self, fp: dict, source: str, ref_id: str, user_id: Optional[int],
+               duplicate_of: Optional[int], distance: Optional[int]) -> int:
+        with get_db_connection() as conn:
+            cursor = conn.execute('''
+                INSERT INTO image_fingerprints (
+                    sha256, phash, dhash, width, height, source, ref_id, user_id,
+                    duplicate_of, distance, created_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                fp["sha256"], to_signed(fp["phash"]), to_signed(fp["dhash"]), fp["width"], fp["height"],
+                source, ref_id, user_id, duplicate_of, distance, datetime.utcnow().isoformat()
+            ))
+            conn.commit()
+            return cursor.lastrowid
+
+    async def check_and_record(self, data: Optional[bytes], source: str, ref_id, user_id: Optional[int],
+                               fp: Optional[dict] = None) -> dict:
+        """Check a submitted proof against stored ones, then store its fingerprint"""
+        fp = fp or await self.fingerprint(data)
+        ref_id = str(ref_id)
+        matches = await self.find_duplicates(fp, exclude=(source, ref_id))
+        best = matches[0] if matches else None
+        fingerprint_id = await asyncio.to_thread(
+            self._store, fp, source, ref_id, user_id,
+            best["fingerprint_id"] if best else None, best["phash_distance"] if best else None
+        )
+        if best:
+            logger.warning(f"🖼️ Proof for {source} {ref_id} resembles {best['source']} {best['ref_id']} "
+                           f"(pHash distance {best['phash_distance']})")
+        return {
+            "fingerprint_id": fingerprint_id,
+            "duplicate": bool(matches),
+            "matches": matches,
+            "phash": f"{fp['phash']:016x}",
+            "dhash": f"{fp['dhash']:016x}",
+        }
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "indexed": len(self._index) if self._index is not None else 0,
+            "max_distance": self.max_distance,
+        }
+
+
+# Singleton instance
+image_fingerprints = ImageFingerprintService()
@@ -1,7 +1,7 @@
-import requests
 import json
 from typing import Optional, Dict, Any
 from app.config import settings
+from app.utils.http_client import http_client
 
 
 class IPFSService:
@@ -24,7 +24,8 @@ class IPFSService:
                 'pinata_secret_api_key': self.pinata_secret_key
             }
 
-            response = requests.post(url, files=files, headers=headers)
+            # Pinning is content-addressed: a repeated upload returns the same hash, so it is safe to retry
+            response = await http_client.post(url, files=files, headers=headers, idempotent=True)
 
             if response.status_code == 200:
                 result = response.json()
@@ -47,7 +48,7 @@ class IPFSService:
                 'Content-Type': 'application/octet-stream'
             }
 
-            response = requests.post(url, data=file_data, headers=headers)
+            response = await http_client.post(url, content=file_data, headers=headers, idempotent=True)
 
             if response.status_code == 200:
                 result = response.json()
@@ -89,7 +90,7 @@ class IPFSService:
                 'pinata_secret_api_key': self.pinata_secret_key
             }
 
-            response = requests.post(url, json=json_data, headers=headers)
+            response = await http_client.post(url, json=json_data, headers=headers, idempotent=True)
 
             if response.status_code == 200:
                 result = response.json()
@@ -112,7 +113,7 @@ class IPFSService:
                 'Content-Type': 'application/json'
             }
 
-            response = requests.post(url, json=json_data, headers=headers)
+            response = await http_client.post(url, json=json_data, headers=headers, idempotent=True)
 
             if response.status_code == 200:
                 result = response.json()
@@ -0,0 +1,157 @@
+"""
+JWT Signing Key Ring
+====================
+Persistent signing keys shared by every uvicorn worker.
+
+Keys live in a small JSON file next to the SQLite database. Every token is
+stamped with the ``kid`` of the key that signed it, so rotating the active
+key does not invalidate sessions issued under the previous one.
+"""
+
+import json
+import os
+import secrets
+import threading
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+from app.database import DB_PATH
+
+logger = logging.getLogger(__name__)
+
+KEYRING_PATH = Path(settings.jwt_keyring_path) if settings.jwt_keyring_path else DB_PATH.parent / "keyring.json"
+
+# Retired keys kept for verification after a rotation (covers refresh token lifetime)
+MAX_KEYS = 4
+
+
+class KeyRing:
+    """File-backed set of signing keys indexed by kid"""
+
+    def __init__(self, path: Path = KEYRING_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._keys: Dict[str, dict] = {}
+        self._active_kid: Optional[str] = None
+        self._mtime: Optional[float] = None
+        self._named: Dict[str, bytes] = {}
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _new_key() -> Tuple[str, dict]:
+        kid = secrets.token_hex(8)
+        return kid, {"secret": secrets.token_urlsafe(48), "created_at": datetime.utcnow().isoformat()}
+
+    @staticmethod
+    def _atomic_write(path: Path, data: dict, exclusive: bool = False) -> bool:
+        """
+        Atomically write a JSON secret file.
+        With exclusive=True the write only succeeds if the file does not exist
+        yet, so workers racing on first boot all end up with the same secret.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{secrets.token_hex(4)}")
+        fd = os.open(str(tmp_path), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+        try:
+            if exclusive:
+                try:
+                    os.link(str(tmp_path), str(path))
+                except FileExistsError:
+                    return False
+            else:
+                os.replace(str(tmp_path), str(path))
+                return True
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        return True
+
+    def _write(self, data: dict, exclusive: bool = False) -> bool:
+        return self._atomic_write(self.path, data, exclusive)
+
+    def _load(self):
+        """(Re)load keys from disk, creating the key file on first use"""
+        if not self.path.exists():
+            kid, key = self._new_key()
+            if self._write({"active": kid, "keys": {kid: key}}, exclusive=True):
+                logger.info(f"Created JWT key ring at {self.path}")
+
+        mtime = self.path.stat().st_mtime
+        with open(self.path) as f:
+            data = json.load(f)
+
+        self._keys = data["keys"]
+        self._active_kid = data["active"]
+        self._mtime = mtime
+
+    def _refresh(self, force: bool = False):
+        """Reload when another process has rotated the key file"""
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if force or self._active_kid is None or mtime != self._mtime:
+            self._load()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def active_key(self) -> Tuple[str, str]:
+        """Return (kid, secret) of the key used to sign new tokens"""
+        with self._lock:
+            self._refresh()
+            return self._active_kid, self._keys[self._active_kid]["secret"]
+
+    def get_key(self, kid: Optional[str]) -> Optional[str]:
+        """Return the secret for a kid, reloading once on a miss"""
+        if not kid:
+            return None
+        with self._lock:
+            if self._active_kid is None or kid not in self._keys:
+                self._refresh(force=self._active_kid is not None)
+            key = self._keys.get(kid)
+            return key["secret"] if key else None
+
+    def named_secret(self, name: str) -> bytes:
+        """
+        Return a stable, non-rotating secret for another subsystem
+        (e.g. the API key HMAC). Stored beside the key ring, one file per name.
+        """
+        secret = self._named.get(name)
+        if secret is None:
+            path = self.path.with_name(f"{self.path.stem}.{name}.key")
+            if not path.exists():
+                self._atomic_write(path, {"secret": secrets.token_urlsafe(48)}, exclusive=True)
+            with open(path) as f:
+                secret = json.load(f)["secret"].encode()
+            self._named[name] = secret
+        return secret
+
+    def rotate(self) -> str:
+        """Generate a new active key, retiring the oldest beyond MAX_KEYS"""
+        with self._lock:
+            self._refresh()
+            kid, key = self._new_key()
+            keys = dict(self._keys)
+            keys[kid] = key
+
+            ordered = sorted(keys.items(), key=lambda item: item[1]["created_at"])
+            keys = dict(ordered[-MAX_KEYS:])
+
+            self._write({"active": kid, "keys": keys})
+            self._load()
+            logger.info(f"Rotated JWT signing key, active kid={kid}")
+            return kid
+
+
+# Singleton instance
+key_ring = KeyRing()
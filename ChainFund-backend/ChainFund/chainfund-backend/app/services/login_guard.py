@@ -0,0 +1,187 @@
+"""
+Login Guard
+===========
+Brute-force protection for email/password login.
+
+Failed attempts are tracked per account and per client IP in bounded,
+in-memory sliding windows. Nothing is written on an ordinary failure; the
+``users`` row is only updated when an account crosses the lockout
+threshold, so other workers see the lock through ``locked_until``.
+
+Every check runs before bcrypt, so a locked account or a blocked IP costs
+a dictionary lookup instead of a password hash.
+"""
+
+import threading
+import time
+import logging
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.config import settings
+from app.database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on tracked accounts / IPs so a spray of random emails cannot grow memory
+MAX_TRACKED_KEYS = 100_000
+
+
+class SlidingWindowCounter:
+    """Per-key failure timestamps within a window, LRU-bounded"""
+
+    def __init__(self, window_seconds: float, max_keys: int = MAX_TRACKED_KEYS):
+        self.window = window_seconds
+        self.max_keys = max_keys
+        self._hits: "OrderedDict[str, deque]" = OrderedDict()
+
+    def _trim(self, key: str, now: float) -> Optional[deque]:
+        hits = self._hits.get(key)
+        if hits is None:
+            return None
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        if not hits:
+            del self._hits[key]
+            return None
+        return hits
+
+    def add(self, key: str, now: float) -> int:
+        hits = self._trim(key, now)
+        if hits is None:
+            hits = self._hits[key] = deque()
+        hits.append(now)
+        self._hits.move_to_end(key)
+        while len(self._hits) > self.max_keys:
+            self._hits.popitem(last=False)
+        return len(hits)
+
+    def count(self, key: str, now: float) -> int:
+        hits = self._trim(key, now)
+        return len(hits) if hits else 0
+
+    def reset(self, key: str):
+        self._hits.pop(key, None)
+
+
+class LoginLocked(Exception):
+    """Raised when a login attempt is refused without checking the password"""
+
+    def __init__(self, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class LoginGuard:
+    """Tracks failed logins and decides when to stop checking passwords"""
+
+    def __init__(self,
+                 max_failures: int = settings.login_max_failures,
+                 ip_max_failures: int = settings.login_ip_max_failures,
+                 window_minutes: int = settings.login_failure_window_minutes,
+                 lockout_minutes: int = settings.login_lockout_minutes):
+        self.max_failures = max_failures
+        self.ip_max_failures = ip_max_failures
+        self.lockout = timedelta(minutes=lockout_minutes)
+
+        window = window_minutes * 60
+        self._accounts = SlidingWindowCounter(window)
+        self._ips = SlidingWindowCounter(window)
+        # account/ip -> monotonic time the lock expires
+        self._locked_accounts: "OrderedDict[str, float]" = OrderedDict()
+        self._blocked_ips: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _account_key(email: str) -> str:
+        return email.strip().lower()
+
+    @staticmethod
+    def _remaining(locks: OrderedDict, key: str, now: float) -> int:
+        until = locks.get(key)
+        if until is None:
+            return 0
+        if until <= now:
+            del locks[key]
+            return 0
+        return int(until - now) + 1
+
+    @staticmethod
+    def _set_lock(locks: OrderedDict, key: str, until: float):
+        locks[key] = until
+        locks.move_to_end(key)
+        while len(locks) > MAX_TRACKED_KEYS:
+            locks.popitem(last=False)
+
+    def check(self, email: str, ip: Optional[str], user: Optional[dict] = None):
+        """
+        Raise LoginLocked if the attempt must be refused.
+        ``user`` is the users row, whose persisted ``locked_until`` covers
+        locks tripped by other workers.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if ip:
+                retry = self._remaining(self._blocked_ips, ip, now)
+                if retry:
+                    raise LoginLocked(retry, "Too many failed login attempts from this address")
+
+            retry = self._remaining(self._locked_accounts, self._account_key(email), now)
+            if retry:
+                raise LoginLocked(retry, "Account temporarily locked")
+
+        locked_until = user.get('locked_until') if user else None
+        if locked_until:
+            try:
+                remaining = (datetime.fromisoformat(locked_until) - datetime.utcnow()).total_seconds()
+            except ValueError:
+                remaining = 0
+            if remaining > 0:
+                raise LoginLocked(int(remaining) + 1, "Account temporarily locked")
+
+    def record_failure(self, email: str, ip: Optional[str], user: Optional[dict] = None):
+        """Count a failed attempt, locking the account / IP if a threshold trips"""
+        now = time.monotonic()
+        account = self._account_key(email)
+        with self._lock:
+            failures = self._accounts.add(account, now)
+            ip_failures = self._ips.add(ip, now) if ip else 0
+
+            if ip and ip_failures >= self.ip_max_failures:
+                self._set_lock(self._blocked_ips, ip, now + self.lockout.total_seconds())
+                self._ips.reset(ip)
+                logger.warning(f"Blocked logins from {ip} after {ip_failures} failures")
+
+            tripped = failures >= self.max_failures
+            if tripped:
+                self._set_lock(self._locked_accounts, account, now + self.lockout.total_seconds())
+                self._accounts.reset(account)
+
+        if tripped:
+            logger.warning(f"Locked account {account} after {failures} failed logins")
+            if user:
+                self._persist_lock(user['id'], failures)
+
+    def record_success(self, email: str, ip: Optional[str]):
+        """Forget an account's failures after a successful login"""
+        with self._lock:
+            self._accounts.reset(self._account_key(email))
+
+    def _persist_lock(self, user_id: int, failures: int):
+        locked_until = (datetime.utcnow() + self.lockout).isoformat()
+        try:
+            with get_db_connection() as conn:
+                conn.execute(
+                    "UPDATE users SET failed_login_attempts = failed_login_attempts + ?, locked_until = ? WHERE id = ?",
+                    (failures, locked_until, user_id)
+                )
+                conn.commit()
+        except Exception as e:
+            # The in-memory lock still protects this worker
+            logger.error(f"Failed to persist lock for user {user_id}: {e}")
+
+
+# Singleton instance
+login_guard = LoginGuard()
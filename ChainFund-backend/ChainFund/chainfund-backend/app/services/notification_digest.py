@@ -0,0 +1,201 @@
+"""
+Notification Digests
+====================
+Lets busy creators receive one summary email per hour or day instead of
+one email per donation.
+
+Each user has a ``digest_mode`` (instant, hourly or daily). For digest
+users, ``route_donation_received`` stores a row in ``notification_events``
+instead of queueing an email. A scheduler closes windows on hour/day
+boundaries (UTC): for every recipient with events older than the window
+end it aggregates totals per currency, top donors and per-project counts,
+and queues a single digest through the email outbox, marking the events
+in the same transaction. Windows missed while the server was down are
+caught up on the next tick.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from app.database import get_db_connection
+from app.services.email_outbox import email_outbox
+
+logger = logging.getLogger(__name__)
+
+DIGEST_MODES = ("instant", "hourly", "daily")
+TOP_DONORS = 5
+TICK_SECONDS = 60
+
+
+def window_end(mode: str, now: datetime) -> datetime:
+    """Start of the current hour/day: events before it belong to a closed window"""
+    if mode == "hourly":
+        return now.replace(minute=0, second=0, microsecond=0)
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class NotificationDigest:
+    """Per-user digest preferences, event buffering and the digest scheduler"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    # ------------------------------------------------------------------
+    # Preferences
+    # ------------------------------------------------------------------
+
+    def get_mode(self, user_id: int, cursor=None) -> str:
+        query = "SELECT digest_mode FROM notification_preferences WHERE user_id = ?"
+        if cursor is not None:
+            row = cursor.execute(query, (user_id,)).fetchone()
+        else:
+            with get_db_connection() as conn:
+                row = conn.execute(query, (user_id,)).fetchone()
+        return row[0] if row else "instant"
+
+    def set_mode(self, user_id: int, mode: str):
+        if mode not in DIGEST_MODES:
+            raise ValueError(f"Digest mode must be one of: {list(DIGEST_MODES)}")
+        with get_db_connection() as conn:
+            conn.execute('''
+                INSERT INTO notification_preferences (user_id, digest_mode, updated_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET digest_mode = excluded.digest_mode,
+                                                   updated_at = excluded.updated_at
+            ''', (user_id, mode, datetime.utcnow().isoformat()))
+            conn.commit()
+
+    def pending_count(self, user_id: int) -> int:
+        with get_db_connection() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM notification_events WHERE user_id = ? AND digest_id IS NULL",
+                (user_id,)
+            ).fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # Routing (inside the caller's transaction)
+    # ------------------------------------------------------------------
+
+    def route_donation_received(self, cursor, creator_id: Optional[int], creator_email: str,
+                                project_id: int, params: dict, dedupe_key: str):
+        """Queue the creator's donation email now, or buffer it for their digest"""
+        mode = self.get_mode(creator_id, cursor) if creator_id else "instant"
+        if mode == "instant":
+            email_outbox.enqueue(cursor, 'donation_received', creator_email, params, dedupe_key)
+            return
+
+        cursor.execute('''
+            INSERT INTO notification_events (
+                user_id, event_type, project_id, project_title, actor_name, amount, currency, created_at
+            ) VALUES (?, 'donation_received', ?, ?, ?, ?, ?, ?)
+        ''', (
+            creator_id, project_id, params.get('project_title'), params.get('donor_name'),
+            params.get('amount') or 0, params.get('currency') or 'XLM', datetime.utcnow().isoformat()
+        ))
+
+    # ------------------------------------------------------------------
+    # Aggregation
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _summarize(cursor, user_id: int, max_event_id: int) -> dict:
+        """Aggregate one recipient's pending events up to max_event_id"""
+        scope = "user_id = ? AND digest_id IS NULL AND id <= ?"
+        args = (user_id, max_event_id)
+
+        totals = cursor.execute(f'''
+            SELECT currency, SUM(amount) FROM notification_events
+            WHERE {scope} GROUP BY currency ORDER BY SUM(amount) DESC
+        ''', args).fetchall()
+        top_donors = cursor.execute(f'''
+            SELECT actor_name, SUM(amount) AS total, currency FROM notification_events
+            WHERE {scope} GROUP BY actor_name, currency ORDER BY total DESC LIMIT {TOP_DONORS}
+        ''', args).fetchall()
+        projects = cursor.execute(f'''
+            SELECT project_title, COUNT(*), SUM(amount) FROM notification_events
+            WHERE {scope} GROUP BY project_id ORDER BY SUM(amount) DESC
+        ''', args).fetchall()
+        count = cursor.execute(f"SELECT COUNT(*) FROM notification_events WHERE {scope}", args).fetchone()[0]
+
+        return {
+            "donation_count": count,
+            "totals": [list(row) for row in totals],
+            "top_donors": [list(row) for row in top_donors],
+            "projects": [list(row) for row in projects],
+        }
+
+    def build_digests(self, mode: str, now: Optional[datetime] = None) -> int:
+        """Close the current window for every recipient in ``mode``. Returns digests queued."""
+        end = window_end(mode, now or datetime.utcnow())
+        # Users who switched back to instant still get their buffered events, hourly
+        modes = ("hourly", "instant") if mode == "hourly" else ("daily",)
+        placeholders = ",".join("?" * len(modes))
+
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            recipients = cursor.execute(f'''
+                SELECT e.user_id, MAX(e.id) AS max_id, MIN(e.created_at) AS first_at,
+                       u.email, u.username
+                FROM notification_events e
+                JOIN users u ON u.id = e.user_id
+                LEFT JOIN notification_preferences p ON p.user_id = e.user_id
+                WHERE e.digest_id IS NULL AND e.created_at < ?
+                  AND COALESCE(p.digest_mode, 'instant') IN ({placeholders})
+                GROUP BY e.user_id
+            ''', (end.isoformat(), *modes)).fetchall()
+
+            queued = 0
+            for user_id, max_id, first_at, email, username in recipients:
+                summary = self._summarize(cursor, user_id, max_id)
+                cursor.execute('''
+                    INSERT INTO notification_digests (user_id, mode, window_start, window_end, event_count)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (user_id, mode, first_at, end.isoformat(), summary["donation_count"]))
+                digest_id = cursor.lastrowid
+                cursor.execute(
+                    "UPDATE notification_events SET digest_id = ? WHERE user_id = ? AND digest_id IS NULL AND id <= ?",
+                    (digest_id, user_id, max_id)
+                )
+                if email:
+                    email_outbox.enqueue(cursor, 'donation_digest', email, {
+                        "user_name": username or "Creator",
+                        "period": mode,
+                        **summary,
+                    }, dedupe_key=f"digest:{user_id}:{mode}:{end.isoformat()}")
+                    queued += 1
+                conn.commit()
+
+        if queued:
+            logger.info(f"📬 Queued {queued} {mode} donation digests")
+            email_outbox.notify()
+        return queued
+
+    # ------------------------------------------------------------------
+    # Scheduler
+    # ------------------------------------------------------------------
+
+    async def _run(self):
+        while True:
+            for mode in ("hourly", "daily"):
+                try:
+                    await asyncio.to_thread(self.build_digests, mode)
+                except Exception as e:
+                    logger.error(f"Digest scheduler error ({mode}): {e}")
+            await asyncio.sleep(TICK_SECONDS)
+
+    def start(self):
+        """Start the digest scheduler (call from app lifespan)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# Singleton instance
+notification_digest = NotificationDigest()
@@ -0,0 +1,220 @@
+"""
+Proof Verification
+==================
+Local pre-verification of proof-of-work photos.
+
+The image is inspected once in the process pool (app/utils/image_evidence.py):
+EXIF GPS and capture time, sharpness and exposure, a thumbnail and the
+perceptual fingerprint. The evidence is then checked against the task:
+the geotag must lie within PROOF_GEO_RADIUS_KM of the bounty's coordinates
+(or of a project whose location is given as "lat, lon"), the photo must
+not predate the task, and it must be sharp and reasonably exposed.
+
+The verdict is ``verified`` only when every check passes, ``rejected`` on
+hard contradictions (far-away geotag, photo older than the task,
+unreadable image) and ``needs_review`` otherwise, so only the ambiguous
+cases need a remote vision model or a human.
+"""
+
+import logging
+import math
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.database import get_db_connection, dict_from_row
+from app.utils import image_hash
+from app.utils.image_evidence import inspect_image
+from app.utils.process_pool import run_in_process
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+NEAR_FACTOR = 10  # geotags within radius * NEAR_FACTOR are ambiguous rather than rejected
+MIN_SHARPNESS = 40.0  # Laplacian variance at 384px; lower is blurry
+MIN_CONTRAST = 12.0
+DARK_BRIGHTNESS, BRIGHT_BRIGHTNESS = 35.0, 225.0
+CLIPPED_FRACTION = 0.5
+CLOCK_SKEW = timedelta(days=1)  # EXIF times are local and camera clocks drift
+
+_COORDINATES = re.compile(r"^\s*(-?\d{1,2}(?:\.\d+)?)\s*,\s*(-?\d{1,3}(?:\.\d+)?)\s*$")
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi, d_lambda = phi2 - phi1, math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace(" ", "T").rstrip("Z"))
+    except ValueError:
+        return None
+
+
+class ProofVerifier:
+    """Evidence extraction and rule-based verdicts for proof photos"""
+
+    def __init__(self, geo_radius_km: float = settings.proof_geo_radius_km):
+        self.geo_radius_km = geo_radius_km
+        self.enabled = image_hash.available()
+
+    # ------------------------------------------------------------------
+    # Task reference
+    # ------------------------------------------------------------------
+
+    def reference(self, bounty_id: Optional[int] = None, project_id: Optional[int] = None) -> Optional[dict]:
+        """Where and since when the proof is expected, from a bounty or project"""
+        with get_db_connection() as conn:
+            if bounty_id is not None:
+                row = dict_from_row(conn.execute(
+                    "SELECT id, latitude, longitude, location_name, created_at FROM bounties WHERE id = ?",
+                    (bounty_id,)
+                ).fetchone())
+                if row:
+                    return {
+                        "kind": "bounty", "id": row["id"], "label": row["location_name"],
+                        "latitude": row["latitude"], "longitude": row["longitude"],
+                        "created_at": row["created_at"],
+                    }
+            if project_id is not None:
+                row = dict_from_row(conn.execute(
+                    "SELECT id, location, created_at FROM projects WHERE id = ?", (project_id,)
+                ).fetchone())
+                if row:
+                    match = _COORDINATES.match(row["location"] or "")
+                    return {
+                        "kind": "project", "id": row["id"], "label": row["location"],
+                        "latitude": float(match.group(1)) if match else None,
+                        "longitude": float(match.group(2)) if match else None,
+                        "created_at": row["created_at"],
+                    }
+        return None
+
+    # ------------------------------------------------------------------
+    # Evidence
+    # ------------------------------------------------------------------
+
+    async def inspect(self, data: bytes) -> dict:
+        """Decode and analyze in the process pool; ValueError if the bytes are not an image"""
+        try:
+            return await run_in_process(inspect_image, data)
+        except Exception as e:
+            raise ValueError(f"Unreadable image: {e}") from e
+
+    def _geotag(self, evidence: dict, reference: Optional[dict]) -> tuple:
+        gps = evidence.get("gps")
+        if not gps:
+            return "missing", None
+        if not reference or reference.get("latitude") is None or reference.get("longitude") is None:
+            return "no_reference", None
+        distance = haversine_km(gps["latitude"], gps["longitude"], reference["latitude"], reference["longitude"])
+        if distance <= self.geo_radius_km:
+            return "match", distance
+        if distance <= self.geo_radius_km * NEAR_FACTOR:
+            return "near", distance
+        return "mismatch", distance
+
+    def _timestamp(self, evidence: dict, reference: Optional[dict]) -> str:
+        captured = _parse_time(evidence.get("captured_at"))
+        if captured is None:
+            return "missing"
+        if captured > datetime.utcnow() + CLOCK_SKEW:
+            return "future"
+        started = _parse_time(reference.get("created_at")) if reference else None
+        if started and captured < started - CLOCK_SKEW:
+            return "before_task"
+        return "ok"
+
+    @staticmethod
+    def _quality_issues(quality: dict) -> List[str]:
+        issues = []
+        if quality["sharpness"] < MIN_SHARPNESS:
+            issues.append("blurry")
+        if quality["brightness"] < DARK_BRIGHTNESS or quality["dark_fraction"] > CLIPPED_FRACTION:
+            issues.append("underexposed")
+        if quality["brightness"] > BRIGHT_BRIGHTNESS or quality["bright_fraction"] > CLIPPED_FRACTION:
+            issues.append("overexposed")
+        if quality["contrast"] < MIN_CONTRAST:
+            issues.append("low_contrast")
+        return issues
+
+    def assess(self, evidence: dict, reference: Optional[dict], milestone_title: str = "") -> Dict[str, Any]:
+        """Verdict in the verify-proof response schema, with the evidence attached"""
+        geotag, distance = self._geotag(evidence, reference)
+        timestamp = self._timestamp(evidence, reference)
+        issues = self._quality_issues(evidence["quality"])
+
+        if geotag == "mismatch" or timestamp in ("before_task", "future"):
+            verdict, confidence = "rejected", 0.1
+        elif geotag == "match" and timestamp == "ok" and not issues:
+            verdict, confidence = "verified", 0.9
+        else:
+            verdict = "needs_review"
+            confidence = round(max(0.2, 0.6 - 0.1 * len(issues) - 0.1 * (geotag != "match")
+                                   - 0.1 * (timestamp != "ok")), 2)
+
+        findings = []
+        if distance is not None:
+            findings.append(f"geotag {distance:.1f} km from the task location")
+        else:
+            findings.append("no geotag" if geotag == "missing" else "task location has no coordinates")
+        findings.append({
+            "ok": "taken after the task was posted", "missing": "no capture time",
+            "future": "capture time is in the future", "before_task": "taken before the task was posted",
+        }[timestamp])
+        if issues:
+            findings.append("image is " + ", ".join(issue.replace("_", " ") for issue in issues))
+        label = f"'{milestone_title}'" if milestone_title else "the task"
+        analysis = {
+            "verified": f"Local verification passed for {label}: ",
+            "rejected": f"Local verification failed for {label}: ",
+            "needs_review": f"Local checks inconclusive for {label}, review needed: ",
+        }[verdict] + "; ".join(findings) + "."
+
+        return {
+            "verified": verdict == "verified",
+            "verdict": verdict,
+            "needs_review": verdict == "needs_review",
+            "confidence": confidence,
+            "analysis": analysis,
+            "objects_detected": [],  # object detection is left to the remote model
+            "geotag_match": {"match": True, "mismatch": False}.get(geotag),
+            "checks": {
+                "geotag": geotag,
+                "distance_km": round(distance, 3) if distance is not None else None,
+                "timestamp": timestamp,
+                "quality_issues": issues,
+            },
+            "evidence": {key: evidence[key] for key in
+                         ("width", "height", "format", "gps", "captured_at", "camera", "quality", "thumbnail")},
+        }
+
+    async def verify(self, data: bytes, reference: Optional[dict], milestone_title: str = "") -> Dict[str, Any]:
+        try:
+            evidence = await self.inspect(data)
+        except ValueError as e:
+            return self.unreadable(str(e))
+        return self.assess(evidence, reference, milestone_title)
+
+    @staticmethod
+    def unreadable(reason: str) -> Dict[str, Any]:
+        return {
+            "verified": False,
+            "verdict": "rejected",
+            "needs_review": False,
+            "confidence": 0.0,
+            "analysis": f"Local verification failed: {reason}",
+            "objects_detected": [],
+            "geotag_match": None,
+        }
+
+
+# Singleton instance
+proof_verifier = ProofVerifier()
@@ -1,6 +1,8 @@
 from typing import Optional
 from datetime import datetime
+from app.config import settings
 from app.services.stellar_service import StellarService
+from app.services.tx_batcher import tx_batcher
 from app.services.email_service import EmailService
 from app.models.reward import Reward
 from app.db import get_db
@@ -18,14 +20,12 @@ class RewardService:
         # Calculate reward amount (example: 1 token per 1 XLM donated)
         reward_amount = donation_amount
         
-        # Get admin wallet for minting
-        admin_wallet = await self.db.get_admin_wallet()
-        
-        # Mint reward tokens using Soroban contract
-        result = await self.stellar_service.mint_reward_tokens(
-            to_address=donor_wallet,
-            amount=reward_amount,
-            source_account=admin_wallet
+        # Mint reward tokens using Soroban contract, signed by the admin (STELLAR_ADMIN_SECRET).
+        # Rewards processed at the same time share one batch_mint_reward transaction.
+        result = await tx_batcher.mint_reward(
+            settings.stellar_reward_token_id,
+            donor_wallet,
+            reward_amount
         )
         
         success = result.get('success', False)
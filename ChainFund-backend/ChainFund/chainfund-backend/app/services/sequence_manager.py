@@ -0,0 +1,198 @@
+"""
+Sequence Manager
+================
+Local sequence numbers for the accounts that submit our transactions.
+
+Every transaction consumes the next sequence number of its source account,
+so loading the account before each submission makes concurrent
+submissions from one account race: all but one get ``txBAD_SEQ``. The
+manager loads each account once and hands out leases instead. A lease
+holds the account from building the transaction until the node has
+accepted (or rejected) it, which keeps sequence numbers gap-free and in
+order. It is released while the transaction waits to be applied, but
+stellar-core queues only one pending transaction per source account: the
+next send from that account is answered TRY_AGAIN_LATER until the
+previous one lands (about one ledger), and is resent with backoff under
+its lease. One account therefore submits about one transaction per
+ledger.
+
+With channel accounts (STELLAR_CHANNEL_SECRETS) transactions rotate
+through them as source accounts, so that many can be pending at once.
+Their operations keep the admin as source, so the admin still authorizes
+the calls, while the channel account pays the transaction fee: keep every
+channel funded. A ``txBAD_SEQ`` (the account was used by something else,
+e.g. the stellar CLI) or an unknown send outcome makes the account reload
+its sequence number.
+"""
+
+import asyncio
+import logging
+import random
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from app.config import settings
+from app.utils.metrics import metrics
+
+try:
+    from stellar_sdk import Account, Keypair
+    STELLAR_SDK_AVAILABLE = True
+except ImportError:
+    STELLAR_SDK_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MAX_SEQUENCE_RETRIES = 2  # resubmissions after txBAD_SEQ
+MAX_TRY_AGAIN_RETRIES = 8  # resends after TRY_AGAIN_LATER (previous transaction of the account still pending)
+TRY_AGAIN_BASE_SECONDS = 0.5
+TRY_AGAIN_MAX_SECONDS = 5.0  # about one ledger
+
+metrics.describe("sequence_leases_total", "counter", "Source account leases by outcome")
+metrics.describe("sequence_resyncs_total", "counter", "Sequence number reloads by reason")
+metrics.describe("sequence_try_again_total", "counter", "Sends answered TRY_AGAIN_LATER and resent under the lease")
+
+
+class SourceAccount:
+    """One submitting account and its last used sequence number"""
+
+    def __init__(self, keypair: "Keypair"):
+        self.keypair = keypair
+        self.public_key = keypair.public_key
+        self.sequence: Optional[int] = None  # None: load before the next lease
+        self.loaded = False
+        self.submitted = 0
+        self.resyncs = 0
+
+
+class SequenceLease:
+    """Exclusive use of a source account for building and sending one transaction"""
+
+    def __init__(self, manager: "SequenceManager", account: SourceAccount, admin: "Keypair"):
+        self._manager = manager
+        self._account = account
+        self.keypair = account.keypair
+        self.public_key = account.public_key
+        self.admin = admin
+        self.outcome = "released"  # sequence not consumed
+
+    @property
+    def operation_source(self) -> Optional[str]:
+        """Source for the operations: the admin when the transaction comes from a channel account"""
+        return self.admin.public_key if self.public_key != self.admin.public_key else None
+
+    def source(self) -> "Account":
+        """Fresh Account for TransactionBuilder (which bumps it) at the leased sequence"""
+        return Account(self.public_key, self._account.sequence)
+
+    def signers(self) -> List["Keypair"]:
+        return [self.keypair] if self.operation_source is None else [self.keypair, self.admin]
+
+    def commit(self):
+        """The node accepted the transaction: its sequence number is used up"""
+        self._account.sequence += 1
+        self._account.submitted += 1
+        self.outcome = "committed"
+
+    async def resync(self, reason: str = "bad_seq"):
+        """Reload the sequence number now (after txBAD_SEQ)"""
+        await self._manager._load(self._account, reason)
+
+    async def wait_for_pending(self, retry: int):
+        """Back off before resending after TRY_AGAIN_LATER (the account's previous transaction is still pending)"""
+        delay = min(TRY_AGAIN_MAX_SECONDS, TRY_AGAIN_BASE_SECONDS * (2 ** retry)) * random.uniform(0.5, 1.0)
+        metrics.inc("sequence_try_again_total")
+        await asyncio.sleep(delay)
+
+    def forget(self):
+        """Unknown whether the node took the transaction: reload before the next lease"""
+        self._account.sequence = None
+        self.outcome = "unknown"
+
+
+class SequenceManager:
+    """Pool of source accounts (channels, else the admin) with locally tracked sequence numbers"""
+
+    def __init__(self, load_sequence: Callable[[str], Awaitable[int]]):
+        self.load_sequence = load_sequence
+        self._accounts: List[SourceAccount] = []
+        self._admin: Optional["Keypair"] = None
+        self._secrets: Optional[tuple] = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiting = 0
+
+    def _configure(self):
+        """(Re)build the pool when the configured secrets change"""
+        channels = tuple(s.strip() for s in settings.stellar_channel_secrets.split(",") if s.strip())
+        secrets = (settings.stellar_admin_secret, channels)
+        if secrets == self._secrets:
+            return
+        self._admin = Keypair.from_secret(settings.stellar_admin_secret)
+        self._accounts = [SourceAccount(Keypair.from_secret(s)) for s in channels] or [SourceAccount(self._admin)]
+        self._secrets = secrets
+        self._idle = None
+        logger.info(f"🔢 Submitting from {len(self._accounts)} "
+                    f"{'channel accounts' if channels else 'admin account'}")
+
+    def _queue(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._idle is None or self._loop is not loop:
+            self._idle = asyncio.Queue()
+            for account in self._accounts:
+                self._idle.put_nowait(account)
+            self._loop = loop
+        return self._idle
+
+    async def _load(self, account: SourceAccount, reason: str):
+        account.sequence = await self.load_sequence(account.public_key)
+        account.loaded = True
+        if reason != "initial":
+            account.resyncs += 1
+            logger.info(f"🔢 Resynced {account.public_key[:8]}… at sequence {account.sequence} ({reason})")
+        metrics.inc("sequence_resyncs_total", reason=reason)
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[SequenceLease]:
+        """
+        Exclusive use of the next idle source account. Build, sign and send inside
+        the block; call ``commit()`` once the node accepted the transaction.
+        """
+        if not settings.stellar_admin_secret:
+            raise ValueError("STELLAR_ADMIN_SECRET is not set")
+        self._configure()
+        idle = self._queue()
+        self._waiting += 1
+        try:
+            account = await idle.get()
+        finally:
+            self._waiting -= 1
+        lease = SequenceLease(self, account, self._admin)
+        try:
+            if account.sequence is None:
+                await self._load(account, "unknown" if account.loaded else "initial")
+            yield lease
+        except BaseException:
+            if lease.outcome == "released":
+                lease.outcome = "failed"
+            raise
+        finally:
+            metrics.inc("sequence_leases_total", outcome=lease.outcome)
+            idle.put_nowait(account)
+
+    def public_keys(self) -> List[str]:
+        """Accounts transactions are sent from (empty until the first lease)"""
+        return [account.public_key for account in self._accounts]
+
+    def busy(self) -> int:
+        return len(self._accounts) - self._idle.qsize() if self._idle is not None else 0
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "accounts": [
+                {"public_key": a.public_key, "sequence": a.sequence, "submitted": a.submitted, "resyncs": a.resyncs}
+                for a in self._accounts
+            ],
+            "channels": self._admin is not None and self._accounts[0].keypair is not self._admin,
+            "busy": self.busy(),
+            "waiting": self._waiting,
+        }
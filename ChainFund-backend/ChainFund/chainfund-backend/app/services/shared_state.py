@@ -0,0 +1,172 @@
+"""
+Process-Shared State
+====================
+Small key/value and counter store used for state that must agree across
+uvicorn workers (rate-limit windows, contract balances, ...).
+
+Single-worker deployments keep everything in memory. With
+HORIZONTAL_SCALING=true the same API is backed by a WAL-mode SQLite file
+so every worker sees the same counters.
+"""
+
+import sqlite3
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import settings
+from app.database import DB_PATH
+
+logger = logging.getLogger(__name__)
+
+SHARED_STATE_PATH = (
+    Path(settings.shared_state_db_path) if settings.shared_state_db_path
+    else DB_PATH.parent / "shared_state.db"
+)
+
+# Expired rows are purged every N writes
+PURGE_EVERY = 1000
+
+
+class MemorySharedState:
+    """In-process backend for single-worker deployments"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._writes = 0
+
+    def _live(self, key: str, now: float):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def _maybe_purge(self, now: float):
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            expired = [k for k, (_, exp) in self._data.items() if exp is not None and exp <= now]
+            for k in expired:
+                del self._data[k]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._live(key, time.time())
+            return entry[0] if entry else default
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        now = time.time()
+        with self._lock:
+            self._data[key] = (value, now + ttl if ttl else None)
+            self._maybe_purge(now)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Atomically add to a counter; ttl only applies when the counter is created"""
+        now = time.time()
+        with self._lock:
+            entry = self._live(key, now)
+            if entry is None:
+                value, expires_at = amount, (now + ttl if ttl else None)
+            else:
+                value, expires_at = int(entry[0]) + amount, entry[1]
+            self._data[key] = (value, expires_at)
+            self._maybe_purge(now)
+            return value
+
+    def hit(self, key: str, window_seconds: int) -> int:
+        """Count a hit in the current fixed window and return the window total"""
+        bucket = int(time.time() // window_seconds)
+        return self.incr(f"{key}:{bucket}", 1, ttl=window_seconds * 2)
+
+
+class SQLiteSharedState:
+    """SQLite backend shared by all workers on the host"""
+
+    def __init__(self, path: Path = SHARED_STATE_PATH):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS shared_state (
+                    key TEXT PRIMARY KEY,
+                    value,
+                    expires_at REAL
+                ) WITHOUT ROWID
+            ''')
+
+    def _connection(self) -> sqlite3.Connection:
+        """One autocommit connection per thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), isolation_level=None, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _maybe_purge(self, conn: sqlite3.Connection, now: float):
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            conn.execute("DELETE FROM shared_state WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        row = self._connection().execute(
+            "SELECT value FROM shared_state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time())
+        ).fetchone()
+        return row[0] if row else default
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO shared_state (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, now + ttl if ttl else None)
+        )
+        self._maybe_purge(conn, now)
+
+    def delete(self, key: str):
+        self._connection().execute("DELETE FROM shared_state WHERE key = ?", (key,))
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Atomically add to a counter; ttl only applies when the counter is created"""
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute('''
+            INSERT INTO shared_state (key, value, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                value = CASE WHEN expires_at IS NOT NULL AND expires_at <= ?
+                             THEN excluded.value ELSE CAST(value AS INTEGER) + excluded.value END,
+                expires_at = CASE WHEN expires_at IS NOT NULL AND expires_at <= ?
+                                  THEN excluded.expires_at ELSE expires_at END
+            RETURNING value
+        ''', (key, amount, now + ttl if ttl else None, now, now)).fetchone()
+        self._maybe_purge(conn, now)
+        return int(row[0])
+
+    def hit(self, key: str, window_seconds: int) -> int:
+        """Count a hit in the current fixed window and return the window total"""
+        bucket = int(time.time() // window_seconds)
+        return self.incr(f"{key}:{bucket}", 1, ttl=window_seconds * 2)
+
+
+def create_shared_state():
+    """Pick the backend for the configured deployment mode"""
+    if settings.horizontal_scaling:
+        logger.info(f"Horizontal scaling enabled, shared state at {SHARED_STATE_PATH}")
+        return SQLiteSharedState()
+    return MemorySharedState()
+
+
+# Singleton instance
+shared_state = create_shared_state()
@@ -0,0 +1,218 @@
+"""
+Soroban CLI Executor
+====================
+Runs ``stellar contract invoke`` without blocking the event loop.
+
+Calls go through ``asyncio.create_subprocess_exec`` behind a bounded pool of
+SOROBAN_CLI_CONCURRENCY slots. Callers beyond that wait in a queue of at
+most SOROBAN_CLI_MAX_QUEUE; past that ``CLIBusyError`` is raised so the
+endpoint can shed load instead of piling up processes. Each call has its
+own timeout; on timeout (or when the awaiting request is cancelled) the
+child and its process group are killed and reaped.
+
+Output is parsed into a structured result: the return value decoded from
+JSON when possible, the transaction hash, and for failures a one-line error
+plus its kind (contract error code, auth, bad sequence, timeout, ...).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import signal
+import time
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_ERROR_CHARS = 500
+KILL_GRACE_SECONDS = 2.0
+
+_ANSI = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+_TX_HASH = re.compile(r"(?:transaction hash is|signing transaction:?|tx hash:?)\s*([0-9a-f]{64})", re.IGNORECASE)
+_CONTRACT_ERROR = re.compile(r"Error\(Contract, #(\d+)\)")
+# (pattern in stderr, error kind), first match wins
+_ERROR_KINDS = (
+    (re.compile(r"Error\(Contract, #\d+\)"), "contract"),
+    (re.compile(r"Error\(Budget|ResourceLimitExceeded|RESOURCE_LIMIT_EXCEEDED|tx_?SOROBAN_INVALID",
+                re.IGNORECASE), "budget"),
+    (re.compile(r"Error\(Auth|require_auth|not authorized", re.IGNORECASE), "auth"),
+    (re.compile(r"tx_bad_seq|bad sequence", re.IGNORECASE), "bad_seq"),
+    (re.compile(r"insufficient|underfunded", re.IGNORECASE), "insufficient_funds"),
+    (re.compile(r"Account not found|No such account", re.IGNORECASE), "account_not_found"),
+    (re.compile(r"timed? ?out|connection|network|rpc", re.IGNORECASE), "network"),
+)
+
+metrics.describe("soroban_cli_calls_total", "counter", "Soroban CLI invocations by method, mode and outcome")
+metrics.histogram("soroban_cli_duration_seconds", "Soroban CLI call latency (including queueing) by mode",
+                  buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0))
+
+
+class CLIBusyError(Exception):
+    """Too many CLI calls queued; the caller should retry later"""
+
+
+def parse_output(stdout: str) -> Any:
+    """Return value printed by ``contract invoke``: JSON when possible, else the raw text"""
+    output = _ANSI.sub("", stdout).strip()
+    if not output:
+        return None
+    try:
+        return json.loads(output)
+    except json.JSONDecodeError:
+        pass
+    # Some CLI versions print log lines before the value; it is always last
+    last = output.splitlines()[-1].strip()
+    try:
+        return json.loads(last)
+    except json.JSONDecodeError:
+        return {"raw_output": output}
+
+
+def parse_error(stderr: str) -> Dict[str, Any]:
+    """One-line message, kind and (for contract panics) the error code from CLI stderr"""
+    text = _ANSI.sub("", stderr).strip()
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    message = next((line for line in lines if line.lower().startswith("error")), lines[-1] if lines else "")
+    kind = next((name for pattern, name in _ERROR_KINDS if pattern.search(text)), "cli")
+    code = _CONTRACT_ERROR.search(text)
+    return {
+        "error": (message or "Contract call failed")[:MAX_ERROR_CHARS],
+        "error_kind": kind,
+        "error_code": int(code.group(1)) if code else None,
+    }
+
+
+def parse_tx_hash(stderr: str) -> Optional[str]:
+    match = _TX_HASH.search(_ANSI.sub("", stderr))
+    return match.group(1) if match else None
+
+
+class SorobanCLI:
+    """Bounded, non-blocking runner for stellar CLI contract calls"""
+
+    def __init__(self, executable: str = settings.soroban_cli_path,
+                 concurrency: int = settings.soroban_cli_concurrency,
+                 max_queue: int = settings.soroban_cli_max_queue):
+        self.executable = executable
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._waiting = 0
+        self._running = 0
+
+    def command(self, contract_id: str, method: str, args: List[str], source: str, network: str,
+                view: bool = False) -> List[str]:
+        cmd = [self.executable, "contract", "invoke", "--id", contract_id, "--source", source, "--network", network]
+        if view:
+            cmd.append("--is-view")
+        return cmd + ["--", method] + list(args)
+
+    async def invoke(self, contract_id: str, method: str, args: List[str], source: str, network: str,
+                     view: bool = False, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Run one contract invocation. Returns {success, data | error, error_kind,
+        error_code, tx_hash, duration_ms}; raises CLIBusyError when the queue is full.
+        """
+        if timeout is None:
+            timeout = settings.soroban_cli_view_timeout if view else settings.soroban_cli_invoke_timeout
+        mode = "view" if view else "invoke"
+        started = time.perf_counter()
+        result = await self.run(self.command(contract_id, method, args, source, network, view), timeout)
+        duration = time.perf_counter() - started
+        result["duration_ms"] = round(duration * 1000, 1)
+        outcome = "ok" if result["success"] else result.get("error_kind", "cli")
+        metrics.inc("soroban_cli_calls_total", method=method, mode=mode, outcome=outcome)
+        metrics.observe("soroban_cli_duration_seconds", duration, mode=mode)
+        if not result["success"]:
+            logger.warning(f"Soroban CLI {method} failed ({outcome}): {result['error']}")
+        return result
+
+    async def run(self, cmd: List[str], timeout: float) -> Dict[str, Any]:
+        """Run a CLI command in a pool slot and parse its output"""
+        if self._waiting >= self.max_queue and self._slots.locked():
+            raise CLIBusyError(f"{self._waiting} contract calls already queued")
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        self._running += 1
+        try:
+            return await self._execute(cmd, timeout)
+        finally:
+            self._running -= 1
+            self._slots.release()
+
+    async def _execute(self, cmd: List[str], timeout: float) -> Dict[str, Any]:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env={**os.environ, "NO_COLOR": "1"},
+                # Own process group, so a timeout also kills anything the CLI spawned
+                start_new_session=hasattr(os, "killpg"),
+            )
+        except FileNotFoundError:
+            return {"success": False, "error": "Stellar CLI not found. Install with: cargo install stellar-cli",
+                    "error_kind": "cli_missing"}
+        except OSError as e:
+            return {"success": False, "error": f"Could not start Stellar CLI: {e}", "error_kind": "cli_missing"}
+
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            await self._kill(process)
+            return {"success": False, "error": f"Contract call timed out after {timeout:g} seconds",
+                    "error_kind": "timeout"}
+        finally:
+            if process.returncode is None:
+                # Cancelled while waiting (e.g. the client disconnected)
+                await self._kill(process)
+
+        out, err = stdout.decode(errors="replace"), stderr.decode(errors="replace")
+        tx_hash = parse_tx_hash(err)
+        if process.returncode == 0:
+            return {"success": True, "data": parse_output(out), "tx_hash": tx_hash}
+        return {"success": False, "tx_hash": tx_hash, **parse_error(err or out)}
+
+    @staticmethod
+    async def _kill(process: asyncio.subprocess.Process):
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+        try:
+            await asyncio.wait_for(process.wait(), timeout=KILL_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            logger.error(f"Soroban CLI process {process.pid} did not exit after SIGKILL")
+
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    def in_flight(self) -> int:
+        return self._running
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "executable": self.executable,
+            "concurrency": self.concurrency,
+            "running": self._running,
+            "queued": self._waiting,
+            "max_queue": self.max_queue,
+        }
+
+
+# Singleton instance
+soroban_cli = SorobanCLI()
+metrics.gauge_callback("soroban_cli_queue_depth", soroban_cli.queue_depth, "Contract calls waiting for a CLI slot")
+metrics.gauge_callback("soroban_cli_running", soroban_cli.in_flight, "Soroban CLI processes running")
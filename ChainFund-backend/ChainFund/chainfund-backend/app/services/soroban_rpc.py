@@ -0,0 +1,442 @@
+"""
+Soroban RPC Client
+==================
+In-process async client for the Soroban JSON-RPC API, used for v2 contract
+calls instead of forking a ``stellar`` CLI process per call.
+
+All requests share one pooled ``httpx.AsyncClient`` (keep-alive, at most
+SOROBAN_RPC_MAX_CONNECTIONS sockets). Read-only calls are a single
+``simulateTransaction``; writes simulate, lease a source account and
+sequence number (app/services/sequence_manager.py, loaded once with
+``getLedgerEntries``, or from Horizon when the node is down), attach the
+footprint and resource fee, sign with STELLAR_ADMIN_SECRET,
+``sendTransaction`` and poll ``getTransaction`` until the transaction
+lands or SOROBAN_RPC_TX_TIMEOUT passes. A send answered TRY_AGAIN_LATER (the source account already has a
+pending transaction) is resent with backoff while the lease is held.
+
+``invoke`` returns the same structured result as the CLI executor
+(app/services/soroban_cli.py), so callers can switch transports with
+SOROBAN_TRANSPORT. scripts/soroban_rpc_stub.py serves a local stand-in.
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.config import settings
+from app.services.contract_spec import decode
+from app.services.horizon_client import horizon
+from app.services.sequence_manager import MAX_SEQUENCE_RETRIES, MAX_TRY_AGAIN_RETRIES, SequenceManager
+from app.services.soroban_cli import parse_error
+from app.utils.metrics import metrics
+
+try:
+    from stellar_sdk import Account, Keypair, StrKey, TransactionBuilder, TransactionEnvelope
+    from stellar_sdk import xdr as stellar_xdr
+    from stellar_sdk.soroban_rpc import (
+        GetLatestLedgerResponse, GetLedgerEntriesResponse, GetTransactionResponse, GetTransactionStatus,
+        SendTransactionResponse, SendTransactionStatus, SimulateTransactionResponse,
+    )
+    from stellar_sdk.soroban_server import _assemble_transaction
+    STELLAR_SDK_AVAILABLE = True
+except ImportError:
+    STELLAR_SDK_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+BASE_FEE = 100
+TX_VALIDITY_SECONDS = 300
+MAX_ERROR_CHARS = 500
+# TransactionResultCode name -> error kind, matching the CLI executor's kinds
+_RESULT_KINDS = {
+    "txBAD_SEQ": "bad_seq",
+    "txBAD_AUTH": "auth",
+    "txBAD_AUTH_EXTRA": "auth",
+    "txINSUFFICIENT_BALANCE": "insufficient_funds",
+    "txINSUFFICIENT_FEE": "insufficient_funds",
+    "txNO_ACCOUNT": "account_not_found",
+    "txFAILED": "contract",
+    "txTOO_LATE": "timeout",
+    "txSOROBAN_INVALID": "budget",  # resources above the network limits (e.g. transaction too large)
+}
+
+metrics.describe("soroban_rpc_requests_total", "counter", "Soroban JSON-RPC requests by RPC method and outcome")
+metrics.describe("soroban_rpc_calls_total", "counter", "Contract calls over Soroban RPC by method, mode and outcome")
+metrics.histogram("soroban_rpc_duration_seconds", "Contract call latency over Soroban RPC by mode",
+                  buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0))
+
+
+class SorobanRPCError(Exception):
+    """A failed RPC request or rejected transaction, with the CLI executor's error kind"""
+
+    def __init__(self, message: str, kind: str = "network", code: Optional[int] = None):
+        super().__init__(message)
+        self.kind = kind
+        self.code = code
+
+
+def _result_code(result_xdr: Optional[str]) -> Optional[str]:
+    if not result_xdr:
+        return None
+    try:
+        return stellar_xdr.TransactionResult.from_xdr(result_xdr).result.code.name
+    except Exception:
+        return None
+
+
+def _resource_limit_exceeded(result_xdr: Optional[str]) -> bool:
+    """Whether a failed invocation ran out of the resources it declared"""
+    try:
+        results = stellar_xdr.TransactionResult.from_xdr(result_xdr).result.results or []
+    except Exception:
+        return False
+    exceeded = stellar_xdr.InvokeHostFunctionResultCode.INVOKE_HOST_FUNCTION_RESOURCE_LIMIT_EXCEEDED
+    return any(
+        r.tr is not None and r.tr.invoke_host_function_result is not None
+        and r.tr.invoke_host_function_result.code == exceeded
+        for r in results
+    )
+
+
+def _contract_error_code(meta: "stellar_xdr.TransactionMeta") -> Optional[int]:
+    """Contract error number from the diagnostic events of a failed invocation"""
+    soroban_meta = meta.v3.soroban_meta if meta.v3 else None
+    for diagnostic in (soroban_meta.diagnostic_events if soroban_meta else []):
+        body = diagnostic.event.body.v0
+        for value in [body.data] + list(body.topics):
+            if value.type == stellar_xdr.SCValType.SCV_ERROR and \
+                    value.error.type == stellar_xdr.SCErrorType.SCE_CONTRACT:
+                return value.error.contract_code.uint32
+    return None
+
+
+def _contract_events(soroban_meta: "stellar_xdr.SorobanTransactionMeta") -> List[Dict[str, Any]]:
+    """Events the invocation emitted, decoded like the indexer's: {contract_id, topic, value}"""
+    return [
+        {
+            "contract_id": StrKey.encode_contract(event.contract_id.hash) if event.contract_id else None,
+            "topic": [decode(topic) for topic in event.body.v0.topics],
+            "value": decode(event.body.v0.data),
+        }
+        for event in soroban_meta.events
+        if event.type == stellar_xdr.ContractEventType.CONTRACT
+    ]
+
+
+class SorobanRPCClient:
+    """Pooled JSON-RPC client plus simulate/sign/send/poll contract invocation"""
+
+    def __init__(self, url: str = settings.soroban_rpc_url,
+                 max_connections: int = settings.soroban_rpc_max_connections,
+                 timeout: float = settings.soroban_rpc_timeout,
+                 network_passphrase: str = settings.stellar_network_passphrase):
+        self.url = url
+        self.max_connections = max(1, max_connections)
+        self.timeout = timeout
+        self.network_passphrase = network_passphrase
+        self._http: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ids = itertools.count(1)
+        self._in_flight = 0
+        self.sequences = SequenceManager(self._load_sequence)
+
+    # ------------------------------------------------------------------
+    # Transport
+    # ------------------------------------------------------------------
+
+    def _client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._http.is_closed or self._loop is not loop:
+            self._http = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections, keepalive_expiry=60),
+                headers={"Content-Type": "application/json"},
+            )
+            self._loop = loop
+        return self._http
+
+    async def request(self, method: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """One JSON-RPC 2.0 call; returns ``result`` or raises SorobanRPCError"""
+        payload = {"jsonrpc": "2.0", "id": next(self._ids), "method": method}
+        if params is not None:
+            payload["params"] = params
+        self._in_flight += 1
+        try:
+            response = await self._client().post(self.url, json=payload)
+            response.raise_for_status()
+            body = response.json()
+        except httpx.TimeoutException as e:
+            metrics.inc("soroban_rpc_requests_total", rpc_method=method, outcome="timeout")
+            raise SorobanRPCError(f"Soroban RPC {method} timed out: {e!r}", kind="timeout") from e
+        except (httpx.HTTPError, ValueError) as e:
+            metrics.inc("soroban_rpc_requests_total", rpc_method=method, outcome="network")
+            raise SorobanRPCError(f"Soroban RPC {method} failed: {e}") from e
+        finally:
+            self._in_flight -= 1
+
+        if body.get("error"):
+            error = body["error"]
+            metrics.inc("soroban_rpc_requests_total", rpc_method=method, outcome="rpc_error")
+            raise SorobanRPCError(f"Soroban RPC {method}: {error.get('message', error)}", kind="rpc",
+                                  code=error.get("code"))
+        metrics.inc("soroban_rpc_requests_total", rpc_method=method, outcome="ok")
+        return body.get("result")
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    # ------------------------------------------------------------------
+    # RPC methods
+    # ------------------------------------------------------------------
+
+    async def get_health(self) -> Dict[str, Any]:
+        return await self.request("getHealth")
+
+    async def get_network(self) -> Dict[str, Any]:
+        return await self.request("getNetwork")
+
+    async def get_latest_ledger(self) -> "GetLatestLedgerResponse":
+        return GetLatestLedgerResponse.model_validate(await self.request("getLatestLedger"))
+
+    async def get_ledger_entries(self, keys: List["stellar_xdr.LedgerKey"]) -> "GetLedgerEntriesResponse":
+        result = await self.request("getLedgerEntries", {"keys": [key.to_xdr() for key in keys]})
+        return GetLedgerEntriesResponse.model_validate(result)
+
+    async def simulate_transaction(self, envelope: "TransactionEnvelope") -> "SimulateTransactionResponse":
+        result = await self.request("simulateTransaction", {"transaction": envelope.to_xdr()})
+        return SimulateTransactionResponse.model_validate(result)
+
+    async def send_transaction(self, envelope: "TransactionEnvelope") -> "SendTransactionResponse":
+        result = await self.request("sendTransaction", {"transaction": envelope.to_xdr()})
+        return SendTransactionResponse.model_validate(result)
+
+    async def get_transaction(self, tx_hash: str) -> "GetTransactionResponse":
+        return GetTransactionResponse.model_validate(await self.request("getTransaction", {"hash": tx_hash}))
+
+    async def wait_for_transaction(self, tx_hash: str,
+                                   timeout: float = settings.soroban_rpc_tx_timeout) -> "GetTransactionResponse":
+        """Poll getTransaction until the transaction is applied or failed"""
+        deadline = time.monotonic() + timeout
+        while True:
+            response = await self.get_transaction(tx_hash)
+            if response.status != GetTransactionStatus.NOT_FOUND:
+                return response
+            if time.monotonic() >= deadline:
+                raise SorobanRPCError(f"Transaction {tx_hash} not applied after {timeout:g} seconds",
+                                      kind="timeout")
+            await asyncio.sleep(settings.soroban_rpc_poll_interval)
+
+    async def get_events(self, contract_ids: List[str], start_ledger: Optional[int] = None,
+                         cursor: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
+        """
+        One page of contract events: {events: [...], latestLedger, cursor?}. Events
+        are raw RPC dicts (id, ledger, contractId, topic/value as SCVal XDR, txHash).
+        Pass ``cursor`` to continue after a previous page, else ``start_ledger``.
+        """
+        params: Dict[str, Any] = {
+            "filters": [{"type": "contract", "contractIds": contract_ids}],
+            "pagination": {"limit": limit, **({"cursor": cursor} if cursor else {})},
+        }
+        if not cursor:
+            params["startLedger"] = start_ledger
+        return await self.request("getEvents", params)
+
+    async def get_account(self, public_key: str) -> "Account":
+        """Source account with its current sequence number, via getLedgerEntries"""
+        key = stellar_xdr.LedgerKey(
+            type=stellar_xdr.LedgerEntryType.ACCOUNT,
+            account=stellar_xdr.LedgerKeyAccount(account_id=Keypair.from_public_key(public_key).xdr_account_id()),
+        )
+        response = await self.get_ledger_entries([key])
+        if not response.entries:
+            raise SorobanRPCError(f"Account not found: {public_key}", kind="account_not_found")
+        entry = stellar_xdr.LedgerEntryData.from_xdr(response.entries[0].xdr)
+        return Account(public_key, entry.account.seq_num.sequence_number.int64)
+
+    async def _load_sequence(self, public_key: str) -> int:
+        """
+        Sequence number for the shared SequenceManager. The same leases back
+        Horizon submissions (app/services/soroban_service.py), so an unreachable
+        RPC node falls back to Horizon rather than failing those too.
+        """
+        try:
+            return (await self.get_account(public_key)).sequence
+        except SorobanRPCError as e:
+            if e.kind == "account_not_found":
+                raise
+            logger.warning(f"Loading sequence of {public_key[:8]}… over RPC failed ({e}), using Horizon")
+        return (await horizon.load_account(public_key)).sequence
+
+    # ------------------------------------------------------------------
+    # Contract invocation
+    # ------------------------------------------------------------------
+
+    def _build(self, account: "Account", contract_id: str, method: str,
+               parameters: List["stellar_xdr.SCVal"], operation_source: Optional[str] = None) -> "TransactionEnvelope":
+        return (
+            TransactionBuilder(account, self.network_passphrase, base_fee=BASE_FEE)
+            .append_invoke_contract_function_op(contract_id, method, parameters, source=operation_source)
+            .set_timeout(TX_VALIDITY_SECONDS)
+            .build()
+        )
+
+    @staticmethod
+    def _simulation_error(simulation: "SimulateTransactionResponse") -> Optional[SorobanRPCError]:
+        if simulation.error:
+            parsed = parse_error(simulation.error)
+            kind = parsed["error_kind"] if parsed["error_kind"] != "cli" else "simulation"
+            return SorobanRPCError(parsed["error"], kind=kind, code=parsed["error_code"])
+        if simulation.restore_preamble:
+            return SorobanRPCError("Contract state is archived and must be restored first", kind="archived")
+        return None
+
+    async def _simulate(self, envelope: "TransactionEnvelope") -> "SimulateTransactionResponse":
+        simulation = await self.simulate_transaction(envelope)
+        error = self._simulation_error(simulation)
+        if error:
+            raise error
+        return simulation
+
+    async def _view(self, contract_id: str, method: str, parameters: List["stellar_xdr.SCVal"],
+                    source: str) -> Dict[str, Any]:
+        # Simulation does not check the sequence number
+        simulation = await self._simulate(self._build(Account(source, 0), contract_id, method, parameters))
+        value = simulation.results[0].xdr if simulation.results else None
+        data = decode(stellar_xdr.SCVal.from_xdr(value)) if value else None
+        return {"success": True, "data": data, "tx_hash": None, "ledger": simulation.latest_ledger}
+
+    async def _submit(self, contract_id: str, method: str, parameters: List["stellar_xdr.SCVal"],
+                      timeout: float) -> Dict[str, Any]:
+        # Simulation ignores the sequence number, so it runs before an account is leased.
+        # The admin authorizes as operation source whichever account sends the transaction.
+        admin = self.admin_public_key()
+        simulation = await self._simulate(self._build(Account(admin, 0), contract_id, method, parameters, admin))
+
+        async with self.sequences.lease() as lease:
+            bad_seq_retries = try_again_retries = 0
+            while True:
+                envelope = _assemble_transaction(
+                    self._build(lease.source(), contract_id, method, parameters, lease.operation_source), simulation
+                )
+                for signer in lease.signers():
+                    envelope.sign(signer)
+                try:
+                    sent = await self.send_transaction(envelope)
+                except Exception:
+                    lease.forget()
+                    raise
+                code = _result_code(sent.error_result_xdr) if sent.status == SendTransactionStatus.ERROR else None
+                if code == "txBAD_SEQ" and bad_seq_retries < MAX_SEQUENCE_RETRIES:
+                    bad_seq_retries += 1
+                    await lease.resync()
+                    continue
+                if sent.status == SendTransactionStatus.TRY_AGAIN_LATER and try_again_retries < MAX_TRY_AGAIN_RETRIES:
+                    # The account's previous transaction is still pending; the sequence number is not used up
+                    await lease.wait_for_pending(try_again_retries)
+                    try_again_retries += 1
+                    continue
+                if sent.status in (SendTransactionStatus.PENDING, SendTransactionStatus.DUPLICATE):
+                    lease.commit()
+                break
+        tx_hash = envelope.hash_hex()
+
+        if sent.status == SendTransactionStatus.ERROR:
+            raise SorobanRPCError(f"Transaction rejected: {code or 'unknown error'}",
+                                  kind=_RESULT_KINDS.get(code, "rejected"))
+        if sent.status == SendTransactionStatus.TRY_AGAIN_LATER:
+            raise SorobanRPCError(f"RPC node still asked to retry the submission later after "
+                                  f"{MAX_TRY_AGAIN_RETRIES} resends", kind="network")
+
+        applied = await self.wait_for_transaction(tx_hash, timeout)
+        meta = stellar_xdr.TransactionMeta.from_xdr(applied.result_meta_xdr) if applied.result_meta_xdr else None
+        if applied.status == GetTransactionStatus.FAILED:
+            code = _result_code(applied.result_xdr)
+            contract_code = _contract_error_code(meta) if meta else None
+            raise SorobanRPCError(
+                f"Transaction failed: {code or 'unknown error'}"
+                + (f" Error(Contract, #{contract_code})" if contract_code is not None else ""),
+                kind="contract" if contract_code is not None
+                else "budget" if _resource_limit_exceeded(applied.result_xdr)
+                else _RESULT_KINDS.get(code, "rejected"),
+                code=contract_code,
+            )
+        soroban_meta = meta.v3.soroban_meta if meta is not None and meta.v3 else None
+        data = decode(soroban_meta.return_value) if soroban_meta else None
+        events = _contract_events(soroban_meta) if soroban_meta else []
+        return {"success": True, "data": data, "tx_hash": tx_hash, "ledger": applied.ledger, "events": events}
+
+    async def invoke(self, contract_id: str, method: str, parameters: List["stellar_xdr.SCVal"],
+                     source: Optional[str] = None, view: bool = False,
+                     timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Simulate (view) or submit one contract call. Returns {success, data | error,
+        error_kind, error_code, tx_hash, ledger, events, duration_ms}; never raises.
+        Writes are authorized by STELLAR_ADMIN_SECRET and sent from a leased source
+        account (see sequence_manager); views simulate as ``source``.
+        """
+        if timeout is None:
+            timeout = settings.soroban_rpc_tx_timeout
+        mode = "view" if view else "invoke"
+        started = time.perf_counter()
+        try:
+            if not STELLAR_SDK_AVAILABLE:
+                raise SorobanRPCError("stellar-sdk is not installed", kind="cli_missing")
+            if view:
+                source = source or self.admin_public_key()
+                if not source:
+                    raise SorobanRPCError("No source account for simulation; set STELLAR_ADMIN_SECRET",
+                                          kind="auth")
+                result = await self._view(contract_id, method, parameters, source)
+            else:
+                if not settings.stellar_admin_secret:
+                    raise SorobanRPCError("STELLAR_ADMIN_SECRET is not set", kind="auth")
+                result = await self._submit(contract_id, method, parameters, timeout)
+        except SorobanRPCError as e:
+            result = {"success": False, "error": str(e)[:MAX_ERROR_CHARS], "error_kind": e.kind,
+                      "error_code": e.code if e.kind == "contract" else None}
+        except Exception as e:
+            logger.exception(f"Soroban RPC {method} failed unexpectedly")
+            result = {"success": False, "error": f"Contract call failed: {e}"[:MAX_ERROR_CHARS],
+                      "error_kind": "rpc"}
+
+        duration = time.perf_counter() - started
+        result["duration_ms"] = round(duration * 1000, 1)
+        outcome = "ok" if result["success"] else result["error_kind"]
+        metrics.inc("soroban_rpc_calls_total", method=method, mode=mode, outcome=outcome)
+        metrics.observe("soroban_rpc_duration_seconds", duration, mode=mode)
+        if not result["success"]:
+            logger.warning(f"Soroban RPC {method} failed ({outcome}): {result['error']}")
+        return result
+
+    @staticmethod
+    def admin_public_key() -> Optional[str]:
+        if not settings.stellar_admin_secret or not STELLAR_SDK_AVAILABLE:
+            return None
+        try:
+            return Keypair.from_secret(settings.stellar_admin_secret).public_key
+        except Exception:
+            return None
+
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "max_connections": self.max_connections,
+            "in_flight": self._in_flight,
+            "connected": self._http is not None and not self._http.is_closed,
+            "sequences": self.sequences.status(),
+        }
+
+
+# Singleton instance
+soroban_rpc = SorobanRPCClient()
+metrics.gauge_callback("soroban_rpc_in_flight", soroban_rpc.in_flight, "Soroban JSON-RPC requests in flight")
@@ -4,15 +4,18 @@ Replaces Web3.py with Stellar SDK for blockchain operations
 """
 
 import os
-import asyncio
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable
 from datetime import datetime
 import logging
 
+from app.services.account_cache import account_cache, native_balance
+from app.services.horizon_client import HorizonError, horizon
+from app.services.sequence_manager import MAX_SEQUENCE_RETRIES
+from app.services.soroban_rpc import soroban_rpc
+
 try:
-    from stellar_sdk import Server, Keypair, TransactionBuilder, Network, SorobanServer
+    from stellar_sdk import Keypair, TransactionBuilder, Network, SorobanServer
     from stellar_sdk import Asset, Account, Claimant
-    from stellar_sdk.exceptions import NotFoundError, BadRequestError
 except ImportError:
     print("Warning: stellar-sdk not installed. Install with: pip install stellar-sdk")
     stellar_sdk_available = False
@@ -36,8 +39,7 @@ class StellarService:
         self.contract_id = os.getenv("CHAINFUND_CONTRACT_ID")
         self.admin_secret = os.getenv("STELLAR_ADMIN_SECRET")
 
-        # Initialize server
-        self.server = Server(horizon_url=self.horizon_url)
+        # Horizon requests go through the pooled async client (app/services/horizon_client.py)
 
         # Initialize Soroban server for contract interactions
         self.soroban_server = SorobanServer(
@@ -64,7 +66,7 @@ class StellarService:
             wasm_id = install_result.contract_id
             
             # Build contract deployment transaction
-            account = await self.server.load_account(admin_keypair.public_key)
+            account = await horizon.load_account(admin_keypair.public_key)
             transaction = (
                 TransactionBuilder(
                     source_account=account,
@@ -168,18 +170,16 @@ class StellarService:
     async def get_account_info(self, public_key: str) -> Optional[Dict[str, Any]]:
         """Get account information from Stellar"""
         try:
-            account = await asyncio.get_event_loop().run_in_executor(
-                None, self.server.accounts().account_id(public_key).call
-            )
+            account = await account_cache.info(public_key)
+            if account is None:
+                return None
             return {
-                "id": account.id,
-                "sequence": account.sequence,
-                "balances": account.balances,
-                "signers": account.signers,
-                "data": account.data
+                "id": account["id"],
+                "sequence": account["sequence"],
+                "balances": account["balances"],
+                "signers": account["signers"],
+                "data": account["data"]
             }
-        except NotFoundError:
-            return None
         except Exception as e:
             logger.error(f"Error getting account info: {e}")
             return None
@@ -190,29 +190,12 @@ class StellarService:
             if not self.admin_secret:
                 raise ValueError("Admin secret key not configured")
 
-            admin_keypair = Keypair.from_secret(self.admin_secret)
-            admin_account = await asyncio.get_event_loop().run_in_executor(
-                None, self.server.load_account, admin_keypair.public_key
-            )
-
-            transaction = (
-                TransactionBuilder(
-                    source_account=admin_account,
-                    network_passphrase=self.network_passphrase,
-                    base_fee=100
-                )
-                .append_create_account_op(
+            response = await self._submit_admin_transaction(
+                lambda builder, source: builder.append_create_account_op(
                     destination=destination,
-                    starting_balance=starting_balance
+                    starting_balance=starting_balance,
+                    source=source
                 )
-                .set_timeout(30)
-                .build()
-            )
-
-            transaction.sign(admin_keypair)
-
-            response = await asyncio.get_event_loop().run_in_executor(
-                None, self.server.submit_transaction, transaction
             )
 
             return response["successful"]
@@ -221,22 +204,58 @@ class StellarService:
             logger.error(f"Error creating account: {e}")
             return False
 
+    async def _submit_admin_transaction(
+        self, add_operations: Callable[["TransactionBuilder", Optional[str]], "TransactionBuilder"]
+    ) -> Dict[str, Any]:
+        """
+        Submit admin operations on a leased source account and sequence number
+        (shared with the Soroban RPC client), instead of reloading the admin
+        account for every transaction. ``add_operations(builder, source)`` appends
+        the operations with ``source`` as their source account.
+        """
+        async with soroban_rpc.sequences.lease() as lease:
+            for attempt in range(MAX_SEQUENCE_RETRIES + 1):
+                builder = TransactionBuilder(
+                    source_account=lease.source(),
+                    network_passphrase=self.network_passphrase,
+                    base_fee=100
+                )
+                transaction = add_operations(builder, lease.operation_source).set_timeout(30).build()
+                for signer in lease.signers():
+                    transaction.sign(signer)
+
+                try:
+                    response = await horizon.submit_transaction(transaction.to_xdr())
+                except HorizonError as e:
+                    if e.result_code == "tx_bad_seq" and attempt < MAX_SEQUENCE_RETRIES:
+                        await lease.resync()
+                        continue
+                    if e.result_code == "tx_failed":
+                        lease.commit()  # applied with failed operations: the sequence number is used
+                    elif e.result_code is None:
+                        lease.forget()  # no verdict (timeout, Horizon down): it may still land
+                    raise
+                except Exception:
+                    lease.forget()
+                    raise
+                finally:
+                    account_cache.invalidate_transaction(transaction)
+                lease.commit()
+                return response
+
     async def get_transaction_history(self, account_id: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Get transaction history for an account"""
         try:
-            transactions = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.server.transactions().for_account(account_id).limit(limit).call()
-            )
+            transactions = await horizon.transactions(account_id, limit)
 
             return [{
-                "id": tx.id,
-                "successful": tx.successful,
-                "source_account": tx.source_account,
-                "created_at": tx.created_at,
-                "fee_charged": tx.fee_charged,
-                "operation_count": tx.operation_count
-            } for tx in transactions["_embedded"]["records"]]
+                "id": tx["id"],
+                "successful": tx["successful"],
+                "source_account": tx["source_account"],
+                "created_at": tx["created_at"],
+                "fee_charged": tx["fee_charged"],
+                "operation_count": tx["operation_count"]
+            } for tx in transactions]
 
         except Exception as e:
             logger.error(f"Error getting transaction history: {e}")
@@ -272,9 +291,7 @@ class StellarService:
 
             # Load backer account
             backer_keypair = Keypair.from_secret(backer_address)  # In practice, this would be handled differently
-            backer_account = await asyncio.get_event_loop().run_in_executor(
-                None, self.server.load_account, backer_keypair.public_key
-            )
+            backer_account = await horizon.load_account(backer_keypair.public_key)
 
             # Create payment transaction
             transaction = (
@@ -294,9 +311,10 @@ class StellarService:
 
             transaction.sign(backer_keypair)
 
-            response = await asyncio.get_event_loop().run_in_executor(
-                None, self.server.submit_transaction, transaction
-            )
+            try:
+                response = await horizon.submit_transaction(transaction.to_xdr())
+            finally:
+                account_cache.invalidate_transaction(transaction)
 
             return response["successful"]
 
@@ -325,55 +343,37 @@ class StellarService:
     async def get_campaign_balance(self, contract_address: str) -> int:
         """Get the XLM balance of a campaign contract"""
         try:
-            account = await asyncio.get_event_loop().run_in_executor(
-                None, self.server.accounts().account_id(contract_address).call
-            )
+            account = await account_cache.summary(contract_address)
+            return int(float(native_balance(account)))
 
-            # Find XLM balance
-            for balance in account.balances:
-                if balance.asset_type == "native":
-                    return int(float(balance.balance))
-
-            return 0
-
-        except NotFoundError:
-            return 0
         except Exception as e:
             logger.error(f"Error getting campaign balance: {e}")
             return 0
 
+    async def get_account_balances(self, addresses: List[str]) -> Dict[str, int]:
+        """XLM balances of many accounts (e.g. every backer of a campaign) in batched lookups"""
+        try:
+            accounts = await account_cache.prefetch(addresses)
+            return {address: int(float(native_balance(account))) for address, account in accounts.items()}
+        except Exception as e:
+            logger.error(f"Error getting account balances: {e}")
+            return {address: 0 for address in addresses}
+
     async def release_milestone_funds(self, campaign_contract: str, creator_address: str, amount: int) -> bool:
         """Release funds from campaign contract to creator"""
         try:
             if not self.admin_secret:
                 raise ValueError("Admin secret key not configured")
 
-            admin_keypair = Keypair.from_secret(self.admin_secret)
-            admin_account = await asyncio.get_event_loop().run_in_executor(
-                None, self.server.load_account, admin_keypair.public_key
-            )
-
             # Create payment transaction from contract to creator
             # Note: In Soroban, this would be a contract call
-            transaction = (
-                TransactionBuilder(
-                    source_account=admin_account,  # In practice, this would be the contract
-                    network_passphrase=self.network_passphrase,
-                    base_fee=100
-                )
-                .append_payment_op(
+            response = await self._submit_admin_transaction(
+                lambda builder, source: builder.append_payment_op(
                     destination=creator_address,
                     asset=Asset.native(),
-                    amount=str(amount)
+                    amount=str(amount),
+                    source=source  # In practice, this would be the contract
                 )
-                .set_timeout(30)
-                .build()
-            )
-
-            transaction.sign(admin_keypair)
-
-            response = await asyncio.get_event_loop().run_in_executor(
-                None, self.server.submit_transaction, transaction
             )
 
             return response["successful"]
@@ -385,11 +385,7 @@ class StellarService:
     async def get_network_status(self) -> Dict[str, Any]:
         """Get current network status"""
         try:
-            ledger = await asyncio.get_event_loop().run_in_executor(
-                None, self.server.ledgers().order(desc=True).limit(1).call
-            )
-
-            latest_ledger = ledger["_embedded"]["records"][0]
+            latest_ledger = await horizon.latest_ledger()
 
             return {
                 "latest_ledger": latest_ledger["sequence"],
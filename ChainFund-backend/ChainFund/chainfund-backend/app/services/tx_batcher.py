@@ -0,0 +1,228 @@
+"""
+Transaction Batcher
+===================
+Packs bulk contract writes (SBT mints, reward mints, refunds) into fewer
+transactions.
+
+A Soroban transaction carries a single contract invocation, so batching
+means calling the contracts' batch entry points: requests arriving within
+TX_BATCH_WINDOW_MS of each other with the same batch key are gathered (up
+to TX_BATCH_MAX_ITEMS) and sent as one ``batch_mint`` /
+``batch_mint_reward`` call. The batch pays one fee, one sequence number
+and one round of simulate/send/poll. Each caller gets its own result back:
+items are matched to the mint events the transaction emitted, so an item
+the contract skipped (e.g. a duplicate SBT role) fails on its own. A batch
+that exceeds the transaction's resource budget is split in halves and
+retried; any other failure (auth, fees, balance) fails every item.
+Refunds already cover every backer in one call; concurrent refund
+requests for a campaign share that call.
+
+A batch of one uses the single-item method, which reports the contract's
+own error code.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.account_cache import account_cache
+from app.services.contract_spec import encode_args
+from app.services.contract_view_cache import contract_view_cache
+from app.services.soroban_rpc import soroban_rpc
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Failures that depend on the batch size: simulation budget exceeded, transaction above the
+# network's resource limits, or resource limit hit when applied. Anything else fails the batch.
+_SPLIT_KINDS = ("budget",)
+
+metrics.describe("tx_batches_total", "counter", "Batched contract transactions by kind and outcome")
+metrics.histogram("tx_batch_size", "Items per batched contract transaction by kind",
+                  buckets=(1, 2, 5, 10, 20, 50, 100))
+
+Flush = Callable[[tuple, List[Any]], Awaitable[List[Dict[str, Any]]]]
+
+
+class TransactionBatcher:
+    """Time/size-window batching of contract writes with per-item results"""
+
+    def __init__(self, window: float = settings.tx_batch_window_ms / 1000,
+                 max_items: int = settings.tx_batch_max_items):
+        self.window = window
+        self.max_items = max(1, max_items)
+        self._pending: Dict[Tuple[str, tuple], dict] = {}  # (kind, key) -> {items, futures, timer}
+        self._flushing = 0
+
+    # ------------------------------------------------------------------
+    # Public operations
+    # ------------------------------------------------------------------
+
+    async def mint_sbt(self, contract_id: str, recipient: str, role: int, campaign_id: int,
+                       metadata_uri: str = "") -> Dict[str, Any]:
+        """Mint one SBT; ``data`` is the new token id"""
+        return await self._enqueue("sbt_mint", (contract_id, campaign_id, metadata_uri), (recipient, int(role)),
+                                   self._flush_sbt_mints)
+
+    async def mint_reward(self, contract_id: str, recipient: str, amount: int) -> Dict[str, Any]:
+        """Mint reward tokens to one recipient; ``data`` is the amount minted"""
+        return await self._enqueue("reward_mint", (contract_id,), (recipient, int(amount)),
+                                   self._flush_reward_mints)
+
+    async def refund_backers(self, contract_id: str, campaign_id: int, admin_address: str) -> Dict[str, Any]:
+        """Refund every backer of a campaign; concurrent requests for it share one call"""
+        return await self._enqueue("refund", (contract_id, campaign_id, admin_address), None, self._flush_refunds)
+
+    # ------------------------------------------------------------------
+    # Windowing
+    # ------------------------------------------------------------------
+
+    async def _enqueue(self, kind: str, key: tuple, item: Any, flush: Flush) -> Dict[str, Any]:
+        future = asyncio.get_running_loop().create_future()
+        batch = self._pending.get((kind, key))
+        if batch is None:
+            batch = self._pending[(kind, key)] = {"items": [], "futures": [], "timer": None}
+            batch["timer"] = asyncio.get_running_loop().call_later(
+                self.window, self._close, kind, key, flush
+            )
+        batch["items"].append(item)
+        batch["futures"].append(future)
+        if len(batch["items"]) >= self.max_items:
+            batch["timer"].cancel()
+            self._close(kind, key, flush)
+        # The transaction goes out regardless; a cancelled caller just stops waiting for it
+        return await asyncio.shield(future)
+
+    def _close(self, kind: str, key: tuple, flush: Flush):
+        batch = self._pending.pop((kind, key), None)
+        if batch is not None:
+            asyncio.ensure_future(self._run(kind, key, batch, flush))
+
+    async def _run(self, kind: str, key: tuple, batch: dict, flush: Flush):
+        self._flushing += 1
+        try:
+            results = await flush(key, batch["items"])
+        except Exception as e:
+            logger.exception(f"📦 {kind} batch of {len(batch['items'])} failed unexpectedly")
+            results = [{"success": False, "error": f"Batch failed: {e}", "error_kind": "rpc"}] * len(batch["items"])
+        finally:
+            self._flushing -= 1
+        for future, result in zip(batch["futures"], results):
+            if not future.done():
+                future.set_result(result)
+
+    # ------------------------------------------------------------------
+    # Submission
+    # ------------------------------------------------------------------
+
+    async def _invoke(self, kind: str, contract_id: str, method: str, args: List[str],
+                      size: int) -> Dict[str, Any]:
+        """One write over the RPC client, with cache invalidation like contracts_v2.invoke_contract"""
+        admin = soroban_rpc.admin_public_key()
+        try:
+            parameters = encode_args(method, args, aliases={"admin": admin} if admin else None)
+        except ValueError as e:
+            return {"success": False, "error": str(e), "error_kind": "invalid_args"}
+        result = await soroban_rpc.invoke(contract_id, method, parameters)
+        contract_view_cache.invalidate_for_write(method, args, result)
+        account_cache.invalidate_for_write(args)
+        metrics.inc("tx_batches_total", kind=kind, outcome="ok" if result["success"] else result["error_kind"])
+        metrics.observe("tx_batch_size", size, kind=kind)
+        return result
+
+    async def _split(self, flush: Flush, key: tuple, items: List[Any], result: Dict[str, Any]):
+        """Retry a failed batch as two halves when its size may be the cause"""
+        if len(items) > 1 and result.get("error_kind") in _SPLIT_KINDS:
+            middle = len(items) // 2
+            logger.info(f"📦 Splitting batch of {len(items)} after {result['error_kind']} failure")
+            halves = await asyncio.gather(flush(key, items[:middle]), flush(key, items[middle:]))
+            return halves[0] + halves[1]
+        return [dict(result) for _ in items]
+
+    @staticmethod
+    def _item_result(result: Dict[str, Any], data: Any, size: int) -> Dict[str, Any]:
+        return {"success": True, "data": data, "tx_hash": result.get("tx_hash"), "ledger": result.get("ledger"),
+                "batch_size": size}
+
+    @staticmethod
+    def _match_events(events: List[Dict[str, Any]], contract_id: str, name: str,
+                      recipients: List[str]) -> List[Optional[Any]]:
+        """Per recipient, in order, the value of its ``(name, recipient)`` event (None if not emitted)"""
+        emitted: Dict[str, List[Any]] = {}
+        for event in events:
+            topic = event["topic"]
+            if event["contract_id"] == contract_id and len(topic) == 2 and topic[0] == name:
+                emitted.setdefault(topic[1], []).append(event["value"])
+        return [emitted[r].pop(0) if emitted.get(r) else None for r in recipients]
+
+    async def _flush_sbt_mints(self, key: tuple, items: List[Tuple[str, int]]) -> List[Dict[str, Any]]:
+        contract_id, campaign_id, metadata_uri = key
+        if len(items) == 1:
+            recipient, role = items[0]
+            result = await self._invoke("sbt_mint", contract_id, "mint", [
+                "--caller", "admin", "--recipient", recipient, "--role", str(role),
+                "--campaign_id", str(campaign_id), "--metadata_uri", metadata_uri,
+            ], 1)
+            return [self._item_result(result, result["data"], 1) if result["success"] else result]
+
+        result = await self._invoke("sbt_mint", contract_id, "batch_mint", [
+            "--caller", "admin", "--recipients", json.dumps([[r, role] for r, role in items]),
+            "--campaign_id", str(campaign_id), "--metadata_uri", metadata_uri,
+        ], len(items))
+        if not result["success"]:
+            return await self._split(self._flush_sbt_mints, key, items, result)
+        # mint event: ("mint", recipient) -> (token_id, role, campaign_id)
+        values = self._match_events(result.get("events", []), contract_id, "mint", [r for r, _ in items])
+        return [
+            self._item_result(result, value[0], len(items)) if value else
+            {"success": False, "error": "Not minted: recipient already holds this role for the campaign",
+             "error_kind": "contract", "tx_hash": result.get("tx_hash")}
+            for value in values
+        ]
+
+    async def _flush_reward_mints(self, key: tuple, items: List[Tuple[str, int]]) -> List[Dict[str, Any]]:
+        contract_id = key[0]
+        if len(items) == 1:
+            recipient, amount = items[0]
+            result = await self._invoke("reward_mint", contract_id, "mint_reward", [
+                "--admin", "admin", "--to", recipient, "--amount", str(amount),
+            ], 1)
+            if result["success"] and result["data"] is False:
+                return [{"success": False, "error": "Reward token refused the mint (not its admin)",
+                         "error_kind": "auth", "tx_hash": result.get("tx_hash")}]
+            return [self._item_result(result, str(amount), 1) if result["success"] else result]
+
+        result = await self._invoke("reward_mint", contract_id, "batch_mint_reward", [
+            "--admin", "admin", "--rewards", json.dumps([[r, str(amount)] for r, amount in items]),
+        ], len(items))
+        if not result["success"]:
+            return await self._split(self._flush_reward_mints, key, items, result)
+        # MINT event: ("MINT", to) -> amount
+        values = self._match_events(result.get("events", []), contract_id, "MINT", [r for r, _ in items])
+        return [
+            self._item_result(result, value, len(items)) if value is not None else
+            {"success": False, "error": "Not minted", "error_kind": "contract", "tx_hash": result.get("tx_hash")}
+            for value in values
+        ]
+
+    async def _flush_refunds(self, key: tuple, items: List[None]) -> List[Dict[str, Any]]:
+        contract_id, campaign_id, admin_address = key
+        result = await self._invoke("refund", contract_id, "refund_backers", [
+            "--campaign_id", str(campaign_id), "--admin", admin_address,
+        ], len(items))
+        return [dict(result, batch_size=len(items)) for _ in items]
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "window_ms": round(self.window * 1000, 1),
+            "max_items": self.max_items,
+            "pending_batches": len(self._pending),
+            "pending_items": sum(len(b["items"]) for b in self._pending.values()),
+            "flushing": self._flushing,
+        }
+
+
+# Singleton instance
+tx_batcher = TransactionBatcher()
@@ -0,0 +1,76 @@
+"""
+Wallet Identity Index
+=====================
+Resolves any wallet linked to an account (registration wallet, primary
+wallet or a secondary wallet connection) to its user id.
+
+Resolution is a single primary-key lookup on the ``wallet_identity``
+table, fronted by an in-process LRU. Every write path that links a wallet
+to a user goes through ``link`` so the table stays authoritative.
+"""
+
+import logging
+from typing import Optional
+
+from app.database import get_db_connection
+from app.utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+CACHE_SIZE = 50_000
+
+
+class WalletIdentityIndex:
+    """Wallet address -> user id resolution"""
+
+    def __init__(self, cache_size: int = CACHE_SIZE):
+        self._cache = LRUCache(maxsize=cache_size)
+
+    def resolve(self, address: str) -> Optional[int]:
+        """Return the user id owning a wallet address, if any"""
+        if not address:
+            return None
+
+        user_id = self._cache.get(address)
+        if user_id is not None:
+            return user_id
+
+        with get_db_connection() as conn:
+            row = conn.execute(
+                "SELECT user_id FROM wallet_identity WHERE address = ?",
+                (address,)
+            ).fetchone()
+
+        if row is None:
+            # Misses are not cached so a fresh registration resolves immediately
+            return None
+
+        self._cache.set(address, row["user_id"])
+        return row["user_id"]
+
+    def link(self, cursor, address: str, user_id: int):
+        """
+        Point a wallet at a user inside the caller's transaction.
+        The cached entry is dropped rather than updated so a rolled back
+        transaction can never leave a wrong mapping behind.
+        """
+        if not address:
+            return
+        cursor.execute(
+            "INSERT OR REPLACE INTO wallet_identity (address, user_id) VALUES (?, ?)",
+            (address, user_id)
+        )
+        self._cache.pop(address)
+
+    def unlink(self, cursor, address: str):
+        """Remove a wallet from the index inside the caller's transaction"""
+        cursor.execute("DELETE FROM wallet_identity WHERE address = ?", (address,))
+        self._cache.pop(address)
+
+    def invalidate(self, address: str):
+        """Forget a cached mapping (e.g. after another worker re-linked it)"""
+        self._cache.pop(address)
+
+
+# Singleton instance
+wallet_identity = WalletIdentityIndex()
@@ -0,0 +1,94 @@
+"""
+Circuit breaker for calls to external providers
+"""
+
+import threading
+import time
+from typing import Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency for a while.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    ``allow()`` returns False until ``reset_timeout`` seconds have passed.
+    It then lets ``half_open_max`` trial calls through: a success closes it
+    again, a failure re-opens it for another ``reset_timeout``.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 half_open_max: int = 1):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.half_open_max = max(1, half_open_max)
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trials = 0
+        self._trial_at = 0.0
+        self._last_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trials = 0
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now (reserves a trial slot when half-open)"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN:
+                now = time.monotonic()
+                # A trial that never reported back (e.g. cancelled) frees its slot after reset_timeout
+                if self._trials < self.half_open_max or now - self._trial_at >= self.reset_timeout:
+                    self._trials = min(self._trials + 1, self.half_open_max)
+                    self._trial_at = now
+                    return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trials = 0
+
+    def record_failure(self, error: Optional[str] = None):
+        with self._lock:
+            self._last_error = error
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._trials = 0
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a trial call through (0 when closed)"""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def snapshot(self) -> dict:
+        state = self.state
+        return {
+            "name": self.name,
+            "state": state,
+            "consecutive_failures": self._failures,
+            "retry_after_seconds": round(self.retry_after(), 1),
+            "last_error": self._last_error,
+        }
@@ -0,0 +1,35 @@
+"""
+Cancel request work when the HTTP client goes away
+"""
+
+import asyncio
+from typing import Awaitable, TypeVar
+
+from fastapi import HTTPException, Request
+
+T = TypeVar("T")
+
+# nginx's "client closed request"; never actually delivered to the client
+CLIENT_CLOSED_REQUEST = 499
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T], poll_interval: float = 0.5) -> T:
+    """
+    Await ``awaitable`` while watching the connection. If the client
+    disconnects first, the work is cancelled (freeing e.g. an AI call slot)
+    and a 499 is raised.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
+    finally:
+        if not task.done():
+            # The handler itself was cancelled (e.g. server shutdown)
+            task.cancel()
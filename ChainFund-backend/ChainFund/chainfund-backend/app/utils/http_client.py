@@ -0,0 +1,181 @@
+"""
+Shared async HTTP client for outbound calls (Horizon, Friendbot, IPFS pinning)
+
+One pooled ``httpx.AsyncClient`` (keep-alive, at most HTTP_MAX_CONNECTIONS
+sockets) replaces blocking ``requests`` calls and ``run_in_executor``
+wrappers around the synchronous stellar-sdk ``Server``. Per host it adds:
+
+- a concurrency limit (HTTP_MAX_PER_HOST), so one slow upstream cannot
+  take every connection;
+- a timeout on every request (HTTP_TIMEOUT);
+- retries with jittered exponential backoff for idempotent requests on
+  connection errors, timeouts, 429 and 502-504 (honouring Retry-After);
+- a circuit breaker that fails fast while the host keeps failing.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.config import settings
+from app.utils.circuit_breaker import CircuitBreaker
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_SECONDS = 0.2
+RETRY_MAX_SECONDS = 5.0
+RETRY_STATUSES = (429, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+
+metrics.describe("http_client_requests_total", "counter", "Outbound HTTP requests by host, method and outcome")
+metrics.histogram("http_client_duration_seconds", "Outbound HTTP request latency (including retries) by host")
+
+
+class UpstreamError(Exception):
+    """A request that failed after retries, or was refused by an open breaker"""
+
+    def __init__(self, message: str, host: str, status: Optional[int] = None,
+                 response: Optional[httpx.Response] = None):
+        super().__init__(message)
+        self.host = host
+        self.status = status
+        self.response = response
+
+
+def retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Full-jitter exponential backoff, or the server's Retry-After when it sent one"""
+    if retry_after:
+        try:
+            return min(RETRY_MAX_SECONDS, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * (2 ** attempt)))
+
+
+class AsyncHTTPClient:
+    """Pooled client with per-host limits, retries and circuit breakers"""
+
+    def __init__(self, timeout: float = settings.http_timeout,
+                 max_connections: int = settings.http_max_connections,
+                 max_per_host: int = settings.http_max_per_host,
+                 max_retries: int = settings.http_max_retries):
+        self.timeout = timeout
+        self.max_connections = max(1, max_connections)
+        self.max_per_host = max(1, max_per_host)
+        self.max_retries = max(0, max_retries)
+        self._http: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._in_flight = 0
+
+    def _client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._http.is_closed or self._loop is not loop:
+            self._http = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections, keepalive_expiry=60),
+            )
+            self._slots = {}
+            self._loop = loop
+        return self._http
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        if host not in self._breakers:
+            self._breakers[host] = CircuitBreaker(
+                host,
+                failure_threshold=settings.http_breaker_failure_threshold,
+                reset_timeout=settings.http_breaker_reset_seconds,
+            )
+        return self._breakers[host]
+
+    async def request(self, method: str, url: str, idempotent: Optional[bool] = None,
+                      timeout: Optional[float] = None, **kwargs) -> httpx.Response:
+        """
+        Send a request and return the response, whatever its status. Raises
+        UpstreamError when the host is unreachable, keeps answering 5xx/429
+        after retries, or its breaker is open. ``idempotent`` (default: by
+        method) allows retries of POSTs that are safe to repeat.
+        """
+        method = method.upper()
+        host = urlsplit(url).netloc
+        retries = self.max_retries if (method in IDEMPOTENT_METHODS if idempotent is None else idempotent) else 0
+        breaker = self.breaker(host)
+        client = self._client()
+        slots = self._slots.setdefault(host, asyncio.Semaphore(self.max_per_host))
+        started = time.perf_counter()
+        attempt = 0
+        try:
+            while True:
+                if not breaker.allow():
+                    self._count(host, method, "breaker_open")
+                    raise UpstreamError(f"{host} is unavailable (circuit open, retry in "
+                                        f"{breaker.retry_after():.0f}s)", host)
+                response, error = None, None
+                async with slots:
+                    self._in_flight += 1
+                    try:
+                        response = await client.request(method, url, timeout=timeout or self.timeout, **kwargs)
+                    except httpx.HTTPError as e:
+                        error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+                    finally:
+                        self._in_flight -= 1
+
+                if response is not None and response.status_code not in RETRY_STATUSES \
+                        and response.status_code < 500:
+                    breaker.record_success()
+                    self._count(host, method, "ok" if response.is_success else f"http_{response.status_code}")
+                    return response
+                if response is not None:
+                    error = f"HTTP {response.status_code}"
+                breaker.record_failure(error)
+                if attempt >= retries:
+                    self._count(host, method, "error")
+                    raise UpstreamError(f"{method} {host} failed: {error}", host,
+                                        status=response.status_code if response is not None else None,
+                                        response=response)
+                delay = retry_delay(attempt, response.headers.get("Retry-After") if response is not None else None)
+                attempt += 1
+                self._count(host, method, "retry")
+                logger.debug(f"Retrying {method} {url} in {delay:.2f}s after {error}")
+                await asyncio.sleep(delay)
+        finally:
+            metrics.observe("http_client_duration_seconds", time.perf_counter() - started, host=host)
+
+    @staticmethod
+    def _count(host: str, method: str, outcome: str):
+        metrics.inc("http_client_requests_total", host=host, method=method, outcome=outcome)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "max_connections": self.max_connections,
+            "max_per_host": self.max_per_host,
+            "in_flight": self._in_flight,
+            "breakers": [b.snapshot() for b in self._breakers.values()],
+        }
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+# Singleton instance
+http_client = AsyncHTTPClient()
+metrics.gauge_callback("http_client_in_flight", http_client.in_flight, "Outbound HTTP requests in flight")
@@ -0,0 +1,116 @@
+"""
+Perceptual image hashes (pHash, dHash) for proof images
+
+The functions here are top-level and take/return plain values so they can
+run in a process pool (see app/utils/process_pool.py).
+"""
+
+import base64
+import binascii
+import hashlib
+import io
+import re
+from functools import lru_cache
+from typing import Optional
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:
+    np = None
+    Image = None
+
+MAX_IMAGE_BYTES = 15 * 1024 * 1024
+MAX_IMAGE_PIXELS = 50_000_000  # refuse decompression bombs
+
+_DATA_URI = re.compile(r"^data:image/[\w.+-]+;base64,", re.IGNORECASE)
+
+
+def available() -> bool:
+    return np is not None and Image is not None
+
+
+def decode_image_payload(value: Optional[str]) -> Optional[bytes]:
+    """
+    Bytes of an inline image given as a data URI or bare base64.
+    Returns None for URLs, IPFS hashes and anything that isn't base64.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    match = _DATA_URI.match(value)
+    if match:
+        value = value[match.end():]
+    elif len(value) < 64 or "://" in value:
+        return None
+    try:
+        data = base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    return data if 0 < len(data) <= MAX_IMAGE_BYTES else None
+
+
+@lru_cache(maxsize=4)
+def _dct_matrix(n: int) -> "np.ndarray":
+    """Orthonormal DCT-II basis, so a 2-D DCT is D @ X @ D.T"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+def _bits_to_int(bits: "np.ndarray") -> int:
+    return int.from_bytes(np.packbits(bits.astype(np.uint8).ravel()).tobytes(), "big")
+
+
+def open_image(data: bytes) -> "Image.Image":
+    image = Image.open(io.BytesIO(data))
+    width, height = image.size
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ValueError(f"Image too large ({width}x{height})")
+    return image
+
+
+def phash(gray: "Image.Image") -> int:
+    """64-bit DCT hash: low 8x8 frequencies of a 32x32 thumbnail against their median"""
+    pixels = np.asarray(gray.resize((32, 32), Image.LANCZOS), dtype=np.float64)
+    dct = _dct_matrix(32)
+    low = (dct @ pixels @ dct.T)[:8, :8]
+    # The DC term only encodes overall brightness
+    return _bits_to_int(low > np.median(low.ravel()[1:]))
+
+
+def dhash(gray: "Image.Image") -> int:
+    """64-bit gradient hash: each pixel brighter than its right neighbour on a 9x8 thumbnail"""
+    pixels = np.asarray(gray.resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def fingerprint(data: bytes) -> dict:
+    """sha256, pHash, dHash and size of an encoded image (runs in a worker process)"""
+    image = open_image(data)
+    width, height = image.size
+    # JPEG can decode straight to a small greyscale image, much faster than full size
+    image.draft("L", (128, 128))
+    gray = image.convert("L")
+    return {
+        "sha256": sha256(data),
+        "phash": phash(gray),
+        "dhash": dhash(gray),
+        "width": width,
+        "height": height,
+    }
+
+
+def to_signed(value: int) -> int:
+    """Unsigned 64-bit hash as SQLite's signed INTEGER"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
@@ -0,0 +1,170 @@
+"""
+In-process metrics (counters, gauges and histograms) with Prometheus text exposition
+"""
+
+import bisect
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Seconds; suits calls from a few milliseconds to a slow LLM completion
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _labels(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in key)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(key, escaped)) + "}"
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class MetricsRegistry:
+    """Thread-safe counters/gauges/histograms; gauges may also be computed at scrape time"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self._values: Dict[str, Dict[LabelKey, float]] = {}
+        self._callbacks: Dict[str, Callable[[], float]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, List[float]]] = {}  # per-bucket counts + [sum, count]
+
+    def describe(self, name: str, metric_type: str, help_text: str = ""):
+        with self._lock:
+            self._meta[name] = (metric_type, help_text)
+            self._values.setdefault(name, {})
+
+    def inc(self, name: str, amount: float = 1.0, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._values.setdefault(name, {})[_labels(labels)] = float(value)
+
+    def histogram(self, name: str, help_text: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS):
+        with self._lock:
+            self._meta[name] = ("histogram", help_text)
+            self._buckets[name] = tuple(sorted(buckets))
+            self._histograms.setdefault(name, {})
+
+    def observe(self, name: str, value: float, **labels):
+        """Record one observation in a histogram (declared with ``histogram`` or default buckets)"""
+        key = _labels(labels)
+        with self._lock:
+            buckets = self._buckets.setdefault(name, DEFAULT_BUCKETS)
+            series = self._histograms.setdefault(name, {})
+            counts = series.get(key)
+            if counts is None:
+                counts = series[key] = [0.0] * (len(buckets) + 2)
+            counts[bisect.bisect_left(buckets, value)] += 1  # lands in +Inf past the last bound
+            counts[-2] += value
+            counts[-1] += 1
+
+    def quantile(self, name: str, q: float, **labels) -> float:
+        """Approximate quantile, interpolated within the bucket (0.0 without observations)"""
+        with self._lock:
+            buckets = self._buckets.get(name, DEFAULT_BUCKETS)
+            counts = list(self._histograms.get(name, {}).get(_labels(labels), ()))
+        if not counts or not counts[-1]:
+            return 0.0
+        rank, seen = q * counts[-1], 0.0
+        for i, bound in enumerate(buckets):
+            if seen + counts[i] >= rank:
+                lower = buckets[i - 1] if i else 0.0
+                return lower + (bound - lower) * ((rank - seen) / counts[i] if counts[i] else 0.0)
+            seen += counts[i]
+        return buckets[-1]
+
+    def gauge_callback(self, name: str, callback: Callable[[], float], help_text: str = ""):
+        """Register a gauge whose value is computed when metrics are read"""
+        with self._lock:
+            self._meta[name] = ("gauge", help_text)
+            self._callbacks[name] = callback
+
+    def value(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._values.get(name, {}).get(_labels(labels), 0.0)
+
+    def total(self, name: str) -> float:
+        """Sum over all label combinations"""
+        with self._lock:
+            return sum(self._values.get(name, {}).values())
+
+    def _collect(self) -> Dict[str, Dict[LabelKey, float]]:
+        with self._lock:
+            values = {name: dict(series) for name, series in self._values.items()}
+            callbacks = list(self._callbacks.items())
+        for name, callback in callbacks:
+            try:
+                values[name] = {(): float(callback())}
+            except Exception:
+                continue
+        return values
+
+    def _collect_histograms(self) -> Dict[str, Dict[LabelKey, List[float]]]:
+        with self._lock:
+            return {name: {key: list(counts) for key, counts in series.items()}
+                    for name, series in self._histograms.items()}
+
+    def snapshot(self) -> Dict[str, object]:
+        """JSON-friendly view: plain numbers for unlabelled series, count/sum/p50/p95 for histograms"""
+        out = {}
+        for name, series in sorted(self._collect().items()):
+            if set(series) == {()}:
+                out[name] = series[()]
+            else:
+                out[name] = {",".join(f"{k}={v}" for k, v in key): value for key, value in series.items()}
+        for name, series in sorted(self._collect_histograms().items()):
+            summaries = {}
+            for key, counts in series.items():
+                labels = dict(key)
+                summaries[",".join(f"{k}={v}" for k, v in key)] = {
+                    "count": int(counts[-1]),
+                    "sum": round(counts[-2], 6),
+                    "p50": round(self.quantile(name, 0.5, **labels), 6),
+                    "p95": round(self.quantile(name, 0.95, **labels), 6),
+                }
+            out[name] = summaries
+        return out
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        for name, series in sorted(self._collect().items()):
+            metric_type, help_text = self._meta.get(name, ("untyped", ""))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for key, value in sorted(series.items()):
+                lines.append(f"{name}{_format_labels(key)} {_format_number(value)}")
+        for name, series in sorted(self._collect_histograms().items()):
+            _, help_text = self._meta.get(name, ("histogram", ""))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            buckets = self._buckets.get(name, DEFAULT_BUCKETS)
+            for key, counts in sorted(series.items()):
+                cumulative = 0.0
+                for bound, count in zip((*buckets, "+Inf"), counts):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else _format_number(bound)
+                    lines.append(f"{name}_bucket{_format_labels(key + (('le', le),))} {_format_number(cumulative)}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_number(counts[-2])}")
+                lines.append(f"{name}_count{_format_labels(key)} {_format_number(counts[-1])}")
+        return "\n".join(lines) + "\n"
+
+
+# Singleton instance
+metrics = MetricsRegistry()
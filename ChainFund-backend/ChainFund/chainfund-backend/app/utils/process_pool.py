@@ -0,0 +1,48 @@
+"""
+Shared process pool for CPU-bound work (image decoding and hashing)
+
+Decoding and resizing images holds the GIL, so it runs in worker
+processes instead of threads; the event loop only awaits the result.
+The pool is created on first use and shut down from the app lifespan.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, TypeVar
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=max(1, settings.image_workers))
+    return _pool
+
+
+async def run_in_process(fn: Callable[..., T], *args) -> T:
+    """Run a top-level function with picklable arguments in the pool"""
+    global _pool
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_pool(), fn, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool once
+        logger.error("Process pool broken, restarting it")
+        _pool = None
+        return await loop.run_in_executor(get_pool(), fn, *args)
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -4,13 +4,14 @@ Helper functions for faucet, keypair generation, transaction building
 """
 
 import os
-import requests
 from typing import Optional, Dict, Any
 import logging
 
+from app.services.horizon_client import HorizonError, horizon
+from app.utils.http_client import UpstreamError, http_client
+
 try:
-    from stellar_sdk import Keypair, Server, TransactionBuilder, Network
-    from stellar_sdk.exceptions import BadRequestError, NotFoundError
+    from stellar_sdk import Keypair, TransactionBuilder, Network
 except ImportError:
     print("Warning: stellar-sdk not installed. Install with: pip install stellar-sdk")
     stellar_sdk_available = False
@@ -31,8 +32,6 @@ class StellarUtils:
         self.horizon_url = os.getenv("STELLAR_HORIZON_URL", "https://horizon-testnet.stellar.org")
         self.friendbot_url = os.getenv("STELLAR_FRIENDBOT_URL", "https://friendbot.stellar.org")
 
-        self.server = Server(horizon_url=self.horizon_url)
-
     def generate_keypair(self) -> Dict[str, str]:
         """Generate a new Stellar keypair"""
         keypair = Keypair.random()
@@ -41,13 +40,15 @@ class StellarUtils:
             "secret_key": keypair.secret
         }
 
-    def fund_account(self, public_key: str) -> bool:
+    async def fund_account(self, public_key: str) -> bool:
         """Fund a testnet account using Friendbot"""
         try:
-            response = requests.get(f"{self.friendbot_url}?addr={public_key}")
-            response.raise_for_status()
+            response = await http_client.get(self.friendbot_url, params={"addr": public_key})
+            if response.status_code != 200:
+                logger.error(f"Failed to fund account {public_key}: HTTP {response.status_code}")
+                return False
             return True
-        except requests.RequestException as e:
+        except UpstreamError as e:
             logger.error(f"Failed to fund account {public_key}: {e}")
             return False
 
@@ -67,18 +68,16 @@ class StellarUtils:
         except Exception:
             return False
 
-    def get_account_sequence(self, public_key: str) -> Optional[int]:
+    async def get_account_sequence(self, public_key: str) -> Optional[int]:
         """Get the sequence number for an account"""
         try:
-            account = self.server.accounts().account_id(public_key).call()
-            return int(account.sequence)
-        except NotFoundError:
-            return None
+            account = await horizon.get_account(public_key)
+            return int(account["sequence"]) if account else None
         except Exception as e:
             logger.error(f"Error getting account sequence: {e}")
             return None
 
-    def build_transaction(
+    async def build_transaction(
         self,
         source_keypair: Keypair,
         operations: list,
@@ -87,7 +86,7 @@ class StellarUtils:
     ) -> Optional[Any]:
         """Build a Stellar transaction"""
         try:
-            source_account = self.server.load_account(source_keypair.public_key)
+            source_account = await horizon.load_account(source_keypair.public_key)
 
             transaction_builder = (
                 TransactionBuilder(
@@ -114,17 +113,17 @@ class StellarUtils:
             logger.error(f"Error building transaction: {e}")
             return None
 
-    def submit_transaction(self, transaction) -> Dict[str, Any]:
+    async def submit_transaction(self, transaction) -> Dict[str, Any]:
         """Submit a transaction to the network"""
         try:
-            response = self.server.submit_transaction(transaction)
+            response = await horizon.submit_transaction(transaction.to_xdr())
             return {
                 "successful": response["successful"],
                 "hash": response["hash"],
                 "ledger": response.get("ledger"),
                 "result_xdr": response.get("result_xdr")
             }
-        except BadRequestError as e:
+        except HorizonError as e:
             logger.error(f"Transaction failed: {e}")
             return {
                 "successful": False,
@@ -137,11 +136,10 @@ class StellarUtils:
                 "error": str(e)
             }
 
-    def get_network_info(self) -> Dict[str, Any]:
+    async def get_network_info(self) -> Dict[str, Any]:
         """Get current network information"""
         try:
-            ledger = self.server.ledgers().order(desc=True).limit(1).call()
-            latest_ledger = ledger["_embedded"]["records"][0]
+            latest_ledger = await horizon.latest_ledger()
 
             return {
                 "latest_ledger": latest_ledger["sequence"],
@@ -168,9 +166,9 @@ def generate_stellar_keypair() -> Dict[str, str]:
     return stellar_utils.generate_keypair()
 
 
-def fund_testnet_account(public_key: str) -> bool:
+async def fund_testnet_account(public_key: str) -> bool:
     """Fund a testnet account"""
-    return stellar_utils.fund_account(public_key)
+    return await stellar_utils.fund_account(public_key)
 
 
 def validate_stellar_address(address: str) -> bool:
@@ -178,6 +176,6 @@ def validate_stellar_address(address: str) -> bool:
     return stellar_utils.validate_public_key(address)
 
 
-def get_account_sequence_number(public_key: str) -> Optional[int]:
+async def get_account_sequence_number(public_key: str) -> Optional[int]:
     """Get account sequence number"""
-    return stellar_utils.get_account_sequence(public_key)
\ No newline at end of file
+    return await stellar_utils.get_account_sequence(public_key)
\ No newline at end of file
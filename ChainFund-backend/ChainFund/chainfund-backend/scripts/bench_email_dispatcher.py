@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Email dispatcher benchmark
+Runs a minimal local SMTP stand-in and compares messages/second for
+the old one-connection-per-message path against the pooled dispatcher.
+
+The stand-in can add latency to connection setup and AUTH to model the
+TLS handshake and login round trips of a real provider:
+
+    python scripts/bench_email_dispatcher.py --messages 500 --connect-ms 40 --auth-ms 20
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+class SMTPStandIn:
+    """Just enough SMTP (EHLO, AUTH, MAIL, RCPT, DATA, NOOP, RSET, QUIT) to accept mail"""
+
+    def __init__(self, connect_delay: float, auth_delay: float):
+        self.connect_delay = connect_delay
+        self.auth_delay = auth_delay
+        self.received = 0
+        self.connections = 0
+        self.port = None
+        self._ready = threading.Event()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        await asyncio.sleep(self.connect_delay)
+        writer.write(b"220 localhost ESMTP stand-in\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line[:4].upper()
+                if command == b"EHLO":
+                    writer.write(b"250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+                elif command == b"AUTH":
+                    await asyncio.sleep(self.auth_delay)
+                    writer.write(b"235 2.7.0 Authentication successful\r\n")
+                elif command == b"DATA":
+                    writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    await writer.drain()
+                    while (await reader.readline()) not in (b".\r\n", b""):
+                        pass
+                    self.received += 1
+                    writer.write(b"250 2.0.0 Ok: queued\r\n")
+                elif command == b"QUIT":
+                    writer.write(b"221 2.0.0 Bye\r\n")
+                    await writer.drain()
+                    break
+                else:
+                    writer.write(b"250 Ok\r\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _run(self):
+        async def main():
+            server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+            self.port = server.sockets[0].getsockname()[1]
+            self._ready.set()
+            async with server:
+                await server.serve_forever()
+        asyncio.run(main())
+
+    def start(self) -> int:
+        threading.Thread(target=self._run, daemon=True).start()
+        self._ready.wait()
+        return self.port
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--connect-ms", type=float, default=40, help="Simulated handshake latency")
+    parser.add_argument("--auth-ms", type=float, default=20, help="Simulated AUTH latency")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--pool-size", type=int, default=2)
+    args = parser.parse_args()
+
+    stand_in = SMTPStandIn(args.connect_ms / 1000, args.auth_ms / 1000)
+    port = stand_in.start()
+
+    # EmailConfig reads the environment at import time
+    os.environ.update({
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(port),
+        "SMTP_USER": "bench",
+        "SMTP_PASSWORD": "bench",
+        "SMTP_USE_TLS": "false",
+        "EMAILS_ENABLED": "true",
+        "EMAIL_SENDER_EMAIL": "bench@localhost",
+    })
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    from app.services.email_service import email_service
+    from app.services.email_dispatcher import EmailDispatcher
+
+    subject, html = email_service.templates.welcome_email("Bench User", "bench@example.com")
+    recipients = [f"backer{i}@example.com" for i in range(args.messages)]
+
+    print(f"📧 SMTP stand-in on 127.0.0.1:{port} "
+          f"(connect {args.connect_ms:.0f}ms, auth {args.auth_ms:.0f}ms)")
+    print(f"  - Messages: {args.messages}")
+
+    # Baseline: one SMTP session per message, sent inline
+    start = time.perf_counter()
+    for to_email in recipients:
+        email_service._send_email(to_email, subject, html)
+    baseline = time.perf_counter() - start
+    baseline_connections = stand_in.connections
+
+    # Dispatcher: pooled sessions fed by the async queue
+    async def run_dispatcher():
+        dispatcher = EmailDispatcher(email_service, workers=args.workers, pool_size=args.pool_size,
+                                     rate_limit=0, provider_rate_limits="")
+        dispatcher.start()
+        start = time.perf_counter()
+        futures = [dispatcher.submit(to_email, subject, html) for to_email in recipients]
+        results = await asyncio.gather(*futures)
+        elapsed = time.perf_counter() - start
+        await dispatcher.stop()
+        return elapsed, sum(results), dispatcher.pool.opened
+
+    pooled, delivered, pooled_connections = asyncio.run(run_dispatcher())
+
+    print(f"\n🐢 Per-message connections: {args.messages / baseline:8.1f} msg/s "
+          f"({baseline_connections} connections)")
+    print(f"🚀 Pooled dispatcher:       {args.messages / pooled:8.1f} msg/s "
+          f"({pooled_connections} connections, {args.workers} workers)")
+    print(f"  - Delivered: {delivered}/{args.messages}")
+    print(f"✅ Speedup: {baseline / pooled:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
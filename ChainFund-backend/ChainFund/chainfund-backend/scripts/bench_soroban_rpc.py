@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Soroban RPC benchmark
+Runs the local RPC stub (scripts/soroban_rpc_stub.py) and compares
+contract reads per second for a fresh connection per call - what every
+``stellar`` CLI process pays, before its own start-up - against the pooled
+keep-alive client used by the v2 contract endpoints.
+
+The stub can add latency to connection setup and to every request to model
+the TLS handshake and round trip to a remote RPC node:
+
+    python scripts/bench_soroban_rpc.py --calls 500 --connect-ms 40 --latency-ms 20
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from soroban_rpc_stub import SorobanRPCStub  # noqa: E402
+
+SBT_CONTRACT = "CBN4UZRCLFTWQUVNJIV7KDNX4QSONEUMWHRDSO3OQEAWPFTQTQRWXODP"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--connect-ms", type=float, default=40, help="Simulated handshake latency")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Simulated per-request latency")
+    args = parser.parse_args()
+
+    stub = SorobanRPCStub(latency=args.latency_ms / 1000, connect_delay=args.connect_ms / 1000).start()
+    os.environ["SOROBAN_RPC_URL"] = stub.url
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    from stellar_sdk import Keypair
+    from app.services.contract_spec import encode_args
+    from app.services.soroban_rpc import SorobanRPCClient
+
+    user = Keypair.random().public_key
+    parameters = encode_args("get_reputation", ["--user", user])
+
+    print(f"🛰️  Soroban RPC stub on {stub.url} "
+          f"(connect {args.connect_ms:.0f}ms, request {args.latency_ms:.0f}ms)")
+    print(f"  - Calls: {args.calls}, concurrency {args.concurrency}")
+
+    async def run(pooled: bool):
+        shared = SorobanRPCClient(url=stub.url, max_connections=args.concurrency)
+        slots = asyncio.Semaphore(args.concurrency)
+        ok = 0
+
+        async def one():
+            nonlocal ok
+            async with slots:
+                client = shared if pooled else SorobanRPCClient(url=stub.url, max_connections=1)
+                result = await client.invoke(SBT_CONTRACT, "get_reputation", parameters, source=user, view=True)
+                ok += result["success"]
+                if not pooled:
+                    await client.aclose()
+
+        connections = stub.connections
+        start = time.perf_counter()
+        await asyncio.gather(*[one() for _ in range(args.calls)])
+        elapsed = time.perf_counter() - start
+        await shared.aclose()
+        return elapsed, ok, stub.connections - connections
+
+    baseline, baseline_ok, baseline_connections = asyncio.run(run(pooled=False))
+    pooled, pooled_ok, pooled_connections = asyncio.run(run(pooled=True))
+    stub.stop()
+
+    print(f"\n🐢 Connection per call: {args.calls / baseline:8.1f} calls/s "
+          f"({baseline_connections} connections, {baseline_ok} ok)")
+    print(f"🚀 Pooled client:       {args.calls / pooled:8.1f} calls/s "
+          f"({pooled_connections} connections, {pooled_ok} ok)")
+    print(f"✅ Speedup: {baseline / pooled:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Chain index tool
+Records, replays and backfills the contract event index
+(app/services/chain_indexer.py) outside the running server.
+
+    # Save events from the RPC node (SOROBAN_RPC_URL) as a fixture
+    python scripts/chain_index.py record --from 1000 --to 5000 --out events.json
+
+    # Apply a recorded fixture to the local database, twice to check idempotency
+    python scripts/chain_index.py replay scripts/fixtures/chain_events.json --times 2
+
+    # Index a historical range in parallel chunks
+    python scripts/chain_index.py backfill --from 1000 --to 200000 --chunk 5000 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.database import init_database  # noqa: E402
+from app.services.chain_indexer import chain_indexer  # noqa: E402
+from app.services.soroban_rpc import soroban_rpc  # noqa: E402
+
+
+async def record(args):
+    chain_indexer.configure()
+    events = await chain_indexer.fetch_range(args.start, args.end)
+    with open(args.out, "w") as f:
+        json.dump({
+            "description": f"Recorded from {soroban_rpc.url}, ledgers {args.start}-{args.end}",
+            "contracts": {"chainfund_core": chain_indexer.core_contract_id,
+                          "chainfund_sbt": chain_indexer.sbt_contract_id},
+            "admin": chain_indexer.admin_address,
+            "events": events,
+        }, f, indent=2)
+    print(f"📼 Recorded {len(events)} events to {args.out}")
+
+
+async def replay(args):
+    with open(args.fixture) as f:
+        fixture = json.load(f)
+    contracts = fixture.get("contracts", {})
+    chain_indexer.configure(contracts.get("chainfund_core"), contracts.get("chainfund_sbt"), fixture.get("admin"))
+    for attempt in range(args.times):
+        applied = await chain_indexer.replay(fixture["events"])
+        print(f"  - Pass {attempt + 1}: {len(fixture['events'])} events, {applied} applied")
+
+
+async def backfill(args):
+    chain_indexer.configure()
+    result = await chain_indexer.backfill(args.start, args.end, args.chunk, args.concurrency)
+    print(f"  - {result['ranges']} ranges, {result['events']} events, {result['applied']} applied "
+          f"in {result['duration_ms']:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="Save contract events as a fixture")
+    record_parser.add_argument("--from", dest="start", type=int, required=True)
+    record_parser.add_argument("--to", dest="end", type=int, required=True)
+    record_parser.add_argument("--out", required=True)
+
+    replay_parser = commands.add_parser("replay", help="Apply a recorded fixture")
+    replay_parser.add_argument("fixture")
+    replay_parser.add_argument("--times", type=int, default=1)
+
+    backfill_parser = commands.add_parser("backfill", help="Index a ledger range from the RPC node")
+    backfill_parser.add_argument("--from", dest="start", type=int, required=True)
+    backfill_parser.add_argument("--to", dest="end", type=int, required=True)
+    backfill_parser.add_argument("--chunk", type=int, default=2000)
+    backfill_parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    init_database()
+    print(f"⛓️  Chain index: {args.command}")
+
+    async def run():
+        try:
+            await {"record": record, "replay": replay, "backfill": backfill}[args.command](args)
+        finally:
+            await soroban_rpc.aclose()
+
+    asyncio.run(run())
+    status = chain_indexer.status()
+    print(f"✅ Indexed rows: {status['rows']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Horizon stub
+Local stand-in for Horizon and Friendbot, for tests and benchmarks of the
+async Horizon client (app/services/horizon_client.py) without network access.
+
+Serves GET /accounts/{id}, /accounts/{id}/transactions, /ledgers and
+/friendbot?addr=, and POST /transactions, over keep-alive HTTP. Accounts
+hold native balances and sequence numbers: create-account and native
+payment operations move funds, and a stale sequence number gets a 400
+with ``tx_bad_seq`` like Horizon. Faults can be injected: ``--fail-rate``
+answers that share of requests with a 503, ``fail_next`` (for tests) the
+next N requests, and ``--latency-ms`` delays every request.
+
+    python scripts/horizon_stub.py --port 8001 --latency-ms 20 --fail-rate 0.1
+
+Then run the backend with STELLAR_HORIZON_URL=http://127.0.0.1:8001 and
+STELLAR_FRIENDBOT_URL=http://127.0.0.1:8001/friendbot.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from stellar_sdk import TransactionEnvelope
+from stellar_sdk.operation import CreateAccount, Payment
+
+NETWORK_PASSPHRASE = "Test SDF Network ; September 2015"
+START_LEDGER = 1000
+START_SEQUENCE = 4_000_000_000
+FRIENDBOT_AMOUNT = 10_000
+BASE_RESERVE = 1
+
+
+def _problem(status: int, title: str, detail: str = "", extras: Optional[dict] = None) -> Tuple[int, dict]:
+    body = {"type": f"https://stellar.org/horizon-errors/{title.lower().replace(' ', '_')}",
+            "title": title, "status": status, "detail": detail}
+    if extras:
+        body["extras"] = extras
+    return status, body
+
+
+def _tx_failed(envelope_xdr: str, code: str, operations: Optional[list] = None) -> Tuple[int, dict]:
+    result_codes = {"transaction": code}
+    if operations:
+        result_codes["operations"] = operations
+    return _problem(400, "Transaction Failed", "The transaction failed when submitted to the stellar network.",
+                    {"envelope_xdr": envelope_xdr, "result_codes": result_codes})
+
+
+class HorizonStub:
+    """In-memory Horizon; start() serves it on a background thread"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, fail_rate: float = 0.0,
+                 close_delay: float = 5.0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.fail_next = 0  # the next N requests get a 503
+        self.fail_status = 503
+        self.close_delay = close_delay
+        self.accounts: Dict[str, dict] = {}  # account id -> {"balance": float, "sequence": int}
+        self.transactions: Dict[str, list] = {}  # account id -> records, oldest first
+        self.requests = 0
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self.url = f"http://{host}:{self._server.server_address[1]}"
+
+    def start(self) -> "HorizonStub":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def ledger(self) -> int:
+        return START_LEDGER + int((time.monotonic() - self._started) / max(self.close_delay, 0.001))
+
+    def fund(self, account_id: str, amount: float = FRIENDBOT_AMOUNT):
+        """Create (or top up) an account directly, for test setup"""
+        with self._lock:
+            account = self.accounts.setdefault(account_id, {"balance": 0.0, "sequence": START_SEQUENCE})
+            account["balance"] += amount
+
+    # ------------------------------------------------------------------
+    # Routes
+    # ------------------------------------------------------------------
+
+    def _account_record(self, account_id: str) -> dict:
+        account = self.accounts[account_id]
+        return {
+            "id": account_id,
+            "account_id": account_id,
+            "sequence": str(account["sequence"]),
+            "subentry_count": 0,
+            "balances": [{"balance": f"{account['balance']:.7f}", "asset_type": "native"}],
+            "signers": [{"key": account_id, "weight": 1, "type": "ed25519_public_key"}],
+            "thresholds": {"low_threshold": 0, "med_threshold": 0, "high_threshold": 0},
+            "data": {},
+        }
+
+    def get_account(self, account_id: str, query: dict) -> Tuple[int, dict]:
+        with self._lock:
+            if account_id not in self.accounts:
+                return _problem(404, "Resource Missing", "The resource at the url requested was not found.")
+            return 200, self._account_record(account_id)
+
+    def get_transactions(self, account_id: str, query: dict) -> Tuple[int, dict]:
+        limit = int(query.get("limit", 10))
+        with self._lock:
+            if account_id not in self.accounts:
+                return _problem(404, "Resource Missing", "The resource at the url requested was not found.")
+            records = list(self.transactions.get(account_id, []))
+        if query.get("order", "asc") == "desc":
+            records.reverse()
+        return 200, {"_embedded": {"records": records[:limit]}}
+
+    def get_ledgers(self, query: dict) -> Tuple[int, dict]:
+        return 200, {"_embedded": {"records": [{
+            "sequence": self.ledger,
+            "base_fee_in_stroops": 100,
+            "base_reserve_in_stroops": BASE_RESERVE * 10_000_000,
+            "closed_at": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }]}}
+
+    def friendbot(self, query: dict) -> Tuple[int, dict]:
+        account_id = (query.get("addr") or "").strip()
+        with self._lock:
+            if account_id in self.accounts:
+                return _problem(400, "Bad Request", "createAccountAlreadyExist")
+            self.accounts[account_id] = {"balance": float(FRIENDBOT_AMOUNT), "sequence": self.ledger << 32}
+        return 200, {"successful": True, "hash": f"{random.getrandbits(256):064x}"}
+
+    def submit(self, form: dict) -> Tuple[int, dict]:
+        try:
+            envelope = TransactionEnvelope.from_xdr(form.get("tx", ""), NETWORK_PASSPHRASE)
+        except Exception as e:
+            return _problem(400, "Transaction Malformed", str(e), {"envelope_xdr": form.get("tx")})
+        tx = envelope.transaction
+        source = tx.source.account_id
+        if not envelope.signatures:
+            return _tx_failed(form["tx"], "tx_bad_auth")
+        with self._lock:
+            if source not in self.accounts:
+                return _tx_failed(form["tx"], "tx_no_source_account")
+            if tx.sequence != self.accounts[source]["sequence"] + 1:
+                return _tx_failed(form["tx"], "tx_bad_seq")
+            self.accounts[source]["sequence"] = tx.sequence
+            balances = {k: a["balance"] for k, a in self.accounts.items()}
+            codes = []
+            for op in tx.operations:
+                op_source = op.source.account_id if op.source else source
+                if isinstance(op, CreateAccount):
+                    amount = float(op.starting_balance)
+                    if op.destination in balances:
+                        codes.append("op_already_exists")
+                        continue
+                    balances[op.destination] = 0.0
+                    destination = op.destination
+                elif isinstance(op, Payment) and op.asset.is_native():
+                    amount = float(op.amount)
+                    destination = op.destination.account_id
+                    if destination not in balances:
+                        codes.append("op_no_destination")
+                        continue
+                else:
+                    codes.append("op_success")
+                    continue
+                if balances.get(op_source, 0.0) - amount < BASE_RESERVE:
+                    codes.append("op_underfunded")
+                    continue
+                balances[op_source] -= amount
+                balances[destination] += amount
+                codes.append("op_success")
+            if any(code != "op_success" for code in codes):
+                return _tx_failed(form["tx"], "tx_failed", codes)  # sequence number consumed, balances untouched
+            for account_id, balance in balances.items():
+                self.accounts.setdefault(account_id, {"balance": 0.0, "sequence": self.ledger << 32})
+                self.accounts[account_id]["balance"] = balance
+            record = {
+                "id": envelope.hash_hex(),
+                "hash": envelope.hash_hex(),
+                "successful": True,
+                "ledger": self.ledger,
+                "source_account": source,
+                "source_account_sequence": str(tx.sequence),
+                "created_at": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "fee_charged": str(tx.fee),
+                "operation_count": len(tx.operations),
+                "envelope_xdr": form["tx"],
+            }
+            for account_id in {source} | {op.source.account_id for op in tx.operations if op.source}:
+                self.transactions.setdefault(account_id, []).append(record)
+        return 200, dict(record, result_xdr="")
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    def dispatch(self, method: str, path: str, query: dict, form: dict) -> Tuple[int, dict]:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            inject = self.fail_next > 0 or (self.fail_rate and random.random() < self.fail_rate)
+            if self.fail_next > 0:
+                self.fail_next -= 1
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if inject:
+                return _problem(self.fail_status, "Service Unavailable", "Injected failure")
+            parts = [p for p in path.split("/") if p]
+            if method == "POST" and parts == ["transactions"]:
+                return self.submit(form)
+            if method == "GET" and len(parts) == 2 and parts[0] == "accounts":
+                return self.get_account(parts[1], query)
+            if method == "GET" and len(parts) == 3 and parts[0] == "accounts" and parts[2] == "transactions":
+                return self.get_transactions(parts[1], query)
+            if method == "GET" and parts == ["ledgers"]:
+                return self.get_ledgers(query)
+            if method == "GET" and parts == ["friendbot"]:
+                return self.friendbot(query)
+            return _problem(404, "Resource Missing", "The resource at the url requested was not found.")
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def setup(self):
+                super().setup()
+                stub.connections += 1
+
+            def _respond(self, method: str):
+                url = urlsplit(self.path)
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+                form = {k: v[-1] for k, v in parse_qs(body).items()}
+                status, response = stub.dispatch(method, url.path, query, form)
+                data = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/hal+json" if status < 400 else "application/problem+json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Horizon stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Added to every request")
+    parser.add_argument("--fail-rate", type=float, default=0, help="Share of requests answered with a 503")
+    parser.add_argument("--fund", nargs="*", default=[], help="Account ids to create with a Friendbot balance")
+    args = parser.parse_args()
+
+    stub = HorizonStub(args.host, args.port, args.latency_ms / 1000, args.fail_rate)
+    for account_id in args.fund:
+        stub.fund(account_id)
+    print(f"Horizon stub listening on {stub.url}")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
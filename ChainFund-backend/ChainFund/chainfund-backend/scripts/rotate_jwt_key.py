@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Rotate the JWT signing key
+New tokens are signed with the new key; tokens signed by retired keys
+stay valid until they expire or the key falls off the ring.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.key_ring import key_ring, MAX_KEYS
+
+
+def main():
+    old_kid, _ = key_ring.active_key()
+    new_kid = key_ring.rotate()
+
+    print(f"🔑 Key ring: {key_ring.path}")
+    print(f"  - Retired kid: {old_kid}")
+    print(f"  - Active kid:  {new_kid}")
+    print(f"  - Keeping the newest {MAX_KEYS} keys for verification")
+    print("✅ Running workers pick up the new key on their next token")
+
+
+if __name__ == "__main__":
+    main()
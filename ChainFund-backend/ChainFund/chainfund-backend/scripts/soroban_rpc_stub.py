@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Soroban RPC stub
+Local stand-in for a Soroban RPC node, for tests and benchmarks of the
+native client (app/services/soroban_rpc.py) without network access.
+
+Serves getHealth, getNetwork, getLatestLedger, getLedgerEntries (accounts),
+simulateTransaction, sendTransaction, getTransaction and getEvents over
+keep-alive HTTP. Contract calls are answered from a table of canned return values per
+method; sequence numbers are tracked per account, so a stale sequence gets
+txBAD_SEQ like a real node. Transactions are applied ``--close-ms`` after
+submission, so clients have to poll; like stellar-core, a source account
+with a transaction still pending gets TRY_AGAIN_LATER. getEvents pages through a recorded
+event list (``--events``, e.g. scripts/fixtures/chain_events.json).
+
+    python scripts/soroban_rpc_stub.py --port 8000 --latency-ms 20 --connect-ms 40
+
+Then run the backend with SOROBAN_RPC_URL=http://127.0.0.1:8000 and any
+STELLAR_ADMIN_SECRET.
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from stellar_sdk import Keypair, SorobanDataBuilder, TransactionEnvelope, scval
+from stellar_sdk import xdr as stellar_xdr
+
+NETWORK_PASSPHRASE = "Test SDF Network ; September 2015"
+START_LEDGER = 1000
+START_SEQUENCE = 4_000_000_000
+PROTOCOL_VERSION = 21
+
+
+def _batch_mint(stub: "SorobanRPCStub", args: list):
+    """SBT batch_mint: one token per new (recipient, role, campaign), duplicates skipped like the contract"""
+    campaign_id = args[2].u32.uint32
+    token_ids, events = [], []
+    for pair in args[1].vec.sc_vec:
+        recipient, role = pair.vec.sc_vec
+        key = (recipient.to_xdr(), role.u32.uint32, campaign_id)
+        if key in stub.minted:
+            continue
+        stub.minted.add(key)
+        token_id = scval.to_uint64(len(stub.minted))
+        token_ids.append(token_id)
+        events.append(([scval.to_symbol("mint"), recipient], scval.to_vec([token_id, role, args[2]])))
+    return scval.to_vec(token_ids), events
+
+
+def _batch_mint_reward(stub: "SorobanRPCStub", args: list):
+    rewards = args[1].vec.sc_vec
+    events = [([scval.to_symbol("MINT"), pair.vec.sc_vec[0]], pair.vec.sc_vec[1]) for pair in rewards]
+    return scval.to_uint32(len(rewards)), events
+
+
+def default_responses() -> Dict[str, Any]:
+    """
+    Canned return values for the ChainFund contracts: an SCVal, or
+    callable(stub, args) -> SCVal or (SCVal, [(topics, data), ...]) to emit contract events
+    """
+    return {
+        "get_reputation": scval.to_uint32(150),
+        "get_config": scval.to_map({
+            scval.to_symbol("fee_bps"): scval.to_uint32(250),
+            scval.to_symbol("paused"): scval.to_bool(False),
+        }),
+        "get_backer": lambda stub, args: scval.to_map({
+            scval.to_symbol("amount"): scval.to_int128(10_000_000),
+            scval.to_symbol("voting_power"): scval.to_uint32(3162),
+        }),
+        "create_campaign": scval.to_uint32(1),
+        "mint": scval.to_uint64(1),
+        "batch_mint": _batch_mint,
+        "mint_reward": scval.to_bool(True),
+        "batch_mint_reward": _batch_mint_reward,
+    }
+
+
+class SorobanRPCStub:
+    """In-memory Soroban RPC node; start() serves it on a background thread"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, close_delay: float = 0.05,
+                 responses: Optional[Dict[str, Any]] = None, errors: Optional[Dict[str, int]] = None,
+                 connect_delay: float = 0.0, events: Optional[list] = None, max_batch: int = 0):
+        self.latency = latency
+        self.connect_delay = connect_delay  # models the TLS handshake of a new connection
+        self.close_delay = close_delay
+        self.responses = default_responses() if responses is None else responses
+        self.errors = dict(errors or {})  # method -> contract error code raised in simulation
+        self.max_batch = max_batch  # vec arguments longer than this exceed the simulated budget (0: no limit)
+        self.events = sorted(events or [], key=lambda e: e["id"])  # raw RPC events, as getEvents returns them
+        self.sequences: Dict[str, int] = {}
+        self.pending: Dict[str, float] = {}  # source account -> when its pending transaction is applied
+        self.transactions: Dict[str, dict] = {}
+        self.minted = set()  # (recipient, role, campaign_id) for batch_mint
+        self.requests = 0
+        self.connections = 0
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self.url = f"http://{host}:{self._server.server_address[1]}"
+
+    def start(self) -> "SorobanRPCStub":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def ledger(self) -> int:
+        # One ledger per close_delay, like a node closing ledgers every few seconds
+        return START_LEDGER + int((time.monotonic() - self._started) / max(self.close_delay, 0.001))
+
+    # ------------------------------------------------------------------
+    # RPC methods
+    # ------------------------------------------------------------------
+
+    def getHealth(self, params):
+        return {"status": "healthy", "latestLedger": self.ledger, "oldestLedger": START_LEDGER,
+                "ledgerRetentionWindow": 17280}
+
+    def getNetwork(self, params):
+        return {"passphrase": NETWORK_PASSPHRASE, "protocolVersion": PROTOCOL_VERSION}
+
+    def getLatestLedger(self, params):
+        return {"id": f"{self.ledger:064x}", "protocolVersion": PROTOCOL_VERSION, "sequence": self.ledger}
+
+    def getLedgerEntries(self, params):
+        entries = []
+        for key_xdr in params["keys"]:
+            key = stellar_xdr.LedgerKey.from_xdr(key_xdr)
+            if key.type != stellar_xdr.LedgerEntryType.ACCOUNT:
+                continue
+            account_id = key.account.account_id
+            public_key = Keypair.from_raw_ed25519_public_key(account_id.account_id.ed25519.uint256).public_key
+            with self._lock:
+                sequence = self.sequences.setdefault(public_key, START_SEQUENCE)
+            entry = stellar_xdr.LedgerEntryData(
+                type=stellar_xdr.LedgerEntryType.ACCOUNT,
+                account=stellar_xdr.AccountEntry(
+                    account_id=account_id,
+                    balance=stellar_xdr.Int64(10_000 * 10_000_000),
+                    seq_num=stellar_xdr.SequenceNumber(stellar_xdr.Int64(sequence)),
+                    num_sub_entries=stellar_xdr.Uint32(0),
+                    inflation_dest=None,
+                    flags=stellar_xdr.Uint32(0),
+                    home_domain=stellar_xdr.String32(b""),
+                    thresholds=stellar_xdr.Thresholds(b"\x01\x00\x00\x00"),
+                    signers=[],
+                    ext=stellar_xdr.AccountEntryExt(0),
+                ),
+            )
+            entries.append({"key": key_xdr, "xdr": entry.to_xdr(), "lastModifiedLedgerSeq": self.ledger})
+        return {"entries": entries, "latestLedger": self.ledger}
+
+    def _call(self, envelope: TransactionEnvelope):
+        invocation = envelope.transaction.operations[0].host_function.invoke_contract
+        method = invocation.function_name.sc_symbol.decode()
+        return method, list(invocation.args), invocation.contract_address.contract_id
+
+    def _execute(self, method: str, args: list, contract_id=None) -> Tuple[stellar_xdr.SCVal, list]:
+        """Return value and ContractEvents of a call"""
+        response = self.responses.get(method)
+        if response is None:
+            return stellar_xdr.SCVal(stellar_xdr.SCValType.SCV_VOID), []
+        result = response(self, args) if callable(response) else response
+        value, events = result if isinstance(result, tuple) else (result, [])
+        return value, [
+            stellar_xdr.ContractEvent(
+                ext=stellar_xdr.ExtensionPoint(0), contract_id=contract_id, type=stellar_xdr.ContractEventType.CONTRACT,
+                body=stellar_xdr.ContractEventBody(0, v0=stellar_xdr.ContractEventV0(topics=list(topics), data=data)),
+            )
+            for topics, data in events
+        ]
+
+    def simulateTransaction(self, params):
+        envelope = TransactionEnvelope.from_xdr(params["transaction"], NETWORK_PASSPHRASE)
+        method, args, _ = self._call(envelope)
+        if method in self.errors:
+            return {"error": f"HostError: Error(Contract, #{self.errors[method]})", "latestLedger": self.ledger}
+        if self.max_batch and len(args) > 1 and args[1].type == stellar_xdr.SCValType.SCV_VEC \
+                and len(args[1].vec.sc_vec) > self.max_batch:
+            return {"error": "HostError: Error(Budget, ExceededLimit)", "latestLedger": self.ledger}
+        # Simulating must not change state (batch_mint records what it minted)
+        with self._lock:
+            minted = set(self.minted)
+            value, _ = self._execute(method, args)
+            self.minted = minted
+        return {
+            "transactionData": SorobanDataBuilder().set_resource_fee(50_000).build().to_xdr(),
+            "minResourceFee": "50000",
+            "results": [{"auth": [], "xdr": value.to_xdr()}],
+            "latestLedger": self.ledger,
+        }
+
+    @staticmethod
+    def _failure(code: "stellar_xdr.TransactionResultCode") -> str:
+        return stellar_xdr.TransactionResult(
+            fee_charged=stellar_xdr.Int64(0),
+            result=stellar_xdr.TransactionResultResult(code=code),
+            ext=stellar_xdr.TransactionResultExt(0),
+        ).to_xdr()
+
+    def sendTransaction(self, params):
+        envelope = TransactionEnvelope.from_xdr(params["transaction"], NETWORK_PASSPHRASE)
+        tx_hash = envelope.hash_hex()
+        source = envelope.transaction.source.account_id
+        base = {"hash": tx_hash, "latestLedger": self.ledger, "latestLedgerCloseTime": str(int(time.time()))}
+        if not envelope.signatures:
+            return {**base, "status": "ERROR", "errorResultXdr": self._failure(stellar_xdr.TransactionResultCode.txBAD_AUTH)}
+        with self._lock:
+            if self.pending.get(source, 0.0) > time.monotonic():
+                return {**base, "status": "TRY_AGAIN_LATER"}
+            expected = self.sequences.setdefault(source, START_SEQUENCE) + 1
+            if envelope.transaction.sequence != expected:
+                return {**base, "status": "ERROR",
+                        "errorResultXdr": self._failure(stellar_xdr.TransactionResultCode.txBAD_SEQ)}
+            self.sequences[source] = expected
+            method, args, contract_id = self._call(envelope)
+            value, events = self._execute(method, args, contract_id)
+            self.pending[source] = time.monotonic() + self.close_delay
+            self.transactions[tx_hash] = {
+                "applied_at": self.pending[source],
+                "envelope": params["transaction"],
+                "return_value": value,
+                "events": events,
+            }
+        return {**base, "status": "PENDING"}
+
+    def getTransaction(self, params):
+        base = {"latestLedger": self.ledger, "latestLedgerCloseTime": str(int(time.time())),
+                "oldestLedger": START_LEDGER, "oldestLedgerCloseTime": "0"}
+        tx = self.transactions.get(params["hash"])
+        if tx is None or time.monotonic() < tx["applied_at"]:
+            return {**base, "status": "NOT_FOUND"}
+        meta = stellar_xdr.TransactionMeta(v=3, v3=stellar_xdr.TransactionMetaV3(
+            ext=stellar_xdr.ExtensionPoint(0),
+            tx_changes_before=stellar_xdr.LedgerEntryChanges([]),
+            operations=[],
+            tx_changes_after=stellar_xdr.LedgerEntryChanges([]),
+            soroban_meta=stellar_xdr.SorobanTransactionMeta(
+                ext=stellar_xdr.ExtensionPoint(0), events=tx["events"], return_value=tx["return_value"],
+                diagnostic_events=[],
+            ),
+        ))
+        return {**base, "status": "SUCCESS", "applicationOrder": 1, "feeBump": False,
+                "envelopeXdr": tx["envelope"], "resultMetaXdr": meta.to_xdr(), "ledger": self.ledger,
+                "createdAt": str(int(time.time()))}
+
+    def getEvents(self, params):
+        contract_ids = {c for f in params.get("filters", []) for c in f.get("contractIds", [])}
+        pagination = params.get("pagination") or {}
+        limit, cursor = pagination.get("limit", 100), pagination.get("cursor")
+        latest = max([self.ledger] + [e["ledger"] for e in self.events])
+        events = [e for e in self.events if not contract_ids or e["contractId"] in contract_ids]
+        if cursor:
+            events = [e for e in events if e["id"] > cursor]
+        else:
+            events = [e for e in events if e["ledger"] >= params.get("startLedger", START_LEDGER)]
+        page = events[:limit]
+        return {"events": page, "latestLedger": latest,
+                "cursor": page[-1]["id"] if page else (cursor or f"{latest << 32:019d}-{0:010d}")}
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    def dispatch(self, payload: dict) -> dict:
+        self.requests += 1
+        method: Optional[Callable] = getattr(self, payload.get("method", ""), None)
+        if method is None or not payload.get("method", "")[:1].islower():
+            return {"jsonrpc": "2.0", "id": payload.get("id"),
+                    "error": {"code": -32601, "message": "method not found"}}
+        if self.latency:
+            time.sleep(self.latency)
+        try:
+            return {"jsonrpc": "2.0", "id": payload.get("id"), "result": method(payload.get("params") or {})}
+        except Exception as e:
+            return {"jsonrpc": "2.0", "id": payload.get("id"), "error": {"code": -32602, "message": str(e)}}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def setup(self):
+                super().setup()
+                stub.connections += 1
+                if stub.connect_delay:
+                    time.sleep(stub.connect_delay)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                try:
+                    response = stub.dispatch(json.loads(body))
+                except json.JSONDecodeError:
+                    response = {"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "parse error"}}
+                data = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Soroban RPC stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Added to every request")
+    parser.add_argument("--connect-ms", type=float, default=0, help="Added to every new connection")
+    parser.add_argument("--close-ms", type=float, default=50, help="Delay before a sent transaction is applied")
+    parser.add_argument("--events", help="JSON file of recorded contract events served by getEvents")
+    args = parser.parse_args()
+
+    events = None
+    if args.events:
+        with open(args.events) as f:
+            events = json.load(f)["events"]
+    stub = SorobanRPCStub(args.host, args.port, args.latency_ms / 1000, args.close_ms / 1000,
+                          connect_delay=args.connect_ms / 1000, events=events)
+    print(f"Soroban RPC stub listening on {stub.url}")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
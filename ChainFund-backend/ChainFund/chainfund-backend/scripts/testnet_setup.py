@@ -40,9 +40,8 @@ async def main():
     # Fund accounts
     print("💰 Funding test accounts...")
 
-    for name, keypair in accounts.items():
-        print(f"Funding {name}...")
-        success = stellar_utils.fund_account(keypair["public_key"])
+    funded = await asyncio.gather(*(stellar_utils.fund_account(k["public_key"]) for k in accounts.values()))
+    for (name, keypair), success in zip(accounts.items(), funded):
         if success:
             print(f"✅ Funded {name}")
         else:
@@ -3,7 +3,8 @@ ChainFund Lite API Server with SQLite
 Zero-configuration backend - no MongoDB needed!
 """
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
@@ -17,6 +18,20 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.database import get_db_connection, to_json, from_json, init_database, DB_PATH
+from app.config import settings
+from app.services.shared_state import shared_state
+from app.services.wallet_identity import wallet_identity
+from app.services.email_dispatcher import email_dispatcher
+from app.services.email_outbox import email_outbox
+from app.services.email_fanout import email_fanout
+from app.services.notification_digest import notification_digest
+from app.utils.metrics import metrics
+from app.services.ai_scoring import ai_scoring, add_score_filters
+from app.services.ai_jobs import ai_jobs
+from app.services.ai_usage import ai_usage
+from app.services.chain_indexer import chain_indexer
+from app.utils import process_pool
+from app.utils.http_client import http_client
 
 # Import security middleware
 try:
@@ -64,6 +79,21 @@ except ImportError as e:
     MARKETPLACE_AVAILABLE = False
     print(f"⚠️  Marketplace router not available: {e}")
 
+try:
+    from app.routers import api_keys
+    from app.services.api_key_service import api_key_service
+    API_KEYS_AVAILABLE = True
+except ImportError as e:
+    API_KEYS_AVAILABLE = False
+    print(f"⚠️  API keys router not available: {e}")
+
+try:
+    from app.routers import notifications
+    NOTIFICATIONS_AVAILABLE = True
+except ImportError as e:
+    NOTIFICATIONS_AVAILABLE = False
+    print(f"⚠️  Notifications router not available: {e}")
+
 # ==================== PYDANTIC MODELS ====================
 
 class UserCreate(BaseModel):
@@ -146,9 +176,32 @@ async def lifespan(app: FastAPI):
     print("🚀 Starting ChainFund Lite API...")
     init_database()
     print(f"📁 Database: {DB_PATH}")
+    if API_KEYS_AVAILABLE:
+        api_key_service.start()
+    email_dispatcher.start()
+    email_outbox.start()
+    email_fanout.start()
+    notification_digest.start()
+    ai_scoring.start()
+    ai_jobs.start()
+    ai_usage.start()
+    if settings.chain_indexer_enabled:
+        chain_indexer.start()
     print("✅ Server ready!")
     yield
     print("🛑 Server shutting down...")
+    await chain_indexer.stop()
+    await ai_jobs.stop()
+    process_pool.shutdown()
+    await ai_scoring.stop()
+    await ai_usage.stop()  # after the AI workers, so their last calls are flushed
+    await notification_digest.stop()
+    await email_fanout.stop()
+    await email_outbox.stop()
+    await email_dispatcher.stop()
+    if API_KEYS_AVAILABLE:
+        await api_key_service.stop()
+    await http_client.aclose()
 
 app = FastAPI(
     title="ChainFund Lite API",
@@ -169,7 +222,11 @@ app.add_middleware(
 # Add security middleware
 if SECURITY_AVAILABLE:
     app.add_middleware(SecurityHeadersMiddleware)
-    app.add_middleware(RateLimitMiddleware, requests_per_minute=100)
+    app.add_middleware(
+        RateLimitMiddleware,
+        requests_per_minute=100,
+        shared_state=shared_state if settings.horizontal_scaling else None
+    )
     print("✅ Security middleware enabled (Rate Limiting: 100 req/min)")
 else:
     print("⚠️  Running without security middleware")
@@ -197,6 +254,17 @@ if MARKETPLACE_AVAILABLE:
     app.include_router(marketplace.router)
     print("✅ Marketplace router included")
 
+if API_KEYS_AVAILABLE:
+    app.include_router(api_keys.router)
+    print("✅ API keys router included")
+
+# Public reads stay anonymous; an X-API-Key with the "read" scope is verified, rate limited and metered
+READ_API_KEY = [Depends(api_keys.optional_api_key("read"))] if API_KEYS_AVAILABLE else []
+
+if NOTIFICATIONS_AVAILABLE:
+    app.include_router(notifications.router)
+    print("✅ Notifications router included")
+
 
 # ==================== STARTUP EVENT ====================
 
@@ -218,10 +286,17 @@ async def root():
 async def health_check():
     return {"status": "healthy", "database": "sqlite"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint(format: str = Query("prometheus", pattern="^(prometheus|json)$")):
+    """Process metrics (e.g. AI cache hit ratio) in Prometheus text format, or JSON"""
+    if format == "json":
+        return JSONResponse(metrics.snapshot())
+    return metrics.render()
+
 
 # ==================== USER ENDPOINTS ====================
 
-@app.get("/api/v1/users")
+@app.get("/api/v1/users", dependencies=READ_API_KEY)
 async def get_users(limit: int = 50, offset: int = 0):
     """Get all users"""
     with get_db_connection() as conn:
@@ -239,7 +314,7 @@ async def get_users(limit: int = 50, offset: int = 0):
         return {"users": users, "total": len(users)}
 
 
-@app.get("/api/v1/users/{wallet_address}")
+@app.get("/api/v1/users/{wallet_address}", dependencies=READ_API_KEY)
 async def get_user(wallet_address: str):
     """Get user by wallet address"""
     with get_db_connection() as conn:
@@ -275,6 +350,7 @@ async def create_user(user: UserCreate):
             to_json(user.skills),
             datetime.now().isoformat()
         ))
+        wallet_identity.link(cursor, user.wallet_address, cursor.lastrowid)
         conn.commit()
         
         return {"message": "User created/updated", "wallet_address": user.wallet_address}
@@ -282,29 +358,38 @@ async def create_user(user: UserCreate):
 
 # ==================== PROJECT ENDPOINTS ====================
 
-@app.get("/api/v1/projects")
+@app.get("/api/v1/projects", dependencies=READ_API_KEY)
 async def get_projects(
     category: Optional[str] = None,
     status: str = "active",
+    min_score: Optional[int] = Query(None, ge=0, le=100),
+    max_score: Optional[int] = Query(None, ge=0, le=100),
+    sort: str = Query("newest", pattern="^(newest|score_desc|score_asc)$"),
     limit: int = 50,
     offset: int = 0
 ):
-    """Get all projects with optional filtering"""
+    """Get all projects with optional filtering (min/max_score use the batch AI greenwashing score)"""
     with get_db_connection() as conn:
         cursor = conn.cursor()
         
-        query = "SELECT * FROM projects WHERE 1=1"
+        query = """
+            SELECT p.*, s.score AS ai_score, s.credibility_level AS ai_credibility_level
+            FROM projects p
+            LEFT JOIN project_ai_scores s ON s.source = 'projects' AND s.project_id = p.id
+            WHERE 1=1
+        """
         params = []
         
         if status:
-            query += " AND status = ?"
+            query += " AND p.status = ?"
             params.append(status)
         
         if category and category.lower() != "all":
-            query += " AND category = ?"
+            query += " AND p.category = ?"
             params.append(category)
         
-        query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+        query, params = add_score_filters(query, params, min_score, max_score, sort, "p")
+        query += " LIMIT ? OFFSET ?"
         params.extend([limit, offset])
         
         cursor.execute(query, params)
@@ -318,7 +403,7 @@ async def get_projects(
         return {"projects": projects, "count": len(projects)}
 
 
-@app.get("/api/v1/projects/{slug}")
+@app.get("/api/v1/projects/{slug}", dependencies=READ_API_KEY)
 async def get_project_by_slug(slug: str):
     """Get single project by slug"""
     with get_db_connection() as conn:
@@ -406,7 +491,7 @@ async def downvote_project(project_id: int):
 
 # ==================== GIG ENDPOINTS ====================
 
-@app.get("/api/v1/gigs")
+@app.get("/api/v1/gigs", dependencies=READ_API_KEY)
 async def get_gigs(
     category: Optional[str] = None,
     limit: int = 50,
@@ -441,7 +526,7 @@ async def get_gigs(
         return {"gigs": gigs, "total": len(gigs)}
 
 
-@app.get("/api/v1/gigs/{gig_id}")
+@app.get("/api/v1/gigs/{gig_id}", dependencies=READ_API_KEY)
 async def get_gig(gig_id: int):
     """Get gig by ID"""
     with get_db_connection() as conn:
@@ -549,7 +634,7 @@ async def create_order(order: OrderCreate):
 
 # ==================== TRANSACTION ENDPOINTS ====================
 
-@app.get("/api/v1/transactions")
+@app.get("/api/v1/transactions", dependencies=READ_API_KEY)
 async def get_transactions(wallet: Optional[str] = None, limit: int = 50):
     """Get transactions"""
     with get_db_connection() as conn:
@@ -592,7 +677,7 @@ async def get_transactions(wallet: Optional[str] = None, limit: int = 50):
 
 # ==================== CONTRACT STATUS ENDPOINT ====================
 
-@app.get("/contracts/status/{project_id}")
+@app.get("/contracts/status/{project_id}", dependencies=READ_API_KEY)
 async def get_contract_status(project_id: str):
     """Get contract status for a project"""
     with get_db_connection() as conn:
@@ -623,7 +708,7 @@ async def get_contract_status(project_id: str):
 
 # ==================== STATS ENDPOINT ====================
 
-@app.get("/api/v1/stats")
+@app.get("/api/v1/stats", dependencies=READ_API_KEY)
 async def get_stats():
     """Get platform statistics"""
     with get_db_connection() as conn:
@@ -661,9 +746,20 @@ if __name__ == "__main__":
     print("📚 API Docs: http://localhost:8000/docs")
     print("="*50 + "\n")
     
-    uvicorn.run(
-        "sqlite_server:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True
-    )
+    if settings.horizontal_scaling:
+        # Signing keys and counters are shared, so run one worker per core
+        workers = settings.web_workers or os.cpu_count() or 1
+        print(f"⚙️  Horizontal scaling: {workers} workers")
+        uvicorn.run(
+            "sqlite_server:app",
+            host="0.0.0.0",
+            port=8000,
+            workers=workers
+        )
+    else:
+        uvicorn.run(
+            "sqlite_server:app",
+            host="0.0.0.0",
+            port=8000,
+            reload=True
+        )
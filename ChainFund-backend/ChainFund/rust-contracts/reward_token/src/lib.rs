@@ -1,5 +1,5 @@
 #![no_std]
-use soroban_sdk::{contract, contractimpl, Address, Env, String, symbol_short};
+use soroban_sdk::{contract, contractimpl, Address, Env, String, Vec, symbol_short};
 
 #[contract]
 pub struct RewardToken;
@@ -45,6 +45,37 @@ impl RewardToken {
         true
     }
 
+    pub fn batch_mint_reward(env: Env, admin: Address, rewards: Vec<(Address, i128)>) -> u32 {
+        // One authorization and one supply update for the whole batch
+        admin.require_auth();
+        if !env.storage().instance().get::<Address, bool>(&admin).unwrap_or(false) {
+            return 0;
+        }
+
+        let balances = env.storage().persistent();
+        let mut minted = 0u32;
+        let mut total_minted = 0i128;
+        for (to, amount) in rewards.iter() {
+            if amount <= 0 {
+                continue;
+            }
+            let current = balances.get::<Address, i128>(&to).unwrap_or(0);
+            balances.set(&to, &(current + amount));
+            total_minted += amount;
+            minted += 1;
+
+            // Same event as mint_reward, so each recipient can be matched to its mint
+            env.events().publish(
+                (symbol_short!("MINT"), to),
+                amount
+            );
+        }
+
+        let total = env.storage().instance().get::<_, i128>(&symbol_short!("supply")).unwrap_or(0);
+        env.storage().instance().set(&symbol_short!("supply"), &(total + total_minted));
+        minted
+    }
+
     pub fn get_balance(env: Env, account: Address) -> i128 {
         env.storage().persistent().get(&account).unwrap_or(0)
     }